@@ -14,6 +14,10 @@ def create_app(config_name='default'):
     from config import config
     app.config.from_object(config[config_name])
     
+    # Journalisation (avant tout log, y compris app.logger de Flask)
+    from app.utils.journalisation import configurer_journalisation
+    configurer_journalisation(app.config)
+    
     # Configuration sessions sécurisées
     app.config['PERMANENT_SESSION_LIFETIME'] = 14400  # 4 heures
     
@@ -55,10 +59,29 @@ def create_app(config_name='default'):
             db.create_all()
             print("Tables de base de données créées/vérifiées")
             
+            # Index et colonnes ajoutés aux tables existantes (create_all ne les modifie pas)
+            from app.utils.migrations import appliquer_migrations
+            appliquer_migrations(db)
+            
             # Initialiser l'authentification
             from app.controleur.controleur_user_management import init_user_management
             init_user_management()
             
+            # Automates nommés des projets, puis tags configurés scrutés en tâche de fond
+            try:
+                from app.controleur.controleur_tags import registre_automates
+                registre_automates.recharger()
+            except ImportError:
+                print("Moteur d'acquisition non disponible")
+            
+            # Bandes mortes d'historisation des tags
+            from app.utils.historien import historien
+            historien.charger_configuration()
+            
+            # Alarmes compilées en index par tag (évaluées à chaque changement publié)
+            from app.utils.moteur_alarmes import moteur_alarmes
+            moteur_alarmes.charger_alarmes()
+            
             # ✅ CORRIGÉ : Créer un projet par défaut si aucun existe
             from app.models.modele_tag import HMIProject
             if HMIProject.query.count() == 0:
@@ -5,8 +5,11 @@ main_bp = Blueprint('main', __name__)
 
 # Import des routes (pour charger toutes les routes dans le blueprint)
 from app.controleur import controleur_tags
+from app.controleur import controleur_automates
 from app.controleur import controleur_graphics
 from app.controleur import controleur_user_management
 from app.controleur import controleur_auth
 from app.controleur import controleur_projects
-from app.controleur import controleur_icons
\ No newline at end of file
+from app.controleur import controleur_icons
+from app.controleur import controleur_historique
+from app.controleur import controleur_alarmes
\ No newline at end of file
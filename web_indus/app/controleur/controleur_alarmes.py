@@ -0,0 +1,136 @@
+from flask import request, jsonify, session, Response, stream_with_context
+from app.controleur import main_bp
+from app.models.modele_auth import AuthSystem
+from app.controleur.controleur_tags import registre_automates
+from app.controleur.controleur_historique import lire_instant, tags_demandes
+from app.utils.moteur_alarmes import moteur_alarmes, APPARITION, DISPARITION, ACQUITTEMENT
+from app.utils.journal_alarmes import journal_alarmes, LIMITE_PAGE_MAX
+from app.utils.flux_sse import flux_alarmes, sequence_reprise
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# API ALARMES (ENSEMBLE ACTIF, ACQUITTEMENT, FLUX DES TRANSITIONS, JOURNAL)
+# =================================================================
+
+TRANSITIONS = (APPARITION, DISPARITION, ACQUITTEMENT)
+LIMITE_PAGE_DEFAUT = 100
+
+
+def liste_parametre(nom):
+    """Valeurs d'un paramètre répété ou séparé par des virgules"""
+    return [v.strip() for valeur in request.args.getlist(nom) for v in valeur.split(',') if v.strip()]
+
+
+@main_bp.route('/api/alarms')
+@AuthSystem.login_required
+def api_alarms():
+    """API: Alarmes présentes ou non acquittées du projet courant"""
+    current_project_id = session.get('current_project_id')
+    sequence = moteur_alarmes.sequence
+    alarmes = moteur_alarmes.actives(current_project_id)
+    return jsonify({
+        "success": True,
+        "alarmes": alarmes,
+        "non_acquittees": sum(1 for a in alarmes if not a['acquittee']),
+        "sequence": sequence
+    })
+
+
+@main_bp.route('/api/alarms/ack', methods=['POST'], defaults={'id_alarme': None})
+@main_bp.route('/api/alarms/<int:id_alarme>/ack', methods=['POST'])
+@AuthSystem.login_required
+def api_alarms_ack(id_alarme):
+    """API: Acquitte une alarme, une liste {"ids": [...]} ou toutes celles du projet courant"""
+    data = request.get_json(silent=True) or {}
+    ids = [id_alarme] if id_alarme is not None else data.get('ids')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+        return jsonify({"error": "Champ 'ids' invalide (liste d'entiers attendue)"}), 400
+
+    acquittees = moteur_alarmes.acquitter(ids, session.get('username'), session.get('current_project_id'))
+    if id_alarme is not None and not acquittees:
+        return jsonify({"error": f"Alarme {id_alarme} non active ou déjà acquittée"}), 404
+
+    logger.info("%d alarme(s) acquittée(s) par %s", len(acquittees), session.get('username'))
+    return jsonify({"success": True, "acquittees": acquittees})
+
+
+@main_bp.route('/api/alarms/reload', methods=['POST'])
+@AuthSystem.auto_required
+def api_alarms_reload():
+    """API: Recharge les alarmes après modification (Alarme, GERER_ALARME, Tag.alarmes_actives)"""
+    regles = moteur_alarmes.charger_alarmes()
+    # Tags sous alarme scrutés en permanence
+    registre_automates.charger_tags_configures()
+    return jsonify({"success": True, "regles": regles, "stats": moteur_alarmes.stats()})
+
+
+@main_bp.route('/api/alarms/stream')
+@AuthSystem.login_required
+def api_alarms_stream():
+    """
+    Flux SSE des alarmes du projet courant : instantané, puis une transition par événement
+    Reprise après coupure : en-tête Last-Event-ID (ou ?depuis=<sequence>)
+    """
+    current_project_id = session.get('current_project_id')
+    reprise = sequence_reprise(
+        moteur_alarmes,
+        request.headers.get('Last-Event-ID') or request.args.get('depuis')
+    )
+
+    def construire():
+        return {'alarmes': moteur_alarmes.actives(current_project_id)}
+
+    flux = flux_alarmes(moteur_alarmes, construire, current_project_id, reprise)
+    return Response(stream_with_context(flux), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@main_bp.route('/api/alarms/history')
+@AuthSystem.login_required
+def api_alarms_history():
+    """
+    API: Journal des alarmes du projet courant, du plus récent au plus ancien, par pages
+    Filtres : start, end, tags, priorite, transition. Page suivante : ?cursor=<cursor de la réponse>
+    """
+    try:
+        debut = lire_instant(request.args.get('start'), None) if request.args.get('start') else None
+        fin = lire_instant(request.args.get('end'), None) if request.args.get('end') else None
+        limite = int(request.args.get('limit', LIMITE_PAGE_DEFAUT))
+    except ValueError as e:
+        return jsonify({"error": f"Paramètre invalide: {e}"}), 400
+    if not 1 <= limite <= LIMITE_PAGE_MAX:
+        return jsonify({"error": f"Paramètre invalide: 'limit' doit être compris entre 1 et {LIMITE_PAGE_MAX}"}), 400
+
+    transitions = [t.upper() for t in liste_parametre('transition')]
+    if any(t not in TRANSITIONS for t in transitions):
+        return jsonify({"error": f"Paramètre invalide: 'transition' doit être parmi {', '.join(TRANSITIONS)}"}), 400
+
+    ids_tags = None
+    noms_tags = liste_parametre('tags')
+    if noms_tags:
+        tags, introuvables = tags_demandes(','.join(noms_tags))
+        if introuvables:
+            return jsonify({"error": f"Tag(s) non trouvé(s): {', '.join(introuvables)}"}), 404
+        ids_tags = [tag.id_tag for tag in tags]
+
+    chrono = time.perf_counter()
+    try:
+        evenements, curseur = journal_alarmes.lire_page(
+            limite, request.args.get('cursor'), session.get('current_project_id'), ids_tags,
+            liste_parametre('priorite'), transitions, debut, fin
+        )
+    except ValueError:
+        return jsonify({"error": "Paramètre invalide: 'cursor'"}), 400
+
+    return jsonify({
+        "success": True,
+        "evenements": [e.to_dict() for e in evenements],
+        "nombre": len(evenements),
+        "cursor": curseur,
+        "duree_ms": round((time.perf_counter() - chrono) * 1000, 1)
+    })
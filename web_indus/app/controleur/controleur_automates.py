@@ -0,0 +1,261 @@
+from flask import request, jsonify, session
+from app.controleur import main_bp
+from app.models.modele_auth import AuthSystem
+from app.models.modele_tag import Tag, ConnexionAutomate, LierConnexionTag
+from app.controleur.controleur_tags import registre_automates
+from app.utils.image_tags import SOURCE_DEFAUT
+from app.utils.plan_runtime import invalider_plans
+from app import db
+import ipaddress
+import logging
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# API AUTOMATES NOMMÉS (PLUSIEURS CPU PAR PROJET)
+# =================================================================
+
+MODES_COMMUNICATION = ('REEL', 'SIMULATEUR')
+
+
+def valider_connexion(data, connexion=None):
+    """Valide les champs d'une connexion automate. Retourne: (succès, message)"""
+    nom = (data.get('nom_connexion') or (connexion.nom_connexion if connexion else '')).strip()
+    if not nom:
+        return False, "Champ 'nom_connexion' requis"
+    if nom == SOURCE_DEFAUT:
+        return False, f"Le nom '{SOURCE_DEFAUT}' est réservé à l'automate par défaut"
+
+    existante = ConnexionAutomate.query.filter_by(nom_connexion=nom).first()
+    if existante and (connexion is None or existante.id_connexion != connexion.id_connexion):
+        return False, f"Automate '{nom}' existe déjà"
+
+    adresse_ip = data.get('adresse_ip', connexion.adresse_ip if connexion else None)
+    try:
+        ipaddress.IPv4Address(adresse_ip)
+    except (ipaddress.AddressValueError, ValueError, TypeError):
+        return False, f"Format IP invalide: {adresse_ip}"
+
+    if data.get('mode_communication', 'REEL') not in MODES_COMMUNICATION:
+        return False, f"Mode de communication invalide (attendu: {', '.join(MODES_COMMUNICATION)})"
+
+    for champ in ('rack', 'slot', 'port', 'taille_pool'):
+        if data.get(champ) is not None:
+            try:
+                int(data[champ])
+            except (TypeError, ValueError):
+                return False, f"Champ '{champ}' invalide"
+
+    return True, "OK"
+
+
+def appliquer_champs(connexion, data):
+    for champ in ('nom_connexion', 'adresse_ip', 'description', 'mode_communication'):
+        if champ in data:
+            setattr(connexion, champ, data[champ].strip() if isinstance(data[champ], str) else data[champ])
+    for champ in ('rack', 'slot', 'port', 'taille_pool'):
+        if champ in data:
+            setattr(connexion, champ, int(data[champ]) if data[champ] is not None else None)
+    for champ in ('connexion_auto', 'actif'):
+        if champ in data:
+            setattr(connexion, champ, bool(data[champ]))
+
+
+def connexion_du_projet(id_connexion):
+    return ConnexionAutomate.query.filter_by(
+        id_connexion=id_connexion,
+        id_projet=session.get('current_project_id')
+    ).first()
+
+
+def recharger_automates(projet_id):
+    """Registre, plans runtime et tags scrutés après une modification des automates"""
+    registre_automates.recharger()
+    invalider_plans(projet_id)
+
+
+@main_bp.route('/api/automates', methods=['GET'])
+@AuthSystem.login_required
+def api_list_automates():
+    """API: Automates du projet actuel avec leur état de connexion"""
+    current_project_id = session.get('current_project_id')
+    if not current_project_id:
+        return jsonify({"error": "Aucun projet sélectionné"}), 400
+
+    connexions = ConnexionAutomate.query.filter_by(id_projet=current_project_id).all()
+    stats = registre_automates.stats()
+
+    automates = []
+    for connexion in connexions:
+        donnees = connexion.to_dict()
+        donnees['nombre_tags'] = LierConnexionTag.query.filter_by(id_connexion=connexion.id_connexion).count()
+        donnees['etat'] = stats.get(connexion.nom_connexion)
+        automates.append(donnees)
+
+    return jsonify({
+        "success": True,
+        "automates": automates,
+        "defaut": stats.get(SOURCE_DEFAUT)
+    })
+
+
+@main_bp.route('/api/automates', methods=['POST'])
+@AuthSystem.auto_required
+def api_create_automate():
+    """API: Déclarer un automate dans le projet actuel"""
+    current_project_id = session.get('current_project_id')
+    if not current_project_id:
+        return jsonify({"error": "Aucun projet sélectionné"}), 400
+
+    data = request.get_json() or {}
+    valide, message = valider_connexion(data)
+    if not valide:
+        return jsonify({"error": message}), 400
+
+    try:
+        connexion = ConnexionAutomate(id_projet=current_project_id)
+        appliquer_champs(connexion, data)
+        db.session.add(connexion)
+        db.session.commit()
+        logger.info("Automate %s déclaré (%s, projet %s)", connexion.nom_connexion, connexion.adresse_ip, current_project_id)
+        recharger_automates(current_project_id)
+
+        return jsonify({
+            "success": True,
+            "message": f"Automate '{connexion.nom_connexion}' créé",
+            "automate": connexion.to_dict()
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Erreur création: {str(e)}"}), 500
+
+
+@main_bp.route('/api/automates/<int:id_connexion>', methods=['PUT'])
+@AuthSystem.auto_required
+def api_update_automate(id_connexion):
+    """API: Modifier un automate (reconnexion si l'adresse ou le mode change)"""
+    connexion = connexion_du_projet(id_connexion)
+    if not connexion:
+        return jsonify({"error": f"Automate {id_connexion} non trouvé dans le projet actuel"}), 404
+
+    data = request.get_json() or {}
+    valide, message = valider_connexion(data, connexion)
+    if not valide:
+        return jsonify({"error": message}), 400
+
+    try:
+        appliquer_champs(connexion, data)
+        db.session.commit()
+        recharger_automates(connexion.id_projet)
+
+        return jsonify({
+            "success": True,
+            "message": f"Automate '{connexion.nom_connexion}' modifié",
+            "automate": connexion.to_dict()
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Erreur modification: {str(e)}"}), 500
+
+
+@main_bp.route('/api/automates/<int:id_connexion>', methods=['DELETE'])
+@AuthSystem.auto_required
+def api_delete_automate(id_connexion):
+    """API: Supprimer un automate (ses tags reviennent sur l'automate par défaut)"""
+    connexion = connexion_du_projet(id_connexion)
+    if not connexion:
+        return jsonify({"error": f"Automate {id_connexion} non trouvé dans le projet actuel"}), 404
+
+    try:
+        nom = connexion.nom_connexion
+        projet_id = connexion.id_projet
+        LierConnexionTag.query.filter_by(id_connexion=id_connexion).delete()
+        db.session.delete(connexion)
+        db.session.commit()
+        logger.info("Automate %s supprimé (projet %s)", nom, projet_id)
+        recharger_automates(projet_id)
+
+        return jsonify({
+            "success": True,
+            "message": f"Automate '{nom}' supprimé"
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Erreur suppression: {str(e)}"}), 500
+
+
+@main_bp.route('/api/automates/<int:id_connexion>/connect', methods=['POST'])
+@AuthSystem.auto_required
+def api_connect_automate(id_connexion):
+    """API: Connexion d'un automate nommé"""
+    connexion = connexion_du_projet(id_connexion)
+    if not connexion:
+        return jsonify({"error": f"Automate {id_connexion} non trouvé dans le projet actuel"}), 404
+    if connexion.nom_connexion not in registre_automates.sources():
+        return jsonify({"error": f"Automate '{connexion.nom_connexion}' inactif"}), 400
+
+    success, message = registre_automates.automate(connexion.nom_connexion).connect()
+    return jsonify({
+        "success": success,
+        "message": message,
+        "automate": connexion.nom_connexion
+    }), 200 if success else 502
+
+
+@main_bp.route('/api/automates/<int:id_connexion>/disconnect', methods=['POST'])
+@AuthSystem.auto_required
+def api_disconnect_automate(id_connexion):
+    """API: Déconnexion d'un automate nommé"""
+    connexion = connexion_du_projet(id_connexion)
+    if not connexion:
+        return jsonify({"error": f"Automate {id_connexion} non trouvé dans le projet actuel"}), 404
+    if connexion.nom_connexion not in registre_automates.sources():
+        return jsonify({"error": f"Automate '{connexion.nom_connexion}' inactif"}), 400
+
+    success, message = registre_automates.automate(connexion.nom_connexion).disconnect()
+    return jsonify({
+        "success": success,
+        "message": message,
+        "automate": connexion.nom_connexion
+    })
+
+
+@main_bp.route('/api/tags/<int:tag_id>/connexion', methods=['PUT'])
+@AuthSystem.auto_required
+def api_set_tag_connexion(tag_id):
+    """API: Rattacher un tag à un automate du projet (id_connexion null : automate par défaut)"""
+    current_project_id = session.get('current_project_id')
+    if not current_project_id:
+        return jsonify({"error": "Aucun projet sélectionné"}), 400
+
+    tag = Tag.query.filter_by(id_tag=tag_id, id_projet=current_project_id).first()
+    if not tag:
+        return jsonify({"error": f"Tag avec ID {tag_id} non trouvé dans le projet actuel"}), 404
+
+    data = request.get_json() or {}
+    id_connexion = data.get('id_connexion')
+
+    try:
+        LierConnexionTag.query.filter_by(id_tag=tag_id).delete()
+        nom = SOURCE_DEFAUT
+        if id_connexion:
+            connexion = connexion_du_projet(id_connexion)
+            if not connexion:
+                db.session.rollback()
+                return jsonify({"error": f"Automate {id_connexion} non trouvé dans le projet actuel"}), 404
+            db.session.add(LierConnexionTag(id_tag=tag_id, id_connexion=connexion.id_connexion))
+            nom = connexion.nom_connexion
+        db.session.commit()
+        recharger_automates(current_project_id)
+
+        return jsonify({
+            "success": True,
+            "message": f"Tag '{tag.nom_tag}' rattaché à l'automate '{nom}'"
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Erreur rattachement: {str(e)}"}), 500
@@ -1,20 +1,26 @@
-from flask import render_template, request, jsonify, redirect, url_for, flash, current_app, session
+from flask import render_template, request, jsonify, redirect, url_for, flash, current_app, session, Response, stream_with_context
 from app.controleur import main_bp
 from app.models.modele_tag import Tag
 from app.models.modele_auth import AuthSystem
-from app.models.modele_graphics import ColorRule
+from app.models.modele_graphics import ColorRule, invalider_regles, index_regles
 from app import db
+from app.utils.image_tags import image_tags, cle_image, QUALITE_EN_ATTENTE
+from app.utils.plan_runtime import obtenir_plan, invalider_plans, version_plans, vider_plans, stats_plans
+from app.utils.adresse_s7 import compiler_adresse
 import json
 import time
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 
 # =================================================================
 # CONTRÔLEUR GRAPHICS ÉTENDU AVEC SUPPORT COMPLET DES ICÔNES ET NAVIGATION
 # =================================================================
 
 # Cache simple pour le runtime (n'affecte pas le reste)
-runtime_cache_values = {}  # Cache des valeurs runtime
+# Les valeurs runtime sont lues dans l'image des tags (app.utils.image_tags)
 runtime_cache_tags = {}    # Cache des résolutions de tags
 
 # =================================================================
@@ -47,15 +53,29 @@ def resoudre_adresse_tag(tag_reference, projet_id=None):
         
         if tag:
             adresse = tag.adresse_tag
-            print(f"🔍 Résolution tag '{tag_reference}' -> '{adresse}' (projet {projet_id})")
+            logger.debug("Résolution tag '%s' -> '%s' (projet %s)", tag_reference, adresse, projet_id)
             return adresse
         else:
-            print(f"⚠️ Tag '{tag_reference}' non trouvé dans le projet {projet_id}")
+            logger.warning("Tag '%s' non trouvé dans le projet %s", tag_reference, projet_id)
             return tag_reference
     except Exception as e:
-        print(f"❌ Erreur résolution tag '{tag_reference}': {e}")
+        logger.error("Erreur résolution tag '%s': %s", tag_reference, e)
         return tag_reference
 
+def automate_du_tag(tag_reference, projet_id=None):
+    """Automate d'un tag référencé par nom (automate par défaut pour une adresse S7 directe)"""
+    from app.controleur.controleur_tags import registre_automates
+    
+    reference = (tag_reference or '').strip()
+    if not reference or ('DB' in reference.upper() and '.' in reference):
+        return registre_automates.automate()
+    
+    query = Tag.query.filter_by(nom_tag=reference)
+    if projet_id:
+        query = query.filter_by(id_projet=projet_id)
+    tag = query.first()
+    return registre_automates.automate_tag(tag.id_tag) if tag else registre_automates.automate()
+
 # =================================================================
 # ROUTES ÉDITEUR GRAPHIQUE AVEC SUPPORT ICÔNES
 # =================================================================
@@ -225,6 +245,7 @@ def api_create_page():
         
         db.session.add(nouvelle_page)
         db.session.commit()
+        invalider_plans(session.get('current_project_id'))
         
         return jsonify({
             'success': True,
@@ -261,6 +282,7 @@ def api_update_page(page_id):
             page.hauteur_page = max(600, min(3000, int(data['hauteur_page'])))
         
         db.session.commit()
+        invalider_plans(session.get('current_project_id'))
         return jsonify({'success': True, 'message': 'Page mise à jour avec succès'})
         
     except Exception as e:
@@ -393,6 +415,7 @@ def api_create_animation():
             db.session.add(liaison)
         
         db.session.commit()
+        invalider_plans(session.get('current_project_id'))
         
         # Vérification finale des données
         icon_data_verification = nouvelle_animation.get_icon_data()
@@ -515,6 +538,7 @@ def api_update_animation(animation_id):
         animation.set_regles_animation(regles)
         
         db.session.commit()
+        invalider_plans(session.get('current_project_id'))
         
         return jsonify({
             'success': True,
@@ -545,6 +569,7 @@ def api_delete_animation(animation_id):
         # Supprimer l'animation
         db.session.delete(animation)
         db.session.commit()
+        invalider_plans(session.get('current_project_id'))
         
         return jsonify({
             'success': True,
@@ -774,150 +799,65 @@ def api_navigation_statistics(project_id):
 def api_get_runtime_values(page_id):
     """Version corrigée avec couleurs dynamiques ET données complètes pour icônes"""
     try:
-        from app.controleur.controleur_tags import automate
-        from app.models.modele_graphics import apply_color_rules_batch
+        from app.controleur.controleur_tags import automate, registre_automates
     except ImportError:
         return jsonify({'success': False, 'error': 'Module automate non disponible'}), 500
     
-    from app.models.modele_graphics import Animation, ContenirAnimation, ColorRule
-    
     try:
-        # Récupérer TOUTES les animations de la page
-        animations = Animation.query.join(ContenirAnimation).filter(
-            ContenirAnimation.id_page == page_id
-        ).all()
-        
-        print(f"📊 Runtime API - Page {page_id}: {len(animations)} objets trouvés")
+        current_project_id = session.get('current_project_id')
         
-        # Séparer les animations avec et sans tags
-        animations_avec_tags = [a for a in animations if a.tag_lie and a.tag_lie.strip()]
-        animations_sans_tags = [a for a in animations if not (a.tag_lie and a.tag_lie.strip())]
+        # Plan compilé de la page : animations, règles, adresses et icônes déjà décodées
+        plan = obtenir_plan(page_id, current_project_id, automate.nom, compiler_adresse,
+                        registre_automates.source_tag)
         
-        print(f"  - {len(animations_avec_tags)} avec tags")
-        print(f"  - {len(animations_sans_tags)} sans tags")
+        # Lecture de tous les tags de la page en un seul accès à l'image des tags
+        periode_runtime = current_app.config.get('ACQUISITION_PERIODE_RUNTIME_MS', 500) / 1000
+        registre_automates.lire(plan.demandes, periode_runtime)
+        etats = plan.etats(image_tags)
         
         valeurs = {}
-        animations_avec_valeurs = []
-        current_project_id = session.get('current_project_id')
+        maintenant = datetime.now().isoformat()
         
         # TRAITER TOUTES LES ANIMATIONS, pas seulement celles avec tags
-        for animation in animations:
-            try:
-                # Données de base pour tous les objets
+        for objet in plan.objets:
+            if objet.id_animation in etats:
+                animation_data = etats[objet.id_animation]
+                del animation_data['sequence']
+                animation_data['timestamp'] = animation_data['timestamp'] or maintenant
+            else:
                 animation_data = {
                     'valeur': None,
-                    'qualite': 'NO_TAG' if not animation.tag_lie else 'READING',
-                    'timestamp': datetime.now().isoformat(),
-                    'couleur_normale': animation.couleur_normale,
-                    'couleur_actuelle': animation.couleur_normale,
-                    'objet_type': animation.type_objet
-                }
-                
-                # CORRECTION PRINCIPALE : Ajouter les données complètes pour le rendu frontend
-                # Récupérer les règles pour avoir les données d'icônes
-                regles = animation.get_regles_animation()
-                
-                # Pour les icônes, s'assurer que les données sont disponibles
-                if animation.type_objet == 'icon':
-                    icon_data_raw = regles.get('icon_data', '{}')
-                    
-                    # Parser et vérifier les données d'icône
-                    try:
-                        if isinstance(icon_data_raw, str):
-                            icon_data_parsed = json.loads(icon_data_raw) if icon_data_raw.strip() else {}
-                        else:
-                            icon_data_parsed = icon_data_raw or {}
-                        
-                        # NOUVEAU : Passer les données d'icône au frontend
-                        animation_data['icon_data'] = icon_data_parsed
-                        animation_data['icon_size'] = regles.get('icon_size', 1.0)
-                        animation_data['icon_rotation'] = regles.get('icon_rotation', 0)
-                        
-                        print(f"🖼️ Icône {animation.nom_animation}: {icon_data_parsed.get('nom_icon', 'INCONNU')}")
-                        
-                    except Exception as e:
-                        print(f"❌ Erreur parsing icon_data pour {animation.nom_animation}: {e}")
-                        animation_data['icon_data'] = {}
-                
-                # Si l'animation a un tag, lire sa valeur
-                if animation.tag_lie and animation.tag_lie.strip():
-                    try:
-                        adresse_resolue = resoudre_adresse_tag(animation.tag_lie, current_project_id)
-                        valeur, qualite = automate.lire_tag_par_adresse(adresse_resolue)
-                        
-                        animation_data.update({
-                            'valeur': valeur,
-                            'qualite': qualite,
-                            'tag_adresse': adresse_resolue
-                        })
-                        
-                        if valeur is not None:
-                            animations_avec_valeurs.append((animation, valeur))
-                            
-                    except Exception as e:
-                        animation_data.update({
-                            'valeur': None,
-                            'qualite': 'ERROR',
-                            'error': str(e)
-                        })
-                
-                valeurs[animation.id_animation] = animation_data
-                
-            except Exception as e:
-                print(f"❌ Erreur traitement animation {animation.id_animation}: {e}")
-                valeurs[animation.id_animation] = {
-                    'valeur': None,
-                    'qualite': 'ERROR',
-                    'error': str(e),
-                    'couleur_normale': animation.couleur_normale or '#CCCCCC',
-                    'couleur_actuelle': animation.couleur_normale or '#CCCCCC',
-                    'objet_type': animation.type_objet
+                    'qualite': 'NO_TAG',
+                    'timestamp': maintenant,
+                    'couleur_normale': objet.couleur_normale,
+                    'couleur_actuelle': objet.couleur_normale,
+                    'objet_type': objet.type_objet
                 }
-        
-        # Appliquer les couleurs dynamiques
-        if animations_avec_valeurs:
-            try:
-                couleurs_finales = {}
-                for animation, valeur in animations_avec_valeurs:
-                    couleur_finale = ColorRule.apply_rules_to_object(animation, valeur, current_project_id)
-                    couleurs_finales[animation.id_animation] = couleur_finale
-                
-                # Mettre à jour les valeurs avec les couleurs finales
-                for animation_id, couleur_finale in couleurs_finales.items():
-                    if animation_id in valeurs:
-                        valeurs[animation_id]['couleur_actuelle'] = couleur_finale
-                        valeurs[animation_id]['couleur_dynamique'] = (couleur_finale != valeurs[animation_id]['couleur_normale'])
-                        
-            except Exception as e:
-                print(f"Erreur application couleurs dynamiques: {e}")
-        
-        # Statut de connexion
-        connection_status = automate.get_status()
-        
-        # Statistiques de debug
-        icon_objects = len([a for a in animations if a.type_objet == 'icon'])
-        print(f"📊 Statistiques finales - Icônes: {icon_objects}, Tags: {len(animations_avec_tags)}")
+            
+            # Données complètes pour le rendu frontend des icônes
+            if objet.type_objet == 'icon':
+                animation_data['icon_data'] = objet.icon_data or {}
+                animation_data['icon_size'] = objet.icon_size
+                animation_data['icon_rotation'] = objet.icon_rotation
+            
+            valeurs[objet.id_animation] = animation_data
         
         return jsonify({
             'success': True,
             'valeurs': valeurs,
-            'timestamp': datetime.now().isoformat(),
-            'connection_status': {
-                'connected': connection_status.get('connected', False),
-                'simulation_mode': connection_status.get('simulation_mode', True),
-                'ip_address': connection_status.get('ip_address', '')
-            },
+            'timestamp': maintenant,
+            'connection_status': registre_automates.statut_connexion(plan.sources),
             'debug_info': {
-                'total_objects': len(animations),
-                'icon_objects': icon_objects,
-                'tagged_objects': len(animations_avec_tags),
+                'total_objects': len(plan.objets),
+                'icon_objects': sum(1 for objet in plan.objets if objet.type_objet == 'icon'),
+                'tagged_objects': len(plan.objets_tags),
                 'page_id': page_id,
                 'project_id': current_project_id
             }
         })
         
     except Exception as e:
-        print(f"❌ Erreur API runtime values: {e}")
+        logger.error("Erreur API runtime values: %s", e)
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -952,7 +892,7 @@ def api_runtime_action():
         regles = animation.get_regles_animation()
         page_destination = regles.get('page_destination')
         
-        print(f"🧭 Action navigation: {animation.nom_animation} vers page {page_destination}")
+        logger.info("Action navigation: %s vers page %s", animation.nom_animation, page_destination)
         
         if not page_destination:
             return jsonify({
@@ -983,12 +923,14 @@ def api_runtime_action():
     # Résoudre l'adresse du tag avec projet
     current_project_id = session.get('current_project_id')
     adresse_resolue = resoudre_adresse_tag(animation.tag_lie, current_project_id)
+    automate = automate_du_tag(animation.tag_lie, current_project_id)
     
-    print(f"🖱️ Action runtime {animation.type_objet}: {animation.nom_animation} | Tag: {animation.tag_lie} -> {adresse_resolue} | Action: {animation.action_clic}")
+    logger.info("Action runtime %s: %s | Tag: %s -> %s | Action: %s",
+                animation.type_objet, animation.nom_animation, animation.tag_lie, adresse_resolue, animation.action_clic)
     
     try:
         if animation.action_clic == 'write' and adresse_resolue and animation.valeur_ecriture:
-            print(f"✏️ Écriture tag {adresse_resolue} = {animation.valeur_ecriture}")
+            logger.info("Écriture tag %s = %s", adresse_resolue, animation.valeur_ecriture)
             success, status = automate.ecrire_tag_par_adresse(
                 adresse_resolue, 
                 animation.valeur_ecriture
@@ -1004,7 +946,7 @@ def api_runtime_action():
             })
             
         elif animation.action_clic == 'toggle' and adresse_resolue:
-            print(f"🔄 Basculement tag {adresse_resolue}")
+            logger.info("Basculement tag %s", adresse_resolue)
             valeur_actuelle, _ = automate.lire_tag_par_adresse(adresse_resolue)
             nouvelle_valeur = not bool(valeur_actuelle) if valeur_actuelle is not None else True
             
@@ -1029,7 +971,7 @@ def api_runtime_action():
             }), 400
             
     except Exception as e:
-        print(f"❌ Erreur action runtime: {e}")
+        logger.error("Erreur action runtime: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -1079,7 +1021,7 @@ def api_runtime_navigate():
             }), 404
         
         # Log de la navigation pour debug
-        print(f"🧭 Navigation: Animation '{animation.nom_animation}' ({animation.type_objet}) vers page '{page_destination.nom_page}'")
+        logger.info("Navigation: animation '%s' (%s) vers page '%s'", animation.nom_animation, animation.type_objet, page_destination.nom_page)
         
         return jsonify({
             'success': True,
@@ -1094,7 +1036,7 @@ def api_runtime_navigate():
         })
         
     except Exception as e:
-        print(f"❌ Erreur navigation runtime: {e}")
+        logger.error("Erreur navigation runtime: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -1107,135 +1049,47 @@ def api_runtime_navigate():
 @main_bp.route('/api/graphics/runtime/values/optimized/<int:page_id>')
 @AuthSystem.login_required
 def api_get_runtime_values_turbo(page_id):
-    """API RUNTIME OPTIMISÉE avec couleurs dynamiques"""
+    """API RUNTIME OPTIMISÉE avec couleurs dynamiques (?depuis=<sequence> pour ne marquer que les changements)"""
     try:
-        from app.controleur.controleur_tags import automate
+        from app.controleur.controleur_tags import automate, registre_automates
     except ImportError:
         return jsonify({
             'success': False,
             'error': 'Module automate non disponible'
         }), 500
     
-    from app.models.modele_graphics import Animation, ContenirAnimation, apply_color_rules_batch
-    
     try:
-        # Récupérer les animations avec tags liés
-        animations = Animation.query.join(ContenirAnimation).filter(
-            ContenirAnimation.id_page == page_id
-        ).all()
-        
-        animations_avec_tags = []
-        for animation in animations:
-            tag_lie = animation.tag_lie
-            if tag_lie and tag_lie.strip():
-                animations_avec_tags.append(animation)
-        
-        valeurs = {}
-        changed_objects = []
-        animations_avec_valeurs = []
         current_project_id = session.get('current_project_id')
         
-        for animation in animations_avec_tags:
-            try:
-                # OPTIMISATION : Utiliser le cache de résolution des tags
-                tag_lie = animation.tag_lie
-                cache_key_tag = f"{current_project_id}_{tag_lie}"
-                if cache_key_tag in runtime_cache_tags:
-                    adresse_resolue = runtime_cache_tags[cache_key_tag]
-                else:
-                    adresse_resolue = resoudre_adresse_tag(tag_lie, current_project_id)
-                    runtime_cache_tags[cache_key_tag] = adresse_resolue
-                
-                # Lire la valeur
-                valeur, qualite = automate.lire_tag_par_adresse(adresse_resolue)
-                
-                # Ajouter pour les règles de couleur
-                if valeur is not None:
-                    animations_avec_valeurs.append((animation, valeur))
-                
-                # OPTIMISATION : Détecter les changements
-                cache_key = f"{page_id}_{animation.id_animation}"
-                old_value = runtime_cache_values.get(cache_key)
-                
-                value_changed = old_value is None or old_value.get('valeur') != valeur
-                if value_changed:
-                    changed_objects.append(animation.id_animation)
-                
-                # Mettre à jour le cache
-                runtime_cache_values[cache_key] = {
-                    'valeur': valeur,
-                    'qualite': qualite,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                # Données enrichies
-                valeur_data = {
-                    'valeur': valeur,
-                    'qualite': qualite,
-                    'timestamp': datetime.now().isoformat(),
-                    'changed': value_changed,
-                    'tag_adresse': adresse_resolue,
-                    'tag_original': animation.tag_lie,
-                    'objet_type': animation.type_objet,
-                    'couleur_normale': animation.couleur_normale,
-                    'couleur_actuelle': animation.couleur_normale
-                }
-                
-                # Ajouter les données d'icône pour le rendu
-                if animation.type_objet == 'icon':
-                    icon_info = animation.get_icon_info()
-                    if icon_info:
-                        valeur_data['icon_info'] = icon_info
-                
-                valeurs[animation.id_animation] = valeur_data
-                
-            except Exception as e:
-                valeur_data = {
-                    'valeur': None,
-                    'qualite': 'ERROR',
-                    'error': str(e),
-                    'changed': True,
-                    'tag_adresse': animation.tag_lie,
-                    'objet_type': animation.type_objet,
-                    'couleur_normale': animation.couleur_normale,
-                    'couleur_actuelle': animation.couleur_normale
-                }
-                
-                # Ajouter données d'icône même en cas d'erreur
-                if animation.type_objet == 'icon':
-                    icon_info = animation.get_icon_info()
-                    if icon_info:
-                        valeur_data['icon_info'] = icon_info
-                
-                valeurs[animation.id_animation] = valeur_data
-                changed_objects.append(animation.id_animation)
+        # OPTIMISATION : Plan compilé de la page (reconstruit seulement après une modification)
+        plan = obtenir_plan(page_id, current_project_id, automate.nom, compiler_adresse,
+                        registre_automates.source_tag)
         
-        # NOUVEAU : Appliquer les règles de couleur dynamique
-        if animations_avec_valeurs:
-            try:
-                couleurs_finales = apply_color_rules_batch(  # Fonction corrigée
-                    animations_avec_valeurs, 
-                    current_project_id
-                )
-                
-                # Détecter les changements de couleur
-                for animation_id, couleur_finale in couleurs_finales.items():
-                    if animation_id in valeurs:
-                        couleur_precedente = valeurs[animation_id]['couleur_actuelle']
-                        valeurs[animation_id]['couleur_actuelle'] = couleur_finale
-                        valeurs[animation_id]['couleur_dynamique'] = True
-                        
-                        # Marquer comme changé si couleur différente
-                        if couleur_finale != couleur_precedente and animation_id not in changed_objects:
-                            changed_objects.append(animation_id)
-                            valeurs[animation_id]['changed'] = True
-                            print(f"🎨 Couleur changée pour {animation_id}: {couleur_precedente} → {couleur_finale}")
-                            
-            except Exception as e:
-                print(f"⚠️ Erreur couleurs dynamiques: {e}")
+        # OPTIMISATION : Lecture de l'image des tags, alimentée par le moteur d'acquisition.
+        # Les changements sont détectés par numéro de séquence : le client renvoie
+        # la séquence reçue au cycle précédent (?depuis=...)
+        depuis = request.args.get('depuis', 0, type=int)
+        sequence = image_tags.sequence
+        periode_runtime = current_app.config.get('ACQUISITION_PERIODE_RUNTIME_MS', 500) / 1000
+        registre_automates.lire(plan.demandes, periode_runtime)
         
-        # Statut de connexion
-        connection_status = automate.get_status()
+        valeurs = plan.etats(image_tags)
+        changed_objects = []
+        
+        for objet in plan.objets_tags:
+            valeur_data = valeurs[objet.id_animation]
+            value_changed = valeur_data.pop('sequence') > depuis or valeur_data['qualite'] == QUALITE_EN_ATTENTE
+            if value_changed:
+                changed_objects.append(objet.id_animation)
+            
+            valeur_data['changed'] = value_changed
+            valeur_data['tag_original'] = objet.tag_lie
+            if valeur_data['timestamp'] is None:
+                valeur_data['timestamp'] = datetime.now().isoformat()
+            
+            # Données d'icône pré-calculées dans le plan
+            if objet.icon_info:
+                valeur_data['icon_info'] = objet.icon_info
         
         return jsonify({
             'success': True,
@@ -1243,21 +1097,19 @@ def api_get_runtime_values_turbo(page_id):
             'timestamp': datetime.now().isoformat(),
             'changed_objects': changed_objects,
             'total_changed': len(changed_objects),
-            'connection_status': {
-                'connected': connection_status.get('connected', False),
-                'simulation_mode': connection_status.get('simulation_mode', True),
-                'ip_address': connection_status.get('ip_address', '')
-            },
+            'sequence': sequence,
+            'connection_status': registre_automates.statut_connexion(plan.sources),
             'debug_info': {
-                'total_animations': len(animations),
-                'animations_with_tags': len(animations_avec_tags),
+                'total_animations': len(plan.objets),
+                'animations_with_tags': len(plan.objets_tags),
                 'page_id': page_id,
-                'projet_id': current_project_id
+                'projet_id': current_project_id,
+                'plan_version': plan.version
             }
         })
         
     except Exception as e:
-        print(f"⚠️ Erreur API runtime values optimisée: {e}")
+        logger.error("Erreur API runtime values optimisée: %s", e)
         import traceback
         traceback.print_exc()
         return jsonify({
@@ -1266,6 +1118,74 @@ def api_get_runtime_values_turbo(page_id):
             'debug': 'Erreur dans api_get_runtime_values_turbo'
         }), 500
 
+# =================================================================
+# FLUX RUNTIME (SERVER-SENT EVENTS) - DELTAS POUSSÉS PAR LE SERVEUR
+# =================================================================
+
+@main_bp.route('/api/graphics/runtime/stream/<int:page_id>')
+@AuthSystem.login_required
+def api_runtime_stream(page_id):
+    """
+    Flux SSE des valeurs runtime d'une page : instantané puis deltas (valeurs, couleurs, visibilité)
+    Reprise après coupure : en-tête Last-Event-ID (ou ?depuis=<sequence>)
+    """
+    try:
+        from app.controleur.controleur_tags import automate, registre_automates
+    except ImportError:
+        return jsonify({
+            'success': False,
+            'error': 'Module automate non disponible'
+        }), 500
+
+    from app.utils.flux_sse import flux_image, sequence_reprise
+
+    current_project_id = session.get('current_project_id')
+    plan = obtenir_plan(page_id, current_project_id, automate.nom, compiler_adresse,
+                        registre_automates.source_tag)
+    db.session.remove()
+
+    periode_runtime = current_app.config.get('ACQUISITION_PERIODE_RUNTIME_MS', 500) / 1000
+    duree_bail = current_app.config.get('ACQUISITION_DUREE_BAIL_S', 30)
+    reprise = sequence_reprise(
+        image_tags,
+        request.headers.get('Last-Event-ID') or request.args.get('depuis')
+    )
+    etat_connexion = {}
+
+    def renouveler():
+        registre_automates.abonner_lot(plan.demandes, periode_runtime)
+
+    def construire(cles_modifiees):
+        etats = plan.etats(image_tags, plan.objets_modifies(cles_modifiees))
+        for donnees in etats.values():
+            del donnees['sequence']
+        donnees = {'page_id': page_id, 'valeurs': etats}
+
+        # Page modifiée dans l'éditeur : le client recharge ses objets et rouvre le flux
+        if plan.version != version_plans(current_project_id):
+            donnees['plan_modifie'] = True
+
+        # Statut de connexion envoyé à l'instantané puis seulement s'il change
+        connexion = registre_automates.statut_connexion(plan.sources)
+        if cles_modifiees is None or connexion != etat_connexion:
+            etat_connexion.clear()
+            etat_connexion.update(connexion)
+            donnees['connection_status'] = connexion
+
+        return donnees
+
+    flux = flux_image(
+        image_tags, plan.cles, construire,
+        reprise=reprise,
+        renouveler=renouveler,
+        periode_renouvellement=duree_bail / 2
+    )
+
+    return Response(stream_with_context(flux), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @main_bp.route('/api/graphics/runtime/action/fast', methods=['POST'])
 @AuthSystem.login_required
 def api_runtime_action_turbo():
@@ -1302,8 +1222,10 @@ def api_runtime_action_turbo():
         adresse_resolue = resoudre_adresse_tag(tag_lie, current_project_id)
         runtime_cache_tags[cache_key_tag] = adresse_resolue
     
+    automate = automate_du_tag(tag_lie, current_project_id)
+    
     obj_desc = f"{animation.type_objet} '{animation.nom_animation}'"
-    print(f"🖱️ Action runtime turbo {obj_desc} | Tag: {tag_lie} -> {adresse_resolue} | Action: {animation.action_clic}")
+    logger.info("Action runtime turbo %s | Tag: %s -> %s | Action: %s", obj_desc, tag_lie, adresse_resolue, animation.action_clic)
     
     try:
         if animation.action_clic == 'write' and adresse_resolue and animation.valeur_ecriture:
@@ -1322,18 +1244,10 @@ def api_runtime_action_turbo():
             except:
                 pass  # Garder la valeur string
             
-            print(f"✏️ Écriture tag turbo {adresse_resolue} = {valeur_a_ecrire}")
+            logger.info("Écriture tag turbo %s = %s", adresse_resolue, valeur_a_ecrire)
             success, status = automate.ecrire_tag_par_adresse(adresse_resolue, valeur_a_ecrire)
             
-            # OPTIMISATION : Mise à jour immédiate du cache si succès
-            if success:
-                cache_key = f"*_{animation_id}"  # Générique pour toutes les pages
-                runtime_cache_values[cache_key] = {
-                    'valeur': valeur_a_ecrire,
-                    'qualite': 'GOOD',
-                    'timestamp': datetime.now().isoformat()
-                }
-            
+            # L'écriture réussie est publiée dans l'image des tags par l'automate
             response_data = {
                 'success': success,
                 'message': f"Écriture {'réussie' if success else 'échouée'}: {status}",
@@ -1353,30 +1267,21 @@ def api_runtime_action_turbo():
             return jsonify(response_data)
             
         elif animation.action_clic == 'toggle' and adresse_resolue:
-            print(f"🔄 Basculement tag turbo {adresse_resolue}")
+            logger.info("Basculement tag turbo %s", adresse_resolue)
             
-            # OPTIMISATION : Essayer d'abord le cache
-            cache_key = f"*_{animation_id}"
-            cached_value = runtime_cache_values.get(cache_key)
-            if cached_value and cached_value['qualite'] == 'GOOD':
-                valeur_actuelle = cached_value['valeur']
-                print(f"📦 Valeur depuis cache: {valeur_actuelle}")
+            # OPTIMISATION : Essayer d'abord l'image des tags
+            entree = image_tags.lire(cle_image(automate.nom, adresse_resolue))
+            if entree and entree.qualite == 'GOOD':
+                valeur_actuelle = entree.valeur
+                logger.debug("Valeur depuis image des tags: %s", valeur_actuelle)
             else:
                 valeur_actuelle, _ = automate.lire_tag_par_adresse(adresse_resolue)
-                print(f"📡 Valeur depuis automate: {valeur_actuelle}")
+                logger.debug("Valeur depuis automate: %s", valeur_actuelle)
             
             nouvelle_valeur = not bool(valeur_actuelle) if valeur_actuelle is not None else True
             
             success, status = automate.ecrire_tag_par_adresse(adresse_resolue, nouvelle_valeur)
             
-            # OPTIMISATION : Mise à jour immédiate du cache si succès
-            if success:
-                runtime_cache_values[cache_key] = {
-                    'valeur': nouvelle_valeur,
-                    'qualite': 'GOOD',
-                    'timestamp': datetime.now().isoformat()
-                }
-            
             response_data = {
                 'success': success,
                 'message': f"Basculement {'réussi' if success else 'échoué'}: {status}",
@@ -1404,7 +1309,7 @@ def api_runtime_action_turbo():
             }), 400
             
     except Exception as e:
-        print(f"⚠️ Erreur action runtime turbo: {e}")
+        logger.error("Erreur action runtime turbo: %s", e)
         return jsonify({
             'success': False,
             'error': str(e),
@@ -1446,8 +1351,10 @@ def api_get_popular_icons():
 @AuthSystem.login_required
 def api_clear_runtime_cache():
     """Vide le cache runtime (utile pour debug)"""
-    global runtime_cache_values, runtime_cache_tags
-    runtime_cache_values = {}
+    global runtime_cache_tags
+    image_tags.vider()
+    vider_plans()
+    invalider_regles()
     runtime_cache_tags = {}
     return jsonify({
         'success': True,
@@ -1461,10 +1368,13 @@ def api_runtime_cache_stats():
     return jsonify({
         'success': True,
         'stats': {
-            'cached_values': len(runtime_cache_values),
+            'cached_values': image_tags.compter(),
             'cached_tags': len(runtime_cache_tags),
-            'sample_values': list(runtime_cache_values.keys())[:5],
-            'sample_tags': list(runtime_cache_tags.items())[:5]
+            'sample_values': list(image_tags.instantane())[:5],
+            'sample_tags': list(runtime_cache_tags.items())[:5],
+            'image': image_tags.stats(),
+            'plans': stats_plans(),
+            'regles': index_regles.stats()
         }
     })
 
@@ -1765,6 +1675,8 @@ def api_create_color_rule():
         
         db.session.add(rule)
         db.session.commit()
+        invalider_regles(session.get('current_project_id'))
+        invalider_plans(session.get('current_project_id'))
         
         return jsonify({
             'success': True,
@@ -1851,6 +1763,8 @@ def api_update_color_rule(rule_id):
         if updated_fields:
             rule.date_modification = datetime.utcnow()
             db.session.commit()
+            invalider_regles(session.get('current_project_id'))
+            invalider_plans(session.get('current_project_id'))
         
         return jsonify({
             'success': True,
@@ -1883,6 +1797,8 @@ def api_delete_color_rule(rule_id):
         rule_name = rule.nom_regle
         db.session.delete(rule)
         db.session.commit()
+        invalider_regles(session.get('current_project_id'))
+        invalider_plans(session.get('current_project_id'))
         
         return jsonify({
             'success': True,
@@ -1985,6 +1901,8 @@ def api_bulk_color_rules(object_id):
             message = f'{affected_count} règle(s) supprimée(s)'
         
         db.session.commit()
+        invalider_regles(session.get('current_project_id'))
+        invalider_plans(session.get('current_project_id'))
         
         return jsonify({
             'success': True,
@@ -2085,12 +2003,12 @@ def apply_dynamic_colors_to_runtime_values(animations_with_values, project_id=No
             
             # Log pour debug
             if final_color != animation.couleur_normale:
-                print(f"🎨 Couleur dynamique: {animation.nom_animation} -> {final_color} (valeur: {tag_value})")
+                logger.debug("Couleur dynamique: %s -> %s (valeur: %s)", animation.nom_animation, final_color, tag_value)
         
         return result_colors
         
     except Exception as e:
-        print(f"❌ Erreur application couleurs dynamiques: {e}")
+        logger.error("Erreur application couleurs dynamiques: %s", e)
         # En cas d'erreur, retourner les couleurs normales
         return {anim.id_animation: anim.couleur_normale for anim, _ in animations_with_values}
 
@@ -2122,6 +2040,8 @@ def api_cleanup_orphaned_rules():
         
         if deleted_count > 0:
             db.session.commit()
+            invalider_regles(session.get('current_project_id'))
+            invalider_plans(session.get('current_project_id'))
         
         return jsonify({
             'success': True,
@@ -2305,6 +2225,8 @@ def api_create_visibility_rule():
         
         db.session.add(rule)
         db.session.commit()
+        invalider_regles(session.get('current_project_id'))
+        invalider_plans(session.get('current_project_id'))
         
         print(f"✅ Règle visibilité créée: {data['nom_regle']} (ID: {rule.id_visibility_rule})")
         return jsonify({
@@ -2335,6 +2257,8 @@ def api_delete_visibility_rule(rule_id):
         rule_name = rule.nom_regle
         db.session.delete(rule)
         db.session.commit()
+        invalider_regles(session.get('current_project_id'))
+        invalider_plans(session.get('current_project_id'))
         
         print(f"✅ Règle visibilité {rule_id} supprimée")
         return jsonify({'message': f'Règle "{rule_name}" supprimée'}), 200
@@ -2365,6 +2289,8 @@ def api_delete_all_visibility_rules():
         ).delete()
         
         db.session.commit()
+        invalider_regles(session.get('current_project_id'))
+        invalider_plans(session.get('current_project_id'))
         
         print(f"✅ {deleted_count} règles visibilité supprimées")
         return jsonify({
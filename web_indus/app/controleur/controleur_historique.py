@@ -0,0 +1,119 @@
+from flask import request, jsonify, session, current_app
+from app.controleur import main_bp
+from app.models.modele_auth import AuthSystem
+from app.models.modele_tag import Tag
+from app.utils.stockage_historique import stockage_historique, horodatage_ms, depuis_horodatage_ms
+from app.utils.sous_echantillonnage import pas_intervalles, agreger, lttb
+from datetime import datetime, timezone, timedelta
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# API HISTORIQUE (LECTURE DE PLAGES SOUS-ÉCHANTILLONNÉES)
+# =================================================================
+
+MODES_HISTORIQUE = ('agregats', 'lttb')
+DUREE_DEFAUT = timedelta(hours=1)
+POINTS_DEFAUT = 2000
+
+
+def lire_instant(texte, defaut):
+    """Instant ISO 8601 (UTC si sans fuseau) ou millisecondes depuis 1970. Retourne: ms. ValueError si invalide"""
+    if not texte:
+        return horodatage_ms(defaut)
+    if texte.lstrip('-').isdigit():
+        return int(texte)
+    instant = datetime.fromisoformat(texte)
+    if instant.tzinfo is not None:
+        instant = instant.astimezone(timezone.utc).replace(tzinfo=None)
+    return horodatage_ms(instant)
+
+
+def parametres_historique():
+    """
+    Paramètres de la requête : start, end, max_points, mode
+    Retourne: (debut_ms, fin_ms, max_points, mode). ValueError si invalide
+    """
+    maintenant = datetime.utcnow()
+    fin = lire_instant(request.args.get('end'), maintenant)
+    debut = lire_instant(request.args.get('start'), depuis_horodatage_ms(fin) - DUREE_DEFAUT)
+    if debut > fin:
+        raise ValueError("'start' postérieur à 'end'")
+
+    max_points = int(request.args.get('max_points', POINTS_DEFAUT))
+    plafond = current_app.config.get('HISTORIQUE_POINTS_MAX', 10000)
+    if not 1 <= max_points <= plafond:
+        raise ValueError(f"'max_points' doit être compris entre 1 et {plafond}")
+
+    mode = request.args.get('mode', 'agregats')
+    if mode not in MODES_HISTORIQUE:
+        raise ValueError(f"'mode' doit être l'un de {', '.join(MODES_HISTORIQUE)}")
+    return debut, fin, max_points, mode
+
+
+def tags_demandes(noms_tags):
+    """Tags du projet courant par nom (liste séparée par des virgules). Retourne: (tags, noms introuvables)"""
+    noms = [nom.strip() for nom in noms_tags.split(',') if nom.strip()]
+    requete = Tag.query.filter(Tag.nom_tag.in_(noms))
+    current_project_id = session.get('current_project_id')
+    if current_project_id:
+        requete = requete.filter_by(id_projet=current_project_id)
+    par_nom = {tag.nom_tag: tag for tag in requete.all()}
+    return [par_nom[nom] for nom in noms if nom in par_nom], [nom for nom in noms if nom not in par_nom]
+
+
+@main_bp.route('/api/history', defaults={'noms_tags': None})
+@main_bp.route('/api/history/<noms_tags>')
+@AuthSystem.auto_required
+def api_history(noms_tags):
+    """
+    API: Historique de un ou plusieurs tags (/api/history/T1,T2 ou ?tags=T1,T2) sur [start, end]
+    mode=agregats : min/max/moyenne/dernière par intervalle, axe des temps commun à tous les tags
+    mode=lttb : au plus max_points points par tag, choisis pour conserver la forme de la courbe
+    """
+    noms_tags = noms_tags or ','.join(request.args.getlist('tags'))
+    if not noms_tags:
+        return jsonify({"error": "Aucun tag demandé"}), 400
+    try:
+        debut, fin, max_points, mode = parametres_historique()
+    except ValueError as e:
+        return jsonify({"error": f"Paramètre invalide: {e}"}), 400
+
+    tags, introuvables = tags_demandes(noms_tags)
+    if introuvables:
+        return jsonify({"error": f"Tag(s) non trouvé(s): {', '.join(introuvables)}"}), 404
+
+    chrono = time.perf_counter()
+    pas, nombre = pas_intervalles(debut, fin, max_points)
+    reponse = {
+        "success": True,
+        "mode": mode,
+        "start": depuis_horodatage_ms(debut).isoformat() + 'Z',
+        "end": depuis_horodatage_ms(fin).isoformat() + 'Z',
+        "tags": {}
+    }
+    if mode == 'agregats':
+        reponse["pas_ms"] = pas
+        reponse["horodatages"] = [debut + i * pas for i in range(nombre)]
+
+    points_lus = 0
+    for tag in tags:
+        serie = stockage_historique.lire_plage(tag.id_tag, debut, fin)
+        points_lus += len(serie)
+        if mode == 'agregats':
+            donnees = agreger(serie.horodatages, serie.valeurs, debut, pas, nombre)
+        else:
+            indices = lttb(serie.horodatages, serie.valeurs, max_points)
+            donnees = {
+                'horodatages': [serie.horodatages[i] for i in indices],
+                'valeurs': [serie.valeurs[i] for i in indices]
+            }
+        donnees['points_lus'] = len(serie)
+        donnees['type_donnee'] = tag.type_donnee
+        reponse["tags"][tag.nom_tag] = donnees
+
+    reponse["duree_ms"] = round((time.perf_counter() - chrono) * 1000, 1)
+    logger.debug("api_history: %d tag(s), %d points lus, %.1f ms", len(tags), points_lus, reponse["duree_ms"])
+    return jsonify(reponse)
@@ -2,6 +2,8 @@ from flask import render_template, request, jsonify, redirect, url_for, flash, s
 from app.controleur import main_bp
 from app.models.modele_auth import AuthSystem
 from app.models.modele_projects import ProjectManager
+from app.utils.plan_runtime import invalider_plans
+from app.models.modele_graphics import invalider_regles
 from app import db
 import json
 import tempfile
@@ -9,6 +11,14 @@ import os
 from datetime import datetime
 import zipfile
 
+def recharger_registre_automates():
+    """Automates et tags scrutés après suppression ou archivage d'un projet"""
+    try:
+        from app.controleur.controleur_tags import registre_automates
+        registre_automates.recharger()
+    except ImportError:
+        pass
+
 # =================================================================
 # PAGE PRINCIPALE - GESTION PROJETS
 # =================================================================
@@ -211,6 +221,9 @@ def api_delete_project(project_id):
         success, message = ProjectManager.delete_project(project_id)
         
         if success:
+            invalider_plans(project_id)
+            invalider_regles(project_id)
+            recharger_registre_automates()
             return jsonify({
                 'success': True,
                 'message': message
@@ -276,6 +289,8 @@ def api_archive_project(project_id):
         success, message = ProjectManager.archive_project(project_id, archive)
         
         if success:
+            # Seuls les automates des projets actifs sont connectés et scrutés
+            recharger_registre_automates()
             return jsonify({
                 'success': True,
                 'message': message
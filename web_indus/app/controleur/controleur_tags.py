@@ -1,42 +1,163 @@
 import os
+import atexit
 import socket
 import subprocess
 import ipaddress
-from flask import render_template, request, jsonify, redirect, url_for, flash, current_app, session
+from flask import render_template, request, jsonify, redirect, url_for, flash, current_app, session, Response, stream_with_context
 from app.controleur import main_bp
-from app.models.modele_tag import Tag
+from app.models.modele_tag import Tag, ConnexionAutomate, LierConnexionTag
 from app.models.modele_auth import AuthSystem
 from app import db
+from app.utils.s7_lecture_groupee import (
+    TAILLE_PDU_DEFAUT, VariableLecture, variable_depuis_adresse, planifier_plages,
+    repartir_multi_vars, decoder_plage, decoder_variable, encoder_valeur, taille_utile_pdu
+)
+from app.utils.s7_ecriture_groupee import (
+    ecriture_depuis_adresse, fusionner_ecritures, appliquer_masques, plages_ecriture,
+    repartir_ecritures, taille_utile_ecriture
+)
+from app.utils.image_tags import (
+    image_tags, cle_image, SOURCE_DEFAUT, QUALITE_GOOD, QUALITE_EN_ATTENTE, QUALITE_BAD, QUALITE_STALE
+)
+from app.utils.acquisition import MoteurAcquisition
+from app.utils.pool_s7 import (
+    PoolConnexionsS7, PoolSatureError, VerrousOctets, ecrire_bit_s7, lire_zone_s7, ecrire_zone_s7,
+    item_s7, item_bit_s7, ecrire_items_s7, taille_pour_cpu,
+    TAILLE_POOL_DEFAUT, CONNEXIONS_RESERVEES, ATTENTE_CONNEXION_S
+)
+from app.utils.supervision_s7 import SuperviseurConnexion, SEUIL_ECHECS, DELAI_INITIAL_S, DELAI_MAX_S
+from app.utils.registre_automates import RegistreAutomates, SOURCE_INDISPONIBLE
+from app.utils.s7_async import (
+    boucle_s7, pilote_async, scanner_reseau_async, scanner_reseau_flux, plage_adresses, adresses_reseau
+)
+from app.utils.plan_runtime import invalider_plans
+from app.utils.adresse_s7 import compiler_adresse, LIMITES_NON_SIGNES
+from app.utils.sante_automates import SanteConnexion, MoniteurSante
+from app.utils.historien import historien
+from app.utils.stockage_historique import stockage_historique
+from app.utils.moteur_alarmes import moteur_alarmes
+from app.utils.journal_alarmes import journal_alarmes
+from app.utils.persistance_valeurs import persistance_valeurs
+from app.utils.simulateur_s7 import SimulateurS7, ClientSimule
 import json
 import time
-import threading
+import logging
+from contextlib import contextmanager, ExitStack
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 # Communication industrielle Siemens S7
 try:
     import snap7
     SNAP7_AVAILABLE = True
 except ImportError:
     SNAP7_AVAILABLE = False
-    print("⚠️ snap7 non installé. Installation: pip install python-snap7")
+    logger.warning("snap7 non installé. Installation: pip install python-snap7")
 
 class AutomateSiemensS7Complete:
     """Gestionnaire de communication S7 intégrant la logique de test_lect_ecr.py"""
     
     def __init__(self, app=None):
-        self.client = None
+        self.pool = None
         self.connected = False
         self.ip_address = ''
         self.rack = 0
         self.slot = 1
+        self.port = 102
         self.simulation_mode = False
-        self.simulation_data = {}
-        self.derniere_lecture = {}
+        self.simulateur = SimulateurS7()   # CPU simulée du mode SIMULATEUR (images mémoire, signaux)
+        self.nom = SOURCE_DEFAUT
+        self.image = image_tags
         self.app = app
         self.validation_ping = True
-        
+        self.lecture_multi_vars = True
+        self.taille_pool = TAILLE_POOL_DEFAUT
+        self.connexions_reservees = CONNEXIONS_RESERVEES
+        self.attente_pool = ATTENTE_CONNEXION_S
+        self.verrous_octets = VerrousOctets()
+        self.bits_atomiques = True   # Écriture de bit seul (WordLen.Bit) acceptée par la CPU
+        self.sante = SanteConnexion()
+        self.superviseur = SuperviseurConnexion(self._reconnecter, self.nom, a_l_ouverture=self._circuit_ouvert)
+
         if app is not None:
             self.init_app(app)
+
+    # =================================================================
+    # CONNEXIONS S7 (POOL)
+    # =================================================================
+
+    @property
+    def client(self):
+        """Première connexion du pool (compatibilité)"""
+        return self.pool.client_principal if self.pool else None
+
+    @client.setter
+    def client(self, client):
+        """Remplace le pool par une connexion unique déjà ouverte (tests, benchmarks)"""
+        if self.pool:
+            self.pool.fermer()
+        self.pool = PoolConnexionsS7.depuis_client(client) if client is not None else None
+
+    def _nouveau_client(self):
+        """Ouvre une connexion S7 (fabrique du pool)"""
+        client = snap7.client.Client()
+        client.connect(self.ip_address, self.rack, self.slot, self.port)
+        if not client.get_connected():
+            raise ConnectionError(f"Impossible d'établir la connexion S7 avec {self.ip_address}")
+        return client
+
+    @contextmanager
+    def _connexion(self):
+        """
+        Emprunte une connexion du pool pour un échange S7
+        Échec immédiat (CircuitOuvertError) si le circuit est ouvert ; une connexion
+        impossible ou perdue est comptée par le superviseur
+        """
+        if self.pool is None:
+            raise ConnectionError("Aucune connexion S7 ouverte")
+        self.superviseur.autoriser()
+
+        client = None
+        try:
+            with self.pool.connexion() as client:
+                yield client
+        except PoolSatureError:
+            raise
+        except Exception:
+            if client is None or not PoolConnexionsS7.est_connecte(client):
+                self.superviseur.echec()
+            raise
+        else:
+            self.superviseur.succes()
+
+    def _circuit_ouvert(self):
+        """Circuit ouvert : dernières valeurs de l'image conservées en STALE"""
+        self.image.marquer_perimees(self.nom, QUALITE_STALE, QUALITE_BAD)
+
+    def _derniere_valeur(self, adresse, type_attendu=None):
+        """Lecture refusée (circuit ouvert) : dernière valeur connue STALE, BAD si jamais lue"""
+        entree = self.image.lire(cle_image(self.nom, adresse, type_attendu))
+        if entree is None or entree.valeur is None:
+            return None, QUALITE_BAD
+        return entree.valeur, QUALITE_STALE
+
+    @property
+    def en_ligne(self):
+        """Connecté et joignable (circuit fermé)"""
+        return self.connected and not self.superviseur.circuit_ouvert()
+
+    @property
+    def derniere_lecture(self):
+        """Dernières valeurs lues de cet automate (copie de l'image des tags)"""
+        return self.image.instantane(self.nom)
+
+    def _publier_lectures(self, demandes, resultats):
+        """Publie un lot de résultats (valeur, qualite) dans l'image des tags"""
+        self.image.publier_lot([
+            (cle_image(self.nom, adresse, type_attendu), valeur, qualite)
+            for (adresse, type_attendu), (valeur, qualite) in zip(demandes, resultats)
+        ])
     
     def init_app(self, app):
         """Initialisation avec le contexte Flask"""
@@ -49,19 +170,41 @@ class AutomateSiemensS7Complete:
             
             self.rack = app.config.get('AUTOMATE_RACK', 0)
             self.slot = app.config.get('AUTOMATE_SLOT', 1)
+            self.port = app.config.get('AUTOMATE_PORT', 102)
             self.validation_ping = app.config.get('VALIDATION_PING', True)
-            
+            self.superviseur.configurer(
+                app.config.get('S7_CIRCUIT_SEUIL_ECHECS', SEUIL_ECHECS),
+                app.config.get('S7_RECONNEXION_DELAI_INITIAL_S', DELAI_INITIAL_S),
+                app.config.get('S7_RECONNEXION_DELAI_MAX_S', DELAI_MAX_S)
+            )
+            self.lecture_multi_vars = app.config.get('LECTURE_MULTI_VARS', True)
+            self.taille_pool = app.config.get('S7_POOL_TAILLE', TAILLE_POOL_DEFAUT)
+            self.connexions_reservees = app.config.get('S7_POOL_CONNEXIONS_RESERVEES', CONNEXIONS_RESERVEES)
+            self.attente_pool = app.config.get('S7_POOL_ATTENTE_S', ATTENTE_CONNEXION_S)
+
             # CORRECTION: Respecter le mode configuré quand snap7 est disponible
             mode_config = app.config.get('MODE_COMMUNICATION', 'SIMULATEUR')
             
             if mode_config == 'REEL' and SNAP7_AVAILABLE:
                 self.simulation_mode = False  # Mode réel si demandé et snap7 dispo
-                print(f"🚀 Mode RÉEL activé - snap7 disponible")
+                logger.info("🚀 Mode RÉEL activé - snap7 disponible")
             else:
                 self.simulation_mode = True   # Simulation sinon
-                print(f"🎮 Mode SIMULATION - snap7: {SNAP7_AVAILABLE}, config: {mode_config}")
+                logger.info("🎮 Mode SIMULATION - snap7: %s, config: %s", SNAP7_AVAILABLE, mode_config)
             
-            self._init_simulation_data()
+            self.simulateur.init_app(app)
+    
+    def configurer_connexion(self, connexion):
+        """Applique les paramètres d'une connexion nommée (table Connexion_Automate)"""
+        self.nom = connexion.nom_connexion
+        self.superviseur.nom = connexion.nom_connexion
+        self.ip_address = connexion.adresse_ip
+        self.rack = connexion.rack if connexion.rack is not None else 0
+        self.slot = connexion.slot if connexion.slot is not None else 1
+        self.port = connexion.port or 102
+        if connexion.taille_pool:
+            self.taille_pool = connexion.taille_pool
+        self.simulation_mode = connexion.mode_communication != 'REEL' or not SNAP7_AVAILABLE
     
     def connect(self, ip_address=None, rack=None, slot=None, force_simulation=False):
         """Connexion à l'automate Siemens S7"""
@@ -75,12 +218,19 @@ class AutomateSiemensS7Complete:
         if not self.ip_address:
             return False, "❌ Veuillez saisir une adresse IP d'automate"
         
-        print(f"🔍 Tentative de connexion S7 à {self.ip_address}...")
+        logger.info("🔍 Tentative de connexion S7 à %s...", self.ip_address)
         
-        # Mode simulation forcé
+        # Mode simulation forcé : pool de connexions vers la CPU simulée, mêmes échanges qu'en réel
         if force_simulation or self.simulation_mode:
+            if self.pool:
+                self.pool.fermer()
+            self.pool = PoolConnexionsS7(lambda: ClientSimule(self.simulateur), self.taille_pool,
+                                         self.attente_pool, self.sante)
+            self.simulateur.demarrer()
+            self.bits_atomiques = True
             self.connected = True
             self.simulation_mode = True
+            self.superviseur.connecte()
             return True, f"MODE SIMULATION - Connexion simulée S7 avec {self.ip_address}"
         
         # Validation IP
@@ -90,196 +240,230 @@ class AutomateSiemensS7Complete:
         
         # Test de connectivité réseau
         if self.validation_ping:
-            print(f"📡 Test ping vers {self.ip_address}...")
+            logger.info("📡 Test ping vers %s...", self.ip_address)
             if not self.ping_automate(self.ip_address):
                 return False, f"❌ Ping échoué - {self.ip_address} non accessible"
         
         # Test du port S7
-        print(f"🔌 Test port S7 (102) vers {self.ip_address}...")
-        if not self.tester_port_s7(self.ip_address):
-            return False, f"❌ Port S7 (102) fermé sur {self.ip_address}"
+        logger.info("🔌 Test port S7 (%s) vers %s...", self.port, self.ip_address)
+        if not self.tester_port_s7(self.ip_address, self.port):
+            return False, f"❌ Port S7 ({self.port}) fermé sur {self.ip_address}"
         
         # Connexion S7 réelle
         if not SNAP7_AVAILABLE:
             return False, "❌ Bibliothèque snap7 non disponible"
         
         try:
-            print(f"🔗 Connexion S7 vers {self.ip_address}...")
-            self.client = snap7.client.Client()
-            self.client.connect(self.ip_address, self.rack, self.slot)
+            logger.info("🔗 Connexion S7 vers %s...", self.ip_address)
+            succes, message = self._ouvrir_pool()
+            if not succes:
+                self.connected = False
+                return False, f"❌ {message}"
             
-            if self.client.get_connected():
-                # Test de lecture pour valider la connexion
-                try:
-                    test_data = self.client.db_read(1, 0, 1)
-                    self.connected = True
-                    self.simulation_mode = False
-                    return True, f"✅ Connexion S7 RÉELLE établie avec {self.ip_address}"
-                except Exception as e:
-                    self.client.disconnect()
-                    return False, f"❌ Connexion établie mais lecture impossible: {str(e)}"
-            else:
-                return False, f"❌ Impossible d'établir la connexion S7"
+            self.connected = True
+            self.simulation_mode = False
+            self.superviseur.connecte()
+            return True, f"✅ Connexion S7 RÉELLE établie avec {self.ip_address}"
                 
         except Exception as e:
             self.connected = False
             return False, f"❌ Erreur de connexion S7: {str(e)}"
     
+    def _ouvrir_pool(self):
+        """Remplace le pool par un nouveau pool validé par une lecture test. Retourne: (succès, message)"""
+        if self.pool:
+            self.pool.fermer()
+        pool = PoolConnexionsS7(self._nouveau_client, self.taille_pool, self.attente_pool, self.sante)
+        
+        # Première connexion, puis pool borné par les connexions acceptées par la CPU
+        try:
+            pool.ouvrir()
+        except Exception as e:
+            pool.fermer()
+            return False, f"Impossible d'établir la connexion S7: {str(e)}"
+        pool.taille = taille_pour_cpu(pool.client_principal, self.taille_pool, self.connexions_reservees)
+        
+        # Test de lecture pour valider la connexion
+        try:
+            with pool.connexion() as client:
+                client.db_read(1, 0, 1)
+        except Exception as e:
+            pool.fermer()
+            return False, f"Connexion établie mais lecture impossible: {str(e)}"
+        
+        self.pool = pool
+        self.bits_atomiques = True
+        self.sante.connexion_etablie()
+        logger.info("Pool S7 prêt : %d connexion(s) max vers %s", pool.taille, self.ip_address)
+        return True, "Pool S7 prêt"
+    
+    def _reconnecter(self):
+        """Tentative du superviseur (circuit ouvert) : port S7 puis nouveau pool. Retourne: (succès, message)"""
+        if not self.tester_port_s7(self.ip_address, self.port, timeout=1):
+            return False, f"Port S7 ({self.port}) fermé sur {self.ip_address}"
+        succes, message = self._ouvrir_pool()
+        if succes and not self.connected:
+            # Déconnexion demandée pendant la tentative
+            self.pool.fermer()
+            self.pool = None
+            return False, "Déconnecté pendant la reconnexion"
+        return succes, message
+    
     def disconnect(self):
         """Déconnexion de l'automate"""
-        if not self.simulation_mode and self.client:
+        self.superviseur.deconnecte()
+        if self.pool:
             try:
-                self.client.disconnect()
-                print("🔌 Déconnexion S7 effectuée")
+                self.pool.fermer()
+                self.pool = None
+                logger.info("🔌 Déconnexion S7 effectuée")
             except Exception as e:
-                print(f"Erreur déconnexion: {e}")
+                logger.warning("Erreur déconnexion: %s", e)
+        self.simulateur.arreter()
         
         self.connected = False
+        self.image.marquer_source(self.nom, "AUTOMATE_NON_CONNECTE")
         return True, "Déconnecté de l'automate S7"
     
     def lire_bit(self, db, byte_offset, bit_offset):
         """Lit un bit dans un DB"""
         try:
-            if self.simulation_mode:
-                # Simulation
-                adresse_sim = f"DB{db}.DBX{byte_offset}.{bit_offset}"
-                return self.simulation_data.get(adresse_sim, False)
-            
             # Lecture réelle
-            data = self.client.db_read(db, byte_offset, 1)
+            with self._connexion() as client:
+                data = client.db_read(db, byte_offset, 1)
             byte_val = data[0]
             return bool(byte_val & (1 << bit_offset))
         except Exception as e:
-            print(f"Erreur lecture bit DB{db}.DBX{byte_offset}.{bit_offset}: {e}")
+            logger.warning("Erreur lecture bit DB%s.DBX%s.%s: %s", db, byte_offset, bit_offset, e)
             return None
     
     def lire_word(self, db, word_offset):
         """Lit un word (16-bit) dans un DB"""
         try:
-            if self.simulation_mode:
-                # Simulation
-                adresse_sim = f"DB{db}.DBW{word_offset}"
-                return self.simulation_data.get(adresse_sim, 0)
-            
             # Lecture réelle
-            data = self.client.db_read(db, word_offset, 2)
+            with self._connexion() as client:
+                data = client.db_read(db, word_offset, 2)
             return int.from_bytes(data, byteorder='big', signed=True)
         except Exception as e:
-            print(f"Erreur lecture word DB{db}.DBW{word_offset}: {e}")
+            logger.warning("Erreur lecture word DB%s.DBW%s: %s", db, word_offset, e)
             return None
     
     def lire_dword(self, db, dword_offset):
         """Lit un double word (32-bit) dans un DB"""
         try:
-            if self.simulation_mode:
-                # Simulation
-                adresse_sim = f"DB{db}.DBD{dword_offset}"
-                return self.simulation_data.get(adresse_sim, 0)
-            
             # Lecture réelle
-            data = self.client.db_read(db, dword_offset, 4)
+            with self._connexion() as client:
+                data = client.db_read(db, dword_offset, 4)
             return int.from_bytes(data, byteorder='big', signed=True)
         except Exception as e:
-            print(f"Erreur lecture dword DB{db}.DBD{dword_offset}: {e}")
+            logger.warning("Erreur lecture dword DB%s.DBD%s: %s", db, dword_offset, e)
             return None
     
     def lire_real(self, db, real_offset):
         """Lit un real (32-bit float) dans un DB"""
         try:
-            if self.simulation_mode:
-                # Simulation
-                adresse_sim = f"DB{db}.DBD{real_offset}"
-                return self.simulation_data.get(adresse_sim, 0.0)
-            
             # Lecture réelle
-            data = self.client.db_read(db, real_offset, 4)
+            with self._connexion() as client:
+                data = client.db_read(db, real_offset, 4)
             import struct
             return struct.unpack('>f', data)[0]  # Big-endian float
         except Exception as e:
-            print(f"Erreur lecture real DB{db}.DBD{real_offset}: {e}")
+            logger.warning("Erreur lecture real DB%s.DBD%s: %s", db, real_offset, e)
             return None
     
-    def ecrire_bit(self, db, byte_offset, bit_offset, valeur):
-        """Écrit un bit dans un DB"""
+    def ecrire_bit(self, db, byte_offset, bit_offset, valeur, zone='DB'):
+        """Écrit un bit dans un DB (ou dans la zone I, Q, M indiquée)"""
         try:
-            if self.simulation_mode:
-                # Simulation
-                adresse_sim = f"DB{db}.DBX{byte_offset}.{bit_offset}"
-                self.simulation_data[adresse_sim] = bool(valeur)
-                return True
-            
-            # Écriture réelle
-            # Lire le byte actuel
-            data = self.client.db_read(db, byte_offset, 1)
-            byte_val = data[0]
-            
-            # Modifier le bit
-            if valeur:
-                byte_val |= (1 << bit_offset)
-            else:
-                byte_val &= ~(1 << bit_offset)
-            
-            # Écrire le byte modifié
-            self.client.db_write(db, byte_offset, bytes([byte_val]))
+            # Écriture réelle : un seul écrivain par octet dans l'IHM
+            with self.verrous_octets(db if zone == 'DB' else zone, byte_offset), self._connexion() as client:
+                if self.bits_atomiques:
+                    # Bit seul : la CPU ne touche pas aux autres bits de l'octet
+                    try:
+                        ecrire_bit_s7(client, db, byte_offset, bit_offset, valeur, zone)
+                        return True
+                    except Exception as e:
+                        logger.info("Écriture de bit seul indisponible (%s), lecture-modification-écriture de l'octet", e)
+                        self.bits_atomiques = False
+                
+                # Lire le byte actuel
+                data = lire_zone_s7(client, zone, db, byte_offset, 1)
+                byte_val = data[0]
+                
+                # Modifier le bit
+                if valeur:
+                    byte_val |= (1 << bit_offset)
+                else:
+                    byte_val &= ~(1 << bit_offset)
+                
+                # Écrire le byte modifié
+                ecrire_zone_s7(client, zone, db, byte_offset, bytes([byte_val]))
             return True
             
         except Exception as e:
-            print(f"Erreur écriture bit DB{db}.DBX{byte_offset}.{bit_offset}: {e}")
+            logger.error("Erreur écriture bit DB%s.DBX%s.%s: %s", db, byte_offset, bit_offset, e)
             return False
     
     def ecrire_word(self, db, word_offset, valeur):
         """Écrit un word dans un DB"""
         try:
-            if self.simulation_mode:
-                # Simulation
-                adresse_sim = f"DB{db}.DBW{word_offset}"
-                self.simulation_data[adresse_sim] = int(valeur)
-                return True
-            
             # Écriture réelle
             word_bytes = int(valeur).to_bytes(2, byteorder='big', signed=True)
-            self.client.db_write(db, word_offset, word_bytes)
+            with self._connexion() as client:
+                client.db_write(db, word_offset, word_bytes)
             return True
             
         except Exception as e:
-            print(f"Erreur écriture word DB{db}.DBW{word_offset}: {e}")
+            logger.error("Erreur écriture word DB%s.DBW%s: %s", db, word_offset, e)
             return False
     
     def ecrire_dword(self, db, dword_offset, valeur):
         """Écrit un double word dans un DB"""
         try:
-            if self.simulation_mode:
-                # Simulation
-                adresse_sim = f"DB{db}.DBD{dword_offset}"
-                self.simulation_data[adresse_sim] = int(valeur)
-                return True
-            
             # Écriture réelle
             dword_bytes = int(valeur).to_bytes(4, byteorder='big', signed=True)
-            self.client.db_write(db, dword_offset, dword_bytes)
+            with self._connexion() as client:
+                client.db_write(db, dword_offset, dword_bytes)
             return True
             
         except Exception as e:
-            print(f"Erreur écriture dword DB{db}.DBD{dword_offset}: {e}")
+            logger.error("Erreur écriture dword DB%s.DBD%s: %s", db, dword_offset, e)
             return False
     
     def ecrire_real(self, db, real_offset, valeur):
         """Écrit un real dans un DB"""
         try:
-            if self.simulation_mode:
-                # Simulation
-                adresse_sim = f"DB{db}.DBD{real_offset}"
-                self.simulation_data[adresse_sim] = float(valeur)
-                return True
-            
             # Écriture réelle
             import struct
             real_bytes = struct.pack('>f', float(valeur))  # Big-endian float
-            self.client.db_write(db, real_offset, real_bytes)
+            with self._connexion() as client:
+                client.db_write(db, real_offset, real_bytes)
             return True
             
         except Exception as e:
-            print(f"Erreur écriture real DB{db}.DBD{real_offset}: {e}")
+            logger.error("Erreur écriture real DB%s.DBD%s: %s", db, real_offset, e)
+            return False
+    
+    def lire_zone(self, adresse, compilee, type_attendu=None):
+        """Lit une adresse hors DB (I, Q, M, T, C) ou d'un type étendu (BYTE, WORD, LREAL, STRING, DTL...)"""
+        variable = variable_depuis_adresse(0, compilee, type_attendu)
+        try:
+            with self._connexion() as client:
+                tampon = lire_zone_s7(client, compilee.zone, compilee.db, variable.debut, variable.taille)
+            return decoder_variable(tampon, 0, variable)
+        except Exception as e:
+            logger.warning("Erreur lecture %s (%s): %s", adresse, variable.type_donnee, e)
+            return None
+    
+    def ecrire_zone(self, adresse, compilee, valeur, type_attendu=None):
+        """Écrit une adresse hors DB (Q, M, T, C...) ou d'un type étendu, hors bits"""
+        type_ecrit = compilee.type_lu(type_attendu)
+        try:
+            donnees = encoder_valeur(type_ecrit, valeur, compilee.largeur)
+            with self._connexion() as client:
+                ecrire_zone_s7(client, compilee.zone, compilee.db, compilee.debut, donnees)
+            return True
+        except Exception as e:
+            logger.error("Erreur écriture %s (%s): %s", adresse, type_ecrit, e)
             return False
     
     # =================================================================
@@ -287,71 +471,41 @@ class AutomateSiemensS7Complete:
     # =================================================================
     
     def parse_adresse_s7(self, adresse):
-        """Parse une adresse S7 et retourne les composants"""
-        try:
-            # Format: DB1.DBX0.0, DB1.DBW2, DB1.DBD4, etc.
-            if not adresse.startswith('DB') or '.DB' not in adresse:
-                raise ValueError(f"Format d'adresse invalide: {adresse}")
-            
-            parts = adresse.split('.')
-            db_num = int(parts[0][2:])  # DB1 -> 1
-            
-            if 'DBX' in parts[1]:  # Bit
-                byte_offset = int(parts[1][3:])
-                bit_offset = int(parts[2])
-                return {
-                    'type': 'BOOL',
-                    'db': db_num,
-                    'byte_offset': byte_offset,
-                    'bit_offset': bit_offset
-                }
-            elif 'DBW' in parts[1]:  # Word (16-bit)
-                word_offset = int(parts[1][3:])
-                return {
-                    'type': 'INT',
-                    'db': db_num,
-                    'offset': word_offset
-                }
-            elif 'DBD' in parts[1]:  # Double Word (32-bit)
-                dword_offset = int(parts[1][3:])
-                return {
-                    'type': 'DINT',  # Peut être DINT ou REAL
-                    'db': db_num,
-                    'offset': dword_offset
-                }
-            else:
-                raise ValueError(f"Type d'adresse non supporté: {parts[1]}")
-                
-        except (ValueError, IndexError) as e:
-            raise ValueError(f"Erreur parsing adresse '{adresse}': {str(e)}")
+        """Parse une adresse S7 et retourne les composants (dict, compatibilité : voir compiler_adresse)"""
+        return compiler_adresse(adresse).composants()
     
     def lire_tag_par_adresse(self, adresse, type_attendu=None):
-        """Lit un tag selon son adresse S7 complète"""
+        """Lit un tag selon son adresse S7 complète et publie le résultat dans l'image des tags"""
+        resultat = self._lire_tag_par_adresse(adresse, type_attendu)
+        self._publier_lectures([(adresse, type_attendu)], [resultat])
+        return resultat
+
+    def _lire_tag_par_adresse(self, adresse, type_attendu=None):
+        """Lecture S7 unitaire, sans publication"""
         if not self.connected:
             return None, "AUTOMATE_NON_CONNECTE"
+        if self.superviseur.circuit_ouvert():
+            return self._derniere_valeur(adresse, type_attendu)
         
         try:
-            parsed = self.parse_adresse_s7(adresse)
+            compilee = compiler_adresse(adresse)
+            type_lu = compilee.type_lu(type_attendu)
             
-            if parsed['type'] == 'BOOL':
-                valeur = self.lire_bit(parsed['db'], parsed['byte_offset'], parsed['bit_offset'])
-            elif parsed['type'] == 'INT':
-                valeur = self.lire_word(parsed['db'], parsed['offset'])
-            elif parsed['type'] == 'DINT':
-                if type_attendu == 'REAL':
-                    valeur = self.lire_real(parsed['db'], parsed['offset'])
-                else:
-                    valeur = self.lire_dword(parsed['db'], parsed['offset'])
+            if compilee.zone != 'DB':
+                valeur = self.lire_zone(adresse, compilee, type_attendu)
+            elif type_lu == 'BOOL':
+                valeur = self.lire_bit(compilee.db, compilee.octet, compilee.bit)
+            elif type_lu == 'INT':
+                valeur = self.lire_word(compilee.db, compilee.octet)
+            elif type_lu == 'REAL':
+                valeur = self.lire_real(compilee.db, compilee.octet)
+            elif type_lu == 'DINT':
+                valeur = self.lire_dword(compilee.db, compilee.octet)
             else:
-                return None, f"TYPE_NON_SUPPORTE: {parsed['type']}"
+                valeur = self.lire_zone(adresse, compilee, type_attendu)
             
             if valeur is not None:
-                self.derniere_lecture[adresse] = {
-                    'valeur': valeur,
-                    'timestamp': datetime.now(),
-                    'qualite': 'GOOD'
-                }
-                return valeur, "GOOD"
+                return valeur, QUALITE_GOOD
             else:
                 return None, "ERREUR_LECTURE_S7"
                 
@@ -362,30 +516,292 @@ class AutomateSiemensS7Complete:
         """Écrit un tag selon son adresse S7 complète"""
         if not self.connected:
             return False, "AUTOMATE_NON_CONNECTE"
+        if self.superviseur.circuit_ouvert():
+            return False, "CIRCUIT_OUVERT"
         
         try:
-            parsed = self.parse_adresse_s7(adresse)
+            compilee = compiler_adresse(adresse)
+            type_ecrit = compilee.type_lu(type_attendu)
             
-            if parsed['type'] == 'BOOL':
-                success = self.ecrire_bit(parsed['db'], parsed['byte_offset'], parsed['bit_offset'], valeur)
-            elif parsed['type'] == 'INT':
-                success = self.ecrire_word(parsed['db'], parsed['offset'], valeur)
-            elif parsed['type'] == 'DINT':
-                if type_attendu == 'REAL':
-                    success = self.ecrire_real(parsed['db'], parsed['offset'], valeur)
-                else:
-                    success = self.ecrire_dword(parsed['db'], parsed['offset'], valeur)
+            if type_ecrit == 'BOOL':
+                success = self.ecrire_bit(compilee.db, compilee.octet, compilee.bit, valeur, compilee.zone)
+            elif compilee.zone != 'DB':
+                success = self.ecrire_zone(adresse, compilee, valeur, type_attendu)
+            elif type_ecrit == 'INT':
+                success = self.ecrire_word(compilee.db, compilee.octet, valeur)
+            elif type_ecrit == 'REAL':
+                success = self.ecrire_real(compilee.db, compilee.octet, valeur)
+            elif type_ecrit == 'DINT':
+                success = self.ecrire_dword(compilee.db, compilee.octet, valeur)
             else:
-                return False, f"TYPE_NON_SUPPORTE: {parsed['type']}"
+                success = self.ecrire_zone(adresse, compilee, valeur, type_attendu)
             
             if success:
+                # Écriture réussie : l'image reflète immédiatement la valeur écrite
+                self.image.publier(cle_image(self.nom, adresse, type_attendu), valeur, forcer=True)
                 return True, "ECRITURE_S7_OK"
             else:
                 return False, "ERREUR_ECRITURE_S7"
                 
         except Exception as e:
             return False, f"EXCEPTION_ECRITURE_S7: {str(e)}"
-    
+
+    # =================================================================
+    # LECTURE GROUPÉE - UN MINIMUM DE REQUÊTES POUR UN LOT DE TAGS
+    # =================================================================
+
+    def lire_tags_par_adresses(self, demandes):
+        """
+        Lit un lot d'adresses S7 en fusionnant les zones contiguës d'un même DB
+        demandes: liste d'adresses ou de tuples (adresse, type_attendu)
+        Retourne: liste de tuples (valeur, qualite) dans l'ordre des demandes
+        """
+        demandes = [d if isinstance(d, (tuple, list)) else (d, None) for d in demandes]
+        resultats = self._lire_tags_par_adresses(demandes)
+        self._publier_lectures(demandes, resultats)
+        return resultats
+
+    def _lire_tags_par_adresses(self, demandes):
+        """Lecture groupée S7, sans publication"""
+        if not self.connected:
+            return [(None, "AUTOMATE_NON_CONNECTE")] * len(demandes)
+
+        if self.superviseur.circuit_ouvert():
+            # Automate injoignable : réponse immédiate depuis l'image, sans attendre le délai snap7
+            return [self._derniere_valeur(adresse, type_attendu) for adresse, type_attendu in demandes]
+
+        resultats = [(None, "ERREUR_LECTURE_S7")] * len(demandes)
+        variables = []
+
+        for index, (adresse, type_attendu) in enumerate(demandes):
+            try:
+                variables.append(variable_depuis_adresse(index, compiler_adresse(adresse), type_attendu))
+            except Exception as e:
+                resultats[index] = (None, f"EXCEPTION_S7: {str(e)}")
+
+        if not variables:
+            return resultats
+
+        # Une connexion du pool pour tout le lot : les lots concurrents utilisent des connexions distinctes
+        try:
+            with self._connexion() as client:
+                taille_pdu = self._taille_pdu(client)
+                plages = planifier_plages(variables, taille_max=taille_utile_pdu(taille_pdu))
+                valeurs = self._lire_plages(client, plages, taille_pdu)
+        except Exception as e:
+            logger.warning("Erreur lecture groupée (%d variables): %s", len(variables), e)
+            if self.superviseur.circuit_ouvert():
+                return [self._derniere_valeur(adresse, type_attendu) for adresse, type_attendu in demandes]
+            return resultats
+
+        for index, valeur in valeurs.items():
+            resultats[index] = (valeur, QUALITE_GOOD)
+
+        return resultats
+
+    def _taille_pdu(self, client):
+        """Taille de PDU négociée avec la CPU (valeur par défaut si inconnue)"""
+        try:
+            return client.get_pdu_length() or TAILLE_PDU_DEFAUT
+        except Exception:
+            return TAILLE_PDU_DEFAUT
+
+    def _lire_plages(self, client, plages, taille_pdu):
+        """Lit les plages planifiées. Retourne: dict {index_demande: valeur}"""
+        valeurs = {}
+
+        if self.lecture_multi_vars and len(plages) > 1:
+            restantes = []
+            for requete in repartir_multi_vars(plages, taille_pdu):
+                try:
+                    tampons = self._read_multi_vars(client, requete)
+                except Exception as e:
+                    logger.warning("Erreur read_multi_vars (%d plages): %s", len(requete), e)
+                    restantes.extend(requete)
+                    continue
+
+                for plage, tampon in zip(requete, tampons):
+                    if tampon is None:
+                        restantes.append(plage)
+                    else:
+                        valeurs.update(decoder_plage(plage, tampon))
+            plages = restantes
+
+        for plage in plages:
+            try:
+                tampon = lire_zone_s7(client, plage.zone, plage.db, plage.debut, plage.taille)
+                valeurs.update(decoder_plage(plage, tampon))
+            except Exception as e:
+                logger.warning("Erreur lecture plage %r: %s", plage, e)
+                if not PoolConnexionsS7.est_connecte(client):
+                    # Connexion perdue : inutile de lire les plages suivantes, le pool la remplacera
+                    raise
+
+        return valeurs
+
+    def _read_multi_vars(self, client, plages):
+        """Lit plusieurs plages en une seule PDU. Retourne: liste de tampons (None si item en erreur)"""
+        if isinstance(client, ClientSimule):
+            return client.lire_plages(plages)
+
+        import ctypes
+        from snap7.types import S7DataItem
+
+        items = (S7DataItem * len(plages))()
+        tampons = []
+
+        for index, plage in enumerate(plages):
+            # Chaque item porte sa zone : un lot mêlant DB, I, Q, M, T et C reste une seule PDU
+            tampon = ctypes.create_string_buffer(plage.taille)
+            tampons.append(tampon)
+            items[index] = item_s7(plage.zone, plage.db, plage.debut, plage.taille, tampon)
+
+        _, items = client.read_multi_vars(items)
+
+        return [
+            bytearray(tampon.raw) if item.Result == 0 else None
+            for item, tampon in zip(items, tampons)
+        ]
+
+    # =================================================================
+    # ÉCRITURE GROUPÉE - UN MINIMUM DE REQUÊTES POUR UN LOT D'ÉCRITURES
+    # =================================================================
+
+    def ecrire_tags_par_adresses(self, ecritures):
+        """
+        Écrit un lot d'adresses S7 en fusionnant les octets consécutifs d'un même DB
+        Les bits d'un même octet sont écrits ensemble (une seule relecture de l'octet)
+        ecritures: liste de tuples (adresse, valeur, type_attendu)
+        Retourne: liste de tuples (succes, statut) dans l'ordre des écritures
+        """
+        if not self.connected:
+            return [(False, "AUTOMATE_NON_CONNECTE")] * len(ecritures)
+        if self.superviseur.circuit_ouvert():
+            return [(False, "CIRCUIT_OUVERT")] * len(ecritures)
+
+        resultats = [(False, "ERREUR_ECRITURE_S7")] * len(ecritures)
+        elements = []
+
+        for index, (adresse, valeur, type_attendu) in enumerate(ecritures):
+            try:
+                elements.append(ecriture_depuis_adresse(index, compiler_adresse(adresse), valeur, type_attendu))
+            except Exception as e:
+                resultats[index] = (False, f"EXCEPTION_ECRITURE_S7: {str(e)}")
+
+        if not elements:
+            return resultats
+
+        octets, masques, index_octets = fusionner_ecritures(elements)
+        echecs = set()
+
+        try:
+            # Un écrivain par octet modifié bit à bit, verrous pris dans l'ordre (pas d'interblocage)
+            with ExitStack() as verrous:
+                for zone, db_numero, octet in sorted(masques):
+                    verrous.enter_context(self.verrous_octets(db_numero if zone == 'DB' else zone, octet))
+                with self._connexion() as client:
+                    taille_pdu = self._taille_pdu(client)
+                    if masques and not self.bits_atomiques:
+                        # Octets écrits en partie : tous relus en une lecture groupée, puis complétés
+                        variables = [VariableLecture(cle, cle[1], cle[2], 1, 'BYTE', zone=cle[0]) for cle in masques]
+                        plages_lues = planifier_plages(variables, taille_max=taille_utile_pdu(taille_pdu))
+                        lus = self._lire_plages(client, plages_lues, taille_pdu)
+                        for cle in [cle for cle in masques if cle not in lus]:
+                            echecs |= index_octets[cle]
+                            del masques[cle]
+                        appliquer_masques(octets, masques, lus)
+                        masques = {}
+                    plages = plages_ecriture(octets, index_octets, masques, taille_utile_ecriture(taille_pdu))
+                    echecs |= self._ecrire_plages(client, plages, taille_pdu)
+        except Exception as e:
+            logger.warning("Erreur écriture groupée (%d écritures): %s", len(elements), e)
+            for element in elements:
+                resultats[element.index] = (False, f"ERREUR_ECRITURE_S7: {str(e)}")
+            return resultats
+
+        ecrites = []
+        for element in elements:
+            if element.index in echecs:
+                continue
+            resultats[element.index] = (True, "ECRITURE_S7_OK")
+            adresse, valeur, type_attendu = ecritures[element.index]
+            ecrites.append((cle_image(self.nom, adresse, type_attendu), valeur, QUALITE_GOOD))
+
+        # Écritures réussies : l'image reflète immédiatement les valeurs écrites
+        self.image.publier_lot(ecrites, forcer=True)
+        return resultats
+
+    def _ecrire_plages(self, client, plages, taille_pdu):
+        """Écrit les plages planifiées. Retourne: ensemble des index d'écritures en échec"""
+        echecs = set()
+
+        for requete in repartir_ecritures(plages, taille_pdu):
+            try:
+                if len(requete) > 1:
+                    # Items refusés par la CPU (DB absent...) : seules leurs écritures échouent
+                    for plage, resultat in zip(requete, self._write_multi_vars(client, requete)):
+                        if resultat:
+                            logger.warning("Écriture plage %r refusée par la CPU (code %s)", plage, resultat)
+                            echecs |= plage.index
+                else:
+                    self._ecrire_plage(client, requete[0])
+                continue
+            except Exception as e:
+                if not PoolConnexionsS7.est_connecte(client):
+                    raise
+                logger.warning("Écriture groupée refusée (%d plages): %s", len(requete), e)
+
+            # Requête refusée : plage par plage, pour n'écarter que les écritures fautives
+            for plage in requete:
+                try:
+                    self._ecrire_plage(client, plage)
+                except Exception as e:
+                    logger.warning("Erreur écriture plage %r: %s", plage, e)
+                    if not PoolConnexionsS7.est_connecte(client):
+                        raise
+                    echecs |= plage.index
+
+        return echecs
+
+    def _ecrire_plage(self, client, plage):
+        """Écrit une plage, ou un bit seul (lecture-modification-écriture de l'octet si la CPU refuse)"""
+        if plage.bit is None:
+            ecrire_zone_s7(client, plage.zone, plage.db, plage.debut, bytes(plage.donnees))
+            return
+
+        if self.bits_atomiques:
+            try:
+                ecrire_bit_s7(client, plage.db, plage.debut, plage.bit, plage.donnees[0], plage.zone)
+                return
+            except Exception as e:
+                if not PoolConnexionsS7.est_connecte(client):
+                    raise
+                logger.info("Écriture de bit seul indisponible (%s), lecture-modification-écriture de l'octet", e)
+                self.bits_atomiques = False
+
+        octet = lire_zone_s7(client, plage.zone, plage.db, plage.debut, 1)[0]
+        octet = octet | (1 << plage.bit) if plage.donnees[0] else octet & ~(1 << plage.bit)
+        ecrire_zone_s7(client, plage.zone, plage.db, plage.debut, bytes([octet]))
+
+    def _write_multi_vars(self, client, plages):
+        """Écrit plusieurs plages (et bits seuls) en une seule PDU. Retourne: code de résultat par plage"""
+        if isinstance(client, ClientSimule):
+            return client.ecrire_plages(plages)
+
+        import ctypes
+
+        items = []
+        tampons = []
+        for plage in plages:
+            tampon = ctypes.create_string_buffer(bytes(plage.donnees), plage.taille)
+            tampons.append(tampon)
+            if plage.bit is None:
+                items.append(item_s7(plage.zone, plage.db, plage.debut, plage.taille, tampon))
+            else:
+                items.append(item_bit_s7(plage.zone, plage.db, plage.debut, plage.bit, tampon))
+
+        return ecrire_items_s7(client, items)
+
     # =================================================================
     # MÉTHODES DE COMPATIBILITÉ AVEC L'ANCIEN SYSTÈME
     # =================================================================
@@ -421,7 +837,7 @@ class AutomateSiemensS7Complete:
             result = subprocess.run(cmd, capture_output=True, timeout=timeout + 2)
             return result.returncode == 0
         except Exception as e:
-            print(f"Erreur ping: {e}")
+            logger.warning("Erreur ping: %s", e)
             return False
     
     def tester_port_s7(self, ip_address, port=102, timeout=3):
@@ -433,93 +849,80 @@ class AutomateSiemensS7Complete:
             sock.close()
             return result == 0
         except Exception as e:
-            print(f"Erreur test port S7: {e}")
+            logger.warning("Erreur test port S7: %s", e)
             return False
     
-    def _init_simulation_data(self):
-        """Initialise les données de simulation avec vos tags Siemens"""
-        self.simulation_data = {
-            # DB1 - Static
-            'DB1.DBX0.0': False,  # bp_marche
-            'DB1.DBX0.1': False,  # bp_arret  
-            'DB1.DBX0.2': False,  # bp_rearmement
-            'DB1.DBX0.3': True,   # ARU
-            'DB1.DBW2': 50,       # quantite_produit
-            'DB1.DBW4': 123,      # TestInt
-            
-            # DB2 - lec_ecr_ihm_indus
-            'DB2.DBX0.0': False,  # bit_de_vie
-            'DB2.DBX0.1': False,  # temp_de_prod
-            
-            # DB3 - sorti_ihm_indus
-            'DB3.DBX0.0': False,  # voyant_marche
-            'DB3.DBX0.1': False,  # voyant_arret
-            'DB3.DBX0.2': False,  # voyant_marche_1
-            'DB3.DBX0.3': False,  # marche_moteur
-        }
-        
-        if self.simulation_mode:
-            self._start_simulation()
-    
-    def _start_simulation(self):
-        """Démarre la simulation avec valeurs qui évoluent"""
-        def update_simulation():
-            import random
-            while self.simulation_mode and self.connected:
-                try:
-                    # Simule un bit de vie qui clignote
-                    self.simulation_data['DB2.DBX0.0'] = not self.simulation_data.get('DB2.DBX0.0', False)
-                    
-                    # Simule la quantité qui augmente
-                    if 'DB1.DBW2' in self.simulation_data:
-                        self.simulation_data['DB1.DBW2'] = (self.simulation_data['DB1.DBW2'] + 1) % 100
-                    
-                    # Simule les états des voyants selon les boutons
-                    if self.simulation_data.get('DB1.DBX0.0'):  # Si bp_marche pressé
-                        self.simulation_data['DB3.DBX0.0'] = True  # voyant_marche ON
-                        self.simulation_data['DB3.DBX0.3'] = True  # marche_moteur ON
-                    
-                    if self.simulation_data.get('DB1.DBX0.1'):  # Si bp_arret pressé
-                        self.simulation_data['DB3.DBX0.0'] = False  # voyant_marche OFF
-                        self.simulation_data['DB3.DBX0.1'] = True   # voyant_arret ON
-                        self.simulation_data['DB3.DBX0.3'] = False  # marche_moteur OFF
-                    
-                    time.sleep(1)
-                except Exception as e:
-                    print(f"Erreur simulation: {e}")
-                    time.sleep(5)
-        
-        thread = threading.Thread(target=update_simulation, daemon=True)
-        thread.start()
-        print("🔄 Simulation S7 démarrée")
-    
-    def get_status(self):
-        """Retourne le statut de connexion détaillé"""
+    def get_status(self, verifier_reseau=False):
+        """
+        Retourne le statut de connexion détaillé depuis le dernier instantané du moniteur de santé
+        verifier_reseau: ping et port S7 testés maintenant (bloquant) au lieu de la dernière sonde
+        """
+        sonde = self.sante.sonde
+        tags_en_cache = sonde.get("tags_en_cache")
         status = {
+            "nom": self.nom,
             "connected": self.connected,
             "ip_address": self.ip_address,
             "rack": self.rack,
             "slot": self.slot,
+            "port": self.port,
             "protocol": "Siemens S7",
             "simulation_mode": self.simulation_mode,
             "driver_available": SNAP7_AVAILABLE,
             "validation_ping": self.validation_ping,
             "timestamp": datetime.now().isoformat(),
-            "tags_en_cache": len(self.derniere_lecture)
+            "tags_en_cache": tags_en_cache if tags_en_cache is not None else self.image.compter(self.nom),
+            "acquisition": registre_automates.moteur(self.nom).stats(),
+            "pool": self.pool.stats() if self.pool else None,
+            "sante": self.sante.stats(),
+            "supervision": self.superviseur.stats(),
+            "simulateur": self.simulateur.stats() if self.simulation_mode else None
         }
         
-        if not self.simulation_mode and self.ip_address:
+        if verifier_reseau and not self.simulation_mode and self.ip_address:
             status["network_ping"] = self.ping_automate(self.ip_address, timeout=1)
-            status["s7_port_open"] = self.tester_port_s7(self.ip_address, timeout=1)
+            status["s7_port_open"] = self.tester_port_s7(self.ip_address, self.port, timeout=1)
+        elif "timestamp" in sonde:
+            for champ in ("network_ping", "s7_port_open", "latence_port_ms"):
+                if champ in sonde:
+                    status[champ] = sonde[champ]
+            status["sonde_timestamp"] = sonde["timestamp"]
         
         return status
 
 # Instance globale de l'automate Siemens
 automate = AutomateSiemensS7Complete()
 
+# Scrutation en tâche de fond : les routes HTTP lisent l'image des tags
+moteur_acquisition = MoteurAcquisition(automate)
+
+# Automates nommés des projets (Connexion_Automate), chacun avec son pool et son moteur
+registre_automates = RegistreAutomates(automate, moteur_acquisition, AutomateSiemensS7Complete)
+
+# Sondes réseau périodiques de tous les automates : get_status() lit le dernier instantané
+moniteur_sante = MoniteurSante(registre_automates)
+
 def init_automate(app):
-    """Initialise l'automate avec le contexte de l'app"""
+    """Initialise l'automate, le moteur d'acquisition et le registre avec le contexte de l'app"""
     automate.init_app(app)
+    moteur_acquisition.init_app(app)
+    registre_automates.init_app(app)
+    boucle_s7.init_app(app)
+    moniteur_sante.init_app(app)
+    stockage_historique.init_app(app)
+    historien.init_app(app)
+    moteur_alarmes.init_app(app)
+    journal_alarmes.init_app(app)
+    persistance_valeurs.init_app(app)
+    moteur_alarmes.ajouter_auditeur(journal_alarmes.enregistrer)
+    # Changements significatifs publiés par l'acquisition -> historien, alarmes
+    image_tags.ajouter_auditeur(historien.changements_image)
+    image_tags.ajouter_auditeur(moteur_alarmes.changements_image)
+    # Fin du processus : dernier vidage des écritures différées en service (une seule fois, même avec plusieurs apps)
+    for ecriture in (persistance_valeurs, journal_alarmes, historien):
+        atexit.unregister(ecriture.arreter)
+        if ecriture.est_actif():
+            atexit.register(ecriture.arreter)
 
 # =================================================================
 # MODÈLE TAG ÉTENDU POUR GESTION FLEXIBLE
@@ -535,10 +938,19 @@ class TagSiemensEtendu:
             if '.' not in str(offset):
                 raise ValueError("Pour BOOL, offset doit être au format 'byte.bit' (ex: 0.0)")
             return f"DB{db}.DBX{offset}"
-        elif type_donnee == 'INT':
+        elif type_donnee == 'BYTE':
+            return f"DB{db}.DBB{offset}"
+        elif type_donnee in ['INT', 'WORD']:
             return f"DB{db}.DBW{offset}"
-        elif type_donnee in ['DINT', 'REAL']:
+        elif type_donnee in ['DINT', 'DWORD', 'REAL']:
             return f"DB{db}.DBD{offset}"
+        elif type_donnee == 'LREAL':
+            return f"DB{db}.DBLR{offset}"
+        elif type_donnee == 'STRING':
+            # offset 'octet' ou 'octet.longueur_max' (254 par défaut)
+            return f"DB{db}.DBS{offset}"
+        elif type_donnee == 'DTL':
+            return f"DB{db}.DBDTL{offset}"
         else:
             raise ValueError(f"Type de donnée non supporté: {type_donnee}")
     
@@ -556,13 +968,26 @@ class TagSiemensEtendu:
                     return False, "Offset BOOL invalide (bit doit être 0-7)"
                 return True, "Offset BOOL valide"
             
-            elif type_donnee == 'INT':
+            elif type_donnee == 'BYTE':
+                if int(offset) < 0:
+                    return False, "Offset BYTE doit être positif"
+                return True, "Offset BYTE valide"
+            
+            elif type_donnee == 'STRING':
+                octet, _, longueur = str(offset).partition('.')
+                if int(octet) < 0 or int(octet) % 2 != 0:
+                    return False, "Offset STRING doit être un nombre pair positif"
+                if longueur and not 1 <= int(longueur) <= 254:
+                    return False, "Longueur STRING invalide (1-254)"
+                return True, "Offset STRING valide"
+            
+            elif type_donnee in ['INT', 'WORD', 'LREAL', 'DTL']:
                 offset_val = int(offset)
                 if offset_val < 0 or offset_val % 2 != 0:
-                    return False, "Offset INT doit être un nombre pair positif"
-                return True, "Offset INT valide"
+                    return False, f"Offset {type_donnee} doit être un nombre pair positif"
+                return True, f"Offset {type_donnee} valide"
             
-            elif type_donnee in ['DINT', 'REAL']:
+            elif type_donnee in ['DINT', 'DWORD', 'REAL']:
                 offset_val = int(offset)
                 if offset_val < 0 or offset_val % 4 != 0:
                     return False, f"Offset {type_donnee} doit être multiple de 4"
@@ -592,7 +1017,12 @@ class TagSiemensEtendu:
                 if val < -2147483648 or val > 2147483647:
                     raise ValueError("Valeur DINT hors limites")
                 return val
-            elif type_donnee == 'REAL':
+            elif type_donnee in LIMITES_NON_SIGNES:
+                val = int(valeur)
+                if not 0 <= val <= LIMITES_NON_SIGNES[type_donnee]:
+                    raise ValueError(f"Valeur {type_donnee} hors limites (0 à {LIMITES_NON_SIGNES[type_donnee]})")
+                return val
+            elif type_donnee in ['REAL', 'LREAL']:
                 return float(valeur)
             else:
                 return str(valeur)
@@ -645,7 +1075,7 @@ def tags():
     
     # ✅ CORRIGÉ : filtrer par projet
     tags = Tag.query.filter_by(id_projet=current_project_id).all()
-    print(f"Debug - Tags du projet {current_project_id}: {len(tags)}")
+    logger.debug("Tags du projet %s: %d", current_project_id, len(tags))
     
     return render_template('monitoring/tags.html', tags=tags)
 
@@ -677,7 +1107,7 @@ def api_read_tag_direct():
     type_attendu = data.get('type', None)
     
     try:
-        valeur, qualite = automate.lire_tag_par_adresse(adresse, type_attendu)
+        valeur, qualite = registre_automates.automate(data.get('automate')).lire_tag_par_adresse(adresse, type_attendu)
         
         return jsonify({
             "success": valeur is not None,
@@ -708,7 +1138,8 @@ def api_write_tag_direct():
     type_attendu = data.get('type', None)
     
     try:
-        success, status = automate.ecrire_tag_par_adresse(adresse, valeur, type_attendu)
+        cible = registre_automates.automate(data.get('automate'))
+        success, status = cible.ecrire_tag_par_adresse(adresse, valeur, type_attendu)
         
         return jsonify({
             "success": success,
@@ -735,27 +1166,32 @@ def api_create_tag_flexible():
     
     data = request.get_json()
     
-    # Validation des champs requis
-    champs_requis = ['nom_tag', 'db', 'type_donnee', 'offset']
+    # Validation des champs requis : adresse complète (I, Q, M, T, C...) ou DB + offset
+    champs_requis = ['nom_tag', 'type_donnee'] + ([] if data.get('adresse') else ['db', 'offset'])
     for champ in champs_requis:
         if champ not in data:
             return jsonify({"error": f"Champ '{champ}' requis"}), 400
     
     nom_tag = data['nom_tag']
-    db_num = data['db']
     type_donnee = data['type_donnee']
-    offset = data['offset']
     acces = data.get('acces', 'R')
     description = data.get('description_tag', '')
     
     try:
-        # Validation de l'offset
-        offset_valide, message_offset = TagSiemensEtendu.valider_offset(type_donnee, offset)
-        if not offset_valide:
-            return jsonify({"error": message_offset}), 400
-        
-        # Génération de l'adresse S7
-        adresse = TagSiemensEtendu.generer_adresse(db_num, type_donnee, offset)
+        if data.get('adresse'):
+            adresse = data['adresse'].strip().upper()
+            try:
+                compiler_adresse(adresse)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            # Validation de l'offset
+            offset_valide, message_offset = TagSiemensEtendu.valider_offset(type_donnee, data['offset'])
+            if not offset_valide:
+                return jsonify({"error": message_offset}), 400
+            
+            # Génération de l'adresse S7
+            adresse = TagSiemensEtendu.generer_adresse(data['db'], type_donnee, data['offset'])
         
         # Vérification de l'unicité
         tag_existant = Tag.query.filter_by(nom_tag=nom_tag).first()
@@ -773,7 +1209,20 @@ def api_create_tag_flexible():
         )
         
         db.session.add(nouveau_tag)
+        db.session.flush()
+        
+        # Automate nommé du projet (automate par défaut sinon)
+        id_connexion = data.get('id_connexion')
+        if id_connexion:
+            connexion = ConnexionAutomate.query.filter_by(id_connexion=id_connexion, id_projet=current_project_id).first()
+            if not connexion:
+                db.session.rollback()
+                return jsonify({"error": f"Automate {id_connexion} non trouvé dans le projet"}), 404
+            db.session.add(LierConnexionTag(id_tag=nouveau_tag.id_tag, id_connexion=connexion.id_connexion))
+        
         db.session.commit()
+        invalider_plans(current_project_id)
+        registre_automates.recharger()
         
         return jsonify({
             "message": f"Tag '{nom_tag}' créé dans le projet {current_project_id}",
@@ -872,35 +1321,36 @@ def api_valider_adresse():
 @AuthSystem.auto_required
 def api_read_tag(nom_tag):
     """API: Lecture d'un tag par nom - VERSION CORRIGÉE"""
-    if not automate.connected:
-        return jsonify({"error": "Automate non connecté"}), 400
-    
     current_project_id = session.get('current_project_id')
-    print(f"DEBUG: current_project_id = {current_project_id}")
+    logger.debug("api_read_tag: current_project_id = %s", current_project_id)
     
     # CORRECTION TEMPORAIRE: Chercher le tag partout si pas de projet
     if current_project_id:
         tag = Tag.query.filter_by(nom_tag=nom_tag, id_projet=current_project_id).first()
     else:
         tag = Tag.query.filter_by(nom_tag=nom_tag).first()
-        print(f"DEBUG: Pas de projet, recherche globale")
+        logger.debug("api_read_tag: pas de projet, recherche globale")
     
     if not tag:
         return jsonify({"error": f"Tag '{nom_tag}' non trouvé"}), 404
     
-    print(f"DEBUG: Tag trouvé - {tag.nom_tag}, projet: {tag.id_projet}")
+    logger.debug("api_read_tag: tag %s, projet %s", tag.nom_tag, tag.id_projet)
+    
+    source = registre_automates.source_tag(tag.id_tag)
+    # Connexion du tag inactive : lecture en BAD, sans passer par l'automate par défaut
+    if source != SOURCE_INDISPONIBLE and not registre_automates.automate(source).connected:
+        return jsonify({"error": f"Automate {source} non connecté"}), 400
     
     try:
-        valeur, qualite = automate.lire_tag_par_adresse(tag.adresse_tag, tag.type_donnee)
-        print(f"DEBUG: Lecture réussie - valeur: {valeur}, qualite: {qualite}")
+        # Lecture dans l'image des tags (alimentée par le moteur d'acquisition de son automate)
+        entree = registre_automates.lire([(source, tag.adresse_tag, tag.type_donnee)])[0]
+        valeur = entree.valeur if entree else None
+        qualite = entree.qualite if entree else QUALITE_EN_ATTENTE
+        logger.debug("api_read_tag: %s = %s (%s)", tag.nom_tag, valeur, qualite)
         
-        # Mise à jour en base (avec protection)
-        try:
-            if valeur is not None and hasattr(tag, 'mettre_a_jour_valeur'):
-                tag.mettre_a_jour_valeur(valeur, qualite)
-                db.session.commit()
-        except Exception as e:
-            print(f"DEBUG: Erreur mise à jour base: {e}")
+        # Tag.valeur écrit plus tard par lots (persistance_valeurs) : pas de commit par lecture
+        if valeur is not None:
+            tag.mettre_a_jour_valeur(valeur, qualite)
         
         return jsonify({
             "success": valeur is not None,
@@ -909,20 +1359,17 @@ def api_read_tag(nom_tag):
             "type_donnee": tag.type_donnee,
             "valeur": valeur,
             "qualite": qualite,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": (entree.timestamp if entree and entree.timestamp else datetime.now()).isoformat()
         })
         
     except Exception as e:
-        print(f"DEBUG: Erreur lecture: {e}")
+        logger.error("Erreur lecture tag %s: %s", nom_tag, e)
         return jsonify({"success": False, "error": str(e)}), 500
 
 @main_bp.route('/api/write/<nom_tag>', methods=['POST'])
 @AuthSystem.auto_required
 def api_write_tag(nom_tag):
     """API: Écriture d'un tag par nom - AVEC FILTRAGE PROJET"""
-    if not automate.connected:
-        return jsonify({"error": "Automate non connecté"}), 400
-    
     # CORRECTION: Ajouter le filtrage par projet
     current_project_id = session.get('current_project_id')
     if not current_project_id:
@@ -943,6 +1390,12 @@ def api_write_tag(nom_tag):
     if not tag.est_accessible_en_ecriture():
         return jsonify({"error": f"Tag '{nom_tag}' non accessible en écriture"}), 403
     
+    automate_tag = registre_automates.automate_tag(tag.id_tag)
+    if automate_tag is registre_automates.indisponible:
+        return jsonify({"error": f"Automate du tag '{nom_tag}' indisponible (connexion inactive)"}), 400
+    if not automate_tag.connected:
+        return jsonify({"error": f"Automate {automate_tag.nom} non connecté"}), 400
+    
     data = request.get_json()
     if not data or 'valeur' not in data:
         return jsonify({"error": "Paramètre 'valeur' requis"}), 400
@@ -954,12 +1407,11 @@ def api_write_tag(nom_tag):
             return jsonify({"error": message}), 400
         
         # Écriture
-        success, status = automate.ecrire_tag_par_adresse(tag.adresse_tag, valeur_convertie, tag.type_donnee)
+        success, status = automate_tag.ecrire_tag_par_adresse(tag.adresse_tag, valeur_convertie, tag.type_donnee)
         
         if success:
-            # Mettre à jour le tag en base
+            # Tag.valeur écrit plus tard par lots (persistance_valeurs)
             tag.mettre_a_jour_valeur(valeur_convertie, 'GOOD')
-            db.session.commit()
             
             return jsonify({
                 "success": True,
@@ -983,43 +1435,125 @@ def api_write_tag(nom_tag):
             "nom_tag": nom_tag
         }), 500
 
+# Nombre maximal d'écritures par appel de /api/write_batch
+ECRITURES_LOT_MAX = 2000
+
+@main_bp.route('/api/write_batch', methods=['POST'])
+@AuthSystem.auto_required
+def api_write_batch():
+    """
+    API: Écriture d'un lot de tags du projet (recette, consignes en masse)
+    Corps : {"ecritures": [{"tag": nom, "valeur": v}, ...]} (ou directement la liste)
+    Les écritures d'un même automate partent en un minimum de requêtes S7 ; résultat par écriture
+    """
+    current_project_id = session.get('current_project_id')
+    if not current_project_id:
+        return jsonify({"error": "Aucun projet sélectionné"}), 400
+
+    data = request.get_json(silent=True)
+    demandes = data.get('ecritures') if isinstance(data, dict) else data
+    if not isinstance(demandes, list) or not demandes \
+            or not all(isinstance(d, dict) and 'tag' in d and ('valeur' in d or 'value' in d) for d in demandes):
+        return jsonify({"error": "Liste 'ecritures' requise : [{\"tag\": nom, \"valeur\": valeur}, ...]"}), 400
+    if len(demandes) > ECRITURES_LOT_MAX:
+        return jsonify({"error": f"Au plus {ECRITURES_LOT_MAX} écritures par lot"}), 400
+
+    chrono = time.perf_counter()
+    noms = {str(d['tag']) for d in demandes}
+    tags = {tag.nom_tag: tag for tag in Tag.query.filter(
+        Tag.id_projet == current_project_id, Tag.nom_tag.in_(noms)
+    )}
+
+    # Contrôles et conversion tag par tag, comme /api/write/<nom_tag>
+    resultats = []
+    ecritures = []
+    for demande in demandes:
+        nom_tag = str(demande['tag'])
+        tag = tags.get(nom_tag)
+        resultat = {"nom_tag": nom_tag, "success": False}
+        resultats.append(resultat)
+        if not tag:
+            resultat["error"] = f"Tag '{nom_tag}' non trouvé dans le projet actuel"
+        elif not tag.actif:
+            resultat["error"] = f"Tag '{nom_tag}' non actif"
+        elif not tag.est_accessible_en_ecriture():
+            resultat["error"] = f"Tag '{nom_tag}' non accessible en écriture"
+        else:
+            valide, valeur_convertie, message = tag.valider_valeur(demande.get('valeur', demande.get('value')))
+            if not valide:
+                resultat["error"] = message
+            else:
+                resultat["valeur"] = valeur_convertie
+                ecritures.append((resultat, tag, valeur_convertie))
+
+    ecrits = registre_automates.ecrire([
+        (registre_automates.source_tag(tag.id_tag), tag.adresse_tag, valeur, tag.type_donnee)
+        for _, tag, valeur in ecritures
+    ]) if ecritures else []
+
+    for (resultat, tag, valeur), (success, status) in zip(ecritures, ecrits):
+        resultat["success"] = success
+        if success:
+            resultat["status"] = status
+            tag.mettre_a_jour_valeur(valeur, 'GOOD')
+        else:
+            resultat["error"] = status
+
+    nb_ecrites = sum(1 for r in resultats if r["success"])
+    logger.info("Écriture par lot: %d/%d tag(s) écrit(s)", nb_ecrites, len(resultats))
+    return jsonify({
+        "success": nb_ecrites == len(resultats),
+        "ecrites": nb_ecrites,
+        "echecs": len(resultats) - nb_ecrites,
+        "resultats": resultats,
+        "duree_ms": round((time.perf_counter() - chrono) * 1000, 1),
+        "timestamp": datetime.now().isoformat()
+    })
+
 @main_bp.route('/api/read_all')
 @AuthSystem.auto_required
 def api_read_all_tags():
     """API: Lecture de tous les tags - VERSION CORRIGÉE"""
-    if not automate.connected:
+    if not registre_automates.un_connecte():
         return jsonify({"error": "Automate non connecté"}), 400
 
     current_project_id = session.get('current_project_id')
-    print(f"DEBUG: current_project_id pour read_all = {current_project_id}")
+    logger.debug("api_read_all: current_project_id = %s", current_project_id)
     
     # CORRECTION: Permettre lecture même sans projet
     if current_project_id:
         all_tags = Tag.query.filter_by(id_projet=current_project_id).all()
-        print(f"DEBUG: {len(all_tags)} tags dans le projet {current_project_id}")
+        logger.debug("api_read_all: %d tags dans le projet %s", len(all_tags), current_project_id)
     else:
         all_tags = Tag.query.all()
-        print(f"DEBUG: {len(all_tags)} tags au total (pas de projet)")
+        logger.debug("api_read_all: %d tags au total (pas de projet)", len(all_tags))
     
     # TEMPORAIRE: Ne plus filtrer par tag.actif
     # tags_actifs = [tag for tag in all_tags if tag.actif]
     tags_actifs = all_tags  # Prendre tous les tags
-    print(f"DEBUG: {len(tags_actifs)} tags à lire")
+    logger.debug("api_read_all: %d tags à lire", len(tags_actifs))
     
+    # Lecture dans l'image des tags : aucune requête S7 sur le chemin de la requête HTTP,
+    # les automates des tags sont lus en parallèle
+    demandes = [(registre_automates.source_tag(tag.id_tag), tag.adresse_tag, tag.type_donnee) for tag in tags_actifs]
+    try:
+        entrees = registre_automates.lire(demandes)
+    except Exception as e:
+        logger.error("Erreur lecture image des tags: %s", e)
+        entrees = [None] * len(demandes)
+
     resultats = []
-    for tag in tags_actifs:
-        try:
-            valeur, qualite = automate.lire_tag_par_adresse(tag.adresse_tag, tag.type_donnee)
-            resultats.append({
-                "nom_tag": tag.nom_tag,
-                "adresse": tag.adresse_tag,
-                "valeur": valeur,
-                "qualite": qualite,
-                "timestamp": datetime.now().isoformat()
-            })
-        except Exception as e:
-            print(f"DEBUG: Erreur lecture {tag.nom_tag}: {e}")
-    
+    timestamp = datetime.now().isoformat()
+    for tag, (source, adresse, _), entree in zip(tags_actifs, demandes, entrees):
+        resultats.append({
+            "nom_tag": tag.nom_tag,
+            "adresse": adresse,
+            "automate": source,
+            "valeur": entree.valeur if entree else None,
+            "qualite": entree.qualite if entree else QUALITE_EN_ATTENTE,
+            "timestamp": entree.timestamp.isoformat() if entree and entree.timestamp else timestamp
+        })
+
     return jsonify({
         "success": True,
         "nombre_tags": len(resultats),
@@ -1027,6 +1561,54 @@ def api_read_all_tags():
         "timestamp": datetime.now().isoformat()
     })
 
+@main_bp.route('/api/stream/tags')
+@AuthSystem.auto_required
+def api_stream_tags():
+    """API: Flux SSE des tags du projet (instantané puis changements), reprise par Last-Event-ID"""
+    from app.utils.flux_sse import flux_image, sequence_reprise
+
+    current_project_id = session.get('current_project_id')
+    if current_project_id:
+        tags = Tag.query.filter_by(id_projet=current_project_id).all()
+    else:
+        tags = Tag.query.all()
+
+    tags_flux = [(tag.nom_tag, tag.adresse_tag, tag.type_donnee) for tag in tags]
+    demandes = [(registre_automates.source_tag(tag.id_tag), tag.adresse_tag, tag.type_donnee) for tag in tags]
+    db.session.remove()
+
+    cles = [cle_image(source, adresse, type_donnee) for source, adresse, type_donnee in demandes]
+    sources = list(dict.fromkeys(source for source, _, _ in demandes))
+    reprise = sequence_reprise(image_tags, request.headers.get('Last-Event-ID') or request.args.get('depuis'))
+
+    def construire(cles_modifiees):
+        resultats = []
+        for (nom_tag, adresse, type_donnee), cle in zip(tags_flux, cles):
+            if cles_modifiees is not None and cle not in cles_modifiees:
+                continue
+            entree = image_tags.lire(cle)
+            resultats.append({
+                "nom_tag": nom_tag,
+                "adresse": adresse,
+                "type_donnee": type_donnee,
+                "valeur": entree.valeur if entree else None,
+                "qualite": entree.qualite if entree else QUALITE_EN_ATTENTE,
+                "timestamp": entree.timestamp.isoformat() if entree and entree.timestamp else None
+            })
+        return {"connected": registre_automates.statut_connexion(sources)['connected'], "tags": resultats}
+
+    flux = flux_image(
+        image_tags, cles, construire,
+        reprise=reprise,
+        renouveler=lambda: registre_automates.abonner_lot(demandes),
+        periode_renouvellement=moteur_acquisition.duree_bail / 2
+    )
+
+    return Response(stream_with_context(flux), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @main_bp.route('/api/tags/<int:tag_id>', methods=['DELETE'])
 @AuthSystem.auto_required
 def api_delete_tag(tag_id):
@@ -1047,6 +1629,8 @@ def api_delete_tag(tag_id):
         nom_tag = tag.nom_tag
         db.session.delete(tag)
         db.session.commit()
+        invalider_plans(current_project_id)
+        registre_automates.recharger()
         
         return jsonify({
             "success": True,
@@ -1075,8 +1659,20 @@ def api_list_tags():
 @main_bp.route('/api/status')
 @AuthSystem.auto_required
 def api_status():
-    """API: Statut de l'automate"""
-    status = automate.get_status()
+    """
+    API: Statut de l'automate (healthcheck) depuis le dernier instantané du moniteur de santé
+    ?verifier=true : ping et port S7 testés maintenant, en parallèle par la couche asynchrone
+    """
+    if request.args.get('verifier', 'false').lower() == 'true':
+        status = boucle_s7.executer(pilote_async(automate).get_status())
+    else:
+        status = automate.get_status()
+    status["automates"] = registre_automates.stats()
+    status["historien"] = historien.stats()
+    status["stockage_historique"] = stockage_historique.stats()
+    status["alarmes"] = moteur_alarmes.stats()
+    status["journal_alarmes"] = journal_alarmes.stats()
+    status["persistance_valeurs"] = persistance_valeurs.stats()
     return jsonify(status)
 
 @main_bp.route('/api/test_ping')
@@ -1099,37 +1695,86 @@ def api_test_ping():
             "error": str(e)
         }), 500
 
+def parametres_scan():
+    """
+    Paramètres de scan de la requête : réseau CIDR (reseau=192.168.0.0/24) ou plage
+    (base_ip, start, end), ping ICMP et identification SZL optionnels
+    Retourne: (adresses, description de la plage, options du scanner). ValueError si invalide
+    """
+    reseau = request.args.get('reseau')
+    if reseau:
+        adresses = adresses_reseau(reseau)
+        plage = reseau
+    else:
+        base_ip = request.args.get('base_ip', '192.168.0')
+        start = int(request.args.get('start', 1))
+        end = int(request.args.get('end', 254))
+        adresses = plage_adresses(base_ip, start, end)
+        plage = f"{start}-{end}"
+
+    options = {
+        'port': int(request.args.get('port', 102)),
+        'timeout': current_app.config.get('SCAN_TIMEOUT_S', 0.5),
+        'concurrence': current_app.config.get('SCAN_CONCURRENCE', 128),
+        'ping': request.args.get('ping', 'false').lower() == 'true',
+        'identifier': request.args.get('identifier', 'false').lower() == 'true'
+    }
+    return adresses, plage, options
+
+
 @main_bp.route('/api/scan_network')
 @AuthSystem.auto_required
 def api_scan_network():
-    """API: Scan réseau pour trouver des automates"""
-    base_ip = request.args.get('base_ip', '192.168.0')
-    start = int(request.args.get('start', 1))
-    end = int(request.args.get('end', 20))
-    
-    automates_found = []
+    """API: Scan réseau pour trouver des automates (sondes TCP sur le port 102 en parallèle)"""
+    try:
+        adresses, plage, options = parametres_scan()
+    except ValueError as e:
+        return jsonify({"error": f"Plage d'adresses invalide: {e}"}), 400
     
-    for i in range(start, end + 1):
-        ip = f"{base_ip}.{i}"
-        try:
-            ping_ok = automate.ping_automate(ip, timeout=1)
-            s7_port = automate.tester_port_s7(ip, timeout=1) if ping_ok else False
-            
-            if ping_ok:
-                automates_found.append({
-                    "ip": ip,
-                    "ping": ping_ok,
-                    "s7_port": s7_port
-                })
-        except Exception:
-            continue
+    debut = time.perf_counter()
+    automates_found = boucle_s7.executer(scanner_reseau_async(adresses, **options))
     
     return jsonify({
         "success": True,
-        "base_ip": base_ip,
-        "range": f"{start}-{end}",
+        "base_ip": request.args.get('reseau') or request.args.get('base_ip', '192.168.0'),
+        "range": plage,
         "automates_found": automates_found,
-        "total_found": len(automates_found)
+        "total_found": len(automates_found),
+        "scanned": len(adresses),
+        "duration_ms": round((time.perf_counter() - debut) * 1000)
+    })
+
+
+@main_bp.route('/api/scan_network/stream')
+@AuthSystem.auto_required
+def api_scan_network_stream():
+    """
+    API: Scan réseau en flux SSE - un événement 'automate' par hôte dès qu'il répond,
+    puis un événement 'fin' avec le total (le scan s'arrête si le client se déconnecte)
+    """
+    from app.utils.flux_sse import evenement_sse
+
+    try:
+        adresses, plage, options = parametres_scan()
+    except ValueError as e:
+        return jsonify({"error": f"Plage d'adresses invalide: {e}"}), 400
+
+    def flux():
+        debut = time.perf_counter()
+        trouves = 0
+        for hote in boucle_s7.iterer(scanner_reseau_flux(adresses, **options)):
+            trouves += 1
+            yield evenement_sse(hote, 'automate')
+        yield evenement_sse({
+            "range": plage,
+            "scanned": len(adresses),
+            "total_found": trouves,
+            "duration_ms": round((time.perf_counter() - debut) * 1000)
+        }, 'fin')
+
+    return Response(stream_with_context(flux()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
 # =================================================================
@@ -1181,6 +1826,8 @@ def admin_init_tags():
     """Admin: Initialise les tags par défaut"""
     try:
         tags_crees = creer_tags_siemens_defaut()
+        invalider_plans(session.get('current_project_id'))
+        registre_automates.recharger()
         return jsonify({
             "success": True,
             "message": f"{len(tags_crees)} tags créés",
@@ -1197,7 +1844,7 @@ def admin_init_tags():
 def admin_reset_simulation():
     """Admin: Remet à zéro la simulation"""
     if automate.simulation_mode:
-        automate._init_simulation_data()
+        automate.simulateur.reinitialiser()
         return jsonify({
             "success": True,
             "message": "Simulation réinitialisée"
@@ -2,7 +2,7 @@ from app.models.modele_tag import Tag
 from app.models.modele_graphics import Page, Animation, ContenirAnimation
 from app.models.modele_user_management import UserManagement
 from app.models.modele_auth import AuthSystem
-from app.models.modele_projects import Project, ContenirProject
+from app.models.modele_projects import ProjectManager
 from app.models.modele_graphics import IconLibrary, IconFileManager
 
 
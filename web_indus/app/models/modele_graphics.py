@@ -6,7 +6,15 @@ import json
 import os
 import uuid
 import time
+import threading
+import logging
 from werkzeug.utils import secure_filename
+from app.utils.evaluation_regles import (
+    convertir_valeur_couleur, convertir_valeur_visibilite,
+    compiler_regle_couleur, compiler_regle_visibilite
+)
+
+logger = logging.getLogger(__name__)
 
 # =================================================================
 # MODÈLES GRAPHIQUES AVEC SUPPORT COMPLET DES ICÔNES ET NAVIGATION
@@ -159,7 +167,7 @@ class Animation(db.Model):
             else:
                 return {}
         except (json.JSONDecodeError, TypeError) as e:
-            print(f"Erreur décodage règles animation {self.id_animation}: {e}")
+            logger.warning("Erreur décodage règles animation %s: %s", self.id_animation, e)
             return {}
     
     def set_regles_animation(self, regles):
@@ -167,7 +175,7 @@ class Animation(db.Model):
         try:
             self.regles_animation = json.dumps(regles) if regles else '{}'
         except (TypeError, ValueError) as e:
-            print(f"Erreur encodage règles animation {self.id_animation}: {e}")
+            logger.warning("Erreur encodage règles animation %s: %s", self.id_animation, e)
             self.regles_animation = '{}'
     
     def update_regles(self, **kwargs):
@@ -1291,89 +1299,25 @@ class ColorRule(db.Model):
             "date_modification": self.date_modification.strftime("%Y-%m-%d %H:%M:%S") if self.date_modification else None
         }
 
+    def predicat(self):
+        """Condition compilée (recompilée si l'opérateur, la cible ou l'état actif changent)"""
+        predicat = getattr(self, '_predicat', None)
+        if predicat is None or predicat.cle != (self.actif, self.operator, self.target_value):
+            predicat = compiler_regle_couleur(self)
+            self._predicat = predicat
+        return predicat
+
     def test_condition(self, tag_value):
-        """Teste si la condition est remplie - AVEC LOGS"""
-        if not self.actif:
-            print(f"⏸️ Règle '{self.nom_regle}' désactivée")
-            return False
-        
-        try:
-            # Conversion des valeurs
-            rule_value = self._convert_value(self.target_value)
-            test_value = self._convert_value(tag_value)
-            
-            print(f"🔍 TEST Règle '{self.nom_regle}':")
-            print(f"   Tag value: {tag_value} ({type(tag_value).__name__}) → converti: {test_value} ({type(test_value).__name__})")
-            print(f"   Rule value: {self.target_value} ({type(self.target_value).__name__}) → converti: {rule_value} ({type(rule_value).__name__})")
-            print(f"   Opérateur: '{self.operator}'")
-            
-            # Application de l'opérateur
-            operators_map = {
-                '=': lambda x, y: x == y,
-                '==': lambda x, y: x == y,
-                '!=': lambda x, y: x != y,
-                '>': lambda x, y: x > y,
-                '<': lambda x, y: x < y,
-                '>=': lambda x, y: x >= y,
-                '<=': lambda x, y: x <= y
-            }
-            
-            if self.operator in operators_map:
-                result = operators_map[self.operator](test_value, rule_value)
-                symbol = "✅" if result else "❌"
-                print(f"{symbol} Résultat: {test_value} {self.operator} {rule_value} = {result}")
-                
-                if result:
-                    print(f"🎨 COULEUR APPLIQUÉE: {self.color}")
-                
-                return result
-            else:
-                print(f"❌ Opérateur invalide: '{self.operator}'")
-                return False
-                
-        except Exception as e:
-            print(f"❌ ERREUR test condition règle '{self.nom_regle}': {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+        """Teste si la condition est remplie"""
+        return self.predicat().tester(tag_value)
 
     def _convert_value(self, value):
         """Convertit intelligemment une valeur"""
-        if value is None:
-            return None
-        
-        # Si c'est déjà un type natif, le retourner
-        if isinstance(value, (bool, int, float)):
-            return value
-        
-        # Convertir en string
-        str_value = str(value).strip()
-        
-        if not str_value:
-            return None
-        
-        str_value_lower = str_value.lower()
-        
-        # Booléens
-        if str_value_lower in ['true', '1', 'on', 'yes', 'oui']:
-            return True
-        elif str_value_lower in ['false', '0', 'off', 'no', 'non']:
-            return False
-        
-        # Nombres
-        try:
-            if '.' not in str_value and 'e' not in str_value_lower:
-                return int(str_value)
-            else:
-                return float(str_value)
-        except (ValueError, TypeError):
-            return str(value)
+        return convertir_valeur_couleur(value)
 
     @classmethod
     def get_rules_for_object(cls, object_id, project_id=None):
         """Récupère toutes les règles actives pour un objet"""
-        print(f"📋 Recherche règles pour objet {object_id}, projet {project_id}")
-        
         query = cls.query.filter_by(object_id=object_id, actif=True)
         
         if project_id:
@@ -1381,221 +1325,37 @@ class ColorRule(db.Model):
         
         rules = query.order_by(cls.priorite.asc(), cls.date_creation.asc()).all()
         
-        print(f"   ➡️ {len(rules)} règle(s) trouvée(s)")
-        for rule in rules:
-            print(f"      - {rule.nom_regle} (priorité {rule.priorite}): {rule.tag_name} {rule.operator} {rule.target_value} → {rule.color}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%d règle(s) pour l'objet %s, projet %s", len(rules), object_id, project_id)
+            for rule in rules:
+                logger.debug("  - %s (priorité %s): %s %s %s -> %s", rule.nom_regle, rule.priorite,
+                             rule.tag_name, rule.operator, rule.target_value, rule.color)
         
         return rules
 
     @classmethod
     def apply_rules_to_object(cls, animation, tag_value, project_id=None):
         """Applique les règles à un objet et retourne la couleur finale"""
-        print(f"\n🎨 === APPLICATION RÈGLES POUR {animation.nom_animation} (ID: {animation.id_animation}) ===")
-        print(f"   Tag lié: {animation.tag_lie}")
-        print(f"   Valeur actuelle: {tag_value}")
-        print(f"   Couleur normale: {animation.couleur_normale}")
-        print(f"   Projet: {project_id}")
-        
-        # Récupérer les règles
-        rules = cls.get_rules_for_object(animation.id_animation, project_id)
-        
+        # Règles depuis l'index du projet (aucune requête SQL), par ordre de priorité
+        rules = index_regles.regles_couleur(animation.id_animation, project_id)
         if not rules:
-            print(f"   ℹ️ Aucune règle définie → couleur normale")
             return animation.couleur_normale
-        
-        # Vérifier chaque règle par ordre de priorité
-        for rule in rules:
-            print(f"\n   🔍 Test règle '{rule.nom_regle}' (priorité {rule.priorite}):")
-            
-            # Vérifier que le tag correspond
-            tag_match = rule.tag_name.strip() == animation.tag_lie.strip()
-            print(f"      Tag règle: '{rule.tag_name}' vs Tag animation: '{animation.tag_lie}' → Match: {tag_match}")
-            
-            if not tag_match:
-                print(f"      ⏭️ Tag ne correspond pas, règle ignorée")
-                continue
-            
-            # Tester la condition
-            if rule.test_condition(tag_value):
-                print(f"   ✅ RÈGLE APPLIQUÉE: {rule.nom_regle} → couleur {rule.color}")
-                return rule.color
-            else:
-                print(f"      ❌ Condition non remplie")
-        
-        # Aucune règle ne s'applique
-        print(f"   ℹ️ Aucune règle ne s'applique → couleur normale {animation.couleur_normale}")
-        return animation.couleur_normale
 
+        # Valeur convertie une seule fois pour toutes les règles de l'objet
+        test_value = convertir_valeur_couleur(tag_value)
+        tag_lie = animation.tag_lie.strip()
 
-# =================================================================
-# FONCTION BATCH
-# =================================================================
-def apply_color_rules_batch(animations_with_values, project_id=None):
-    """Applique les règles de couleur à un lot d'animations"""
-    print(f"\n🎨 ========== APPLICATION RÈGLES EN LOT (Projet {project_id}) ==========")
-    print(f"📊 Nombre d'animations à traiter: {len(animations_with_values)}")
-    
-    result = {}
-    
-    for animation, tag_value in animations_with_values:
-        try:
-            final_color = ColorRule.apply_rules_to_object(animation, tag_value, project_id)
-            result[animation.id_animation] = final_color
-            
-            if final_color != animation.couleur_normale:
-                print(f"\n🎨 COULEUR CHANGÉE: {animation.nom_animation}")
-                print(f"   {animation.couleur_normale} → {final_color}")
-                print(f"   Valeur: {tag_value}")
-            
-        except Exception as e:
-            print(f"\n❌ ERREUR application règle pour {animation.nom_animation}: {e}")
-            import traceback
-            traceback.print_exc()
-            result[animation.id_animation] = animation.couleur_normale
-    
-    print(f"\n✅ Application règles terminée: {len(result)} objets traités")
-    print(f"🎨 ============================================================\n")
-    
-    return result
-    """Règle de couleur dynamique simplifiée"""
-    
-    __tablename__ = 'color_rule'
-    
-    id_color_rule = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    nom_regle = db.Column(db.String(100), nullable=False)
-    id_projet = db.Column(db.Integer, db.ForeignKey("hmi_project.id_projet"), nullable=False)
-    object_id = db.Column(db.Integer, nullable=False)  # ID de l'animation
-    tag_name = db.Column(db.String(100), nullable=False)  # Nom du tag à surveiller
-    operator = db.Column(db.String(3), nullable=False)   # '=', '!=', '>', '<', '>=', '<='
-    target_value = db.Column(db.String(50), nullable=False)  # Valeur à comparer
-    color = db.Column(db.String(7), nullable=False)      # Couleur à appliquer (#RRGGBB)
-    priorite = db.Column(db.Integer, default=1)          # Priorité (1 = plus haute)
-    actif = db.Column(db.Boolean, default=True)
-    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
-    date_modification = db.Column(db.DateTime, default=datetime.utcnow)
-
-    def __init__(self, **kwargs):
-        self.nom_regle = kwargs.get('nom_regle')
-        self.id_projet = kwargs.get('id_projet')
-        self.object_id = kwargs.get('object_id')
-        self.tag_name = kwargs.get('tag_name')
-        self.operator = kwargs.get('operator', '=')
-        self.target_value = str(kwargs.get('target_value', ''))
-        self.color = kwargs.get('color', '#ff0000')
-        self.priorite = kwargs.get('priorite', 1)
-        self.actif = kwargs.get('actif', True)
-        self.date_creation = datetime.utcnow()
-        self.date_modification = datetime.utcnow()
-
-    def to_dict(self):
-        return {
-            "id": self.id_color_rule,
-            "nom_regle": self.nom_regle,
-            "id_projet": self.id_projet,
-            "object_id": self.object_id,
-            "tag_name": self.tag_name,
-            "operator": self.operator,
-            "target_value": self.target_value,
-            "color": self.color,
-            "priorite": self.priorite,
-            "actif": self.actif,
-            "date_creation": self.date_creation.strftime("%Y-%m-%d %H:%M:%S"),
-            "date_modification": self.date_modification.strftime("%Y-%m-%d %H:%M:%S")
-        }
-
-    def test_condition(self, tag_value):
-        """Teste si la condition de la règle est remplie"""
-        if not self.actif:
-            return False
-            
-        try:
-            # Conversion automatique des types
-            rule_value = self._convert_value(self.target_value)
-            test_value = self._convert_value(tag_value)
-            
-            # Application de l'opérateur
-            operators_map = {
-                '=': lambda x, y: x == y,
-                '==': lambda x, y: x == y,
-                '!=': lambda x, y: x != y,
-                '>': lambda x, y: x > y,
-                '<': lambda x, y: x < y,
-                '>=': lambda x, y: x >= y,
-                '<=': lambda x, y: x <= y
-            }
-            
-            if self.operator in operators_map:
-                result = operators_map[self.operator](test_value, rule_value)
-                print(f"🔍 Test règle '{self.nom_regle}': {test_value} {self.operator} {rule_value} = {result}")
-                return result
-            else:
-                print(f"❌ Opérateur invalide: {self.operator}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Erreur test condition règle {self.nom_regle}: {e}")
-            return False
-
-    def _convert_value(self, value):
-        """Convertit intelligemment une valeur pour la comparaison"""
-        if value is None:
-            return None
-            
-        # Convertir en string d'abord
-        str_value = str(value).strip().lower()
-        
-        # Booléens
-        if str_value in ['true', '1', 'on', 'yes']:
-            return True
-        elif str_value in ['false', '0', 'off', 'no']:
-            return False
-        
-        # Nombres
-        try:
-            # Essayer d'abord un entier
-            if '.' not in str_value:
-                return int(str_value)
-            else:
-                return float(str_value)
-        except ValueError:
-            # Retourner la chaîne originale si pas de conversion possible
-            return str(value)
-
-    @classmethod
-    def get_rules_for_object(cls, object_id, project_id=None):
-        """Récupère toutes les règles actives pour un objet, triées par priorité"""
-        query = cls.query.filter_by(object_id=object_id, actif=True)
-        
-        if project_id:
-            query = query.filter_by(id_projet=project_id)
-            
-        return query.order_by(cls.priorite.asc(), cls.date_creation.asc()).all()
-
-    @classmethod
-    def apply_rules_to_object(cls, animation, tag_value, project_id=None):
-        """Applique les règles à un objet et retourne la couleur finale"""
-        rules = cls.get_rules_for_object(animation.id_animation, project_id)
-        
-        if not rules:
-            return animation.couleur_normale  # Couleur par défaut
-        
-        # Vérifier chaque règle par ordre de priorité
         for rule in rules:
-            # Vérifier que le tag correspond
-            if rule.tag_name.strip() != animation.tag_lie.strip():
+            if rule.tag_name.strip() != tag_lie:
                 continue
-                
-            # Tester la condition
-            if rule.test_condition(tag_value):
-                print(f"✅ Règle appliquée: {rule.nom_regle} -> couleur {rule.color}")
+            if rule.predicat().tester_converti(test_value):
                 return rule.color
-        
-        # Aucune règle ne s'applique, retourner la couleur normale
-        return animation.couleur_normale    
+
+        return animation.couleur_normale
 
 
 # =================================================================
-# FONCTION D'APPLICATION DES RÈGLES CORRIGÉE
+# APPLICATION DES RÈGLES DE COULEUR EN LOT
 # =================================================================
 def apply_color_rules_batch(animations_with_values, project_id=None):
     """
@@ -1612,10 +1372,10 @@ def apply_color_rules_batch(animations_with_values, project_id=None):
             
             # Log si couleur changée
             if final_color != animation.couleur_normale:
-                print(f"🎨 Couleur dynamique: {animation.nom_animation} {animation.couleur_normale} -> {final_color}")
+                logger.debug("Couleur dynamique: %s %s -> %s", animation.nom_animation, animation.couleur_normale, final_color)
                 
         except Exception as e:
-            print(f"⚠ Erreur application règle pour {animation.nom_animation}: {e}")
+            logger.warning("Erreur application règle pour %s: %s", animation.nom_animation, e)
             result[animation.id_animation] = animation.couleur_normale
     
     return result
@@ -1669,63 +1429,21 @@ class VisibilityRule(db.Model):
             "date_creation": self.date_creation.strftime("%Y-%m-%d %H:%M:%S") if self.date_creation else None
         }
 
+    def predicat(self):
+        """Condition compilée (recompilée si l'opérateur, la cible ou l'état actif changent)"""
+        predicat = getattr(self, '_predicat', None)
+        if predicat is None or predicat.cle != (self.actif, self.operator, self.target_value):
+            predicat = compiler_regle_visibilite(self)
+            self._predicat = predicat
+        return predicat
+
     def test_condition(self, tag_value):
         """Teste si la condition est remplie"""
-        if not self.actif:
-            return False
-        
-        try:
-            rule_value = self._convert_value(self.target_value)
-            test_value = self._convert_value(tag_value)
-            
-            operators_map = {
-                '=': lambda x, y: x == y,
-                '==': lambda x, y: x == y,
-                '!=': lambda x, y: x != y,
-                '>': lambda x, y: x > y,
-                '<': lambda x, y: x < y,
-                '>=': lambda x, y: x >= y,
-                '<=': lambda x, y: x <= y
-            }
-            
-            if self.operator in operators_map:
-                result = operators_map[self.operator](test_value, rule_value)
-                print(f"👁️ Test visibilité '{self.nom_regle}': {test_value} {self.operator} {rule_value} = {result}")
-                return result
-            
-            return False
-                
-        except Exception as e:
-            print(f"❌ Erreur test condition visibilité: {e}")
-            return False
+        return self.predicat().tester(tag_value)
 
     def _convert_value(self, value):
         """Convertit intelligemment une valeur"""
-        if value is None:
-            return None
-        
-        if isinstance(value, (bool, int, float)):
-            return value
-        
-        str_value = str(value).strip().lower()
-        
-        if not str_value:
-            return None
-        
-        # Booléens
-        if str_value in ['true', '1', 'on', 'yes', 'oui']:
-            return True
-        elif str_value in ['false', '0', 'off', 'no', 'non']:
-            return False
-        
-        # Nombres
-        try:
-            if '.' not in str_value:
-                return int(str_value)
-            else:
-                return float(str_value)
-        except (ValueError, TypeError):
-            return str(value)
+        return convertir_valeur_visibilite(value)
 
     @classmethod
     def get_rules_for_object(cls, object_id, project_id=None):
@@ -1743,19 +1461,98 @@ class VisibilityRule(db.Model):
         Applique les règles à un objet et retourne l'action à effectuer
         Retourne: 'show', 'hide', ou None (pas de changement)
         """
-        rules = cls.get_rules_for_object(animation.id_animation, project_id)
+        rules = index_regles.regles_visibilite(animation.id_animation, project_id)
         
         if not rules:
             return None  # Pas de règles = pas de changement
         
-        # Vérifier chaque règle par ordre de priorité
+        # Vérifier chaque règle par ordre de priorité, valeur convertie une seule fois
+        test_value = convertir_valeur_visibilite(tag_value)
+        tag_lie = animation.tag_lie.strip()
         for rule in rules:
-            if rule.tag_name.strip() != animation.tag_lie.strip():
+            if rule.tag_name.strip() != tag_lie:
                 continue
-                
-            if rule.test_condition(tag_value):
-                print(f"✅ Règle visibilité appliquée: {rule.nom_regle} → {rule.action}")
+            if rule.predicat().tester_converti(test_value):
                 return rule.action
         
         return None  # Aucune règle ne s'applique
 
+
+# =================================================================
+# INDEX DES RÈGLES PAR PROJET (ÉVALUATION SANS REQUÊTE SQL)
+# =================================================================
+
+class IndexRegles:
+    """Règles de couleur et de visibilité actives d'un projet, groupées par objet et triées par priorité"""
+
+    def __init__(self):
+        self._projets = {}      # {id_projet: {'couleur': {object_id: [...]}, 'visibilite': {...}}}
+        self._generation = 0    # Incrémentée à chaque invalidation
+        self._verrou = threading.Lock()
+        self.chargements = 0
+
+    def _charger(self, project_id):
+        """Charge toutes les règles actives du projet : une requête par type de règle"""
+        couleurs = {}
+        query = ColorRule.query.filter_by(actif=True)
+        if project_id:
+            query = query.filter_by(id_projet=project_id)
+        for regle in query.order_by(ColorRule.priorite.asc(), ColorRule.date_creation.asc()).all():
+            # Copie transitoire : l'index est partagé entre requêtes, hors de toute session SQL
+            couleurs.setdefault(regle.object_id, []).append(ColorRule(**regle.to_dict()))
+
+        visibilites = {}
+        query = VisibilityRule.query.filter_by(actif=True)
+        if project_id:
+            query = query.filter_by(id_projet=project_id)
+        for regle in query.order_by(VisibilityRule.priorite.asc()).all():
+            visibilites.setdefault(regle.object_id, []).append(VisibilityRule(**regle.to_dict()))
+
+        self.chargements += 1
+        return {'couleur': couleurs, 'visibilite': visibilites}
+
+    def projet(self, project_id=None):
+        """Règles d'un projet (de tous les projets si None), chargées au premier accès"""
+        regles = self._projets.get(project_id)
+        if regles is None:
+            generation = self._generation
+            regles = self._charger(project_id)
+            with self._verrou:
+                # Ne pas mémoriser un chargement concurrent d'une invalidation
+                if generation == self._generation:
+                    self._projets[project_id] = regles
+        return regles
+
+    def regles_couleur(self, object_id, project_id=None):
+        return self.projet(project_id)['couleur'].get(object_id, [])
+
+    def regles_visibilite(self, object_id, project_id=None):
+        return self.projet(project_id)['visibilite'].get(object_id, [])
+
+    def invalider(self, project_id=None):
+        """À appeler après toute modification de règles (tous les projets si None)"""
+        with self._verrou:
+            self._generation += 1
+            if project_id is None:
+                self._projets.clear()
+            else:
+                self._projets.pop(project_id, None)
+                self._projets.pop(None, None)
+
+    def stats(self):
+        projets = list(self._projets.values())
+        return {
+            'projets': len(projets),
+            'regles_couleur': sum(len(r) for p in projets for r in p['couleur'].values()),
+            'regles_visibilite': sum(len(r) for p in projets for r in p['visibilite'].values()),
+            'chargements': self.chargements
+        }
+
+
+# Instance globale partagée par le runtime et les API de règles
+index_regles = IndexRegles()
+
+
+def invalider_regles(project_id=None):
+    """Invalide l'index des règles d'un projet après une modification"""
+    index_regles.invalider(project_id)
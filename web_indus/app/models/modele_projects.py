@@ -187,7 +187,14 @@ class ProjectManager:
             # 2. Supprimer les pages
             Page.query.filter_by(id_projet=project_id).delete()
             
-            # 3. Supprimer les tags
+            # 3. Supprimer les automates du projet et les tags
+            from app.models.modele_tag import ConnexionAutomate, LierConnexionTag
+            ids_connexions = [c.id_connexion for c in ConnexionAutomate.query.filter_by(id_projet=project_id).all()]
+            if ids_connexions:
+                LierConnexionTag.query.filter(
+                    LierConnexionTag.id_connexion.in_(ids_connexions)
+                ).delete(synchronize_session=False)
+                ConnexionAutomate.query.filter_by(id_projet=project_id).delete()
             Tag.query.filter_by(id_projet=project_id).delete()
             
             # 4. Supprimer le projet
@@ -1,8 +1,14 @@
 from app import db
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, DECIMAL
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, DECIMAL, Float, Double, BigInteger, SmallInteger, LargeBinary
 from sqlalchemy.orm import relationship
-import re
+from sqlalchemy.orm.attributes import set_committed_value
+from app.utils.adresse_s7 import compiler_adresse_ou_none, LIMITES_NON_SIGNES
+from app.utils.persistance_valeurs import persistance_valeurs
+from app.utils.stockage_historique import depuis_horodatage_ms
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Tag(db.Model):
     """Modèle Tag selon le schéma existant"""
@@ -21,9 +27,20 @@ class Tag(db.Model):
     disponibilite_externe = Column(Boolean)
     id_projet = Column(Integer, ForeignKey('HMI_Project.id_projet'))
     
+    # Adresse S7 (table Mapping_Com, liée par nom) chargée avec les tags : une requête
+    # IN pour toute une liste au lieu d'une requête par accès à adresse_tag
+    mappings_com = relationship(
+        'MappingCom',
+        primaryjoin='foreign(MappingCom.nom_du_tag) == Tag.nom_tag',
+        order_by='MappingCom.id_mapping_com',
+        viewonly=True,
+        lazy='selectin'
+    )
+    
     # Variables internes pour la compatibilité (non stockées en BDD)
     _qualite_temp = 'UNKNOWN'
     _timestamp_temp = None
+    _adresse_s7_cache = None   # (AdresseS7 ou None,) : adresse compilée une fois par instance
     
     def __init__(self, nom_tag, type_donnee, adresse_tag=None, **kwargs):
         """Initialisation du tag"""
@@ -52,11 +69,13 @@ class Tag(db.Model):
             if mapping:
                 mapping.adresse = adresse
             else:
-                nouveau_mapping = MappingCom(
+                mapping = MappingCom(
                     nom_du_tag=self.nom_tag,
                     adresse=adresse
                 )
-                db.session.add(nouveau_mapping)
+                db.session.add(mapping)
+            # Relation chargée à jour sans relire la base
+            set_committed_value(self, 'mappings_com', [mapping])
         except Exception as e:
             print(f"Erreur création mapping: {e}")
     
@@ -66,19 +85,27 @@ class Tag(db.Model):
     
     @property
     def adresse_tag(self):
-        """Récupère l'adresse depuis la table Mapping_Com"""
+        """Adresse de la table Mapping_Com (relation chargée avec le tag, sans requête supplémentaire)"""
         try:
-            mapping = MappingCom.query.filter_by(nom_du_tag=self.nom_tag).first()
-            if mapping:
-                return mapping.adresse
+            mappings = self.mappings_com
+            if mappings:
+                return mappings[0].adresse
             return "DB1.DBX0.0"  # Adresse par défaut
-        except:
+        except Exception:
             return "DB1.DBX0.0"
     
     @adresse_tag.setter
     def adresse_tag(self, value):
         """Définit l'adresse dans la table Mapping_Com"""
         self._creer_mapping_communication(value)
+        self._adresse_s7_cache = None
+    
+    @property
+    def adresse_s7(self):
+        """Adresse S7 compilée (AdresseS7, None si invalide), analysée une seule fois par instance"""
+        if self._adresse_s7_cache is None:
+            self._adresse_s7_cache = (compiler_adresse_ou_none(self.adresse_tag),)
+        return self._adresse_s7_cache[0]
     
     @property
     def valeur_courante(self):
@@ -117,28 +144,22 @@ class Tag(db.Model):
     
     @property
     def db_number(self):
-        """Extrait le numéro de DB de l'adresse"""
-        try:
-            adresse = self.adresse_tag
-            match = re.search(r'DB(\d+)', adresse)
-            return int(match.group(1)) if match else 1
-        except:
-            return 1
+        """Numéro de DB de l'adresse"""
+        adresse = self.adresse_s7
+        return adresse.db if adresse else 1
     
     @property
     def offset_address(self):
-        """Extrait l'offset de l'adresse"""
-        try:
-            adresse = self.adresse_tag
-            pattern = r'DB\d+\.DB[XWD](.+)'
-            match = re.search(pattern, adresse)
-            return match.group(1) if match else "0.0"
-        except:
-            return "0.0"
+        """Offset de l'adresse ('0.1' pour un bit, '4' sinon)"""
+        adresse = self.adresse_s7
+        return adresse.offset_texte if adresse else "0.0"
     
     @property
     def data_size(self):
-        """Calcule la taille des données selon le type"""
+        """Calcule la taille des données selon le type (largeur de l'adresse pour STRING, DTL, LREAL...)"""
+        adresse = self.adresse_s7
+        if adresse is not None and not adresse.est_bit:
+            return adresse.largeur
         if self.type_donnee == 'BOOL':
             return 1
         elif self.type_donnee == 'INT':
@@ -153,10 +174,11 @@ class Tag(db.Model):
     
     def to_dict(self):
         """Conversion en dictionnaire pour API"""
+        adresse = self.adresse_s7
         return {
             'id_tag': self.id_tag,
             'nom_tag': self.nom_tag,
-            'adresse_tag': self.adresse_tag,
+            'adresse_tag': adresse.texte if adresse else self.adresse_tag,
             'type_donnee': self.type_donnee,
             'description_tag': self.description_tag,
             'acces': self.acces,
@@ -169,43 +191,23 @@ class Tag(db.Model):
             'disponibilite_externe': self.disponibilite_externe,
             'actif': self.actif,
             'id_projet': self.id_projet,
-            'db_number': self.db_number,
-            'offset_address': self.offset_address,
+            'db_number': adresse.db if adresse else 1,
+            'offset_address': adresse.offset_texte if adresse else "0.0",
             'data_size': self.data_size
         }
     
     def mettre_a_jour_valeur(self, nouvelle_valeur, qualite='GOOD'):
-        """Met à jour la valeur du tag"""
-        self.valeur = str(nouvelle_valeur) if nouvelle_valeur is not None else None
+        """Met à jour la valeur du tag (écrite en base plus tard par persistance_valeurs, sans commit)"""
+        valeur = str(nouvelle_valeur) if nouvelle_valeur is not None else None
+        if self.id_tag is None:
+            self.valeur = valeur
+        else:
+            # L'objet reflète la valeur sans être marqué modifié : aucun UPDATE au prochain commit
+            set_committed_value(self, 'valeur', valeur)
+            persistance_valeurs.noter(self.id_tag, valeur)
         self.qualite = qualite
         self.timestamp_lecture = datetime.utcnow()
-        
-        # Historiser si activé
-        if self.historisation_active:
-            self._ajouter_historique(nouvelle_valeur, qualite)
-    
-    def _ajouter_historique(self, valeur, qualite):
-        """Ajoute une entrée dans l'historique selon votre schéma"""
-        try:
-            # Créer l'entrée d'historique
-            historique = HistoriqueTag(
-                valeur_historique=str(valeur),
-                timestamp_hist=datetime.utcnow(),
-                qualite_hist=qualite,
-                type_changement='LECTURE_AUTO'
-            )
-            db.session.add(historique)
-            db.session.flush()  # Pour obtenir l'ID
-            
-            # Créer la relation dans la table de liaison
-            relation = Historiser(
-                id_tag=self.id_tag,
-                id_historique=historique.id_historique
-            )
-            db.session.add(relation)
-            
-        except Exception as e:
-            print(f"Erreur historisation: {e}")
+        # Historisation : l'historien écoute les changements publiés par l'image des tags
     
     def valeur_typee(self):
         """Retourne la valeur convertie selon le type"""
@@ -221,7 +223,12 @@ class Tag(db.Model):
             elif self.type_donnee == 'DINT':
                 val = int(self.valeur)
                 return val if -2147483648 <= val <= 2147483647 else None
-            elif self.type_donnee == 'REAL':
+            elif self.type_donnee in LIMITES_NON_SIGNES:
+                val = int(self.valeur)
+                return val if 0 <= val <= LIMITES_NON_SIGNES[self.type_donnee] else None
+            elif self.type_donnee in ['TIMER', 'COUNTER']:
+                return int(self.valeur)
+            elif self.type_donnee in ['REAL', 'LREAL']:
                 return float(self.valeur)
             else:
                 return self.valeur
@@ -258,9 +265,32 @@ class Tag(db.Model):
                     return False, None, "Valeur DINT hors limites"
                 return True, valeur_convertie, "Valeur DINT valide"
             
-            elif self.type_donnee == 'REAL':
+            elif self.type_donnee in LIMITES_NON_SIGNES:
+                valeur_convertie = int(valeur)
+                maximum = LIMITES_NON_SIGNES[self.type_donnee]
+                if not 0 <= valeur_convertie <= maximum:
+                    return False, None, f"Valeur {self.type_donnee} hors limites (0 à {maximum})"
+                return True, valeur_convertie, f"Valeur {self.type_donnee} valide"
+            
+            elif self.type_donnee == 'COUNTER':
+                valeur_convertie = int(valeur)
+                if not 0 <= valeur_convertie <= 999:
+                    return False, None, "Valeur COUNTER hors limites (0 à 999)"
+                return True, valeur_convertie, "Valeur COUNTER valide"
+            
+            elif self.type_donnee == 'TIMER':
+                valeur_convertie = int(valeur)
+                if not 0 <= valeur_convertie <= 9990000:
+                    return False, None, "Durée TIMER hors limites (0 à 9990000 ms)"
+                return True, valeur_convertie, "Valeur TIMER valide (ms)"
+            
+            elif self.type_donnee in ['REAL', 'LREAL']:
                 valeur_convertie = float(valeur)
-                return True, valeur_convertie, "Valeur REAL valide"
+                return True, valeur_convertie, f"Valeur {self.type_donnee} valide"
+            
+            elif self.type_donnee == 'DTL':
+                valeur_convertie = datetime.fromisoformat(str(valeur)).isoformat()
+                return True, valeur_convertie, "Valeur DTL valide"
             
             else:
                 return True, str(valeur), "Valeur STRING valide"
@@ -270,32 +300,21 @@ class Tag(db.Model):
     
     def get_adresse_components(self):
         """Retourne les composants de l'adresse S7"""
-        adresse = self.adresse_tag
+        adresse = self.adresse_s7
         components = {
-            'adresse_complete': adresse,
+            'adresse_complete': adresse.texte if adresse else self.adresse_tag,
             'type': self.type_donnee
         }
         
-        try:
-            # Parse l'adresse S7
-            pattern = r'DB(\d+)\.DB([XWD])(.+)'
-            match = re.match(pattern, adresse)
-            
-            if match:
-                components['db'] = int(match.group(1))
-                type_access = match.group(2)
-                offset_part = match.group(3)
-                
-                if type_access == 'X':  # Bit
-                    if '.' in offset_part:
-                        byte_part, bit_part = offset_part.split('.')
-                        components['byte_offset'] = int(byte_part)
-                        components['bit_offset'] = int(bit_part)
-                elif type_access in ['W', 'D']:  # Word ou DWord
-                    components['offset'] = int(offset_part)
-            
-        except Exception as e:
-            print(f"Erreur parsing adresse {adresse}: {e}")
+        if adresse is None:
+            logger.warning("Adresse invalide pour le tag %s: %s", self.nom_tag, components['adresse_complete'])
+        elif adresse.est_bit:
+            components['db'] = adresse.db
+            components['byte_offset'] = adresse.octet
+            components['bit_offset'] = adresse.bit
+        else:
+            components['db'] = adresse.db
+            components['offset'] = adresse.octet
         
         return components
     
@@ -449,6 +468,7 @@ class Tag(db.Model):
 class MappingCom(db.Model):
     """Table Mapping_Com selon votre schéma existant"""
     __tablename__ = 'Mapping_Com'
+    __table_args__ = (db.Index('ix_mapping_com_nom_du_tag', 'nom_du_tag'),)
     
     id_mapping_com = Column(Integer, primary_key=True, autoincrement=True)
     nom_du_tag = Column(String(100), nullable=False)
@@ -495,6 +515,8 @@ class Alarme(db.Model):
     limite = Column(DECIMAL(10, 2))
     message = Column(String(255))
     priorite = Column(String(10))
+    hysteresis = Column(Float)               # Écart de retour à la normale sous/au-dessus de la limite
+    delai_activation_ms = Column(Integer)    # Durée de persistance de la condition avant apparition
 
 class HMIProject(db.Model):
     """Table HMI_Project selon le schéma"""
@@ -555,6 +577,131 @@ class DefinirConfigCom(db.Model):
     id_tag = Column(Integer, ForeignKey('Tag.id_tag'), primary_key=True)
     id_mapping_config_comm = Column(Integer, ForeignKey('Config_Mapping_Com.id_mapping_config_comm'), primary_key=True)
 
+class ConfigAcquisitionTag(db.Model):
+    """Table Config_Acquisition_Tag : période de scrutation et filtrage des changements propres à un tag"""
+    __tablename__ = 'Config_Acquisition_Tag'
+
+    id_tag = Column(Integer, ForeignKey('Tag.id_tag', ondelete='CASCADE'), primary_key=True)
+    periode_ms = Column(Integer)        # Période propre (prioritaire sur le groupe)
+    groupe_scan = Column(String(30))    # Groupe de scrutation défini dans ACQUISITION_GROUPES
+    bande_morte = Column(Float)         # Écart absolu sous lequel un changement n'est pas publié
+    bande_morte_pct = Column(Float)     # Idem, en % de la dernière valeur publiée
+    intervalle_min_ms = Column(Integer) # Délai minimal entre deux publications de la valeur
+
+class ConfigHistorisationTag(db.Model):
+    """Filtrage de l'historisation d'un tag (voir app/utils/historien.py)"""
+
+    __tablename__ = 'Config_Historisation_Tag'
+
+    id_tag = Column(Integer, ForeignKey('Tag.id_tag', ondelete='CASCADE'), primary_key=True)
+    bande_morte = Column(Float)          # Écart absolu en dessous duquel une valeur n'est pas historisée
+    periode_max_s = Column(Integer)      # Valeur historisée malgré la bande morte après ce délai
+
+class MesureHistorique(db.Model):
+    """Table Historique_Mesure : échantillon numérique récent, clé (tag, horodatage) (voir app/utils/stockage_historique.py)"""
+    __tablename__ = 'Historique_Mesure'
+
+    id_tag = Column(Integer, ForeignKey('Tag.id_tag', ondelete='CASCADE'), primary_key=True)
+    horodatage_ms = Column(BigInteger, primary_key=True, autoincrement=False)   # ms depuis 1970 (UTC)
+    valeur = Column(Double, nullable=False)
+    qualite = Column(SmallInteger, nullable=False)    # Code de QUALITES_HISTORIQUE
+
+class BlocHistorique(db.Model):
+    """Table Historique_Bloc : journée d'échantillons d'un tag compressée (voir app/utils/compression_series.py)"""
+    __tablename__ = 'Historique_Bloc'
+
+    id_tag = Column(Integer, ForeignKey('Tag.id_tag', ondelete='CASCADE'), primary_key=True)
+    debut_ms = Column(BigInteger, primary_key=True, autoincrement=False)   # Début de la journée (UTC)
+    fin_ms = Column(BigInteger, nullable=False)       # Horodatage du dernier point
+    nb_points = Column(Integer, nullable=False)
+    valeur_min = Column(Double)
+    valeur_max = Column(Double)
+    donnees = Column(LargeBinary(2 ** 24 - 1), nullable=False)   # MEDIUMBLOB sous MySQL
+
+class JournalAlarme(db.Model):
+    """Table Journal_Alarme : transition d'alarme, en ajout seul (voir app/utils/journal_alarmes.py)"""
+    __tablename__ = 'Journal_Alarme'
+    # Pagination par curseur (horodatage_ms, id_evenement) décroissant, filtrée par projet, tag ou priorité
+    __table_args__ = (
+        db.Index('ix_journal_alarme_projet_temps', 'id_projet', 'horodatage_ms', 'id_evenement'),
+        db.Index('ix_journal_alarme_tag_temps', 'id_tag', 'horodatage_ms', 'id_evenement'),
+        db.Index('ix_journal_alarme_priorite_temps', 'id_projet', 'priorite', 'horodatage_ms', 'id_evenement'),
+    )
+
+    id_evenement = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    horodatage_ms = Column(BigInteger, nullable=False)   # ms depuis 1970 (UTC)
+    transition = Column(String(15), nullable=False)      # APPARITION, DISPARITION, ACQUITTEMENT
+    # Pas de clé étrangère : le journal survit à la suppression de l'alarme ou du tag
+    id_alarme = Column(Integer, nullable=False)
+    id_tag = Column(Integer, nullable=False)
+    id_projet = Column(Integer)
+    nom_tag = Column(String(100))
+    type_alarme = Column(String(20))
+    priorite = Column(String(10))
+    limite = Column(Double)
+    valeur = Column(Double)
+    message = Column(String(255))
+    utilisateur = Column(String(50))                     # Acquittement
+
+    def to_dict(self):
+        return {
+            'id_evenement': self.id_evenement,
+            'horodatage': depuis_horodatage_ms(self.horodatage_ms).isoformat() + 'Z',
+            'horodatage_ms': self.horodatage_ms,
+            'transition': self.transition,
+            'id_alarme': self.id_alarme,
+            'id_tag': self.id_tag,
+            'nom_tag': self.nom_tag,
+            'type_alarme': self.type_alarme,
+            'priorite': self.priorite,
+            'limite': self.limite,
+            'valeur': self.valeur,
+            'message': self.message,
+            'utilisateur': self.utilisateur
+        }
+
+class ConnexionAutomate(db.Model):
+    """Table Connexion_Automate : automate nommé d'un projet (une connexion, un pool, un moteur d'acquisition)"""
+    __tablename__ = 'Connexion_Automate'
+
+    id_connexion = Column(Integer, primary_key=True, autoincrement=True)
+    nom_connexion = Column(String(50), nullable=False, unique=True)   # Source dans l'image des tags
+    adresse_ip = Column(String(45), nullable=False)
+    rack = Column(Integer, nullable=False, default=0)
+    slot = Column(Integer, nullable=False, default=1)
+    port = Column(Integer, nullable=False, default=102)
+    mode_communication = Column(String(20), nullable=False, default='REEL')   # 'REEL' ou 'SIMULATEUR'
+    taille_pool = Column(Integer)           # S7_POOL_TAILLE si vide
+    connexion_auto = Column(Boolean, nullable=False, default=True)
+    actif = Column(Boolean, nullable=False, default=True)
+    description = Column(String(255))
+    date_creation = Column(DateTime, default=datetime.now)
+    id_projet = Column(Integer, ForeignKey('HMI_Project.id_projet', ondelete='CASCADE'), nullable=False)
+
+    def to_dict(self):
+        return {
+            'id_connexion': self.id_connexion,
+            'nom_connexion': self.nom_connexion,
+            'adresse_ip': self.adresse_ip,
+            'rack': self.rack,
+            'slot': self.slot,
+            'port': self.port,
+            'mode_communication': self.mode_communication,
+            'taille_pool': self.taille_pool,
+            'connexion_auto': self.connexion_auto,
+            'actif': self.actif,
+            'description': self.description,
+            'date_creation': self.date_creation.isoformat() if self.date_creation else None,
+            'id_projet': self.id_projet
+        }
+
+class LierConnexionTag(db.Model):
+    """Table de liaison LIER_CONNEXION_TAG : automate d'un tag (automate par défaut si absent)"""
+    __tablename__ = 'LIER_CONNEXION_TAG'
+
+    id_tag = Column(Integer, ForeignKey('Tag.id_tag', ondelete='CASCADE'), primary_key=True)
+    id_connexion = Column(Integer, ForeignKey('Connexion_Automate.id_connexion', ondelete='CASCADE'), nullable=False)
+
 class SessionUtilisateur(db.Model):
     """Table Session_Utilisateur selon votre schéma existant"""
     __tablename__ = 'Session_Utilisateur'
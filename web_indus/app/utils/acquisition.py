@@ -0,0 +1,339 @@
+import math
+import logging
+import threading
+import time
+
+from app.utils.image_tags import image_tags, cle_image, FiltreChangement, QUALITE_EN_ATTENTE
+from app.utils.historien import historien
+from app.utils.moteur_alarmes import moteur_alarmes
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# MOTEUR D'ACQUISITION - UN THREAD DE SCRUTATION PAR AUTOMATE
+# =================================================================
+# Les variables sont scrutées à leur propre période (tag configuré ou
+# abonnement temporaire d'une page runtime). Toutes les variables échues
+# au même instant sont lues en une seule lecture groupée, et le résultat
+# est publié dans l'image des tags. Les routes HTTP ne lisent que l'image :
+# la charge automate ne dépend plus du nombre d'écrans connectés.
+# La bande morte et l'intervalle minimal de publication des tags configurés
+# sont appliqués par l'image ; l'historien et le moteur d'alarmes reçoivent
+# les changements publiés des tags historisés et des tags sous alarme.
+
+PERIODE_DEFAUT_MS = 1000
+PERIODE_MIN_MS = 50
+DUREE_BAIL_DEFAUT_S = 30
+ATTENTE_PREMIERE_LECTURE_S = 2.0
+
+
+class Abonnement:
+    """Variable scrutée par le moteur d'acquisition"""
+
+    __slots__ = ('cle', 'adresse', 'type_donnee', 'periode_config', 'periode_bail', 'expiration', 'prochaine')
+
+    def __init__(self, cle, adresse, type_donnee):
+        self.cle = cle
+        self.adresse = adresse
+        self.type_donnee = type_donnee
+        self.periode_config = None   # Période permanente (tag configuré)
+        self.periode_bail = None     # Période temporaire (demande HTTP)
+        self.expiration = None       # Fin du bail temporaire
+        self.prochaine = 0.0         # Prochaine échéance de lecture (time.monotonic)
+
+    @property
+    def periode(self):
+        periodes = [p for p in (self.periode_config, self.periode_bail) if p]
+        return min(periodes) if periodes else PERIODE_DEFAUT_MS / 1000
+
+    def est_expire(self, maintenant):
+        if self.expiration is not None and maintenant >= self.expiration:
+            self.periode_bail = None
+            self.expiration = None
+        return self.periode_config is None and self.periode_bail is None
+
+
+def filtre_tag(config):
+    """FiltreChangement d'un tag selon Config_Acquisition_Tag (None : tout changement est publié)"""
+    if config is None:
+        return None
+    filtre = FiltreChangement(
+        config.bande_morte,
+        config.bande_morte_pct,
+        config.intervalle_min_ms / 1000 if config.intervalle_min_ms else None
+    )
+    return filtre if filtre.actif else None
+
+
+def filtre_plus_sensible(a, b):
+    """Filtre d'une variable partagée par plusieurs tags : le plus petit seuil de chacun"""
+    if a is None or b is None:
+        return None
+    return FiltreChangement(
+        min(a.bande_morte or 0.0, b.bande_morte or 0.0) or None,
+        min(a.bande_morte_pct or 0.0, b.bande_morte_pct or 0.0) or None,
+        min(a.intervalle_min or 0.0, b.intervalle_min or 0.0) or None
+    )
+
+
+class MoteurAcquisition:
+    """Thread de scrutation d'un automate alimentant l'image des tags"""
+
+    def __init__(self, automate, image=None, id_connexion=None):
+        self.automate = automate
+        self.id_connexion = id_connexion   # Connexion_Automate scrutée (None : automate par défaut)
+        self.image = image or image_tags
+        self.periode_defaut = PERIODE_DEFAUT_MS / 1000
+        self.duree_bail = DUREE_BAIL_DEFAUT_S
+        self.attente_premiere_lecture = ATTENTE_PREMIERE_LECTURE_S
+        self.groupes = {}
+        self.app = None
+
+        self._abonnements = {}
+        self._verrou = threading.Lock()
+        self._reveil = threading.Event()
+        self._thread = None
+        self._actif = False
+        self.cycles = 0
+        self.derniere_duree_cycle = 0.0
+
+    @property
+    def source(self):
+        return self.automate.nom
+
+    def init_app(self, app):
+        """Configure le moteur, charge les tags configurés et démarre le thread"""
+        self.app = app
+        self.periode_defaut = app.config.get('ACQUISITION_PERIODE_MS', PERIODE_DEFAUT_MS) / 1000
+        self.duree_bail = app.config.get('ACQUISITION_DUREE_BAIL_S', DUREE_BAIL_DEFAUT_S)
+        self.attente_premiere_lecture = app.config.get('ACQUISITION_ATTENTE_PREMIERE_LECTURE_S', ATTENTE_PREMIERE_LECTURE_S)
+        self.groupes = dict(app.config.get('ACQUISITION_GROUPES', {}))
+
+        if app.config.get('ACQUISITION_ACTIVE', True):
+            self.demarrer()
+
+    # =================================================================
+    # ABONNEMENTS
+    # =================================================================
+
+    def abonner(self, adresse, type_donnee=None, periode=None, permanent=False):
+        """
+        Ajoute (ou renouvelle) une variable à scruter
+        periode: en secondes (période par défaut si None)
+        permanent: tag configuré, sinon bail renouvelé à chaque lecture HTTP
+        Retourne: la clé de la variable dans l'image
+        """
+        cle = cle_image(self.source, adresse, type_donnee)
+        periode = max(PERIODE_MIN_MS / 1000, periode or self.periode_defaut)
+
+        with self._verrou:
+            abonnement = self._abonnements.get(cle)
+            if abonnement is None:
+                abonnement = Abonnement(cle, adresse, type_donnee)
+                self._abonnements[cle] = abonnement
+                nouveau = True
+            else:
+                nouveau = False
+
+            if permanent:
+                abonnement.periode_config = periode
+            else:
+                if abonnement.periode_bail is None or periode < abonnement.periode_bail:
+                    abonnement.periode_bail = periode
+                abonnement.expiration = time.monotonic() + self.duree_bail
+
+        if nouveau:
+            self._reveil.set()
+
+        return cle
+
+    def abonner_lot(self, demandes, periode=None):
+        """Abonne (ou renouvelle le bail d') un lot d'adresses. Retourne: liste des clés"""
+        demandes = [d if isinstance(d, (tuple, list)) else (d, None) for d in demandes]
+        return [self.abonner(adresse, type_donnee, periode) for adresse, type_donnee in demandes]
+
+    def desabonner(self, adresse, type_donnee=None):
+        with self._verrou:
+            self._abonnements.pop(cle_image(self.source, adresse, type_donnee), None)
+
+    def periode_tag(self, config):
+        """Période (s) d'un tag selon sa configuration d'acquisition (période propre ou groupe)"""
+        if config is None:
+            return self.periode_defaut
+        if config.periode_ms:
+            return config.periode_ms / 1000
+        if config.groupe_scan and config.groupe_scan in self.groupes:
+            return self.groupes[config.groupe_scan] / 1000
+        return self.periode_defaut
+
+    def charger_tags_configures(self):
+        """(Re)charge les tags des projets actifs rattachés à cet automate comme abonnements permanents"""
+        if self.app is None:
+            return 0
+
+        from sqlalchemy import or_
+        from app.models.modele_tag import Tag, HMIProject, ConfigAcquisitionTag, LierConnexionTag
+
+        with self.app.app_context():
+            try:
+                lignes = Tag.query.join(
+                    HMIProject, Tag.id_projet == HMIProject.id_projet
+                ).outerjoin(
+                    ConfigAcquisitionTag, ConfigAcquisitionTag.id_tag == Tag.id_tag
+                ).outerjoin(
+                    LierConnexionTag, LierConnexionTag.id_tag == Tag.id_tag
+                ).filter(
+                    HMIProject.actif_projet == True,
+                    # Un tag sous alarme est scruté en permanence, même non exposé
+                    or_(Tag.disponibilite_externe == True, Tag.alarmes_actives == True),
+                    # Automate par défaut : tags sans connexion nommée
+                    LierConnexionTag.id_connexion == self.id_connexion
+                ).with_entities(Tag, ConfigAcquisitionTag).all()
+
+                configures = {}
+                filtres = {}
+                historises = {}
+                surveilles = {}
+                for tag, config in lignes:
+                    cle = cle_image(self.source, tag.adresse_tag, tag.type_donnee)
+                    filtre = filtre_tag(config)
+                    filtres[cle] = filtre_plus_sensible(filtres[cle], filtre) if cle in configures else filtre
+                    configures[cle] = (tag.adresse_tag, tag.type_donnee, self.periode_tag(config))
+                    if tag.historisation_active:
+                        historises.setdefault(cle, []).append(tag.id_tag)
+                    if tag.alarmes_actives:
+                        surveilles.setdefault(cle, []).append(tag.id_tag)
+            except Exception as e:
+                logger.error("Erreur chargement tags acquisition: %s", e)
+                return 0
+
+        with self._verrou:
+            # Les tags retirés de la configuration redeviennent de simples baux
+            for abonnement in self._abonnements.values():
+                if abonnement.cle not in configures:
+                    abonnement.periode_config = None
+
+        self.image.definir_filtres(self.source, {cle: f for cle, f in filtres.items() if f is not None})
+        historien.associer_cles(self.source, historises)
+        moteur_alarmes.associer_cles(self.source, surveilles)
+
+        for adresse, type_donnee, periode in configures.values():
+            self.abonner(adresse, type_donnee, periode, permanent=True)
+
+        logger.info("Acquisition %s: %d tags configurés scrutés", self.source, len(configures))
+        return len(configures)
+
+    # =================================================================
+    # LECTURE DEPUIS L'IMAGE (UTILISÉE PAR LES ROUTES HTTP)
+    # =================================================================
+
+    def lire(self, demandes, periode=None):
+        """
+        Lit un lot de variables depuis l'image des tags, sans accès automate
+        Les variables jamais lues sont abonnées et on attend leur première scrutation
+        demandes: liste d'adresses ou de tuples (adresse, type_attendu)
+        Retourne: liste d'EntreeImage (None si aucune valeur disponible)
+        """
+        demandes = [d if isinstance(d, (tuple, list)) else (d, None) for d in demandes]
+
+        if not self.est_actif():
+            # Moteur arrêté : lecture directe pour ne pas bloquer l'IHM
+            self.automate.lire_tags_par_adresses(demandes)
+            return self.image.lire_lot([cle_image(self.source, a, t) for a, t in demandes])
+
+        cles = self.abonner_lot(demandes, periode)
+        entrees = self.image.lire_lot(cles)
+
+        if any(entree is None for entree in entrees):
+            self._reveil.set()
+            echeance = time.monotonic() + self.attente_premiere_lecture
+            sequence = self.image.sequence
+            while any(entree is None for entree in entrees):
+                restant = echeance - time.monotonic()
+                if restant <= 0:
+                    break
+                sequence = self.image.attendre_changement(sequence, restant)
+                entrees = self.image.lire_lot(cles)
+
+        return entrees
+
+    def lire_valeurs(self, demandes, periode=None):
+        """Comme lire(), au format (valeur, qualite) des méthodes lire_* de l'automate"""
+        return [
+            (entree.valeur, entree.qualite) if entree is not None else (None, QUALITE_EN_ATTENTE)
+            for entree in self.lire(demandes, periode)
+        ]
+
+    # =================================================================
+    # BOUCLE DE SCRUTATION
+    # =================================================================
+
+    def demarrer(self):
+        if self.est_actif():
+            return
+        self._actif = True
+        self._thread = threading.Thread(target=self._boucle, name=f"acquisition-{self.source}", daemon=True)
+        self._thread.start()
+        logger.info("Moteur d'acquisition démarré (%s)", self.source)
+
+    def arreter(self):
+        self._actif = False
+        self._reveil.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def est_actif(self):
+        return self._actif and self._thread is not None and self._thread.is_alive()
+
+    def _boucle(self):
+        while self._actif:
+            try:
+                attente = self._cycle()
+            except Exception as e:
+                logger.error("Erreur cycle acquisition %s: %s", self.source, e)
+                attente = 1.0
+
+            self._reveil.wait(attente)
+            self._reveil.clear()
+
+    def _cycle(self):
+        """Lit toutes les variables échues en une lecture groupée. Retourne l'attente avant la prochaine échéance"""
+        maintenant = time.monotonic()
+
+        with self._verrou:
+            for cle in [c for c, a in self._abonnements.items() if a.est_expire(maintenant)]:
+                del self._abonnements[cle]
+
+            echus = [a for a in self._abonnements.values() if a.prochaine <= maintenant]
+            for abonnement in echus:
+                # Échéances alignées sur une grille par période : les variables de même
+                # période sont lues ensemble au cycle suivant
+                periode = abonnement.periode
+                abonnement.prochaine = (math.floor(maintenant / periode) + 1) * periode
+
+            prochaine = min((a.prochaine for a in self._abonnements.values()), default=maintenant + self.periode_defaut)
+
+        if echus:
+            if self.automate.connected:
+                debut = time.perf_counter()
+                # L'automate publie lui-même les résultats (valeurs et qualités) dans l'image
+                self.automate.lire_tags_par_adresses([(a.adresse, a.type_donnee) for a in echus])
+                self.derniere_duree_cycle = time.perf_counter() - debut
+            else:
+                self.image.publier_lot([(a.cle, None, 'AUTOMATE_NON_CONNECTE') for a in echus])
+            self.cycles += 1
+
+        return max(0.0, prochaine - time.monotonic())
+
+    def stats(self):
+        with self._verrou:
+            abonnements = list(self._abonnements.values())
+        return {
+            'actif': self.est_actif(),
+            'source': self.source,
+            'abonnements': len(abonnements),
+            'permanents': sum(1 for a in abonnements if a.periode_config is not None),
+            'cycles': self.cycles,
+            'derniere_duree_cycle_ms': round(self.derniere_duree_cycle * 1000, 2)
+        }
@@ -0,0 +1,187 @@
+import re
+from functools import lru_cache
+
+# =================================================================
+# ADRESSES S7 COMPILÉES
+# =================================================================
+# Une adresse texte est analysée une seule fois en un enregistrement compact
+# et immuable (zone, db, octet, bit, largeur, type). Le cache est partagé par
+# tout le processus : les lectures, écritures, plans runtime et
+# sérialisations API ne découpent plus la chaîne à chaque appel.
+#
+# Syntaxe acceptée (mnémoniques allemands E/A/Z acceptés pour I/Q/C) :
+#   DB1.DBX0.0  DB1.DBB0  DB1.DBW2  DB1.DBD4       blocs de données
+#   I0.0  IB0  IW0  ID0  (Q, M idem)               entrées, sorties, mémentos
+#   DB1.DBLR8  MLR8                                LREAL (8 octets)
+#   DB1.DBS10.20  MS10.20                          STRING de 20 caractères max
+#   DB1.DBDTL20  MDTL20                            DTL (date et heure, 12 octets)
+#   T5  C3                                         temporisations, compteurs
+
+CACHE_ADRESSES_MAX = 8192
+
+# Longueur maximale d'une STRING S7 (hors en-tête de 2 octets)
+LONGUEUR_STRING_MAX = 254
+
+# Lettre(s) de zone -> zone
+ZONES = {
+    'I': 'I', 'E': 'I',
+    'Q': 'Q', 'A': 'Q',
+    'M': 'M',
+    'T': 'T',
+    'C': 'C', 'Z': 'C'
+}
+
+# Zone -> nom de la zone snap7 (snap7.types.Areas)
+ZONES_SNAP7 = {
+    'DB': 'DB',
+    'I': 'PE',
+    'Q': 'PA',
+    'M': 'MK',
+    'T': 'TM',
+    'C': 'CT'
+}
+
+# Lettre d'accès -> (largeur en octets, type naturel). Largeur None : donnée par l'adresse (STRING)
+ACCES = {
+    'X': (1, 'BOOL'),
+    'B': (1, 'BYTE'),
+    'W': (2, 'INT'),    # INT ou WORD selon le type attendu
+    'D': (4, 'DINT'),   # DINT, DWORD ou REAL selon le type attendu
+    'LR': (8, 'LREAL'),
+    'S': (None, 'STRING'),
+    'DTL': (12, 'DTL')
+}
+
+# Types lisibles à la place du type naturel (même largeur, autre décodage)
+TYPES_COMPATIBLES = {
+    'INT': ('WORD',),
+    'DINT': ('DWORD', 'REAL')
+}
+
+# Bornes des types non signés
+LIMITES_NON_SIGNES = {
+    'BYTE': 0xFF,
+    'WORD': 0xFFFF,
+    'DWORD': 0xFFFFFFFF
+}
+
+_ACCES = 'DTL|LR|X|B|W|D|S'
+_MOTIF_DB = re.compile(rf'^DB(\d+)\.DB({_ACCES})(\d+)(?:\.(\d+))?$')
+_MOTIF_ZONE = re.compile(rf'^([IEQAM])({_ACCES})?(\d+)(?:\.(\d+))?$')
+_MOTIF_COMPTEUR = re.compile(r'^([TCZ])(\d+)$')
+
+
+class AdresseS7:
+    """Adresse S7 analysée : zone, numéro de DB, octet, bit, largeur (octets) et type naturel"""
+
+    __slots__ = ('texte', 'zone', 'db', 'octet', 'bit', 'largeur', 'type_donnee')
+
+    def __init__(self, texte, zone, db, octet, bit, largeur, type_donnee):
+        self.texte = texte
+        self.zone = zone
+        self.db = db
+        self.octet = octet
+        self.bit = bit
+        self.largeur = largeur
+        self.type_donnee = type_donnee
+
+    @property
+    def est_bit(self):
+        return self.bit is not None
+
+    @property
+    def debut(self):
+        """Position en octets dans la zone (une temporisation / un compteur occupe 2 octets)"""
+        return self.octet * 2 if self.zone in ('T', 'C') else self.octet
+
+    @property
+    def offset_texte(self):
+        """Offset tel qu'écrit dans l'adresse ('0.1' pour un bit, '4' sinon)"""
+        return f"{self.octet}.{self.bit}" if self.bit is not None else str(self.octet)
+
+    def type_lu(self, type_attendu=None):
+        """Type de décodage : un DBD est lu en REAL si le tag est REAL, un DBW en WORD si le tag est WORD"""
+        if type_attendu in TYPES_COMPATIBLES.get(self.type_donnee, ()):
+            return type_attendu
+        return self.type_donnee
+
+    def composants(self):
+        """Format historique de parse_adresse_s7 (dict), avec la zone hors blocs de données"""
+        if self.bit is not None:
+            composants = {'type': 'BOOL', 'db': self.db, 'byte_offset': self.octet, 'bit_offset': self.bit}
+        else:
+            composants = {'type': self.type_donnee, 'db': self.db, 'offset': self.octet}
+        if self.zone != 'DB':
+            composants['zone'] = self.zone
+        return composants
+
+    def __repr__(self):
+        return f"<AdresseS7 {self.texte}>"
+
+
+def _acces(texte, zone, db, acces, octet, suffixe):
+    """Construit l'AdresseS7 d'une zone adressée à l'octet (DB, I, Q, M)"""
+    if acces is None:
+        if suffixe is None:
+            raise ValueError(f"Type d'adresse non supporté: {texte}")
+        acces = 'X'
+    largeur, type_donnee = ACCES[acces]
+    octet = int(octet)
+
+    if acces == 'X':
+        if suffixe is None:
+            raise ValueError(f"Bit manquant: {texte}")
+        bit = int(suffixe)
+        if not 0 <= bit <= 7:
+            raise ValueError(f"Bit hors limites: {bit}")
+        return AdresseS7(texte, zone, db, octet, bit, largeur, type_donnee)
+
+    if acces == 'S':
+        # Octet 0 : longueur maximale, octet 1 : longueur courante, puis les caractères
+        longueur = int(suffixe) if suffixe is not None else LONGUEUR_STRING_MAX
+        if not 1 <= longueur <= LONGUEUR_STRING_MAX:
+            raise ValueError(f"Longueur de STRING hors limites: {longueur}")
+        return AdresseS7(texte, zone, db, octet, None, longueur + 2, type_donnee)
+
+    if suffixe is not None:
+        raise ValueError(f"Bit inattendu pour un accès {acces}: {texte}")
+    return AdresseS7(texte, zone, db, octet, None, largeur, type_donnee)
+
+
+@lru_cache(maxsize=CACHE_ADRESSES_MAX)
+def compiler_adresse(adresse):
+    """
+    Analyse une adresse S7 (résultat mis en cache, partagé par tous les appelants)
+    Retourne: AdresseS7. ValueError si l'adresse est invalide
+    """
+    try:
+        texte = adresse.strip().upper()
+
+        correspondance = _MOTIF_DB.match(texte)
+        if correspondance:
+            db_num, acces, octet, suffixe = correspondance.groups()
+            return _acces(adresse, 'DB', int(db_num), acces, octet, suffixe)
+
+        correspondance = _MOTIF_ZONE.match(texte)
+        if correspondance:
+            zone, acces, octet, suffixe = correspondance.groups()
+            return _acces(adresse, ZONES[zone], 0, acces, octet, suffixe)
+
+        correspondance = _MOTIF_COMPTEUR.match(texte)
+        if correspondance:
+            zone, numero = correspondance.groups()
+            zone = ZONES[zone]
+            return AdresseS7(adresse, zone, 0, int(numero), None, 2, 'TIMER' if zone == 'T' else 'COUNTER')
+
+        raise ValueError(f"Format d'adresse invalide: {adresse}")
+
+    except (ValueError, IndexError, AttributeError) as e:
+        raise ValueError(f"Erreur parsing adresse '{adresse}': {str(e)}")
+
+
+def compiler_adresse_ou_none(adresse):
+    """Comme compiler_adresse, None si l'adresse est invalide"""
+    try:
+        return compiler_adresse(adresse)
+    except ValueError:
+        return None
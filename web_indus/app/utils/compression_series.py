@@ -0,0 +1,154 @@
+import sys
+import zlib
+import struct
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# =================================================================
+# COMPRESSION DES SÉRIES TEMPORELLES (BLOCS D'HISTORIQUE)
+# =================================================================
+# Inspirée de Gorilla : les horodatages (ms) sont codés en différence de
+# différences (quasi nulles pour une scrutation périodique), les valeurs en
+# XOR avec la valeur précédente (octets de poids fort nuls tant que le signe,
+# l'exposant et le début de la mantisse ne changent pas). Les entiers 64 bits
+# obtenus sont transposés par plans d'octets (tous les octets de poids fort,
+# puis les suivants...) avant zlib : les longues suites de zéros se
+# compressent presque entièrement. Sans perte : les float64 sont restitués
+# bit à bit. NumPy accélère le codage s'il est installé.
+
+VERSION_FORMAT = 1
+ENTETE = struct.Struct('>BI')   # version, nombre de points
+NIVEAU_ZLIB = 6
+MASQUE_64 = 0xFFFFFFFFFFFFFFFF
+
+
+def _vers_plans(octets, largeur=8):
+    """Transpose des entiers big-endian de `largeur` octets en plans d'octets"""
+    return b''.join(octets[i::largeur] for i in range(largeur))
+
+
+def _depuis_plans(plans, nombre, largeur=8):
+    octets = bytearray(nombre * largeur)
+    for i in range(largeur):
+        octets[i::largeur] = plans[i * nombre:(i + 1) * nombre]
+    return bytes(octets)
+
+
+def _entiers_big_endian(entiers):
+    """array('Q') -> octets big-endian"""
+    if sys.byteorder == 'little':
+        entiers = array('Q', entiers)
+        entiers.byteswap()
+    return entiers.tobytes()
+
+
+def _entiers_depuis_big_endian(octets):
+    entiers = array('Q')
+    entiers.frombytes(octets)
+    if sys.byteorder == 'little':
+        entiers.byteswap()
+    return entiers
+
+
+# =================================================================
+# CODAGE
+# =================================================================
+
+def _coder_python(horodatages, valeurs):
+    deltas = array('Q')
+    precedent, delta_precedent = 0, 0
+    for horodatage in horodatages:
+        delta = horodatage - precedent
+        difference = delta - delta_precedent
+        deltas.append(((difference << 1) ^ (difference >> 63)) & MASQUE_64)   # zigzag : petits négatifs -> petits positifs
+        precedent, delta_precedent = horodatage, delta
+
+    bits = array('Q')
+    bits.frombytes(array('d', valeurs).tobytes())
+    xors = array('Q', [bits[0]]) if bits else array('Q')
+    for i in range(1, len(bits)):
+        xors.append(bits[i] ^ bits[i - 1])
+    return _entiers_big_endian(deltas), _entiers_big_endian(xors)
+
+
+def _coder_numpy(horodatages, valeurs):
+    horodatages = np.asarray(horodatages, dtype=np.int64)
+    differences = np.diff(np.diff(horodatages, prepend=0), prepend=0)
+    zigzag = (differences << 1) ^ (differences >> 63)
+
+    bits = np.asarray(valeurs, dtype=np.float64).view(np.uint64)
+    xors = bits ^ np.concatenate((np.zeros(1, dtype=np.uint64), bits[:-1]))
+    return zigzag.view(np.uint64).astype('>u8').tobytes(), xors.astype('>u8').tobytes()
+
+
+def encoder_bloc(horodatages, valeurs, qualites):
+    """
+    Compresse une série triée par horodatage
+    horodatages: entiers (ms), valeurs: float, qualites: codes 0-255
+    Retourne: bytes
+    """
+    nombre = len(horodatages)
+    if np is not None and nombre:
+        deltas, xors = _coder_numpy(horodatages, valeurs)
+    else:
+        deltas, xors = _coder_python(horodatages, valeurs)
+
+    charge = _vers_plans(deltas) + _vers_plans(xors) + bytes(array('B', qualites))
+    return ENTETE.pack(VERSION_FORMAT, nombre) + zlib.compress(charge, NIVEAU_ZLIB)
+
+
+# =================================================================
+# DÉCODAGE
+# =================================================================
+
+def _decoder_python(deltas, xors):
+    horodatages = array('q')
+    horodatage, delta = 0, 0
+    for zigzag in _entiers_depuis_big_endian(deltas):
+        delta += (zigzag >> 1) ^ -(zigzag & 1)
+        horodatage += delta
+        horodatages.append(horodatage)
+
+    bits = array('Q')
+    courant = 0
+    for xor in _entiers_depuis_big_endian(xors):
+        courant ^= xor
+        bits.append(courant)
+    valeurs = array('d')
+    valeurs.frombytes(bits.tobytes())
+    return horodatages, valeurs
+
+
+def _decoder_numpy(deltas, xors):
+    zigzag = np.frombuffer(deltas, dtype='>u8').astype(np.uint64)
+    differences = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+    horodatages = np.cumsum(np.cumsum(differences))
+
+    bits = np.bitwise_xor.accumulate(np.frombuffer(xors, dtype='>u8').astype(np.uint64))
+    return array('q', horodatages.tobytes()), array('d', bits.view(np.float64).tobytes())
+
+
+def decoder_bloc(donnees):
+    """
+    Décompresse un bloc produit par encoder_bloc
+    Retourne: (horodatages array('q'), valeurs array('d'), qualites array('B'))
+    """
+    version, nombre = ENTETE.unpack_from(donnees)
+    if version != VERSION_FORMAT:
+        raise ValueError(f"Format de bloc d'historique inconnu: {version}")
+
+    charge = zlib.decompress(donnees[ENTETE.size:])
+    taille = nombre * 8
+    deltas = _depuis_plans(charge[:taille], nombre)
+    xors = _depuis_plans(charge[taille:2 * taille], nombre)
+    qualites = array('B', charge[2 * taille:2 * taille + nombre])
+
+    if np is not None and nombre:
+        horodatages, valeurs = _decoder_numpy(deltas, xors)
+    else:
+        horodatages, valeurs = _decoder_python(deltas, xors)
+    return horodatages, valeurs, qualites
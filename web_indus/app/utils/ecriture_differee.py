@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# ÉCRITURE DIFFÉRÉE - THREAD DE VIDAGE PAR LOTS
+# =================================================================
+# Historien, journal des alarmes et persistance des valeurs des tags
+# accumulent en mémoire ce qu'ils doivent écrire en base. Un thread commun
+# le vide dès qu'un lot est plein (réveil) ou que la période est écoulée, et
+# patiente après un échec. L'arrêt fait un dernier vidage. Un lot échoué
+# retourne en tête de sa file bornée (remettre_en_tete).
+
+ATTENTE_APRES_ERREUR_S = 5.0
+
+
+def remettre_en_tete(file, lot):
+    """
+    Remet un lot échoué en tête d'une file bornée (deque)
+    File remplie entre-temps : le lot est plus ancien que toute la file, sa tête est perdue
+    Retourne: nombre d'éléments perdus
+    """
+    perdus = max(0, len(lot) + len(file) - file.maxlen)
+    file.extendleft(reversed(lot[perdus:]))
+    return perdus
+
+
+class EcritureDifferee:
+    """Thread de vidage en tâche de fond ; les classes dérivées implémentent vider()"""
+
+    nom_thread = 'ecriture-differee'
+
+    def __init__(self, periode):
+        self.periode = periode
+        self._verrou_vidage = threading.Lock()
+        self._reveil = threading.Event()
+        self._thread = None
+        self._actif = False
+
+    def vider(self):
+        """Écrit ce qui est en attente. Retourne False si l'écriture a échoué (données conservées)"""
+        raise NotImplementedError
+
+    def apres_vidage(self):
+        """Travail périodique après un vidage réussi (thread de vidage)"""
+
+    def reveiller(self):
+        """Vidage anticipé (lot plein)"""
+        self._reveil.set()
+
+    def demarrer(self):
+        if self.est_actif():
+            return
+        self._actif = True
+        self._thread = threading.Thread(target=self._boucle, name=self.nom_thread, daemon=True)
+        self._thread.start()
+        logger.info("Écriture différée %s démarrée (période %.1f s)", self.nom_thread, self.periode)
+
+    def arreter(self):
+        """Arrête le thread après un dernier vidage"""
+        self._actif = False
+        self._reveil.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        self._thread = None
+        self.vider()
+
+    def est_actif(self):
+        return self._actif and self._thread is not None and self._thread.is_alive()
+
+    def _boucle(self):
+        while self._actif:
+            self._reveil.wait(self.periode)
+            self._reveil.clear()
+            if not self.vider():
+                time.sleep(ATTENTE_APRES_ERREUR_S)
+                continue
+            self.apres_vidage()
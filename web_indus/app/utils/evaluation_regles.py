@@ -0,0 +1,249 @@
+import operator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# =================================================================
+# ÉVALUATION COMPILÉE DES RÈGLES DE COULEUR ET DE VISIBILITÉ
+# =================================================================
+# Chaque règle est compilée une seule fois en prédicat : valeur cible
+# convertie, opérateur résolu. Une page est évaluée en une passe : la valeur
+# d'un objet est convertie une fois pour toutes ses règles, et au-delà de
+# SEUIL_NUMPY règles les comparaisons numériques sont vectorisées.
+# Les résultats sont identiques à ColorRule/VisibilityRule.test_condition.
+
+SEUIL_NUMPY = 1000
+ENTIER_EXACT_MAX = 2 ** 53   # Au-delà, un entier n'est plus exact en float64
+TYPES_NUMERIQUES = (bool, int, float)
+
+OPERATEURS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le
+}
+
+BOOLEENS_VRAI_COULEUR = ('true', '1', 'on', 'yes', 'oui')
+BOOLEENS_FAUX_COULEUR = ('false', '0', 'off', 'no', 'non')
+
+
+def convertir_valeur_couleur(value):
+    """Conversion de ColorRule._convert_value ('.' ou 'e' : float)"""
+    if value is None:
+        return None
+
+    if isinstance(value, (bool, int, float)):
+        return value
+
+    str_value = str(value).strip()
+    if not str_value:
+        return None
+
+    str_value_lower = str_value.lower()
+    if str_value_lower in BOOLEENS_VRAI_COULEUR:
+        return True
+    if str_value_lower in BOOLEENS_FAUX_COULEUR:
+        return False
+
+    try:
+        if '.' not in str_value and 'e' not in str_value_lower:
+            return int(str_value)
+        return float(str_value)
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def convertir_valeur_visibilite(value):
+    """Conversion de VisibilityRule._convert_value (seul '.' donne un float)"""
+    if value is None:
+        return None
+
+    if isinstance(value, (bool, int, float)):
+        return value
+
+    str_value = str(value).strip().lower()
+    if not str_value:
+        return None
+
+    if str_value in BOOLEENS_VRAI_COULEUR:
+        return True
+    if str_value in BOOLEENS_FAUX_COULEUR:
+        return False
+
+    try:
+        if '.' not in str_value:
+            return int(str_value)
+        return float(str_value)
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def est_numerique(valeur):
+    """Valeur comparable exactement en float64 (bool, int raisonnable, float)"""
+    if isinstance(valeur, float) or isinstance(valeur, bool):
+        return True
+    return isinstance(valeur, int) and -ENTIER_EXACT_MAX <= valeur <= ENTIER_EXACT_MAX
+
+
+def deja_convertie(valeur):
+    return valeur
+
+
+class Predicat:
+    """Condition d'une règle, compilée une fois : opérateur résolu et valeur cible convertie"""
+
+    __slots__ = ('operateur', 'comparer', 'cible', 'convertir', 'resultat', 'cle')
+
+    def __init__(self, operateur, cible, convertir, resultat=None, actif=True):
+        self.operateur = operateur
+        self.comparer = OPERATEURS.get(operateur) if actif else None
+        self.cible = convertir(cible)
+        self.convertir = convertir
+        self.resultat = resultat
+        self.cle = (actif, operateur, cible)
+
+    @property
+    def valide(self):
+        return self.comparer is not None
+
+    def tester_converti(self, valeur):
+        """Teste une valeur déjà passée par self.convertir"""
+        if self.comparer is None:
+            return False
+        try:
+            return self.comparer(valeur, self.cible)
+        except Exception:
+            # Comparaison impossible (ex: '>' entre texte et nombre) : condition non remplie
+            return False
+
+    def tester(self, valeur):
+        return self.tester_converti(self.convertir(valeur))
+
+
+def premier_resultat(predicats, valeur, convertir):
+    """Résultat du premier prédicat vérifié (ordre de priorité), None si aucun"""
+    if not predicats:
+        return None
+    valeur = convertir(valeur)
+    for predicat in predicats:
+        if predicat.tester_converti(valeur):
+            return predicat.resultat
+    return None
+
+
+class JeuRegles:
+    """Règles d'une page, une liste ordonnée de prédicats par objet, évaluées en une passe"""
+
+    def __init__(self, listes, convertir):
+        self.listes = [[p for p in liste if p.valide] for liste in listes]
+        self.convertir = convertir
+        self.nombre = sum(len(liste) for liste in self.listes)
+        self.vecteur = None
+        if np is not None and self.nombre >= SEUIL_NUMPY:
+            self.vecteur = VecteurRegles(self.listes)
+
+    def evaluer(self, valeurs, rangs=None):
+        """
+        Évalue les règles des objets
+        valeurs: valeur brute par objet (tous les objets, ou ceux de rangs)
+        Retourne: liste alignée sur valeurs (résultat de la première règle vérifiée ou None)
+        """
+        if rangs is None and self.vecteur is not None:
+            return self.vecteur.evaluer(valeurs, self.convertir)
+
+        if rangs is None:
+            rangs = range(len(self.listes))
+        return [premier_resultat(self.listes[rang], valeur, self.convertir) for rang, valeur in zip(rangs, valeurs)]
+
+
+class VecteurRegles:
+    """Comparaisons numériques d'un jeu de règles vectorisées avec NumPy"""
+
+    def __init__(self, listes):
+        self.listes = listes
+        self.nb_objets = len(listes)
+
+        regles = [(rang, predicat) for rang, liste in enumerate(listes) for predicat in liste]
+        self.resultats = [predicat.resultat for _, predicat in regles]
+        self.objets = np.array([rang for rang, _ in regles], dtype=np.intp)
+
+        # Objets dont une cible n'est pas exacte en float64 : évalués en Python
+        self.objets_python = np.zeros(self.nb_objets, dtype=bool)
+        cibles = np.zeros(len(regles))
+        fixes = np.zeros(len(regles), dtype=bool)
+        cible_numerique = np.zeros(len(regles), dtype=bool)
+
+        for i, (rang, predicat) in enumerate(regles):
+            if est_numerique(predicat.cible):
+                cibles[i] = float(predicat.cible)
+                cible_numerique[i] = True
+            elif isinstance(predicat.cible, (str, type(None))):
+                # Nombre comparé à un texte ou à None : seul '!=' est vrai, l'ordre lève TypeError
+                fixes[i] = predicat.operateur == '!='
+            else:
+                self.objets_python[rang] = True
+
+        self.cibles = cibles
+        self.fixes = fixes
+        self.indices_fixes = np.nonzero(~cible_numerique)[0]
+        self.indices_par_operateur = []
+        for comparer in set(OPERATEURS.values()):
+            indices = np.nonzero(cible_numerique & np.array(
+                [predicat.comparer is comparer for _, predicat in regles], dtype=bool
+            ))[0]
+            if len(indices):
+                self.indices_par_operateur.append((comparer, indices))
+
+    def evaluer(self, valeurs, convertir):
+        nombres = None
+        if all(type(valeur) in TYPES_NUMERIQUES for valeur in valeurs):
+            # Cas courant : valeurs automate natives, inchangées par la conversion
+            nombres = np.array(valeurs, dtype=float)
+            if (np.abs(nombres) > ENTIER_EXACT_MAX).any():
+                nombres = None
+            else:
+                converties = valeurs
+                numeriques = ~self.objets_python
+
+        if nombres is None:
+            converties = [convertir(valeur) for valeur in valeurs]
+            numeriques = np.fromiter((est_numerique(v) for v in converties), dtype=bool, count=self.nb_objets)
+            numeriques &= ~self.objets_python
+            nombres = np.fromiter(
+                (float(v) if n else 0.0 for v, n in zip(converties, numeriques)),
+                dtype=float, count=self.nb_objets
+            )
+
+        # Une passe vectorisée par opérateur sur toutes les règles de la page
+        valeurs_regles = nombres[self.objets]
+        verifiees = np.zeros(len(self.objets), dtype=bool)
+        for comparer, indices in self.indices_par_operateur:
+            verifiees[indices] = comparer(valeurs_regles[indices], self.cibles[indices])
+        verifiees[self.indices_fixes] = self.fixes[self.indices_fixes]
+        verifiees &= numeriques[self.objets]
+
+        # Première règle vérifiée de chaque objet (règles contiguës, triées par priorité)
+        resultats = [None] * self.nb_objets
+        positions = np.nonzero(verifiees)[0]
+        objets, premieres = np.unique(self.objets[positions], return_index=True)
+        for rang, position in zip(objets.tolist(), positions[premieres].tolist()):
+            resultats[rang] = self.resultats[position]
+
+        # Valeurs non numériques (texte, None) : évaluation Python exacte
+        for rang in np.nonzero(~numeriques)[0].tolist():
+            resultats[rang] = premier_resultat(self.listes[rang], converties[rang], deja_convertie)
+
+        return resultats
+
+
+def compiler_regle_couleur(regle):
+    return Predicat(regle.operator, regle.target_value, convertir_valeur_couleur, regle.color, regle.actif)
+
+
+def compiler_regle_visibilite(regle):
+    return Predicat(regle.operator, regle.target_value, convertir_valeur_visibilite, regle.action, regle.actif)
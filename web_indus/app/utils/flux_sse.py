@@ -0,0 +1,120 @@
+import json
+import time
+
+# =================================================================
+# FLUX SERVER-SENT EVENTS SUR L'IMAGE DES TAGS
+# =================================================================
+# Un flux envoie un instantané complet à la connexion, puis uniquement les
+# changements (deltas) des clés suivies. Chaque événement porte la séquence
+# de l'image comme identifiant : à la reconnexion, le navigateur renvoie
+# Last-Event-ID et le flux reprend par un delta au lieu d'un instantané.
+
+HEARTBEAT_S = 15
+RETRY_MS = 2000
+
+
+def evenement_sse(donnees, evenement=None, identifiant=None):
+    """Formate un événement SSE (données sérialisées en JSON sur une ligne)"""
+    lignes = []
+    if identifiant is not None:
+        lignes.append(f"id: {identifiant}")
+    if evenement:
+        lignes.append(f"event: {evenement}")
+    lignes.append("data: " + json.dumps(donnees, default=str))
+    return "\n".join(lignes) + "\n\n"
+
+
+def sequence_reprise(image, identifiant):
+    """Séquence de reprise d'après Last-Event-ID (None : instantané complet nécessaire)"""
+    try:
+        sequence = int(identifiant)
+    except (TypeError, ValueError):
+        return None
+
+    # Une séquence future vient d'un processus précédent (redémarrage serveur)
+    if 0 < sequence <= image.sequence:
+        return sequence
+    return None
+
+
+def flux_image(image, cles, construire, reprise=None, renouveler=None,
+               periode_renouvellement=None, heartbeat=HEARTBEAT_S):
+    """
+    Générateur SSE : instantané (ou delta de reprise), puis deltas des clés modifiées
+    construire(cles_modifiees): dict envoyé au client (cles_modifiees=None pour l'instantané)
+    renouveler(): appelé périodiquement pour maintenir les abonnements d'acquisition
+    """
+    cles = set(cles)
+
+    yield f"retry: {RETRY_MS}\n\n"
+
+    if renouveler:
+        renouveler()
+
+    if reprise is None:
+        sequence = image.sequence
+        yield evenement_sse(construire(None), 'snapshot', sequence)
+    else:
+        sequence, modifiees = image.changements_depuis(reprise, cles)
+        yield evenement_sse(construire(set(modifiees)), 'delta', sequence)
+
+    dernier_envoi = dernier_renouvellement = time.monotonic()
+
+    while True:
+        actuelle = image.attendre_changement(sequence, heartbeat)
+        maintenant = time.monotonic()
+
+        if renouveler and periode_renouvellement and maintenant - dernier_renouvellement >= periode_renouvellement:
+            renouveler()
+            dernier_renouvellement = maintenant
+
+        modifiees = {}
+        if actuelle > sequence:
+            sequence, modifiees = image.changements_depuis(sequence, cles)
+
+        if modifiees:
+            yield evenement_sse(construire(set(modifiees)), 'delta', sequence)
+            dernier_envoi = maintenant
+        elif maintenant - dernier_envoi >= heartbeat:
+            # Commentaire SSE : garde la connexion ouverte et détecte les clients partis
+            yield ": ping\n\n"
+            dernier_envoi = maintenant
+
+
+def flux_alarmes(moteur, construire, id_projet=None, reprise=None, heartbeat=HEARTBEAT_S):
+    """
+    Générateur SSE des alarmes : instantané de l'ensemble actif (ou transitions de reprise),
+    puis chaque transition dans l'ordre. Une alarme brève reste visible (apparition puis disparition)
+    construire(): dict de l'instantané. File des transitions dépassée : nouvel instantané
+    """
+    yield f"retry: {RETRY_MS}\n\n"
+
+    transitions = None
+    if reprise is not None:
+        sequence, transitions = moteur.transitions_depuis(reprise, id_projet)
+    if transitions is None:
+        sequence = moteur.sequence
+        yield evenement_sse(construire(), 'snapshot', sequence)
+        transitions = []
+
+    dernier_envoi = time.monotonic()
+
+    while True:
+        for transition in transitions:
+            yield evenement_sse(transition, 'transition', transition['sequence'])
+            dernier_envoi = time.monotonic()
+
+        actuelle = moteur.attendre_changement(sequence, heartbeat)
+        transitions = []
+        if actuelle > sequence:
+            sequence, transitions = moteur.transitions_depuis(sequence, id_projet)
+            if transitions is None:
+                # Client trop lent : transitions perdues, l'état complet est renvoyé
+                yield evenement_sse(construire(), 'snapshot', sequence)
+                dernier_envoi = time.monotonic()
+                transitions = []
+                continue
+
+        if not transitions and time.monotonic() - dernier_envoi >= heartbeat:
+            yield ": ping\n\n"
+            dernier_envoi = time.monotonic()
@@ -0,0 +1,393 @@
+import os
+import json
+import math
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from app.utils.stockage_historique import stockage_historique, horodatage_ms, code_qualite
+from app.utils.ecriture_differee import EcritureDifferee, remettre_en_tete
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# HISTORIEN - HISTORISATION ASYNCHRONE PAR LOTS
+# =================================================================
+# Les valeurs à historiser (changements publiés par l'image des tags pour
+# les tags historisés) sont filtrées (bande morte d'historisation du tag),
+# journalisées dans un fichier d'écriture anticipée puis placées dans un
+# tampon circulaire en mémoire.
+# Un thread vide le tampon par lots dès que le lot est plein ou que la
+# période est écoulée : la requête HTTP ou le cycle d'acquisition ne fait
+# plus aucun aller-retour SQL. Les valeurs numériques vont dans
+# Historique_Mesure (voir stockage_historique.py), les autres dans
+# Historique_tag puis HISTORISER. Au redémarrage, les valeurs du journal non
+# validées par un lot réussi sont rejouées.
+
+TAILLE_TAMPON_DEFAUT = 100000
+LOT_MAX_DEFAUT = 500
+PERIODE_VIDAGE_S = 2.0
+NOM_JOURNAL = 'historien.spool'
+TYPE_CHANGEMENT_DEFAUT = 'LECTURE_AUTO'
+
+
+class EchantillonHistorique:
+    """Valeur à historiser, en attente d'écriture"""
+
+    __slots__ = ('sequence', 'id_tag', 'valeur', 'qualite', 'timestamp', 'type_changement')
+
+    def __init__(self, sequence, id_tag, valeur, qualite, timestamp, type_changement):
+        self.sequence = sequence
+        self.id_tag = id_tag
+        self.valeur = valeur
+        self.qualite = qualite
+        self.timestamp = timestamp
+        self.type_changement = type_changement
+
+    def vers_ligne(self):
+        return json.dumps([self.sequence, self.id_tag, self.valeur, self.qualite,
+                           self.timestamp.isoformat(), self.type_changement])
+
+    @classmethod
+    def depuis_ligne(cls, donnees):
+        sequence, id_tag, valeur, qualite, timestamp, type_changement = donnees
+        return cls(sequence, id_tag, valeur, qualite, datetime.fromisoformat(timestamp), type_changement)
+
+
+class JournalEcriture:
+    """
+    Fichier d'écriture anticipée : une ligne JSON par échantillon, puis une ligne
+    {"ok": sequence} quand tous les échantillons jusqu'à cette séquence sont en base
+    """
+
+    def __init__(self, chemin, synchroniser=False):
+        self.chemin = chemin
+        self.synchroniser = synchroniser   # fsync à chaque validation (coupure secteur)
+        self._fichier = None
+        self._verrou = threading.Lock()
+
+    def ouvrir(self, vider=False):
+        os.makedirs(os.path.dirname(os.path.abspath(self.chemin)), exist_ok=True)
+        self._fichier = open(self.chemin, 'w' if vider else 'a', encoding='utf-8')
+
+    def fermer(self):
+        with self._verrou:
+            if self._fichier:
+                self._fichier.close()
+                self._fichier = None
+
+    def ecrire(self, echantillon):
+        with self._verrou:
+            if self._fichier:
+                self._fichier.write(echantillon.vers_ligne() + '\n')
+                self._fichier.flush()
+
+    def valider(self, sequence, vide=False):
+        """Marque les échantillons jusqu'à `sequence` comme écrits. vide: plus rien en attente, le journal repart de zéro"""
+        with self._verrou:
+            if not self._fichier:
+                return
+            if vide:
+                self._fichier.truncate(0)
+                self._fichier.seek(0)
+            else:
+                self._fichier.write(json.dumps({'ok': sequence}) + '\n')
+            self._fichier.flush()
+            if self.synchroniser:
+                os.fsync(self._fichier.fileno())
+
+    def relire(self):
+        """Retourne les échantillons non validés (une dernière ligne tronquée par un arrêt brutal est ignorée)"""
+        if not os.path.exists(self.chemin):
+            return []
+
+        echantillons = []
+        valide_jusqua = 0
+        with open(self.chemin, encoding='utf-8') as fichier:
+            for numero, ligne in enumerate(fichier, 1):
+                try:
+                    donnees = json.loads(ligne)
+                    if isinstance(donnees, dict):
+                        valide_jusqua = max(valide_jusqua, donnees['ok'])
+                    else:
+                        echantillons.append(EchantillonHistorique.depuis_ligne(donnees))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("Journal historien: ligne %d illisible ignorée", numero)
+
+        return [e for e in echantillons if e.sequence > valide_jusqua]
+
+
+class FiltreHistorique:
+    """Bande morte et enregistrement forcé d'un tag (Config_Historisation_Tag)"""
+
+    __slots__ = ('bande_morte', 'periode_max_s')
+
+    def __init__(self, bande_morte=None, periode_max_s=None):
+        self.bande_morte = bande_morte
+        self.periode_max_s = periode_max_s
+
+
+def valeur_numerique(valeur):
+    if isinstance(valeur, (bool, int, float)):
+        return float(valeur)
+    try:
+        return float(valeur)
+    except (TypeError, ValueError):
+        return None
+
+
+def valeur_a_historiser(valeur):
+    """float pour une valeur numérique finie (stockage typé), texte sinon"""
+    mesure = valeur_numerique(valeur)
+    if mesure is not None and math.isfinite(mesure):
+        return mesure
+    return None if valeur is None else str(valeur)
+
+
+class Historien(EcritureDifferee):
+    """Tampon circulaire d'échantillons vidé par lots en tâche de fond"""
+
+    nom_thread = 'historien'
+
+    def __init__(self, taille_tampon=TAILLE_TAMPON_DEFAUT, lot_max=LOT_MAX_DEFAUT, periode=PERIODE_VIDAGE_S):
+        super().__init__(periode)
+        self.lot_max = lot_max
+        self.app = None
+        self.journal = None
+        self.filtres = {}
+        self._cles = {}        # source -> {cle image: [id_tag historisés]}
+
+        self._tampon = deque(maxlen=taille_tampon)
+        self._dernieres = {}   # id_tag -> (valeur, qualite, time.monotonic) du dernier échantillon retenu
+        self._sequence = 0
+        self._verrou = threading.Lock()
+
+        self.recus = 0
+        self.filtres_bande_morte = 0
+        self.perdus = 0
+        self.ecrits = 0
+        self.lots = 0
+        self.erreurs = 0
+        self.derniere_duree_lot = 0.0
+
+    def init_app(self, app):
+        """Configure l'historien, rejoue le journal et démarre le thread de vidage"""
+        self.app = app
+        self.lot_max = app.config.get('HISTORIEN_LOT_MAX', LOT_MAX_DEFAUT)
+        self.periode = app.config.get('HISTORIEN_PERIODE_S', PERIODE_VIDAGE_S)
+        taille = app.config.get('HISTORIEN_TAILLE_TAMPON', TAILLE_TAMPON_DEFAUT)
+        if taille != self._tampon.maxlen:
+            self._tampon = deque(self._tampon, maxlen=taille)
+
+        chemin = app.config.get('HISTORIEN_JOURNAL') or os.path.join(app.instance_path, NOM_JOURNAL)
+        self.journal = JournalEcriture(chemin, app.config.get('HISTORIEN_JOURNAL_FSYNC', False))
+        self._rejouer_journal()
+
+        if app.config.get('HISTORIEN_ACTIF', True):
+            self.demarrer()
+
+    def _rejouer_journal(self):
+        """Remet en tampon les échantillons d'une exécution précédente non écrits en base"""
+        try:
+            echantillons = self.journal.relire()
+        except OSError as e:
+            logger.error("Journal historien illisible (%s): %s", self.journal.chemin, e)
+            echantillons = []
+
+        # Le journal repart avec les séquences de cette exécution
+        self.journal.ouvrir(vider=True)
+        with self._verrou:
+            for echantillon in echantillons:
+                self._sequence += 1
+                echantillon.sequence = self._sequence
+                self._tampon.append(echantillon)
+                self.journal.ecrire(echantillon)
+
+        if echantillons:
+            logger.warning("Historien: %d valeurs non écrites rejouées depuis le journal", len(echantillons))
+
+    def charger_configuration(self):
+        """(Re)charge les bandes mortes des tags (Config_Historisation_Tag)"""
+        if self.app is None:
+            return 0
+
+        from app.models.modele_tag import ConfigHistorisationTag
+
+        with self.app.app_context():
+            try:
+                configs = ConfigHistorisationTag.query.all()
+            except Exception as e:
+                logger.error("Erreur chargement configuration historisation: %s", e)
+                return 0
+
+        self.filtres = {c.id_tag: FiltreHistorique(c.bande_morte, c.periode_max_s) for c in configs}
+        return len(self.filtres)
+
+    def associer_cles(self, source, historises):
+        """Tags historisés d'un automate par clé de l'image : {cle: [id_tag]}"""
+        self._cles[source] = historises
+
+    def changements_image(self, changements):
+        """Auditeur de l'image des tags : historise les changements publiés des tags historisés"""
+        for cle, valeur, qualite, _ in changements:
+            for id_tag in self._cles.get(cle[0], {}).get(cle, ()):
+                # Horodatage de l'image en heure locale : l'historique est en UTC
+                self.enregistrer(id_tag, valeur, qualite)
+
+    # =================================================================
+    # ENREGISTREMENT (CHEMIN DES REQUÊTES ET DE L'ACQUISITION)
+    # =================================================================
+
+    def enregistrer(self, id_tag, valeur, qualite='GOOD', timestamp=None, type_changement=TYPE_CHANGEMENT_DEFAUT):
+        """
+        Ajoute une valeur à historiser, sans accès base
+        Retourne: False si la valeur est filtrée par la bande morte du tag
+        """
+        maintenant = time.monotonic()
+        timestamp = timestamp or datetime.utcnow()
+
+        with self._verrou:
+            self.recus += 1
+            if self._dans_bande_morte(id_tag, valeur, qualite, maintenant):
+                self.filtres_bande_morte += 1
+                return False
+
+            self._dernieres[id_tag] = (valeur, qualite, maintenant)
+            self._sequence += 1
+            echantillon = EchantillonHistorique(self._sequence, id_tag, valeur_a_historiser(valeur),
+                                                qualite, timestamp, type_changement)
+            if len(self._tampon) == self._tampon.maxlen:
+                self.perdus += 1
+            self._tampon.append(echantillon)
+            # Sous le verrou : un vidage concurrent ne peut pas valider le journal avant cette ligne
+            if self.journal:
+                self.journal.ecrire(echantillon)
+            plein = len(self._tampon) >= self.lot_max
+
+        if plein:
+            self.reveiller()
+        return True
+
+    def _dans_bande_morte(self, id_tag, valeur, qualite, maintenant):
+        filtre = self.filtres.get(id_tag)
+        derniere = self._dernieres.get(id_tag)
+        if filtre is None or filtre.bande_morte is None or derniere is None:
+            return False
+
+        valeur_precedente, qualite_precedente, instant = derniere
+        if qualite != qualite_precedente:
+            return False
+        if filtre.periode_max_s and maintenant - instant >= filtre.periode_max_s:
+            return False
+
+        actuelle, precedente = valeur_numerique(valeur), valeur_numerique(valeur_precedente)
+        if actuelle is None or precedente is None:
+            return valeur == valeur_precedente
+        return abs(actuelle - precedente) <= filtre.bande_morte
+
+    # =================================================================
+    # VIDAGE PAR LOTS
+    # =================================================================
+
+    def apres_vidage(self):
+        stockage_historique.compacter_si_du()
+
+    def vider(self):
+        """Écrit tout le tampon en base par lots. Retourne False si un lot a échoué (il reste en tampon)"""
+        with self._verrou_vidage:
+            while True:
+                with self._verrou:
+                    lot = [self._tampon.popleft() for _ in range(min(self.lot_max, len(self._tampon)))]
+                if not lot:
+                    return True
+
+                debut = time.perf_counter()
+                try:
+                    self._ecrire_lot(lot)
+                except Exception as e:
+                    self.erreurs += 1
+                    logger.error("Historien: écriture de %d valeurs échouée: %s", len(lot), e)
+                    with self._verrou:
+                        self.perdus += remettre_en_tete(self._tampon, lot)
+                    return False
+
+                self.derniere_duree_lot = time.perf_counter() - debut
+                self.ecrits += len(lot)
+                self.lots += 1
+                if self.journal:
+                    with self._verrou:
+                        vide = not self._tampon
+                        self.journal.valider(lot[-1].sequence, vide)
+
+    def _ecrire_lot(self, lot):
+        """Mesures numériques dans Historique_Mesure, autres valeurs dans Historique_tag + HISTORISER, une transaction"""
+        from app import db
+
+        mesures = []
+        textes = []
+        for e in lot:
+            valeur = valeur_a_historiser(e.valeur)   # Journal d'une version antérieure : valeurs en texte
+            if isinstance(valeur, float):
+                mesures.append((e.id_tag, horodatage_ms(e.timestamp), valeur, code_qualite(e.qualite)))
+            else:
+                textes.append(e)
+
+        with self.app.app_context():
+            moteur = db.engine
+            with moteur.begin() as connexion:
+                stockage_historique.ecrire(connexion, mesures)
+                if textes:
+                    self._ecrire_textes(moteur, connexion, textes)
+
+    def _ecrire_textes(self, moteur, connexion, lot):
+        """Un INSERT multi-lignes dans Historique_tag, puis un dans HISTORISER"""
+        from sqlalchemy import insert
+        from app.models.modele_tag import HistoriqueTag, Historiser
+
+        table = HistoriqueTag.__table__
+        lignes = [{
+            'valeur_historique': e.valeur if e.valeur is not None else '',
+            'timestamp_hist': e.timestamp,
+            'qualite_hist': e.qualite,
+            'type_changement': e.type_changement
+        } for e in lot]
+
+        if moteur.dialect.insert_returning and moteur.dialect.name != 'sqlite':
+            # INSERT ... VALUES (...), (...) RETURNING, identifiants dans l'ordre des lignes
+            # (SQLite ne garantit pas cet ordre : SQLAlchemy y repasse à un INSERT par ligne)
+            requete = insert(table).returning(table.c.id_historique, sort_by_parameter_order=True)
+            identifiants = connexion.execute(requete, lignes).scalars().all()
+        else:
+            # Un INSERT multi-lignes reçoit des identifiants consécutifs : lastrowid est
+            # le premier (LAST_INSERT_ID() de MySQL) ou le dernier (SQLite)
+            resultat = connexion.execute(insert(table).values(lignes))
+            premier = resultat.lastrowid
+            if moteur.dialect.name == 'sqlite':
+                premier -= len(lignes) - 1
+            identifiants = range(premier, premier + len(lignes))
+
+        connexion.execute(insert(Historiser.__table__), [
+            {'id_tag': e.id_tag, 'id_historique': identifiant}
+            for e, identifiant in zip(lot, identifiants)
+        ])
+
+    def stats(self):
+        return {
+            'actif': self.est_actif(),
+            'en_attente': len(self._tampon),
+            'capacite': self._tampon.maxlen,
+            'recus': self.recus,
+            'filtres_bande_morte': self.filtres_bande_morte,
+            'perdus': self.perdus,
+            'ecrits': self.ecrits,
+            'lots': self.lots,
+            'erreurs': self.erreurs,
+            'derniere_duree_lot_ms': round(self.derniere_duree_lot * 1000, 2),
+            'tags_filtres': len(self.filtres)
+        }
+
+
+# Instance globale
+historien = Historien()
@@ -0,0 +1,286 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from app.utils.adresse_s7 import compiler_adresse_ou_none
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# IMAGE DES TAGS - MÉMOIRE PARTAGÉE DU PROCESSUS
+# =================================================================
+# Dernière valeur connue de chaque variable automate, avec sa qualité et
+# son horodatage. Alimentée par les lectures S7 (moteur d'acquisition,
+# écritures réussies), lue par les routes HTTP sans solliciter l'automate.
+# Un changement n'est publié (nouvelle séquence, auditeurs notifiés) que
+# s'il est significatif pour le filtre de la variable : bande morte absolue
+# ou relative, intervalle minimal entre deux publications. Tous les
+# consommateurs (deltas runtime, flux SSE, historien, alarmes) ne voient
+# ainsi que les changements significatifs, calculés une seule fois.
+
+QUALITE_GOOD = 'GOOD'
+QUALITE_EN_ATTENTE = 'EN_ATTENTE'
+QUALITE_STALE = 'STALE'   # Dernière valeur connue, automate injoignable
+QUALITE_BAD = 'BAD'       # Automate injoignable, aucune valeur connue
+
+SOURCE_DEFAUT = 'defaut'
+
+
+def type_lecture(adresse, type_attendu=None):
+    """Type de décodage d'une adresse : un DBW lu en INT ou en WORD, un DBD en DINT, DWORD ou REAL"""
+    compilee = compiler_adresse_ou_none(adresse)
+    if compilee is None:
+        return type_attendu
+    return compilee.type_lu(type_attendu)
+
+
+def cle_image(source, adresse, type_attendu=None):
+    """Clé d'une variable dans l'image : (automate, adresse, type de décodage)"""
+    return (source, adresse, type_lecture(adresse, type_attendu))
+
+
+def est_numerique(valeur):
+    return isinstance(valeur, (int, float)) and not isinstance(valeur, bool)
+
+
+class FiltreChangement:
+    """Bande morte (absolue, ou en % de la dernière valeur publiée) et intervalle minimal entre publications"""
+
+    __slots__ = ('bande_morte', 'bande_morte_pct', 'intervalle_min')
+
+    def __init__(self, bande_morte=None, bande_morte_pct=None, intervalle_min=None):
+        self.bande_morte = bande_morte
+        self.bande_morte_pct = bande_morte_pct
+        self.intervalle_min = intervalle_min   # secondes
+
+    @property
+    def actif(self):
+        return bool(self.bande_morte or self.bande_morte_pct or self.intervalle_min)
+
+    def significatif(self, publiee, valeur):
+        """Écart significatif par rapport à la dernière valeur publiée (toute différence hors numérique)"""
+        if not (est_numerique(publiee) and est_numerique(valeur)):
+            return valeur != publiee
+        seuil = max(self.bande_morte or 0.0, abs(publiee) * (self.bande_morte_pct or 0.0) / 100)
+        return abs(valeur - publiee) > seuil if seuil else valeur != publiee
+
+
+class EntreeImage:
+    """Valeur d'une variable dans l'image des tags"""
+
+    __slots__ = ('valeur', 'qualite', 'timestamp', 'sequence', 'publication')
+
+    def __init__(self, valeur, qualite, timestamp, sequence, publication=0.0):
+        self.valeur = valeur
+        self.qualite = qualite
+        self.timestamp = timestamp
+        self.sequence = sequence
+        self.publication = publication   # time.monotonic() de la dernière publication
+
+    def to_dict(self):
+        return {
+            'valeur': self.valeur,
+            'qualite': self.qualite,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'sequence': self.sequence
+        }
+
+
+class ImageTags:
+    """Image process des tags, thread-safe, avec numéro de séquence des changements"""
+
+    def __init__(self):
+        self._entrees = {}
+        self._filtres = {}
+        self._auditeurs = []
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self.changements_filtres = 0
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    # =================================================================
+    # FILTRES DE CHANGEMENT ET AUDITEURS
+    # =================================================================
+
+    def definir_filtres(self, source, filtres):
+        """Remplace les filtres des variables d'un automate. filtres: {cle: FiltreChangement}"""
+        with self._condition:
+            for cle in [c for c in self._filtres if c[0] == source]:
+                del self._filtres[cle]
+            self._filtres.update((cle, filtre) for cle, filtre in filtres.items() if filtre.actif)
+
+    def filtre(self, cle):
+        return self._filtres.get(cle)
+
+    def ajouter_auditeur(self, auditeur):
+        """
+        auditeur(changements) est appelé après chaque publication significative, hors verrou,
+        dans le thread qui publie : changements = [(cle, valeur, qualite, timestamp)]
+        """
+        if auditeur not in self._auditeurs:
+            self._auditeurs.append(auditeur)
+
+    def retirer_auditeur(self, auditeur):
+        if auditeur in self._auditeurs:
+            self._auditeurs.remove(auditeur)
+
+    # =================================================================
+    # PUBLICATION
+    # =================================================================
+
+    def publier(self, cle, valeur, qualite=QUALITE_GOOD, timestamp=None, forcer=False):
+        """Publie une valeur. Retourne True si la valeur ou la qualité a changé"""
+        return bool(self.publier_lot([(cle, valeur, qualite)], timestamp, forcer))
+
+    def publier_lot(self, publications, timestamp=None, forcer=False):
+        """
+        Publie un lot de valeurs en une seule notification
+        publications: liste de tuples (cle, valeur, qualite)
+        Une valeur None conserve la dernière valeur connue (seule la qualité change)
+        Un écart non significatif pour le filtre de la variable est ignoré : la dernière
+        valeur publiée reste la référence. forcer: filtres ignorés (écriture opérateur)
+        Retourne: liste des clés modifiées
+        """
+        timestamp = timestamp or datetime.now()
+        maintenant = time.monotonic()
+        modifiees = []
+        changements = []
+
+        with self._condition:
+            for cle, valeur, qualite in publications:
+                entree = self._entrees.get(cle)
+
+                if entree is None:
+                    self._sequence += 1
+                    entree = EntreeImage(valeur, qualite, timestamp, self._sequence, maintenant)
+                    self._entrees[cle] = entree
+                    modifiees.append(cle)
+                    changements.append((cle, valeur, qualite, timestamp))
+                    continue
+
+                if valeur is None:
+                    valeur = entree.valeur
+
+                if qualite != entree.qualite:
+                    publiee = True
+                elif valeur != entree.valeur:
+                    filtre = None if forcer else self._filtres.get(cle)
+                    publiee = filtre is None or (
+                        filtre.significatif(entree.valeur, valeur)
+                        and maintenant - entree.publication >= (filtre.intervalle_min or 0)
+                    )
+                    if not publiee:
+                        self.changements_filtres += 1
+                else:
+                    publiee = False
+
+                if publiee:
+                    self._sequence += 1
+                    entree.valeur = valeur
+                    entree.qualite = qualite
+                    entree.sequence = self._sequence
+                    entree.publication = maintenant
+                    modifiees.append(cle)
+                    changements.append((cle, valeur, qualite, timestamp))
+
+                if qualite == QUALITE_GOOD:
+                    entree.timestamp = timestamp
+
+            if modifiees:
+                self._condition.notify_all()
+
+        if changements:
+            for auditeur in list(self._auditeurs):
+                try:
+                    auditeur(changements)
+                except Exception as e:
+                    logger.error("Auditeur de l'image des tags en erreur: %s", e)
+
+        return modifiees
+
+    def lire(self, cle):
+        """Retourne l'EntreeImage d'une clé (None si jamais lue)"""
+        return self._entrees.get(cle)
+
+    def lire_lot(self, cles):
+        """Retourne la liste des EntreeImage (None pour les clés absentes)"""
+        entrees = self._entrees
+        return [entrees.get(cle) for cle in cles]
+
+    def changements_depuis(self, sequence, cles=None):
+        """
+        Retourne (sequence_actuelle, {cle: EntreeImage}) des entrées modifiées
+        après `sequence`, éventuellement restreintes à un ensemble de clés
+        """
+        with self._condition:
+            sequence_actuelle = self._sequence
+            if cles is None:
+                candidats = self._entrees.items()
+            else:
+                candidats = ((cle, self._entrees.get(cle)) for cle in cles)
+
+            return sequence_actuelle, {
+                cle: entree for cle, entree in candidats
+                if entree is not None and entree.sequence > sequence
+            }
+
+    def attendre_changement(self, sequence, timeout=None):
+        """Bloque jusqu'à un changement postérieur à `sequence`. Retourne la séquence actuelle"""
+        with self._condition:
+            if self._sequence <= sequence:
+                self._condition.wait(timeout)
+            return self._sequence
+
+    def marquer_source(self, source, qualite):
+        """Change la qualité de toutes les entrées d'un automate (valeurs conservées)"""
+        publications = [(cle, None, qualite) for cle in list(self._entrees) if cle[0] == source]
+        return self.publier_lot(publications)
+
+    def marquer_perimees(self, source, qualite_connue=QUALITE_STALE, qualite_inconnue=QUALITE_BAD):
+        """Automate injoignable : valeurs connues conservées (STALE), entrées sans valeur en BAD"""
+        publications = [
+            (cle, None, qualite_connue if entree.valeur is not None else qualite_inconnue)
+            for cle, entree in list(self._entrees.items()) if cle[0] == source
+        ]
+        return self.publier_lot(publications)
+
+    def instantane(self, source=None):
+        """Copie {adresse: dict} des entrées (d'un automate ou de tous)"""
+        with self._condition:
+            return {
+                cle[1]: entree.to_dict()
+                for cle, entree in self._entrees.items()
+                if source is None or cle[0] == source
+            }
+
+    def compter(self, source=None):
+        if source is None:
+            return len(self._entrees)
+        return sum(1 for cle in list(self._entrees) if cle[0] == source)
+
+    def vider(self, source=None):
+        with self._condition:
+            if source is None:
+                self._entrees.clear()
+            else:
+                for cle in [c for c in self._entrees if c[0] == source]:
+                    del self._entrees[cle]
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def stats(self):
+        return {
+            'entrees': len(self._entrees),
+            'sequence': self._sequence,
+            'filtres': len(self._filtres),
+            'changements_filtres': self.changements_filtres,
+            'sources': sorted({cle[0] for cle in list(self._entrees)})
+        }
+
+
+# Instance globale partagée par tout le processus
+image_tags = ImageTags()
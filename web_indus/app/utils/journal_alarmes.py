@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from app.utils.ecriture_differee import EcritureDifferee, remettre_en_tete
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# JOURNAL DES ALARMES - ÉCRITURE PAR LOTS EN TÂCHE DE FOND
+# =================================================================
+# Chaque transition du moteur d'alarmes (apparition, disparition,
+# acquittement) est ajoutée à une file bornée, sans accès base : une
+# avalanche d'alarmes (déclenchement d'une ligne) ne ralentit ni
+# l'acquisition ni l'évaluation. Un thread écrit la file dans Journal_Alarme
+# par INSERT groupés, dès qu'un lot est plein ou que la période est écoulée.
+# File pleine : les transitions les plus anciennes sont perdues et comptées.
+# La table est en ajout seul, indexée par (projet | tag | priorité, temps) :
+# la lecture pagine par curseur sans OFFSET (voir lire_page).
+
+TAILLE_FILE_DEFAUT = 100000
+LOT_MAX_DEFAUT = 1000
+PERIODE_VIDAGE_S = 1.0
+LIMITE_PAGE_MAX = 1000
+
+
+def encoder_curseur(horodatage_ms, id_evenement):
+    return f"{horodatage_ms}_{id_evenement}"
+
+
+def decoder_curseur(curseur):
+    """(horodatage_ms, id_evenement) du dernier événement d'une page. ValueError si invalide"""
+    horodatage, _, identifiant = curseur.partition('_')
+    return int(horodatage), int(identifiant)
+
+
+def ligne_journal(transition):
+    """Ligne de Journal_Alarme d'une transition du moteur d'alarmes"""
+    return {
+        'horodatage_ms': transition['horodatage_ms'],
+        'transition': transition['transition'],
+        'id_alarme': transition['id_alarme'],
+        'id_tag': transition['id_tag'],
+        'id_projet': transition['id_projet'],
+        'nom_tag': transition['nom_tag'],
+        'type_alarme': transition['type_alarme'],
+        'priorite': transition['priorite'],
+        'limite': transition['limite'],
+        'valeur': transition['valeur'],
+        'message': transition['message'],
+        'utilisateur': transition['acquittee_par'] if transition['transition'] == 'ACQUITTEMENT' else None
+    }
+
+
+class JournalAlarmes(EcritureDifferee):
+    """File bornée de transitions d'alarmes vidée par lots dans Journal_Alarme"""
+
+    nom_thread = 'journal-alarmes'
+
+    def __init__(self, taille_file=TAILLE_FILE_DEFAUT, lot_max=LOT_MAX_DEFAUT, periode=PERIODE_VIDAGE_S):
+        super().__init__(periode)
+        self.lot_max = lot_max
+        self.app = None
+
+        self._file = deque(maxlen=taille_file)
+        self._verrou_file = threading.Lock()   # Ajout et remise en file d'un lot échoué
+
+        self.recues = 0
+        self.perdues = 0
+        self.ecrites = 0
+        self.lots = 0
+        self.erreurs = 0
+        self.derniere_duree_lot = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.lot_max = app.config.get('ALARMES_JOURNAL_LOT_MAX', LOT_MAX_DEFAUT)
+        self.periode = app.config.get('ALARMES_JOURNAL_PERIODE_S', PERIODE_VIDAGE_S)
+        taille = app.config.get('ALARMES_JOURNAL_TAILLE_FILE', TAILLE_FILE_DEFAUT)
+        if taille != self._file.maxlen:
+            self._file = deque(self._file, maxlen=taille)
+        if app.config.get('ALARMES_JOURNAL_ACTIF', True):
+            self.demarrer()
+
+    def enregistrer(self, transition):
+        """
+        Auditeur du moteur d'alarmes : ajoute une transition à la file (appelé sous le verrou
+        du moteur, sans accès base)
+        """
+        ligne = ligne_journal(transition)
+        with self._verrou_file:
+            self.recues += 1
+            if len(self._file) == self._file.maxlen:
+                self.perdues += 1
+            self._file.append(ligne)
+        if len(self._file) >= self.lot_max:
+            self.reveiller()
+
+    # =================================================================
+    # VIDAGE PAR LOTS
+    # =================================================================
+
+    def vider(self):
+        """Écrit toute la file par lots. Retourne False si un lot a échoué (il reste en file)"""
+        if self.app is None:
+            return True
+
+        from sqlalchemy import insert
+        from app import db
+        from app.models.modele_tag import JournalAlarme
+
+        with self._verrou_vidage:
+            while True:
+                lot = []
+                try:
+                    for _ in range(self.lot_max):
+                        lot.append(self._file.popleft())
+                except IndexError:
+                    pass
+                if not lot:
+                    return True
+
+                debut = time.perf_counter()
+                try:
+                    with self.app.app_context():
+                        with db.engine.begin() as connexion:
+                            connexion.execute(insert(JournalAlarme.__table__), lot)
+                except Exception as e:
+                    self.erreurs += 1
+                    logger.error("Journal des alarmes: écriture de %d transitions échouée: %s", len(lot), e)
+                    with self._verrou_file:
+                        self.perdues += remettre_en_tete(self._file, lot)
+                    return False
+
+                self.derniere_duree_lot = time.perf_counter() - debut
+                self.ecrites += len(lot)
+                self.lots += 1
+
+    # =================================================================
+    # LECTURE PAGINÉE PAR CURSEUR
+    # =================================================================
+
+    @staticmethod
+    def lire_page(limite, curseur=None, id_projet=None, ids_tags=None, priorites=None, transitions=None,
+                  debut_ms=None, fin_ms=None):
+        """
+        Événements du plus récent au plus ancien, après le curseur de la page précédente
+        Le curseur (horodatage, id) remplace l'OFFSET : chaque page coûte une descente d'index
+        Retourne: (événements JournalAlarme, curseur de la page suivante ou None)
+        """
+        from sqlalchemy import or_
+        from app.models.modele_tag import JournalAlarme
+
+        requete = JournalAlarme.query
+        if ids_tags:
+            # Tags déjà restreints au projet : le filtre projet ferait préférer l'index (projet, temps)
+            requete = requete.filter(JournalAlarme.id_tag.in_(ids_tags))
+        elif id_projet is not None:
+            requete = requete.filter(JournalAlarme.id_projet == id_projet)
+        if priorites:
+            requete = requete.filter(JournalAlarme.priorite.in_(priorites))
+        if transitions:
+            requete = requete.filter(JournalAlarme.transition.in_(transitions))
+        if debut_ms is not None:
+            requete = requete.filter(JournalAlarme.horodatage_ms >= debut_ms)
+        if fin_ms is not None:
+            requete = requete.filter(JournalAlarme.horodatage_ms <= fin_ms)
+        if curseur:
+            horodatage, identifiant = decoder_curseur(curseur)
+            # (h, id) < curseur, écrit avec une borne h <= ... que l'index parcourt en plage
+            requete = requete.filter(
+                JournalAlarme.horodatage_ms <= horodatage,
+                or_(JournalAlarme.horodatage_ms < horodatage, JournalAlarme.id_evenement < identifiant)
+            )
+
+        # Une ligne de plus : indique s'il reste une page sans COUNT(*)
+        evenements = requete.order_by(
+            JournalAlarme.horodatage_ms.desc(), JournalAlarme.id_evenement.desc()
+        ).limit(limite + 1).all()
+
+        if len(evenements) <= limite:
+            return evenements, None
+        evenements = evenements[:limite]
+        dernier = evenements[-1]
+        return evenements, encoder_curseur(dernier.horodatage_ms, dernier.id_evenement)
+
+    def stats(self):
+        return {
+            'actif': self.est_actif(),
+            'en_attente': len(self._file),
+            'capacite': self._file.maxlen,
+            'recues': self.recues,
+            'perdues': self.perdues,
+            'ecrites': self.ecrites,
+            'lots': self.lots,
+            'erreurs': self.erreurs,
+            'derniere_duree_lot_ms': round(self.derniere_duree_lot * 1000, 2)
+        }
+
+
+# Instance globale partagée par tout le processus
+journal_alarmes = JournalAlarmes()
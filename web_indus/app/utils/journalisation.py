@@ -0,0 +1,118 @@
+import json
+import logging
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# =================================================================
+# JOURNALISATION : LOGGERS PAR MODULE, NIVEAUX CONFIGURABLES
+# =================================================================
+# Chaque module utilise logging.getLogger(__name__) : tous les loggers de
+# l'application sont sous le logger 'app', configuré une fois par
+# configurer_journalisation() depuis config.py (niveau global, niveaux par
+# module, format texte ou JSON). Les erreurs répétées (lecture automate en
+# échec à chaque cycle...) sont limitées par fenêtre de temps.
+
+LOGGER_RACINE = 'app'
+FORMAT_TEXTE = '%(asctime)s %(levelname)-7s [%(name)s] %(message)s'
+LIMITE_MESSAGES = 5
+LIMITE_FENETRE_S = 60
+
+
+class FormatJSON(logging.Formatter):
+    """Une ligne JSON par message (collecte par un agrégateur de logs)"""
+
+    def format(self, record):
+        donnees = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'niveau': record.levelname,
+            'module': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        supprimes = getattr(record, 'messages_supprimes', 0)
+        if supprimes:
+            donnees['messages_supprimes'] = supprimes
+        if record.exc_info:
+            donnees['exception'] = self.formatException(record.exc_info)
+        return json.dumps(donnees, ensure_ascii=False, default=str)
+
+
+class FiltreRepetitions(logging.Filter):
+    """Laisse passer au plus `limite` messages identiques (même gabarit) par fenêtre, à partir de WARNING"""
+
+    def __init__(self, limite=LIMITE_MESSAGES, fenetre=LIMITE_FENETRE_S):
+        super().__init__()
+        self.limite = limite
+        self.fenetre = fenetre
+        self._compteurs = {}   # {(logger, niveau, gabarit): [debut_fenetre, emis, supprimes]}
+        self._verrou = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or not self.limite:
+            return True
+
+        cle = (record.name, record.levelno, str(record.msg))
+        maintenant = time.monotonic()
+
+        with self._verrou:
+            compteur = self._compteurs.get(cle)
+            if compteur is None or maintenant - compteur[0] >= self.fenetre:
+                supprimes = compteur[2] if compteur else 0
+                self._compteurs[cle] = [maintenant, 1, 0]
+            elif compteur[1] < self.limite:
+                compteur[1] += 1
+                supprimes = 0
+            else:
+                compteur[2] += 1
+                return False
+
+        if supprimes:
+            # Le premier message de la nouvelle fenêtre signale ceux qui ont été supprimés
+            record.messages_supprimes = supprimes
+            record.msg = f"{record.getMessage()} ({supprimes} messages identiques supprimés)"
+            record.args = None
+        return True
+
+
+def configurer_journalisation(config):
+    """
+    Configure le logger 'app' depuis la configuration Flask
+    LOG_NIVEAU, LOG_FORMAT ('texte' ou 'json'), LOG_NIVEAUX_MODULES,
+    LOG_LIMITE_MESSAGES, LOG_LIMITE_FENETRE_S
+    """
+    racine = logging.getLogger(LOGGER_RACINE)
+
+    # Reconfiguration (plusieurs create_app dans le même processus) : un seul handler
+    for handler in list(racine.handlers):
+        if getattr(handler, 'journalisation_ihm', False):
+            racine.removeHandler(handler)
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.journalisation_ihm = True
+    if str(config.get('LOG_FORMAT', 'texte')).lower() == 'json':
+        handler.setFormatter(FormatJSON())
+    else:
+        handler.setFormatter(logging.Formatter(FORMAT_TEXTE))
+    handler.addFilter(FiltreRepetitions(
+        config.get('LOG_LIMITE_MESSAGES', LIMITE_MESSAGES),
+        config.get('LOG_LIMITE_FENETRE_S', LIMITE_FENETRE_S)
+    ))
+
+    racine.addHandler(handler)
+    racine.setLevel(niveau(config.get('LOG_NIVEAU', 'INFO')))
+    racine.propagate = False
+
+    for module, niveau_module in config.get('LOG_NIVEAUX_MODULES', {}).items():
+        logging.getLogger(module).setLevel(niveau(niveau_module))
+
+    return racine
+
+
+def niveau(valeur):
+    """Niveau logging depuis un nom ('DEBUG', 'info'...) ou un entier"""
+    if isinstance(valeur, int):
+        return valeur
+    resultat = logging.getLevelName(str(valeur).upper())
+    return resultat if isinstance(resultat, int) else logging.INFO
@@ -0,0 +1,89 @@
+import logging
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# MIGRATIONS DU SCHÉMA - APPLIQUÉES APRÈS db.create_all()
+# =================================================================
+# create_all() crée les tables manquantes mais ne modifie jamais une table
+# existante. Chaque migration est idempotente : elle inspecte le schéma et
+# n'ajoute que ce qui manque (index, colonne), sur MySQL comme sur SQLite.
+# Ajouter une migration : une fonction (inspecteur, connexion) en fin de
+# MIGRATIONS, sans jamais modifier ni réordonner les précédentes.
+
+
+def index_existe(inspecteur, table, nom):
+    return any(index['name'] == nom for index in inspecteur.get_indexes(table))
+
+
+def colonne_existe(inspecteur, table, colonne):
+    return any(c['name'] == colonne for c in inspecteur.get_columns(table))
+
+
+def ajouter_index(inspecteur, connexion, table, nom, colonnes):
+    """Crée un index s'il n'existe pas. Retourne True si créé"""
+    if not inspecteur.has_table(table) or index_existe(inspecteur, table, nom):
+        return False
+    connexion.execute(text(f"CREATE INDEX {nom} ON {table} ({', '.join(colonnes)})"))
+    logger.info("Migration: index %s créé sur %s(%s)", nom, table, ', '.join(colonnes))
+    return True
+
+
+def ajouter_colonne(inspecteur, connexion, table, colonne, definition):
+    """Ajoute une colonne (définition SQL : type, défaut) si elle n'existe pas. Retourne True si ajoutée"""
+    if not inspecteur.has_table(table) or colonne_existe(inspecteur, table, colonne):
+        return False
+    connexion.execute(text(f"ALTER TABLE {table} ADD COLUMN {colonne} {definition}"))
+    logger.info("Migration: colonne %s.%s ajoutée", table, colonne)
+    return True
+
+
+# =================================================================
+# MIGRATIONS
+# =================================================================
+
+def index_mapping_com_nom(inspecteur, connexion):
+    """Tag.adresse_tag : adresses chargées par nom de tag (WHERE nom_du_tag IN ...)"""
+    return ajouter_index(inspecteur, connexion, 'Mapping_Com', 'ix_mapping_com_nom_du_tag', ['nom_du_tag'])
+
+
+def filtres_acquisition(inspecteur, connexion):
+    """Config_Acquisition_Tag : bande morte et intervalle minimal de publication des changements"""
+    ajoutees = [
+        ajouter_colonne(inspecteur, connexion, 'Config_Acquisition_Tag', 'bande_morte', 'FLOAT'),
+        ajouter_colonne(inspecteur, connexion, 'Config_Acquisition_Tag', 'bande_morte_pct', 'FLOAT'),
+        ajouter_colonne(inspecteur, connexion, 'Config_Acquisition_Tag', 'intervalle_min_ms', 'INTEGER'),
+    ]
+    return any(ajoutees)
+
+
+def hysteresis_alarmes(inspecteur, connexion):
+    """Alarme : hystérésis et temporisation d'apparition (moteur d'alarmes)"""
+    ajoutees = [
+        ajouter_colonne(inspecteur, connexion, 'Alarme', 'hysteresis', 'FLOAT'),
+        ajouter_colonne(inspecteur, connexion, 'Alarme', 'delai_activation_ms', 'INTEGER'),
+    ]
+    return any(ajoutees)
+
+
+MIGRATIONS = [
+    index_mapping_com_nom,
+    filtres_acquisition,
+    hysteresis_alarmes,
+]
+
+
+def appliquer_migrations(db):
+    """Applique les migrations manquantes. Retourne: nombre de modifications du schéma"""
+    modifications = 0
+    for migration in MIGRATIONS:
+        try:
+            with db.engine.begin() as connexion:
+                # Inspecteur neuf par migration : il met le schéma en cache
+                if migration(inspect(connexion), connexion):
+                    modifications += 1
+        except Exception as e:
+            logger.error("Migration %s échouée: %s", migration.__name__, e)
+    return modifications
@@ -0,0 +1,464 @@
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from app.utils.image_tags import QUALITE_GOOD
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# MOTEUR D'ALARMES - ÉVALUATION INCRÉMENTALE SUR CHANGEMENT
+# =================================================================
+# Les alarmes (table Alarme, rattachées aux tags par GERER_ALARME) sont
+# compilées en règles indexées par clé de l'image des tags. Le moteur est
+# un auditeur de l'image : à chaque publication, seules les règles des clés
+# modifiées sont évaluées, le coût ne dépend pas du nombre total d'alarmes.
+# - Hystérésis : une alarme haute apparaît au-dessus de la limite et ne
+#   disparaît qu'une fois la valeur revenue sous limite - hystérésis.
+# - Temporisation : la condition doit persister delai_activation_ms avant
+#   l'apparition ; les échéances sont tenues par un thread (tas trié).
+# - Une alarme reste dans l'ensemble actif tant qu'elle est présente ou non
+#   acquittée. Chaque transition (apparition, disparition, acquittement)
+#   reçoit une séquence et est gardée dans une file bornée pour les flux SSE,
+#   puis transmise aux auditeurs (journal des alarmes).
+
+APPARITION = 'APPARITION'
+DISPARITION = 'DISPARITION'
+ACQUITTEMENT = 'ACQUITTEMENT'
+
+# type_alarme -> comparaison à la limite
+COMPARAISONS = {
+    'HAUTE': '>', 'TRES_HAUTE': '>', 'H': '>', 'HH': '>', 'HIGH': '>',
+    'BASSE': '<', 'TRES_BASSE': '<', 'L': '<', 'LL': '<', 'LOW': '<',
+    'EGAL': '==', 'TOR': '==',
+    'DIFFERENT': '!=',
+}
+
+TAILLE_TRANSITIONS_DEFAUT = 1000
+ATTENTE_MAX_S = 1.0
+
+
+def valeur_alarme(valeur):
+    """Valeur comparable à une limite (booléen -> 0/1), None si non numérique"""
+    if isinstance(valeur, bool):
+        return float(valeur)
+    if isinstance(valeur, (int, float)):
+        return float(valeur)
+    try:
+        return float(valeur)
+    except (TypeError, ValueError):
+        return None
+
+
+class RegleAlarme:
+    """Alarme compilée : comparaison, limite, hystérésis, temporisation et état d'évaluation"""
+
+    __slots__ = ('id_alarme', 'id_tag', 'nom_tag', 'id_projet', 'type_alarme', 'comparaison', 'limite',
+                 'hysteresis', 'delai', 'message', 'priorite', 'presente', 'echeance', 'valeur')
+
+    def __init__(self, alarme, tag):
+        self.id_alarme = alarme.id_alarme
+        self.id_tag = tag.id_tag
+        self.nom_tag = tag.nom_tag
+        self.id_projet = tag.id_projet
+        self.type_alarme = (alarme.type_alarme or '').strip().upper()
+        self.comparaison = COMPARAISONS.get(self.type_alarme)
+        self.limite = float(alarme.limite) if alarme.limite is not None else 0.0
+        self.hysteresis = abs(alarme.hysteresis or 0.0)
+        self.delai = (alarme.delai_activation_ms or 0) / 1000
+        self.message = alarme.message
+        self.priorite = alarme.priorite
+        self.presente = False
+        self.echeance = None   # time.monotonic() d'apparition si la condition persiste
+        self.valeur = None
+
+    def condition(self, valeur):
+        """Condition d'apparition"""
+        if self.comparaison == '>':
+            return valeur > self.limite
+        if self.comparaison == '<':
+            return valeur < self.limite
+        if self.comparaison == '==':
+            return valeur == self.limite
+        return valeur != self.limite
+
+    def retour_normal(self, valeur):
+        """Condition de disparition (hystérésis sur les seuils haut et bas)"""
+        if self.comparaison == '>':
+            return valeur <= self.limite - self.hysteresis
+        if self.comparaison == '<':
+            return valeur >= self.limite + self.hysteresis
+        return not self.condition(valeur)
+
+
+class AlarmeActive:
+    """Alarme présente, ou disparue mais pas encore acquittée"""
+
+    __slots__ = ('regle', 'presente', 'acquittee', 'apparition', 'disparition', 'acquittement',
+                 'acquittee_par', 'valeur')
+
+    def __init__(self, regle, valeur, horodatage):
+        self.regle = regle
+        self.presente = True
+        self.acquittee = False
+        self.apparition = horodatage
+        self.disparition = None
+        self.acquittement = None
+        self.acquittee_par = None
+        self.valeur = valeur
+
+    @property
+    def etat(self):
+        if self.presente:
+            return 'ACQUITTEE' if self.acquittee else 'ACTIVE'
+        return 'NON_ACQUITTEE'
+
+    def to_dict(self):
+        regle = self.regle
+        return {
+            'id_alarme': regle.id_alarme,
+            'id_tag': regle.id_tag,
+            'nom_tag': regle.nom_tag,
+            'id_projet': regle.id_projet,
+            'type_alarme': regle.type_alarme,
+            'limite': regle.limite,
+            'message': regle.message,
+            'priorite': regle.priorite,
+            'etat': self.etat,
+            'presente': self.presente,
+            'acquittee': self.acquittee,
+            'valeur': self.valeur,
+            'apparition': self.apparition.isoformat() if self.apparition else None,
+            'disparition': self.disparition.isoformat() if self.disparition else None,
+            'acquittement': self.acquittement.isoformat() if self.acquittement else None,
+            'acquittee_par': self.acquittee_par
+        }
+
+
+class MoteurAlarmes:
+    """Index des alarmes par clé de l'image, ensemble des alarmes actives et file des transitions"""
+
+    def __init__(self, taille_transitions=TAILLE_TRANSITIONS_DEFAUT):
+        self.app = None
+        self._regles_tag = {}    # id_tag -> [RegleAlarme]
+        self._regles = {}        # id_alarme -> RegleAlarme
+        self._cles = {}          # source -> {cle image: [id_tag surveillés]}
+        self._index = {}         # cle image -> [RegleAlarme]
+        self._actives = {}       # id_alarme -> AlarmeActive
+        self._echeances = []     # tas (echeance, id_alarme)
+        self._transitions = deque(maxlen=taille_transitions)   # (sequence, dict)
+        self._auditeurs = []
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._reveil = threading.Event()
+        self._thread = None
+        self._actif = False
+
+        self.evaluations = 0
+        self.nb_transitions = 0
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def init_app(self, app):
+        """Configure le moteur et démarre le thread des temporisations (alarmes chargées après create_all)"""
+        self.app = app
+        taille = app.config.get('ALARMES_TAILLE_TRANSITIONS', TAILLE_TRANSITIONS_DEFAUT)
+        if taille != self._transitions.maxlen:
+            self._transitions = deque(self._transitions, maxlen=taille)
+        if app.config.get('ALARMES_ACTIVES', True):
+            self.demarrer()
+
+    # =================================================================
+    # CONFIGURATION ET INDEX
+    # =================================================================
+
+    def charger_alarmes(self):
+        """(Re)charge les alarmes (Alarme + GERER_ALARME) et recompile l'index. Retourne: nombre de règles"""
+        if self.app is None:
+            return 0
+
+        from app.models.modele_tag import Tag, Alarme, GererAlarme
+
+        with self.app.app_context():
+            try:
+                lignes = Alarme.query.join(
+                    GererAlarme, GererAlarme.id_alarme == Alarme.id_alarme
+                ).join(
+                    Tag, Tag.id_tag == GererAlarme.id_tag
+                ).with_entities(Alarme, Tag).all()
+            except Exception as e:
+                logger.error("Erreur chargement alarmes: %s", e)
+                return 0
+
+            regles_tag = {}
+            for alarme, tag in lignes:
+                regle = RegleAlarme(alarme, tag)
+                if regle.comparaison is None:
+                    logger.warning("Alarme %s: type '%s' inconnu, ignorée", alarme.id_alarme, alarme.type_alarme)
+                    continue
+                regles_tag.setdefault(tag.id_tag, []).append(regle)
+
+        with self._condition:
+            # L'état d'évaluation des alarmes conservées est repris, les alarmes supprimées quittent l'ensemble actif
+            anciennes = {r.id_alarme: r for regles in self._regles_tag.values() for r in regles}
+            for regles in regles_tag.values():
+                for regle in regles:
+                    ancienne = anciennes.get(regle.id_alarme)
+                    if ancienne is not None:
+                        regle.presente, regle.echeance, regle.valeur = ancienne.presente, ancienne.echeance, ancienne.valeur
+                    active = self._actives.get(regle.id_alarme)
+                    if active is not None:
+                        active.regle = regle
+            conservees = {r.id_alarme for regles in regles_tag.values() for r in regles}
+            for id_alarme in [i for i in self._actives if i not in conservees]:
+                del self._actives[id_alarme]
+
+            self._regles_tag = regles_tag
+            self._regles = {r.id_alarme: r for regles in regles_tag.values() for r in regles}
+            self._compiler()
+
+        nombre = sum(len(regles) for regles in regles_tag.values())
+        logger.info("Alarmes: %d règle(s) sur %d tag(s)", nombre, len(regles_tag))
+        return nombre
+
+    def ajouter_auditeur(self, auditeur):
+        """auditeur(transition) est appelé sous le verrou du moteur : il doit rendre la main immédiatement"""
+        if auditeur not in self._auditeurs:
+            self._auditeurs.append(auditeur)
+
+    def retirer_auditeur(self, auditeur):
+        if auditeur in self._auditeurs:
+            self._auditeurs.remove(auditeur)
+
+    def associer_cles(self, source, surveilles):
+        """Tags surveillés d'un automate par clé de l'image : {cle: [id_tag]}"""
+        with self._condition:
+            self._cles[source] = surveilles
+            self._compiler()
+
+    def _compiler(self):
+        """Index clé de l'image -> règles (sous verrou)"""
+        index = {}
+        for surveilles in self._cles.values():
+            for cle, ids_tags in surveilles.items():
+                regles = [r for id_tag in ids_tags for r in self._regles_tag.get(id_tag, ())]
+                if regles:
+                    index[cle] = regles
+        self._index = index
+
+    # =================================================================
+    # ÉVALUATION (AUDITEUR DE L'IMAGE DES TAGS)
+    # =================================================================
+
+    def changements_image(self, changements):
+        """Auditeur de l'image des tags : évalue les seules règles des clés modifiées"""
+        index = self._index
+        if not index:
+            return
+        maintenant = time.monotonic()
+        horodatage = datetime.now()
+        reveiller = False
+
+        with self._condition:
+            sequence = self._sequence
+            for cle, valeur, qualite, _ in changements:
+                regles = index.get(cle)
+                if not regles:
+                    continue
+                # Valeur incertaine (automate injoignable) : état conservé, temporisations annulées
+                mesure = valeur_alarme(valeur) if qualite == QUALITE_GOOD else None
+                for regle in regles:
+                    self.evaluations += 1
+                    reveiller |= self._evaluer(regle, mesure, maintenant, horodatage)
+            if self._sequence != sequence:
+                self._condition.notify_all()
+
+        if reveiller:
+            self._reveil.set()
+
+    def _evaluer(self, regle, mesure, maintenant, horodatage):
+        """Évalue une règle (sous verrou). Retourne True si une nouvelle temporisation est armée"""
+        if mesure is None:
+            regle.echeance = None
+            return False
+
+        regle.valeur = mesure
+        if regle.condition(mesure):
+            if regle.presente or regle.echeance is not None:
+                return False
+            if regle.delai:
+                regle.echeance = maintenant + regle.delai
+                heapq.heappush(self._echeances, (regle.echeance, regle.id_alarme))
+                return True
+            self._apparition(regle, mesure, horodatage)
+            return False
+
+        regle.echeance = None
+        if regle.presente and regle.retour_normal(mesure):
+            self._disparition(regle, mesure, horodatage)
+        return False
+
+    def _apparition(self, regle, valeur, horodatage):
+        regle.presente = True
+        regle.echeance = None
+        active = self._actives.get(regle.id_alarme)
+        if active is None:
+            active = self._actives[regle.id_alarme] = AlarmeActive(regle, valeur, horodatage)
+        else:
+            # Réapparition avant acquittement : la même alarme redevient présente
+            active.presente, active.acquittee, active.apparition = True, False, horodatage
+            active.disparition = active.acquittement = active.acquittee_par = None
+            active.valeur = valeur
+        self._transition(APPARITION, active, horodatage)
+        logger.info("Alarme %s apparue: %s %s %s (valeur %s)", regle.id_alarme, regle.nom_tag,
+                    regle.comparaison, regle.limite, valeur)
+
+    def _disparition(self, regle, valeur, horodatage):
+        regle.presente = False
+        active = self._actives.get(regle.id_alarme)
+        if active is None:
+            return
+        active.presente = False
+        active.disparition = horodatage
+        active.valeur = valeur
+        if active.acquittee:
+            del self._actives[regle.id_alarme]
+        self._transition(DISPARITION, active, horodatage)
+
+    def _transition(self, type_transition, active, horodatage):
+        self._sequence += 1
+        self.nb_transitions += 1
+        transition = active.to_dict()
+        transition.update(sequence=self._sequence, transition=type_transition, horodatage=horodatage.isoformat(),
+                          horodatage_ms=int(time.time() * 1000))
+        self._transitions.append((self._sequence, transition))
+        for auditeur in self._auditeurs:
+            try:
+                auditeur(transition)
+            except Exception as e:
+                logger.error("Auditeur du moteur d'alarmes en erreur: %s", e)
+
+    # =================================================================
+    # TEMPORISATIONS
+    # =================================================================
+
+    def demarrer(self):
+        if self.est_actif():
+            return
+        self._actif = True
+        self._thread = threading.Thread(target=self._boucle, name="alarmes", daemon=True)
+        self._thread.start()
+        logger.info("Moteur d'alarmes démarré")
+
+    def arreter(self):
+        self._actif = False
+        self._reveil.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def est_actif(self):
+        return self._actif and self._thread is not None and self._thread.is_alive()
+
+    def _boucle(self):
+        while self._actif:
+            attente = self.traiter_echeances()
+            self._reveil.wait(attente)
+            self._reveil.clear()
+
+    def traiter_echeances(self):
+        """Fait apparaître les alarmes dont la temporisation est écoulée. Retourne: attente avant la prochaine (s)"""
+        maintenant = time.monotonic()
+        horodatage = datetime.now()
+        with self._condition:
+            sequence = self._sequence
+            while self._echeances and self._echeances[0][0] <= maintenant:
+                echeance, id_alarme = heapq.heappop(self._echeances)
+                regle = self._regles.get(id_alarme)
+                # Échéance annulée (condition disparue) ou réarmée depuis
+                if regle is not None and regle.echeance == echeance:
+                    self._apparition(regle, regle.valeur, horodatage)
+            if self._sequence != sequence:
+                self._condition.notify_all()
+            if self._echeances:
+                return min(ATTENTE_MAX_S, max(0.0, self._echeances[0][0] - maintenant))
+        return ATTENTE_MAX_S
+
+    # =================================================================
+    # ACQUITTEMENT ET CONSULTATION
+    # =================================================================
+
+    def acquitter(self, ids_alarmes=None, utilisateur=None, id_projet=None):
+        """
+        Acquitte des alarmes (toutes celles du projet si ids_alarmes est None)
+        Retourne: liste des id_alarme acquittés
+        """
+        horodatage = datetime.now()
+        acquittees = []
+        with self._condition:
+            candidates = list(self._actives.values()) if ids_alarmes is None else \
+                [self._actives[i] for i in ids_alarmes if i in self._actives]
+            for active in candidates:
+                if active.acquittee or (id_projet is not None and active.regle.id_projet != id_projet):
+                    continue
+                active.acquittee = True
+                active.acquittement = horodatage
+                active.acquittee_par = utilisateur
+                if not active.presente:
+                    del self._actives[active.regle.id_alarme]
+                self._transition(ACQUITTEMENT, active, horodatage)
+                acquittees.append(active.regle.id_alarme)
+            if acquittees:
+                self._condition.notify_all()
+        return acquittees
+
+    def actives(self, id_projet=None):
+        """Alarmes de l'ensemble actif (dict), plus récentes en premier"""
+        with self._condition:
+            alarmes = [a.to_dict() for a in self._actives.values()
+                       if id_projet is None or a.regle.id_projet == id_projet]
+        return sorted(alarmes, key=lambda a: a['apparition'] or '', reverse=True)
+
+    def transitions_depuis(self, sequence, id_projet=None):
+        """
+        Retourne (sequence_actuelle, [transitions postérieures à `sequence`])
+        transitions None : la file ne remonte pas jusque-là, un instantané est nécessaire
+        """
+        with self._condition:
+            sequence_actuelle = self._sequence
+            if sequence >= sequence_actuelle:
+                return sequence_actuelle, []
+            if not self._transitions or self._transitions[0][0] > sequence + 1:
+                return sequence_actuelle, None
+            return sequence_actuelle, [
+                t for s, t in self._transitions
+                if s > sequence and (id_projet is None or t['id_projet'] == id_projet)
+            ]
+
+    def attendre_changement(self, sequence, timeout=None):
+        """Bloque jusqu'à une transition postérieure à `sequence`. Retourne la séquence actuelle"""
+        with self._condition:
+            if self._sequence <= sequence:
+                self._condition.wait(timeout)
+            return self._sequence
+
+    def stats(self):
+        return {
+            'regles': len(self._regles),
+            'cles_surveillees': len(self._index),
+            'actives': len(self._actives),
+            'temporisations': len(self._echeances),
+            'evaluations': self.evaluations,
+            'transitions': self.nb_transitions,
+            'sequence': self._sequence,
+            'thread_actif': self.est_actif()
+        }
+
+
+# Instance globale partagée par tout le processus
+moteur_alarmes = MoteurAlarmes()
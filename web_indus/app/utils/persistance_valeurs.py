@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+
+from app.utils.ecriture_differee import EcritureDifferee
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# PERSISTANCE DIFFÉRÉE DES VALEURS DES TAGS (WRITE-BEHIND)
+# =================================================================
+# Les valeurs vivantes sont dans l'image des tags : une lecture ou une
+# écriture HTTP ne fait plus d'UPDATE + COMMIT de Tag.valeur. La dernière
+# valeur de chaque tag modifié est notée en mémoire (un tag lu cent fois
+# entre deux vidages n'est écrit qu'une fois) ; un thread l'écrit dans
+# Tag.valeur à intervalle régulier, par un UPDATE groupé (executemany) dans
+# une seule transaction. Échec : les valeurs restent notées, sans écraser
+# une valeur plus récente, et sont réessayées au vidage suivant.
+
+PERIODE_VIDAGE_S = 5.0
+LOT_MAX_DEFAUT = 1000
+
+
+class PersistanceValeurs(EcritureDifferee):
+    """Dernière valeur de chaque tag modifié, écrite par lots dans Tag.valeur hors requête HTTP"""
+
+    nom_thread = 'persistance-valeurs'
+
+    def __init__(self, periode=PERIODE_VIDAGE_S, lot_max=LOT_MAX_DEFAUT):
+        super().__init__(periode)
+        self.lot_max = lot_max
+        self.app = None
+
+        self._en_attente = {}      # {id_tag: valeur texte}
+        self._verrou = threading.Lock()
+
+        self.notees = 0
+        self.ecrites = 0
+        self.vidages = 0
+        self.erreurs = 0
+        self.derniere_duree_vidage = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.periode = app.config.get('VALEURS_PERSISTANCE_PERIODE_S', PERIODE_VIDAGE_S)
+        self.lot_max = app.config.get('VALEURS_PERSISTANCE_LOT_MAX', LOT_MAX_DEFAUT)
+        if app.config.get('VALEURS_PERSISTANCE_ACTIVE', True):
+            self.demarrer()
+
+    def noter(self, id_tag, valeur):
+        """Note la dernière valeur (texte) d'un tag, sans accès base"""
+        with self._verrou:
+            self._en_attente[id_tag] = valeur
+            self.notees += 1
+
+    # =================================================================
+    # VIDAGE PÉRIODIQUE
+    # =================================================================
+
+    def vider(self):
+        """Écrit toutes les valeurs notées. Retourne False si l'écriture a échoué (valeurs conservées)"""
+        if self.app is None:
+            return True
+
+        from sqlalchemy import update, bindparam
+        from app import db
+        from app.models.modele_tag import Tag
+
+        with self._verrou_vidage:
+            with self._verrou:
+                valeurs, self._en_attente = self._en_attente, {}
+            if not valeurs:
+                return True
+
+            table = Tag.__table__
+            requete = update(table).where(table.c.id_tag == bindparam('b_id_tag')).values(valeur=bindparam('b_valeur'))
+            lignes = [{'b_id_tag': id_tag, 'b_valeur': valeur} for id_tag, valeur in valeurs.items()]
+
+            debut = time.perf_counter()
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connexion:
+                        for i in range(0, len(lignes), self.lot_max):
+                            connexion.execute(requete, lignes[i:i + self.lot_max])
+            except Exception as e:
+                self.erreurs += 1
+                logger.error("Persistance de %d valeurs de tags échouée: %s", len(valeurs), e)
+                with self._verrou:
+                    # Une valeur notée pendant le vidage est plus récente : elle est conservée
+                    for id_tag, valeur in valeurs.items():
+                        self._en_attente.setdefault(id_tag, valeur)
+                return False
+
+            self.derniere_duree_vidage = time.perf_counter() - debut
+            self.ecrites += len(valeurs)
+            self.vidages += 1
+            return True
+
+    def stats(self):
+        return {
+            'actif': self.est_actif(),
+            'en_attente': len(self._en_attente),
+            'notees': self.notees,
+            'ecrites': self.ecrites,
+            'vidages': self.vidages,
+            'erreurs': self.erreurs,
+            'derniere_duree_vidage_ms': round(self.derniere_duree_vidage * 1000, 2)
+        }
+
+
+# Instance globale partagée par tout le processus
+persistance_valeurs = PersistanceValeurs()
@@ -0,0 +1,271 @@
+import logging
+import threading
+
+from app.utils.image_tags import cle_image, QUALITE_EN_ATTENTE
+from app.utils.evaluation_regles import (
+    JeuRegles, premier_resultat, compiler_regle_couleur, compiler_regle_visibilite,
+    convertir_valeur_couleur, convertir_valeur_visibilite
+)
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# PLAN RUNTIME COMPILÉ PAR PAGE
+# =================================================================
+# Tout ce qui ne dépend pas des valeurs automate est calculé une seule fois
+# par (projet, page) : animations, règles décodées, adresses S7 résolues et
+# analysées, règles de couleur et de visibilité, données d'icônes. Le plan
+# est reconstruit quand la version du projet change (édition de page,
+# d'animation, de tag ou de règle) : le chemin chaud ne fait plus que des
+# lectures dans l'image des tags.
+
+_versions = {}          # {id_projet: version}
+_version_globale = 0    # Modifications sans projet identifié
+_plans = {}             # {(id_projet, id_page, source): PlanPage}
+_verrou = threading.Lock()
+
+
+def version_plans(projet_id):
+    """Version courante des plans d'un projet"""
+    return (_version_globale, _versions.get(projet_id, 0))
+
+
+def invalider_plans(projet_id=None):
+    """Rend obsolètes les plans d'un projet (de tous les projets si None)"""
+    global _version_globale
+    with _verrou:
+        if projet_id is None:
+            _version_globale += 1
+        else:
+            _versions[projet_id] = _versions.get(projet_id, 0) + 1
+
+
+def est_adresse_s7(reference):
+    """Même règle que resoudre_adresse_tag : une référence 'DBx.' est déjà une adresse"""
+    return 'DB' in reference.upper() and '.' in reference
+
+
+class ObjetRuntime:
+    """Animation d'une page, pré-compilée pour le runtime"""
+
+    __slots__ = (
+        'id_animation', 'nom_animation', 'type_objet', 'couleur_normale',
+        'regles', 'tag_lie', 'action_clic', 'valeur_ecriture',
+        'adresse', 'type_donnee', 'adresse_parsee', 'cle', 'source',
+        'icon_data', 'icon_size', 'icon_rotation', 'icon_info',
+        'regles_couleur', 'regles_visibilite', 'rang'
+    )
+
+    def __init__(self, animation):
+        regles = animation.get_regles_animation()
+
+        self.id_animation = animation.id_animation
+        self.nom_animation = animation.nom_animation
+        self.type_objet = animation.type_objet
+        self.couleur_normale = animation.couleur_normale
+        self.regles = regles
+        self.tag_lie = (regles.get('tag_lie') or '').strip()
+        self.action_clic = regles.get('action_clic', 'read')
+        self.valeur_ecriture = regles.get('valeur_ecriture', '')
+
+        self.adresse = None
+        self.type_donnee = None
+        self.adresse_parsee = None
+        self.cle = None
+        self.source = None            # Automate du tag (nom de connexion)
+
+        self.icon_data = None
+        self.icon_size = regles.get('icon_size', 1.0)
+        self.icon_rotation = regles.get('icon_rotation', 0)
+        self.icon_info = None
+        if self.type_objet == 'icon':
+            self.icon_data = animation.get_icon_data()
+            self.icon_info = animation.get_icon_info()
+
+        self.regles_couleur = []      # Prédicats compilés, par ordre de priorité
+        self.regles_visibilite = []
+        self.rang = None              # Position dans PlanPage.objets_tags
+
+    def couleur(self, valeur):
+        """Couleur finale (même logique que ColorRule.apply_rules_to_object)"""
+        couleur = premier_resultat(self.regles_couleur, valeur, convertir_valeur_couleur)
+        return self.couleur_normale if couleur is None else couleur
+
+    def visibilite(self, valeur):
+        """Action de visibilité 'show' / 'hide', ou None (même logique que VisibilityRule.apply_rules_to_object)"""
+        return premier_resultat(self.regles_visibilite, valeur, convertir_valeur_visibilite)
+
+
+class PlanPage:
+    """Plan compilé d'une page runtime"""
+
+    def __init__(self, page_id, projet_id, version, objets):
+        self.page_id = page_id
+        self.projet_id = projet_id
+        self.version = version
+        self.objets = objets
+        self.objets_tags = [objet for objet in objets if objet.cle is not None]
+
+        # Demandes de lecture uniques (source, adresse, type) et index clé image -> objets
+        self.demandes = []
+        self.objets_par_cle = {}
+        for rang, objet in enumerate(self.objets_tags):
+            objet.rang = rang
+            if objet.cle not in self.objets_par_cle:
+                self.objets_par_cle[objet.cle] = []
+                self.demandes.append((objet.source, objet.adresse, objet.type_donnee))
+            self.objets_par_cle[objet.cle].append(objet)
+        self.sources = list(dict.fromkeys(source for source, _, _ in self.demandes))
+
+        # Règles de toute la page, évaluées en une passe (vectorisée si nombreuses)
+        self.jeu_couleurs = JeuRegles([objet.regles_couleur for objet in self.objets_tags], convertir_valeur_couleur)
+        self.jeu_visibilites = JeuRegles([objet.regles_visibilite for objet in self.objets_tags], convertir_valeur_visibilite)
+
+    @property
+    def cles(self):
+        return list(self.objets_par_cle)
+
+    def objets_modifies(self, cles_modifiees):
+        """Objets concernés par un ensemble de clés modifiées (tous si None)"""
+        if cles_modifiees is None:
+            return self.objets_tags
+        return [
+            objet
+            for cle in cles_modifiees if cle in self.objets_par_cle
+            for objet in self.objets_par_cle[cle]
+        ]
+
+    def etats(self, image, objets=None):
+        """
+        Calcule valeur, qualité, couleur et visibilité depuis l'image des tags, sans SQL
+        Retourne: dict {animation_id: donnees}
+        """
+        if objets is None or objets is self.objets_tags:
+            objets, rangs = self.objets_tags, None
+        else:
+            rangs = [objet.rang for objet in objets]
+
+        entrees = image.lire_lot([objet.cle for objet in objets])
+        valeurs = [entree.valeur if entree else None for entree in entrees]
+
+        try:
+            couleurs = self.jeu_couleurs.evaluer(valeurs, rangs)
+            visibilites = self.jeu_visibilites.evaluer(valeurs, rangs)
+        except Exception as e:
+            logger.error("Erreur évaluation règles page %s: %s", self.page_id, e)
+            couleurs = visibilites = [None] * len(objets)
+
+        etats = {}
+        for objet, entree, valeur, couleur, visibilite in zip(objets, entrees, valeurs, couleurs, visibilites):
+            donnees = {
+                'valeur': valeur,
+                'qualite': entree.qualite if entree else QUALITE_EN_ATTENTE,
+                'timestamp': entree.timestamp.isoformat() if entree and entree.timestamp else None,
+                'sequence': entree.sequence if entree else 0,
+                'tag_adresse': objet.adresse,
+                'objet_type': objet.type_objet,
+                'couleur_normale': objet.couleur_normale,
+                'couleur_actuelle': objet.couleur_normale,
+                'couleur_dynamique': False,
+                'visibilite': None
+            }
+
+            # Sans valeur lue, l'objet garde sa couleur normale et sa visibilité
+            if valeur is not None:
+                if couleur is not None:
+                    donnees['couleur_actuelle'] = couleur
+                    donnees['couleur_dynamique'] = couleur != objet.couleur_normale
+                donnees['visibilite'] = visibilite
+
+            etats[objet.id_animation] = donnees
+
+        return etats
+
+
+def construire_plan(page_id, projet_id, source, analyseur=None, source_tag=None):
+    """
+    Compile le plan d'une page : 2 requêtes (animations, tags), les règles venant de l'index du projet
+    source: automate des adresses S7 directes et des tags sans connexion nommée
+    analyseur: fonction adresse -> adresse S7 compilée (ex: compiler_adresse)
+    source_tag: fonction id_tag -> automate du tag (ex: registre_automates.source_tag)
+    """
+    from app.models.modele_tag import Tag
+    from app.models.modele_graphics import Animation, ContenirAnimation, index_regles
+
+    version = version_plans(projet_id)
+
+    animations = Animation.query.join(ContenirAnimation).filter(
+        ContenirAnimation.id_page == page_id
+    ).all()
+    objets = [ObjetRuntime(animation) for animation in animations]
+    objets_tags = [objet for objet in objets if objet.tag_lie]
+
+    # Résolution des noms de tags du projet en une requête
+    noms = {objet.tag_lie for objet in objets_tags if not est_adresse_s7(objet.tag_lie)}
+    tags = {}
+    if noms:
+        query = Tag.query.filter(Tag.nom_tag.in_(noms))
+        if projet_id:
+            query = query.filter_by(id_projet=projet_id)
+        for tag in query.all():
+            tags.setdefault(tag.nom_tag, tag)
+
+    for objet in objets_tags:
+        tag = tags.get(objet.tag_lie)
+        objet.source = source
+        if tag is not None:
+            objet.adresse = tag.adresse_tag or objet.tag_lie
+            objet.type_donnee = tag.type_donnee
+            if source_tag is not None:
+                objet.source = source_tag(tag.id_tag)
+        else:
+            objet.adresse = objet.tag_lie
+        objet.cle = cle_image(objet.source, objet.adresse, objet.type_donnee)
+
+        if analyseur:
+            try:
+                objet.adresse_parsee = analyseur(objet.adresse)
+            except ValueError as e:
+                logger.warning("Adresse invalide pour %s: %s", objet.nom_animation, e)
+
+    # Règles de couleur et de visibilité depuis l'index du projet, déjà triées par priorité, compilées en prédicats
+    for objet in objets_tags:
+        # Une règle sur un autre tag que celui de l'objet ne s'applique jamais
+        objet.regles_couleur = [
+            compiler_regle_couleur(regle)
+            for regle in index_regles.regles_couleur(objet.id_animation, projet_id)
+            if regle.tag_name.strip() == objet.tag_lie
+        ]
+        objet.regles_visibilite = [
+            compiler_regle_visibilite(regle)
+            for regle in index_regles.regles_visibilite(objet.id_animation, projet_id)
+            if regle.tag_name.strip() == objet.tag_lie
+        ]
+
+    return PlanPage(page_id, projet_id, version, objets)
+
+
+def obtenir_plan(page_id, projet_id, source, analyseur=None, source_tag=None):
+    """Plan compilé d'une page, reconstruit seulement si le projet a été modifié depuis"""
+    cle = (projet_id, page_id, source)
+    plan = _plans.get(cle)
+
+    if plan is None or plan.version != version_plans(projet_id):
+        plan = construire_plan(page_id, projet_id, source, analyseur, source_tag)
+        with _verrou:
+            _plans[cle] = plan
+
+    return plan
+
+
+def vider_plans():
+    with _verrou:
+        _plans.clear()
+
+
+def stats_plans():
+    return {
+        'plans': len(_plans),
+        'objets': sum(len(plan.objets) for plan in list(_plans.values())),
+        'version_globale': _version_globale
+    }
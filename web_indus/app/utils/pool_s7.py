@@ -0,0 +1,353 @@
+import ctypes
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from app.utils.adresse_s7 import ZONES_SNAP7
+from app.utils.simulateur_s7 import ClientSimule
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# POOL DE CONNEXIONS S7 - ACCÈS CONCURRENTS SANS PARTAGE DE CLIENT
+# =================================================================
+# Un client snap7 n'est pas utilisable par plusieurs threads à la fois.
+# Chaque requête emprunte une connexion au pool pour la durée de son
+# échange, et l'attend dans une file si toutes sont occupées. La taille du
+# pool est bornée par le nombre de connexions que la CPU accepte (moins
+# celles réservées à la console de programmation / aux autres IHM).
+
+TAILLE_POOL_DEFAUT = 3
+CONNEXIONS_RESERVEES = 1
+ATTENTE_CONNEXION_S = 5.0
+
+
+class PoolSatureError(Exception):
+    """Aucune connexion S7 libérée dans le délai d'attente"""
+
+
+def taille_pour_cpu(client, taille_demandee, reservees=CONNEXIONS_RESERVEES):
+    """Taille de pool compatible avec le nombre maximal de connexions annoncé par la CPU"""
+    try:
+        maximum = client.get_cp_info().MaxConnections
+    except Exception:
+        return taille_demandee
+    if not maximum:
+        return taille_demandee
+    return max(1, min(taille_demandee, maximum - reservees))
+
+
+class PoolConnexionsS7:
+    """Ensemble borné de connexions S7 vers un automate, empruntées une à la fois"""
+
+    def __init__(self, fabrique=None, taille=TAILLE_POOL_DEFAUT, attente=ATTENTE_CONNEXION_S, sante=None):
+        self.fabrique = fabrique     # () -> client snap7 connecté
+        self.taille = max(1, taille)
+        self.attente = attente
+        self.sante = sante           # SanteConnexion : latence et résultat de chaque échange
+
+        self._libres = queue.LifoQueue()   # LIFO : on réutilise la connexion la plus récente
+        self._clients = []
+        self._verrou = threading.Lock()
+
+        self.emprunts = 0
+        self.attentes = 0
+        self.duree_attente_totale = 0.0
+        self.connexions_perdues = 0
+        self._a_remplacer = 0
+        self.occupees = 0
+        self.occupees_max = 0
+
+    @classmethod
+    def depuis_client(cls, client):
+        """Pool d'une seule connexion déjà ouverte (tests, benchmarks)"""
+        pool = cls(taille=1)
+        pool.ajouter(client)
+        return pool
+
+    def ajouter(self, client):
+        """Ajoute une connexion déjà ouverte au pool"""
+        with self._verrou:
+            self._clients.append(client)
+        self._libres.put(client)
+
+    @property
+    def client_principal(self):
+        with self._verrou:
+            return self._clients[0] if self._clients else None
+
+    def ouvrir(self):
+        """Ouvre la première connexion (erreur de connexion propagée à l'appelant)"""
+        self._rendre(self._emprunter(self.attente))
+
+    # =================================================================
+    # EMPRUNT / RESTITUTION
+    # =================================================================
+
+    @contextmanager
+    def connexion(self, attente=None):
+        """
+        Emprunte une connexion pour la durée du bloc
+        Une connexion tombée pendant le bloc est fermée et remplacée au prochain emprunt
+        """
+        client = self._emprunter(self.attente if attente is None else attente)
+        defectueux = False
+        debut = time.perf_counter()
+        try:
+            yield client
+        except Exception as e:
+            defectueux = not self.est_connecte(client)
+            if self.sante is not None:
+                self.sante.echange(time.perf_counter() - debut, e)
+            raise
+        else:
+            if self.sante is not None:
+                self.sante.echange(time.perf_counter() - debut)
+        finally:
+            self._rendre(client, defectueux)
+
+    def _emprunter(self, attente):
+        try:
+            client = self._libres.get_nowait()
+        except queue.Empty:
+            client = self._creer_si_possible()
+            if client is None:
+                client = self._attendre(attente)
+
+        with self._verrou:
+            self.emprunts += 1
+            self.occupees += 1
+            self.occupees_max = max(self.occupees_max, self.occupees)
+        return client
+
+    def _attendre(self, attente):
+        """File d'attente : première connexion rendue, ou place libérée par une connexion perdue"""
+        debut = time.perf_counter()
+        echeance = debut + attente
+        while True:
+            restant = echeance - time.perf_counter()
+            if restant <= 0:
+                raise PoolSatureError(f"Aucune connexion S7 libre après {attente}s ({self.taille} connexions)")
+            try:
+                client = self._libres.get(timeout=min(restant, 0.1))
+                break
+            except queue.Empty:
+                client = self._creer_si_possible()
+                if client is not None:
+                    break
+
+        with self._verrou:
+            self.attentes += 1
+            self.duree_attente_totale += time.perf_counter() - debut
+        return client
+
+    def _creer_si_possible(self):
+        """Nouvelle connexion si le pool n'est pas plein. Retourne None sinon"""
+        if self.fabrique is None:
+            return None
+
+        with self._verrou:
+            if len(self._clients) >= self.taille:
+                return None
+            # Place réservée pendant la connexion (hors verrou, elle peut être lente)
+            self._clients.append(None)
+
+        try:
+            client = self.fabrique()
+        except Exception:
+            with self._verrou:
+                self._clients.remove(None)
+            raise
+
+        with self._verrou:
+            self._clients[self._clients.index(None)] = client
+            remplacement = self._a_remplacer > 0
+            if remplacement:
+                self._a_remplacer -= 1
+        if remplacement and self.sante is not None:
+            self.sante.connexion_remplacee()
+        return client
+
+    def _rendre(self, client, defectueux=False):
+        with self._verrou:
+            self.occupees -= 1
+            present = client in self._clients
+            if defectueux and present:
+                self.connexions_perdues += 1
+                self._a_remplacer += 1
+                self._clients.remove(client)
+
+        if defectueux:
+            logger.warning("Connexion S7 perdue, retirée du pool")
+            self._deconnecter(client)
+        elif present:
+            self._libres.put(client)
+        else:
+            # Pool fermé pendant l'emprunt
+            self._deconnecter(client)
+
+    @staticmethod
+    def est_connecte(client):
+        try:
+            return bool(client.get_connected())
+        except Exception:
+            return False
+
+    @staticmethod
+    def _deconnecter(client):
+        try:
+            client.disconnect()
+        except Exception as e:
+            logger.debug("Erreur déconnexion client S7: %s", e)
+
+    def fermer(self):
+        """Ferme toutes les connexions (celles empruntées le seront à leur retour)"""
+        with self._verrou:
+            clients = [c for c in self._clients if c is not None]
+            self._clients = []
+        while True:
+            try:
+                self._libres.get_nowait()
+            except queue.Empty:
+                break
+        for client in clients:
+            self._deconnecter(client)
+
+    def stats(self):
+        with self._verrou:
+            return {
+                'taille': self.taille,
+                'ouvertes': sum(1 for c in self._clients if c is not None),
+                'occupees': self.occupees,
+                'occupees_max': self.occupees_max,
+                'emprunts': self.emprunts,
+                'attentes': self.attentes,
+                'attente_moyenne_ms': round(self.duree_attente_totale / self.attentes * 1000, 2) if self.attentes else 0.0,
+                'connexions_perdues': self.connexions_perdues
+            }
+
+
+# =================================================================
+# ÉCRITURE ATOMIQUE D'UN BIT
+# =================================================================
+
+def zone_snap7(zone):
+    """Zone d'adresse ('DB', 'I', 'Q', 'M', 'T', 'C') -> (snap7.types.Areas, WordLen des éléments)"""
+    from snap7.types import Areas, WordLen
+
+    area = Areas[ZONES_SNAP7[zone]]
+    if area == Areas.TM:
+        return area, WordLen.Timer
+    if area == Areas.CT:
+        return area, WordLen.Counter
+    return area, WordLen.Byte
+
+
+def item_s7(zone, db, debut, taille, tampon):
+    """
+    S7DataItem d'une plage d'octets d'une zone (read_multi_vars / write_multi_vars)
+    Temporisations et compteurs : 2 octets par élément, adressés par numéro
+    """
+    from snap7.types import S7DataItem, WordLen
+
+    area, word_len = zone_snap7(zone)
+    par_element = 1 if word_len == WordLen.Byte else 2
+    item = S7DataItem()
+    item.Area = ctypes.c_int32(area.value)
+    item.WordLen = ctypes.c_int32(word_len.value)
+    item.Result = ctypes.c_int32(0)
+    item.DBNumber = ctypes.c_int32(db)
+    item.Start = ctypes.c_int32(debut // par_element)
+    item.Amount = ctypes.c_int32(taille // par_element)
+    item.pData = ctypes.cast(ctypes.pointer(tampon), ctypes.POINTER(ctypes.c_uint8))
+    return item
+
+
+def item_bit_s7(zone, db, byte_offset, bit_offset, tampon):
+    """S7DataItem d'un bit seul (WordLen.Bit, adresse en bits) pour write_multi_vars"""
+    from snap7.types import S7DataItem, Areas, WordLen
+
+    item = S7DataItem()
+    item.Area = ctypes.c_int32(Areas[ZONES_SNAP7[zone]].value)
+    item.WordLen = ctypes.c_int32(WordLen.Bit.value)
+    item.Result = ctypes.c_int32(0)
+    item.DBNumber = ctypes.c_int32(db)
+    item.Start = ctypes.c_int32(byte_offset * 8 + bit_offset)
+    item.Amount = ctypes.c_int32(1)
+    item.pData = ctypes.cast(ctypes.pointer(tampon), ctypes.POINTER(ctypes.c_uint8))
+    return item
+
+
+def ecrire_items_s7(client, items):
+    """
+    write_multi_vars avec le résultat de chaque item
+    Client.write_multi_vars (python-snap7) travaille sur une copie des items : un item refusé
+    par la CPU (DB absent, zone protégée) y passe pour écrit
+    Retourne: liste des codes de résultat des items (0 = écrit)
+    """
+    from snap7.types import S7DataItem
+    from snap7.common import check_error
+
+    tableau = (S7DataItem * len(items))(*items)
+    check_error(client._library.Cli_WriteMultiVars(client._pointer, ctypes.byref(tableau), len(items)),
+                context="client")
+    return [item.Result for item in tableau]
+
+
+def lire_zone_s7(client, zone, db, debut, taille):
+    """Lit une plage d'octets d'une zone (db_read pour un bloc de données)"""
+    if isinstance(client, ClientSimule):
+        return client.lire_zone(zone, db, debut, taille)
+    if zone == 'DB':
+        return client.db_read(db, debut, taille)
+    area, _ = zone_snap7(zone)
+    if zone in ('T', 'C'):
+        # read_area compte en éléments de 2 octets pour ces zones
+        return client.read_area(area, db, debut // 2, taille // 2)
+    return client.read_area(area, db, debut, taille)
+
+
+def ecrire_zone_s7(client, zone, db, debut, donnees):
+    """Écrit une plage d'octets dans une zone (db_write pour un bloc de données)"""
+    if isinstance(client, ClientSimule):
+        client.ecrire_zone(zone, db, debut, donnees)
+        return
+    if zone == 'DB':
+        client.db_write(db, debut, donnees)
+        return
+    tampon = ctypes.create_string_buffer(bytes(donnees), len(donnees))
+    resultat, = ecrire_items_s7(client, [item_s7(zone, db, debut, len(donnees), tampon)])
+    if resultat:
+        raise RuntimeError(f"Écriture refusée par la CPU (code {resultat})")
+
+
+def ecrire_bit_s7(client, db, byte_offset, bit_offset, valeur, zone='DB'):
+    """
+    Écrit un seul bit (WordLen.Bit) : la CPU modifie le bit elle-même,
+    sans lecture-modification-écriture de l'octet qui écraserait les autres bits
+    """
+    if isinstance(client, ClientSimule):
+        client.ecrire_bit(zone, db, byte_offset, bit_offset, valeur)
+        return
+    tampon = ctypes.create_string_buffer(bytes([1 if valeur else 0]), 1)
+    resultat, = ecrire_items_s7(client, [item_bit_s7(zone, db, byte_offset, bit_offset, tampon)])
+    if resultat:
+        raise RuntimeError(f"Écriture bit refusée par la CPU (code {resultat})")
+
+
+class VerrousOctets:
+    """Un verrou par octet (db, offset) : sérialise les lectures-modifications-écritures de bits"""
+
+    def __init__(self):
+        self._verrous = {}
+        self._verrou = threading.Lock()
+
+    def __call__(self, db, byte_offset):
+        cle = (db, byte_offset)
+        verrou = self._verrous.get(cle)
+        if verrou is None:
+            with self._verrou:
+                verrou = self._verrous.setdefault(cle, threading.Lock())
+        return verrou
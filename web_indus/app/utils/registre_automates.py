@@ -0,0 +1,351 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.image_tags import image_tags, cle_image, SOURCE_DEFAUT, QUALITE_BAD
+from app.utils.acquisition import MoteurAcquisition
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# REGISTRE DES AUTOMATES - PLUSIEURS CPU PAR INSTALLATION
+# =================================================================
+# Chaque connexion nommée (table Connexion_Automate) a son propre objet
+# automate, donc son pool de connexions S7 et son thread d'acquisition :
+# un automate lent ou déconnecté ne retarde pas les autres. Le nom de la
+# connexion est la source des clés de l'image des tags. Les tags sans
+# connexion restent sur l'automate par défaut (configuration AUTOMATE_IP).
+# Les tags liés à une connexion non chargée (inactive, projet inactif) sont
+# indisponibles : lus en BAD, écritures refusées, jamais envoyés à
+# l'automate par défaut.
+
+LECTURES_PARALLELES_MAX = 8
+
+SOURCE_INDISPONIBLE = 'indisponible'
+STATUT_INDISPONIBLE = "AUTOMATE_INDISPONIBLE"
+ETAT_INDISPONIBLE = 'INDISPONIBLE'
+
+
+class AutomateIndisponible:
+    """Automate des tags liés à une connexion non chargée : aucune lecture ni écriture S7"""
+
+    nom = SOURCE_INDISPONIBLE
+    connected = False
+    en_ligne = False
+    simulation_mode = False
+    ip_address = None
+
+    def lire_tag_par_adresse(self, adresse, type_attendu=None):
+        return None, QUALITE_BAD
+
+    def lire_tags_par_adresses(self, demandes):
+        return [(None, QUALITE_BAD)] * len(demandes)
+
+    def ecrire_tag_par_adresse(self, adresse, valeur, type_attendu=None):
+        return False, STATUT_INDISPONIBLE
+
+    def ecrire_tags_par_adresses(self, ecritures):
+        return [(False, STATUT_INDISPONIBLE)] * len(ecritures)
+
+
+class RegistreAutomates:
+    """Automates nommés et leurs moteurs d'acquisition, indexés par source"""
+
+    def __init__(self, automate_defaut, moteur_defaut, fabrique):
+        self.fabrique = fabrique      # () -> nouvel objet automate
+        self.app = None
+        self.lectures_paralleles_max = LECTURES_PARALLELES_MAX
+
+        self._automates = {SOURCE_DEFAUT: automate_defaut}
+        self._moteurs = {SOURCE_DEFAUT: moteur_defaut}
+        self._connexions = {}         # {source: signature de la configuration appliquée}
+        self._sources_tags = {}       # {id_tag: source}
+        self.indisponible = AutomateIndisponible()
+        self._verrou = threading.RLock()
+        self._executeur = None
+
+    def init_app(self, app):
+        self.app = app
+        self.lectures_paralleles_max = app.config.get('AUTOMATES_LECTURES_PARALLELES_MAX', LECTURES_PARALLELES_MAX)
+
+    # =================================================================
+    # ACCÈS PAR SOURCE
+    # =================================================================
+
+    def automate(self, source=None):
+        """Automate d'une source (automate par défaut si inconnue, AutomateIndisponible si indisponible)"""
+        if source == SOURCE_INDISPONIBLE:
+            return self.indisponible
+        return self._automates.get(source or SOURCE_DEFAUT) or self._automates[SOURCE_DEFAUT]
+
+    def moteur(self, source=None):
+        """Moteur d'acquisition d'une source (moteur par défaut si inconnue, None si indisponible)"""
+        if source == SOURCE_INDISPONIBLE:
+            return None
+        return self._moteurs.get(source or SOURCE_DEFAUT) or self._moteurs[SOURCE_DEFAUT]
+
+    def sources(self):
+        return list(self._automates)
+
+    def source_tag(self, id_tag):
+        """Source (nom de connexion) d'un tag : SOURCE_DEFAUT sans connexion, SOURCE_INDISPONIBLE si elle n'est pas chargée"""
+        return self._sources_tags.get(id_tag, SOURCE_DEFAUT)
+
+    def automate_tag(self, id_tag):
+        return self.automate(self.source_tag(id_tag))
+
+    # =================================================================
+    # CHARGEMENT DEPUIS LA BASE
+    # =================================================================
+
+    def charger_connexions(self):
+        """
+        Synchronise les automates avec les connexions actives des projets actifs
+        Crée, reconfigure ou arrête les automates nommés. Retourne: nombre de connexions chargées
+        """
+        if self.app is None:
+            return 0
+
+        from app.models.modele_tag import ConnexionAutomate, LierConnexionTag, HMIProject
+
+        with self.app.app_context():
+            try:
+                connexions = ConnexionAutomate.query.join(
+                    HMIProject, ConnexionAutomate.id_projet == HMIProject.id_projet
+                ).filter(
+                    HMIProject.actif_projet == True,
+                    ConnexionAutomate.actif == True
+                ).all()
+                actives = {c.id_connexion: c.nom_connexion for c in connexions}
+                connexions = [c for c in connexions if c.nom_connexion not in (SOURCE_DEFAUT, SOURCE_INDISPONIBLE)]
+                noms = {c.id_connexion: c.nom_connexion for c in connexions}
+
+                # Tous les rattachements : un tag d'une connexion non chargée ne retombe pas sur l'automate par défaut
+                sources_tags = {}
+                for lien in LierConnexionTag.query.all():
+                    source = actives.get(lien.id_connexion, SOURCE_INDISPONIBLE)
+                    if source != SOURCE_INDISPONIBLE or lien.id_tag not in sources_tags:
+                        sources_tags[lien.id_tag] = source
+            except Exception as e:
+                logger.error("Erreur chargement des connexions automates: %s", e)
+                return 0
+
+            with self._verrou:
+                for source in [s for s in self._automates if s != SOURCE_DEFAUT and s not in noms.values()]:
+                    self._retirer(source)
+                for connexion in connexions:
+                    self._appliquer(connexion)
+                self._sources_tags = sources_tags
+
+        indisponibles = sum(1 for source in sources_tags.values() if source == SOURCE_INDISPONIBLE)
+        logger.info("Registre automates: %d connexion(s) nommée(s), %d tag(s) rattaché(s) dont %d indisponible(s)",
+                    len(connexions), len(sources_tags), indisponibles)
+        return len(connexions)
+
+    @staticmethod
+    def _signature(connexion):
+        return (connexion.adresse_ip, connexion.rack, connexion.slot, connexion.port,
+                connexion.mode_communication, connexion.taille_pool)
+
+    def _appliquer(self, connexion):
+        """Crée l'automate d'une connexion, ou le reconfigure si ses paramètres ont changé"""
+        source = connexion.nom_connexion
+        signature = self._signature(connexion)
+        automate = self._automates.get(source)
+        moteur = self._moteurs.get(source)
+
+        if automate is not None and self._connexions.get(source) == signature:
+            moteur.id_connexion = connexion.id_connexion
+            return
+
+        if automate is None:
+            automate = self.fabrique()
+            automate.init_app(self.app)
+            moteur = MoteurAcquisition(automate, id_connexion=connexion.id_connexion)
+            self._automates[source] = automate
+            self._moteurs[source] = moteur
+        elif automate.connected:
+            automate.disconnect()
+
+        automate.configurer_connexion(connexion)
+        moteur.id_connexion = connexion.id_connexion
+        self._connexions[source] = signature
+
+        if not moteur.est_actif():
+            moteur.init_app(self.app)
+
+        if connexion.connexion_auto:
+            # Connexion (ping, port, pool) en tâche de fond : ne bloque ni le démarrage ni la requête
+            threading.Thread(target=self._connecter, args=(source,), name=f"connexion-{source}", daemon=True).start()
+
+    def _connecter(self, source):
+        automate = self._automates.get(source)
+        if automate is None:
+            return
+        succes, message = automate.connect()
+        if succes:
+            logger.info("Automate %s connecté: %s", source, message)
+        else:
+            logger.warning("Automate %s non connecté: %s", source, message)
+
+    def _retirer(self, source):
+        moteur = self._moteurs.pop(source, None)
+        automate = self._automates.pop(source, None)
+        self._connexions.pop(source, None)
+        if moteur is not None:
+            moteur.arreter()
+        if automate is not None:
+            automate.disconnect()
+        logger.info("Automate %s retiré du registre", source)
+
+    def charger_tags_configures(self):
+        """Recharge les tags configurés de tous les moteurs (chaque moteur ne garde que les siens)"""
+        return sum(moteur.charger_tags_configures() for moteur in list(self._moteurs.values()))
+
+    def recharger(self):
+        """Après une modification des automates ou des tags : connexions, rattachements et tags scrutés"""
+        self.charger_connexions()
+        return self.charger_tags_configures()
+
+    # =================================================================
+    # LECTURE / ÉCRITURE / ABONNEMENT MULTI-AUTOMATES
+    # =================================================================
+
+    @staticmethod
+    def _grouper(demandes):
+        """{source: [(position, (adresse, ...))]} depuis des demandes (source, adresse, ...)"""
+        groupes = {}
+        for position, (source, *demande) in enumerate(demandes):
+            groupes.setdefault(source or SOURCE_DEFAUT, []).append((position, tuple(demande)))
+        return groupes
+
+    def lire(self, demandes, periode=None):
+        """
+        Lit un lot de variables de plusieurs automates depuis l'image des tags
+        Chaque automate est lu par son propre moteur, les automates en parallèle
+        (l'attente d'une première lecture sur l'un ne retarde pas les autres)
+        demandes: liste de tuples (source, adresse, type_attendu)
+        Retourne: liste d'EntreeImage alignée sur demandes
+        """
+        groupes = self._grouper(demandes)
+        entrees = [None] * len(demandes)
+
+        def lire_source(source):
+            positions = groupes[source]
+            if source == SOURCE_INDISPONIBLE:
+                return positions, self._publier_indisponibles([demande for _, demande in positions])
+            return positions, self.moteur(source).lire([demande for _, demande in positions], periode)
+
+        if len(groupes) <= 1:
+            resultats = [lire_source(source) for source in groupes]
+        else:
+            resultats = list(self._executeur_lectures().map(lire_source, groupes))
+
+        for positions, lues in resultats:
+            for (position, _), entree in zip(positions, lues):
+                entrees[position] = entree
+        return entrees
+
+    def ecrire(self, ecritures):
+        """
+        Écrit un lot de variables sur plusieurs automates, chacun en écriture groupée
+        (octets consécutifs fusionnés), les automates en parallèle
+        ecritures: liste de tuples (source, adresse, valeur, type_attendu)
+        Retourne: liste de tuples (succes, statut) alignée sur ecritures
+        """
+        groupes = self._grouper(ecritures)
+        resultats = [None] * len(ecritures)
+
+        def ecrire_source(source):
+            positions = groupes[source]
+            return positions, self.automate(source).ecrire_tags_par_adresses([e for _, e in positions])
+
+        if len(groupes) <= 1:
+            lots = [ecrire_source(source) for source in groupes]
+        else:
+            lots = list(self._executeur_lectures().map(ecrire_source, groupes))
+
+        for positions, ecrits in lots:
+            for (position, _), resultat in zip(positions, ecrits):
+                resultats[position] = resultat
+        return resultats
+
+    def abonner_lot(self, demandes, periode=None):
+        """Abonne (ou renouvelle) des variables (source, adresse, type) auprès de leur moteur"""
+        for source, positions in self._grouper(demandes).items():
+            if source == SOURCE_INDISPONIBLE:
+                self._publier_indisponibles([demande for _, demande in positions])
+            else:
+                self.moteur(source).abonner_lot([demande for _, demande in positions], periode)
+
+    @staticmethod
+    def _publier_indisponibles(demandes):
+        """Variables d'automates indisponibles : publiées en BAD dans l'image (flux, pages runtime), jamais lues"""
+        cles = [cle_image(SOURCE_INDISPONIBLE, adresse, type_attendu) for adresse, type_attendu in demandes]
+        image_tags.publier_lot([(cle, None, QUALITE_BAD) for cle in cles])
+        return image_tags.lire_lot(cles)
+
+    def _executeur_lectures(self):
+        with self._verrou:
+            if self._executeur is None:
+                self._executeur = ThreadPoolExecutor(
+                    max_workers=self.lectures_paralleles_max, thread_name_prefix='lecture-automates'
+                )
+            return self._executeur
+
+    # =================================================================
+    # ÉTAT
+    # =================================================================
+
+    def statut_connexion(self, sources=None):
+        """
+        Statut de connexion d'un ensemble de sources (page runtime, liste de tags)
+        connected: tous les automates concernés sont connectés et joignables (circuit fermé)
+        """
+        sources = [s or SOURCE_DEFAUT for s in (sources or [SOURCE_DEFAUT])]
+        automates = {source: self.automate(source) for source in sources}
+        principal = automates[sources[0]]
+        statut = {
+            'connected': all(a.en_ligne for a in automates.values()),
+            'etat': self._etat(principal),
+            'simulation_mode': principal.simulation_mode,
+            'ip_address': principal.ip_address
+        }
+        if len(automates) > 1:
+            statut['automates'] = {
+                source: {
+                    'connected': a.en_ligne, 'etat': self._etat(a),
+                    'ip_address': a.ip_address, 'simulation_mode': a.simulation_mode
+                }
+                for source, a in automates.items()
+            }
+        return statut
+
+    def _etat(self, automate):
+        return ETAT_INDISPONIBLE if automate is self.indisponible else automate.superviseur.etat
+
+    def un_connecte(self):
+        return any(automate.connected for automate in list(self._automates.values()))
+
+    def stats(self):
+        return {
+            source: {
+                'connected': automate.connected,
+                'ip_address': automate.ip_address,
+                'simulation_mode': automate.simulation_mode,
+                'acquisition': self.moteur(source).stats(),
+                'pool': automate.pool.stats() if automate.pool else None,
+                'sante': automate.sante.stats(),
+                'supervision': automate.superviseur.stats()
+            }
+            for source, automate in list(self._automates.items())
+        }
+
+    def arreter(self):
+        """Arrête les automates nommés (l'automate par défaut reste géré par init_automate)"""
+        with self._verrou:
+            for source in [s for s in self._automates if s != SOURCE_DEFAUT]:
+                self._retirer(source)
+            if self._executeur is not None:
+                self._executeur.shutdown(wait=False)
+                self._executeur = None
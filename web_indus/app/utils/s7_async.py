@@ -0,0 +1,377 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import queue
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# COUCHE S7 ASYNCHRONE - UNE BOUCLE ASYNCIO POUR TOUS LES AUTOMATES
+# =================================================================
+# snap7 est bloquant : chaque appel client est exécuté dans un exécuteur
+# dédié de quelques threads (S7_THREADS_IO), partagé par tous les
+# automates. Les requêtes en attente sont des coroutines, pas des threads :
+# un processus sert beaucoup d'automates et de lectures concurrentes, le
+# nombre d'échanges simultanés par automate étant borné par la taille de
+# son pool. Les tests réseau (ping, port 102) sont faits en asyncio natif,
+# sans bloquer de thread, et en parallèle.
+
+THREADS_IO_DEFAUT = 16
+PORT_S7 = 102
+TIMEOUT_RESEAU_S = 1.0
+SCAN_CONCURRENCE_DEFAUT = 128
+SCAN_TIMEOUT_S = 0.5
+SCAN_ADRESSES_MAX = 1024         # Un /22 au plus par scan
+TIMEOUT_IDENTIFICATION_S = 2.0
+EMPLACEMENTS_CPU = ((0, 1), (0, 2), (0, 0))   # (rack, slot) : S7-1200/1500, S7-300, autres
+
+
+class BoucleAsynchrone:
+    """Boucle asyncio dans un thread de fond et exécuteur des appels snap7 bloquants"""
+
+    def __init__(self, threads_io=THREADS_IO_DEFAUT):
+        self.threads_io = threads_io
+        self._boucle = None
+        self._thread = None
+        self._executeur = None
+        self._verrou = threading.Lock()
+
+    def init_app(self, app):
+        self.threads_io = app.config.get('S7_THREADS_IO', THREADS_IO_DEFAUT)
+
+    @property
+    def executeur(self):
+        """Threads des appels snap7 bloquants, créés à la première utilisation"""
+        with self._verrou:
+            if self._executeur is None:
+                self._executeur = ThreadPoolExecutor(max_workers=self.threads_io, thread_name_prefix='s7-io')
+            return self._executeur
+
+    @property
+    def boucle(self):
+        """Boucle démarrée à la première utilisation"""
+        executeur = self.executeur
+        with self._verrou:
+            if self._boucle is None or not self._thread.is_alive():
+                self._boucle = asyncio.new_event_loop()
+                self._boucle.set_default_executor(executeur)
+                self._thread = threading.Thread(target=self._boucle.run_forever, name='s7-asyncio', daemon=True)
+                self._thread.start()
+            return self._boucle
+
+    def executer(self, coroutine, timeout=None):
+        """Exécute une coroutine sur la boucle depuis du code synchrone (route Flask). Retourne son résultat"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.boucle).result(timeout)
+
+    def iterer(self, generateur):
+        """
+        Parcourt un générateur asynchrone depuis du code synchrone (réponse Flask en flux)
+        Les éléments sont rendus dès qu'ils sont produits ; si le consommateur s'arrête
+        (client déconnecté), le générateur est annulé
+        """
+        file = queue.Queue()
+        fin = object()
+
+        async def pomper():
+            try:
+                async for element in generateur:
+                    file.put((element, None))
+            except Exception as e:
+                file.put((fin, e))
+                return
+            file.put((fin, None))
+
+        futur = asyncio.run_coroutine_threadsafe(pomper(), self.boucle)
+        try:
+            while True:
+                element, erreur = file.get()
+                if erreur is not None:
+                    raise erreur
+                if element is fin:
+                    return
+                yield element
+        finally:
+            futur.cancel()
+
+    async def en_thread(self, fonction, *args, **kwargs):
+        """Appel bloquant (snap7) dans l'exécuteur S7, attendu sans bloquer la boucle"""
+        return await asyncio.get_running_loop().run_in_executor(self.executeur, partial(fonction, *args, **kwargs))
+
+    def arreter(self):
+        with self._verrou:
+            if self._boucle is not None:
+                self._boucle.call_soon_threadsafe(self._boucle.stop)
+                self._thread.join(timeout=5)
+            if self._executeur is not None:
+                self._executeur.shutdown(wait=False)
+            self._boucle = None
+            self._thread = None
+            self._executeur = None
+
+
+boucle_s7 = BoucleAsynchrone()
+
+
+# =================================================================
+# TESTS RÉSEAU NATIFS ASYNCIO
+# =================================================================
+
+async def tester_port_async(ip_address, port=PORT_S7, timeout=TIMEOUT_RESEAU_S):
+    """Port TCP ouvert (ISO-on-TCP : 102) : connexion établie dans le délai"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip_address, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def ping_async(ip_address, timeout=TIMEOUT_RESEAU_S):
+    """Ping ICMP via la commande système, sans bloquer de thread pendant l'attente"""
+    secondes = max(1, int(round(timeout)))
+    if os.name == 'nt':
+        cmd = ['ping', '-n', '1', '-w', str(secondes * 1000), ip_address]
+    else:
+        cmd = ['ping', '-c', '1', '-W', str(secondes), ip_address]
+
+    try:
+        processus = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+    except OSError as e:
+        logger.warning("Erreur ping: %s", e)
+        return False
+
+    try:
+        return await asyncio.wait_for(processus.wait(), secondes + 2) == 0
+    except asyncio.TimeoutError:
+        processus.kill()
+        return False
+
+
+async def tester_hote_async(ip_address, port=PORT_S7, timeout=TIMEOUT_RESEAU_S):
+    """Ping et port S7 testés en parallèle. Retourne: (ping, port_ouvert)"""
+    ping, port_ouvert = await asyncio.gather(
+        ping_async(ip_address, timeout),
+        tester_port_async(ip_address, port, timeout)
+    )
+    return ping, port_ouvert
+
+
+# =================================================================
+# SCAN RÉSEAU : SONDES TCP PARALLÈLES ET IDENTIFICATION SZL
+# =================================================================
+
+def plage_adresses(base_ip, debut, fin):
+    """Adresses IPv4 base_ip.debut à base_ip.fin (ValueError si invalide)"""
+    adresses = [f"{base_ip}.{i}" for i in range(debut, fin + 1)]
+    for adresse in adresses:
+        ipaddress.IPv4Address(adresse)
+    return adresses
+
+
+def adresses_reseau(reseau):
+    """Hôtes d'un réseau CIDR ('192.168.0.0/24'). ValueError si invalide ou trop grand"""
+    hotes = [str(hote) for hote in ipaddress.IPv4Network(reseau, strict=False).hosts()]
+    if len(hotes) > SCAN_ADRESSES_MAX:
+        raise ValueError(f"{len(hotes)} adresses (maximum {SCAN_ADRESSES_MAX})")
+    return hotes
+
+
+def identifier_cpu(ip_address, port=PORT_S7, timeout=TIMEOUT_IDENTIFICATION_S):
+    """
+    Identifie une CPU S7 par lecture SZL (0x001C : module et station, 0x0011 : référence)
+    Appel snap7 bloquant. Retourne: dict, ou None si aucun emplacement ne répond en S7
+    """
+    import snap7
+    from snap7.types import PingTimeout, SendTimeout, RecvTimeout
+
+    delai_ms = int(timeout * 1000)
+    for rack, slot in EMPLACEMENTS_CPU:
+        client = snap7.client.Client()
+        for parametre in (PingTimeout, SendTimeout, RecvTimeout):
+            client.set_param(parametre, delai_ms)
+        try:
+            client.connect(ip_address, rack, slot, port)
+            info = client.get_cpu_info()
+            identification = {
+                'rack': rack,
+                'slot': slot,
+                'module': info.ModuleTypeName.decode(errors='replace').strip(),
+                'nom_module': info.ModuleName.decode(errors='replace').strip(),
+                'nom_station': info.ASName.decode(errors='replace').strip(),
+                'numero_serie': info.SerialNumber.decode(errors='replace').strip()
+            }
+            try:
+                code = client.get_order_code()
+                identification['reference'] = code.OrderCode.decode(errors='replace').strip()
+                identification['version'] = f"V{code.V1}.{code.V2}.{code.V3}"
+            except Exception:
+                pass
+            try:
+                identification['etat'] = client.get_cpu_state()
+            except Exception:
+                pass
+            return identification
+        except Exception as e:
+            logger.debug("Identification %s (rack %s, slot %s) impossible: %s", ip_address, rack, slot, e)
+        finally:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+    return None
+
+
+async def sonder_hote(adresse, port=PORT_S7, timeout=SCAN_TIMEOUT_S, ping=False, identifier=False, boucle=None):
+    """
+    Sonde un hôte : connexion TCP au port S7, ping ICMP en parallèle si demandé,
+    identification SZL si le port est ouvert et si demandée
+    Retourne: {ip, s7_port, ping, identification}
+    """
+    if ping:
+        ping_ok, port_ouvert = await asyncio.gather(
+            ping_async(adresse, timeout),
+            tester_port_async(adresse, port, timeout)
+        )
+    else:
+        ping_ok, port_ouvert = None, await tester_port_async(adresse, port, timeout)
+
+    resultat = {"ip": adresse, "s7_port": port_ouvert, "ping": ping_ok}
+    if identifier and port_ouvert:
+        try:
+            resultat["identification"] = await (boucle or boucle_s7).en_thread(identifier_cpu, adresse, port)
+        except ImportError:
+            resultat["identification"] = None
+    return resultat
+
+
+async def scanner_reseau_flux(adresses, port=PORT_S7, timeout=SCAN_TIMEOUT_S,
+                              concurrence=SCAN_CONCURRENCE_DEFAUT, ping=False, identifier=False):
+    """
+    Générateur asynchrone : sonde toutes les adresses en parallèle (au plus `concurrence`
+    connexions en cours) et rend chaque hôte qui répond dès que sa sonde se termine
+    """
+    limite = asyncio.Semaphore(max(1, concurrence))
+
+    async def sonder(adresse):
+        async with limite:
+            return await sonder_hote(adresse, port, timeout, ping, identifier)
+
+    taches = [asyncio.ensure_future(sonder(adresse)) for adresse in adresses]
+    try:
+        for prochaine in asyncio.as_completed(taches):
+            resultat = await prochaine
+            if resultat["s7_port"] or resultat["ping"]:
+                yield resultat
+    finally:
+        # Consommateur parti (client déconnecté) : sondes restantes annulées
+        for tache in taches:
+            tache.cancel()
+
+
+async def scanner_reseau_async(adresses, port=PORT_S7, timeout=SCAN_TIMEOUT_S,
+                               concurrence=SCAN_CONCURRENCE_DEFAUT, ping=False, identifier=False):
+    """Scan complet. Retourne: liste des hôtes qui répondent, dans l'ordre des adresses"""
+    rangs = {adresse: rang for rang, adresse in enumerate(adresses)}
+    trouves = [
+        resultat async for resultat in scanner_reseau_flux(adresses, port, timeout, concurrence, ping, identifier)
+    ]
+    return sorted(trouves, key=lambda resultat: rangs[resultat["ip"]])
+
+
+# =================================================================
+# PILOTE ASYNCHRONE D'UN AUTOMATE
+# =================================================================
+
+class PiloteS7Async:
+    """
+    API lire_* / ecrire_* d'un AutomateSiemensS7Complete en coroutines
+    Au plus taille_pool appels simultanés par automate : les autres attendent
+    dans la boucle sans occuper de thread de l'exécuteur
+    """
+
+    def __init__(self, automate, boucle=None):
+        self.automate = automate
+        self.boucle = boucle or boucle_s7
+        self._limite = None
+
+    @property
+    def limite(self):
+        if self._limite is None:
+            self._limite = asyncio.Semaphore(max(1, self.automate.taille_pool))
+        return self._limite
+
+    async def _appel(self, methode, *args):
+        async with self.limite:
+            return await self.boucle.en_thread(getattr(self.automate, methode), *args)
+
+    # Lectures / écritures unitaires
+    async def lire_bit(self, db, byte_offset, bit_offset):
+        return await self._appel('lire_bit', db, byte_offset, bit_offset)
+
+    async def lire_word(self, db, word_offset):
+        return await self._appel('lire_word', db, word_offset)
+
+    async def lire_dword(self, db, dword_offset):
+        return await self._appel('lire_dword', db, dword_offset)
+
+    async def lire_real(self, db, real_offset):
+        return await self._appel('lire_real', db, real_offset)
+
+    async def ecrire_bit(self, db, byte_offset, bit_offset, valeur):
+        return await self._appel('ecrire_bit', db, byte_offset, bit_offset, valeur)
+
+    async def ecrire_word(self, db, word_offset, valeur):
+        return await self._appel('ecrire_word', db, word_offset, valeur)
+
+    async def ecrire_dword(self, db, dword_offset, valeur):
+        return await self._appel('ecrire_dword', db, dword_offset, valeur)
+
+    async def ecrire_real(self, db, real_offset, valeur):
+        return await self._appel('ecrire_real', db, real_offset, valeur)
+
+    # Par adresse S7
+    async def lire_tag_par_adresse(self, adresse, type_attendu=None):
+        return await self._appel('lire_tag_par_adresse', adresse, type_attendu)
+
+    async def ecrire_tag_par_adresse(self, adresse, valeur, type_attendu=None):
+        return await self._appel('ecrire_tag_par_adresse', adresse, valeur, type_attendu)
+
+    async def lire_tags_par_adresses(self, demandes):
+        return await self._appel('lire_tags_par_adresses', demandes)
+
+    async def get_status(self):
+        """Statut de get_status(), ping et port S7 testés en parallèle en asyncio natif"""
+        automate = self.automate
+        status = automate.get_status(verifier_reseau=False)
+        status["timestamp"] = datetime.now().isoformat()
+
+        if not automate.simulation_mode and automate.ip_address:
+            status["network_ping"], status["s7_port_open"] = await tester_hote_async(
+                automate.ip_address, automate.port, TIMEOUT_RESEAU_S
+            )
+        return status
+
+
+_pilotes = weakref.WeakKeyDictionary()   # Libéré avec l'automate (retiré du registre)
+_verrou_pilotes = threading.Lock()
+
+
+def pilote_async(automate):
+    """Pilote asynchrone (unique) d'un automate"""
+    with _verrou_pilotes:
+        pilote = _pilotes.get(automate)
+        if pilote is None:
+            pilote = _pilotes[automate] = PiloteS7Async(automate)
+        return pilote
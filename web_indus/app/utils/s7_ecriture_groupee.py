@@ -0,0 +1,180 @@
+from app.utils.s7_lecture_groupee import TAILLE_PDU_DEFAUT, MAX_ITEMS_MULTI_VARS, encoder_valeur
+
+# =================================================================
+# PLANIFICATION DES ÉCRITURES GROUPÉES S7
+# =================================================================
+# Un lot d'écritures (recette, changement de consignes en masse) est
+# ramené à des octets à écrire par zone et par DB : les écritures d'un même
+# octet sont fusionnées dans l'ordre du lot, les bits d'un même octet forment
+# un masque (une seule lecture-modification-écriture par octet, aucune si les
+# 8 bits sont écrits). Les octets consécutifs forment des plages, sans combler
+# les trous (ce serait écraser des octets que le lot ne touche pas), réparties
+# dans des requêtes write_multi_vars qui tiennent dans une PDU.
+
+# En-têtes S7 d'une requête d'écriture (en-tête + fonction + nombre d'items)
+ENTETE_REQUETE_ECRITURE = 12
+
+# Par item : spécification de l'adresse (12 octets) + en-tête des données (4 octets)
+TAILLE_ITEM_ECRITURE = 16
+
+
+class EcritureS7:
+    """Écriture d'un lot : octets codés, ou un bit (donnees None)"""
+
+    __slots__ = ('index', 'zone', 'db', 'debut', 'donnees', 'bit', 'valeur_bit')
+
+    def __init__(self, index, zone, db, debut, donnees=None, bit=None, valeur_bit=False):
+        self.index = index
+        self.zone = zone
+        self.db = db
+        self.debut = debut
+        self.donnees = donnees
+        self.bit = bit
+        self.valeur_bit = valeur_bit
+
+
+class PlageEcriture:
+    """Octets consécutifs d'une zone (d'un DB) à écrire, ou un bit seul (bit non None)"""
+
+    __slots__ = ('zone', 'db', 'debut', 'donnees', 'bit', 'index')
+
+    def __init__(self, zone, db, debut, donnees, bit=None):
+        self.zone = zone
+        self.db = db
+        self.debut = debut
+        self.donnees = donnees
+        self.bit = bit
+        self.index = set()   # Écritures du lot portées par la plage
+
+    @property
+    def taille(self):
+        return len(self.donnees)
+
+    def __repr__(self):
+        zone = f"DB{self.db}" if self.zone == 'DB' else self.zone
+        if self.bit is not None:
+            return f"<PlageEcriture {zone} bit {self.debut}.{self.bit}>"
+        return f"<PlageEcriture {zone} [{self.debut}:{self.debut + self.taille}] {len(self.index)} écr.>"
+
+
+def ecriture_depuis_adresse(index, adresse, valeur, type_attendu=None):
+    """Construit une EcritureS7 depuis une AdresseS7 compilée (ValueError si la valeur ne se code pas)"""
+    type_ecrit = adresse.type_lu(type_attendu)
+    if type_ecrit == 'BOOL':
+        return EcritureS7(index, adresse.zone, adresse.db, adresse.octet, bit=adresse.bit, valeur_bit=bool(valeur))
+    return EcritureS7(index, adresse.zone, adresse.db, adresse.debut,
+                      donnees=encoder_valeur(type_ecrit, valeur, adresse.largeur))
+
+
+def taille_utile_ecriture(taille_pdu):
+    """Nombre d'octets de données d'un item seul dans une requête d'écriture (pair : T et C)"""
+    utile = (taille_pdu or TAILLE_PDU_DEFAUT) - ENTETE_REQUETE_ECRITURE - TAILLE_ITEM_ECRITURE
+    return max(2, utile - utile % 2)
+
+
+def fusionner_ecritures(ecritures):
+    """
+    Ramène un lot d'écritures à des octets, dans l'ordre du lot (la dernière écriture d'un octet l'emporte)
+    Retourne: (octets {(zone, db, octet): valeur}, masques {(zone, db, octet): [bits à 1, bits à 0]},
+               index {(zone, db, octet): {index des écritures}})
+    Un octet des masques n'est écrit qu'en partie : il doit être relu (ou écrit bit à bit)
+    """
+    octets = {}
+    masques = {}
+    index = {}
+
+    for ecriture in ecritures:
+        if ecriture.bit is None:
+            for decalage, valeur in enumerate(ecriture.donnees):
+                cle = (ecriture.zone, ecriture.db, ecriture.debut + decalage)
+                octets[cle] = valeur
+                masques.pop(cle, None)
+                index.setdefault(cle, set()).add(ecriture.index)
+            continue
+
+        cle = (ecriture.zone, ecriture.db, ecriture.debut)
+        bit = 1 << ecriture.bit
+        index.setdefault(cle, set()).add(ecriture.index)
+        if cle in octets:
+            octets[cle] = octets[cle] | bit if ecriture.valeur_bit else octets[cle] & ~bit
+            continue
+
+        masque = masques.setdefault(cle, [0, 0])
+        if ecriture.valeur_bit:
+            masque[0] |= bit
+            masque[1] &= ~bit
+        else:
+            masque[1] |= bit
+            masque[0] &= ~bit
+        if masque[0] | masque[1] == 0xFF:
+            # Les 8 bits sont écrits : l'octet est connu sans le relire
+            octets[cle] = masque[0]
+            del masques[cle]
+
+    return octets, masques, index
+
+
+def appliquer_masques(octets, masques, lus):
+    """Octets relus {cle: valeur} + masques de bits -> octets complets à écrire"""
+    for cle, (a_un, a_zero) in masques.items():
+        octets[cle] = (lus[cle] | a_un) & ~a_zero & 0xFF
+
+
+def plages_ecriture(octets, index, masques=None, taille_max=None):
+    """
+    Regroupe les octets consécutifs d'une même zone et d'un même DB en plages
+    masques: octets écrits bit à bit (écriture de bit seul), un item par bit
+    Retourne: liste de PlageEcriture triées par (zone, db, debut)
+    """
+    if taille_max is None:
+        taille_max = taille_utile_ecriture(TAILLE_PDU_DEFAUT)
+
+    plages = []
+    plage = None
+    for cle in sorted(octets):
+        zone, db, octet = cle
+        if (plage is None or plage.zone != zone or plage.db != db
+                or octet != plage.debut + plage.taille or plage.taille >= taille_max):
+            plage = PlageEcriture(zone, db, octet, bytearray())
+            plages.append(plage)
+        plage.donnees.append(octets[cle])
+        plage.index |= index[cle]
+
+    for cle, (a_un, a_zero) in sorted((masques or {}).items()):
+        zone, db, octet = cle
+        for bit in range(8):
+            if (a_un | a_zero) & (1 << bit):
+                plage = PlageEcriture(zone, db, octet, bytes([1 if a_un & (1 << bit) else 0]), bit)
+                plage.index = index[cle]
+                plages.append(plage)
+
+    return plages
+
+
+def repartir_ecritures(plages, taille_pdu=TAILLE_PDU_DEFAUT, max_items=MAX_ITEMS_MULTI_VARS):
+    """
+    Répartit les plages dans des requêtes write_multi_vars
+    Chaque requête respecte la limite d'items et la taille de PDU
+    Retourne: liste de listes de PlageEcriture
+    """
+    budget = (taille_pdu or TAILLE_PDU_DEFAUT) - ENTETE_REQUETE_ECRITURE
+    requetes = []
+    courante = []
+    taille_requete = 0
+
+    for plage in plages:
+        # Un octet de bourrage suit les données de longueur impaire
+        cout = TAILLE_ITEM_ECRITURE + plage.taille + (plage.taille % 2)
+
+        if courante and (len(courante) >= max_items or taille_requete + cout > budget):
+            requetes.append(courante)
+            courante = []
+            taille_requete = 0
+
+        courante.append(plage)
+        taille_requete += cout
+
+    if courante:
+        requetes.append(courante)
+
+    return requetes
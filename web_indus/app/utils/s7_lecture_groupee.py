@@ -0,0 +1,262 @@
+import struct
+from datetime import datetime
+
+# =================================================================
+# PLANIFICATION DES LECTURES GROUPÉES S7
+# =================================================================
+# Regroupe les variables d'une même zone (DB, entrées, sorties, mémentos,
+# temporisations, compteurs) en plages contiguës, puis répartit ces plages
+# dans des requêtes read_multi_vars qui tiennent dans une PDU : un lot
+# mêlant plusieurs zones reste groupé zone par zone.
+
+# Octets "inutiles" tolérés entre deux variables pour les lire d'un seul bloc
+ECART_MAX_FUSION = 16
+
+# Taille de PDU négociée par défaut (S7-1200). Les S7-300/400/1500 négocient 480 ou 960.
+TAILLE_PDU_DEFAUT = 240
+
+# Limite snap7 du nombre d'items par requête read_multi_vars
+MAX_ITEMS_MULTI_VARS = 20
+
+# En-têtes S7 d'une réponse de lecture (en-tête + paramètres)
+ENTETE_REPONSE_S7 = 18
+
+# En-tête de chaque item dans une réponse read_var
+ENTETE_ITEM_REPONSE = 4
+
+# Taille d'un item dans une requête read_var
+TAILLE_ITEM_REQUETE = 12
+
+TAILLES_TYPES = {
+    'BOOL': 1,
+    'BYTE': 1,
+    'INT': 2,
+    'WORD': 2,
+    'DINT': 4,
+    'DWORD': 4,
+    'REAL': 4,
+    'LREAL': 8,
+    'DTL': 12,
+    'TIMER': 2,
+    'COUNTER': 2
+}
+
+# Base de temps S5TIME (bits 12-13) -> millisecondes
+BASES_S5TIME_MS = (10, 100, 1000, 10000)
+
+
+class VariableLecture:
+    """Variable à lire dans une plage groupée"""
+
+    __slots__ = ('index', 'db', 'debut', 'taille', 'type_donnee', 'bit', 'zone')
+
+    def __init__(self, index, db, debut, taille, type_donnee, bit=None, zone='DB'):
+        self.index = index
+        self.db = db
+        self.debut = debut
+        self.taille = taille
+        self.type_donnee = type_donnee
+        self.bit = bit
+        self.zone = zone
+
+
+class PlageLecture:
+    """Plage contiguë d'octets d'une zone (d'un DB) couvrant une ou plusieurs variables"""
+
+    __slots__ = ('db', 'debut', 'fin', 'variables', 'zone')
+
+    def __init__(self, db, debut, fin, zone='DB'):
+        self.db = db
+        self.debut = debut
+        self.fin = fin
+        self.zone = zone
+        self.variables = []
+
+    @property
+    def taille(self):
+        return self.fin - self.debut
+
+    def __repr__(self):
+        zone = f"DB{self.db}" if self.zone == 'DB' else self.zone
+        return f"<PlageLecture {zone} [{self.debut}:{self.fin}] {len(self.variables)} var>"
+
+
+def variable_depuis_adresse(index, adresse, type_attendu=None):
+    """Construit une VariableLecture depuis une AdresseS7 compilée (voir compiler_adresse)"""
+    return VariableLecture(index, adresse.db, adresse.debut, adresse.largeur,
+                           adresse.type_lu(type_attendu), adresse.bit, adresse.zone)
+
+
+def taille_utile_pdu(taille_pdu):
+    """Nombre d'octets de données transportables dans une réponse"""
+    return max(1, (taille_pdu or TAILLE_PDU_DEFAUT) - ENTETE_REPONSE_S7 - ENTETE_ITEM_REPONSE)
+
+
+def planifier_plages(variables, ecart_max=ECART_MAX_FUSION, taille_max=None):
+    """
+    Fusionne les variables adjacentes ou chevauchantes d'une même zone et d'un même DB
+    variables: liste de VariableLecture
+    Retourne: liste de PlageLecture triées par (zone, db, debut)
+    """
+    if taille_max is None:
+        taille_max = taille_utile_pdu(TAILLE_PDU_DEFAUT)
+
+    plages = []
+    plage = None
+
+    for variable in sorted(variables, key=lambda v: (v.zone, v.db, v.debut, -v.taille)):
+        fin_variable = variable.debut + variable.taille
+
+        if (plage is not None
+                and plage.zone == variable.zone
+                and plage.db == variable.db
+                and variable.debut <= plage.fin + ecart_max
+                and max(plage.fin, fin_variable) - plage.debut <= taille_max):
+            plage.fin = max(plage.fin, fin_variable)
+        else:
+            plage = PlageLecture(variable.db, variable.debut, fin_variable, variable.zone)
+            plages.append(plage)
+
+        plage.variables.append(variable)
+
+    return plages
+
+
+def repartir_multi_vars(plages, taille_pdu=TAILLE_PDU_DEFAUT, max_items=MAX_ITEMS_MULTI_VARS):
+    """
+    Répartit les plages dans des requêtes read_multi_vars
+    Chaque requête respecte la limite d'items et la taille de PDU (requête et réponse)
+    Retourne: liste de listes de PlageLecture
+    """
+    budget = (taille_pdu or TAILLE_PDU_DEFAUT) - ENTETE_REPONSE_S7
+    requetes = []
+    courante = []
+    taille_reponse = 0
+    taille_requete = 0
+
+    for plage in plages:
+        # Un octet de bourrage suit chaque item de longueur impaire
+        cout_reponse = ENTETE_ITEM_REPONSE + plage.taille + (plage.taille % 2)
+
+        if courante and (len(courante) >= max_items
+                         or taille_reponse + cout_reponse > budget
+                         or taille_requete + TAILLE_ITEM_REQUETE > budget):
+            requetes.append(courante)
+            courante = []
+            taille_reponse = 0
+            taille_requete = 0
+
+        courante.append(plage)
+        taille_reponse += cout_reponse
+        taille_requete += TAILLE_ITEM_REQUETE
+
+    if courante:
+        requetes.append(courante)
+
+    return requetes
+
+
+# =================================================================
+# CODAGE DES TYPES S7 (BIG-ENDIAN)
+# =================================================================
+
+def bcd_vers_entier(valeur):
+    """3 chiffres BCD (12 bits de poids faible) -> entier"""
+    return ((valeur >> 8) & 0xF) * 100 + ((valeur >> 4) & 0xF) * 10 + (valeur & 0xF)
+
+
+def entier_vers_bcd(valeur):
+    """Entier 0-999 -> 3 chiffres BCD"""
+    if not 0 <= valeur <= 999:
+        raise ValueError(f"Valeur hors limites (0 à 999): {valeur}")
+    return ((valeur // 100) << 8) | (((valeur // 10) % 10) << 4) | (valeur % 10)
+
+
+def decoder_s5time(mot):
+    """S5TIME -> durée en millisecondes"""
+    return bcd_vers_entier(mot) * BASES_S5TIME_MS[(mot >> 12) & 0x3]
+
+
+def encoder_s5time(duree_ms):
+    """Durée en millisecondes -> S5TIME, avec la base de temps la plus fine possible"""
+    duree_ms = int(duree_ms)
+    for base, pas in enumerate(BASES_S5TIME_MS):
+        if duree_ms <= 999 * pas:
+            return (base << 12) | entier_vers_bcd(duree_ms // pas)
+    raise ValueError(f"Durée S5TIME hors limites (9990 s max): {duree_ms} ms")
+
+
+def decoder_dtl(buffer, decalage):
+    """DTL (année, mois, jour, jour de semaine, heure, minute, seconde, nanosecondes) -> ISO 8601"""
+    annee, mois, jour, _, heure, minute, seconde, nanosecondes = struct.unpack_from('>HBBBBBBI', buffer, decalage)
+    return datetime(annee, mois, jour, heure, minute, seconde, nanosecondes // 1000).isoformat()
+
+
+def encoder_dtl(valeur):
+    """datetime ou texte ISO 8601 -> DTL"""
+    horodatage = valeur if isinstance(valeur, datetime) else datetime.fromisoformat(str(valeur))
+    jour_semaine = horodatage.isoweekday() % 7 + 1   # DTL : 1 = dimanche
+    return struct.pack('>HBBBBBBI', horodatage.year, horodatage.month, horodatage.day, jour_semaine,
+                       horodatage.hour, horodatage.minute, horodatage.second, horodatage.microsecond * 1000)
+
+
+def decoder_variable(buffer, decalage, variable):
+    """Décode une variable depuis le tampon de sa plage (big-endian S7)"""
+    type_donnee = variable.type_donnee
+    if type_donnee == 'BOOL':
+        return bool(buffer[decalage] & (1 << variable.bit))
+    elif type_donnee == 'INT':
+        return int.from_bytes(buffer[decalage:decalage + 2], byteorder='big', signed=True)
+    elif type_donnee == 'DINT':
+        return int.from_bytes(buffer[decalage:decalage + 4], byteorder='big', signed=True)
+    elif type_donnee == 'REAL':
+        return struct.unpack_from('>f', buffer, decalage)[0]
+    elif type_donnee in ('BYTE', 'WORD', 'DWORD'):
+        return int.from_bytes(buffer[decalage:decalage + variable.taille], byteorder='big', signed=False)
+    elif type_donnee == 'LREAL':
+        return struct.unpack_from('>d', buffer, decalage)[0]
+    elif type_donnee == 'STRING':
+        longueur = min(buffer[decalage + 1], buffer[decalage], variable.taille - 2)
+        return bytes(buffer[decalage + 2:decalage + 2 + longueur]).decode('latin-1')
+    elif type_donnee == 'DTL':
+        return decoder_dtl(buffer, decalage)
+    elif type_donnee == 'TIMER':
+        return decoder_s5time(int.from_bytes(buffer[decalage:decalage + 2], byteorder='big'))
+    elif type_donnee == 'COUNTER':
+        return bcd_vers_entier(int.from_bytes(buffer[decalage:decalage + 2], byteorder='big'))
+    raise ValueError(f"Type non supporté: {type_donnee}")
+
+
+def encoder_valeur(type_donnee, valeur, taille):
+    """
+    Code une valeur à écrire (hors BOOL, écrit bit à bit)
+    taille: largeur de l'adresse en octets (longueur maximale + 2 pour une STRING)
+    Retourne: bytes
+    """
+    if type_donnee in ('INT', 'DINT'):
+        return int(valeur).to_bytes(taille, byteorder='big', signed=True)
+    elif type_donnee in ('BYTE', 'WORD', 'DWORD'):
+        return int(valeur).to_bytes(taille, byteorder='big', signed=False)
+    elif type_donnee == 'REAL':
+        return struct.pack('>f', float(valeur))
+    elif type_donnee == 'LREAL':
+        return struct.pack('>d', float(valeur))
+    elif type_donnee == 'STRING':
+        # L'octet de longueur maximale est écrit tel que déclaré dans l'adresse
+        texte = str(valeur).encode('latin-1', errors='replace')[:taille - 2]
+        return bytes([taille - 2, len(texte)]) + texte
+    elif type_donnee == 'DTL':
+        return encoder_dtl(valeur)
+    elif type_donnee == 'TIMER':
+        return encoder_s5time(valeur).to_bytes(2, byteorder='big')
+    elif type_donnee == 'COUNTER':
+        return entier_vers_bcd(int(valeur)).to_bytes(2, byteorder='big')
+    raise ValueError(f"Type non supporté: {type_donnee}")
+
+
+def decoder_plage(plage, buffer):
+    """Décode toutes les variables d'une plage lue. Retourne: dict {index: valeur}"""
+    return {
+        variable.index: decoder_variable(buffer, variable.debut - plage.debut, variable)
+        for variable in plage.variables
+    }
@@ -0,0 +1,213 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from datetime import datetime
+
+from app.utils.s7_async import boucle_s7, ping_async, tester_port_async
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# SANTÉ DES CONNEXIONS AUTOMATES - SONDES EN TÂCHE DE FOND
+# =================================================================
+# get_status() était appelé à chaque rafraîchissement runtime et par le
+# healthcheck : en mode réel, chaque appel lançait un ping et ouvrait une
+# socket vers le port 102. Un thread unique sonde désormais tous les
+# automates à période fixe (en parallèle via la couche asynchrone) ;
+# get_status() ne fait que recopier le dernier instantané. Les échanges S7
+# du pool alimentent en continu l'histogramme de latence, l'horodatage du
+# dernier échange réussi et le compteur de reconnexions.
+
+PERIODE_SONDE_DEFAUT_S = 10.0
+TIMEOUT_SONDE_S = 1.0
+BORNES_LATENCE_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+class HistogrammeLatence:
+    """Histogramme cumulatif de latences à classes fixes (en ms), sans conservation des mesures"""
+
+    def __init__(self, bornes=BORNES_LATENCE_MS):
+        self.bornes = tuple(bornes)
+        self.compteurs = [0] * (len(self.bornes) + 1)   # Dernière classe : au-delà de la dernière borne
+        self.total = 0
+        self.somme_ms = 0.0
+        self.max_ms = 0.0
+
+    def ajouter(self, duree_s):
+        duree_ms = duree_s * 1000
+        self.compteurs[bisect.bisect_left(self.bornes, duree_ms)] += 1
+        self.total += 1
+        self.somme_ms += duree_ms
+        self.max_ms = max(self.max_ms, duree_ms)
+
+    def quantile(self, q):
+        """Borne haute de la classe contenant le quantile q, plafonnée au maximum observé (None si vide)"""
+        if not self.total:
+            return None
+        rang = q * self.total
+        cumul = 0
+        for position, compteur in enumerate(self.compteurs):
+            cumul += compteur
+            if cumul >= rang:
+                borne = self.bornes[position] if position < len(self.bornes) else self.max_ms
+                return round(min(borne, self.max_ms), 2)
+        return round(self.max_ms, 2)
+
+    def stats(self):
+        return {
+            'total': self.total,
+            'moyenne_ms': round(self.somme_ms / self.total, 2) if self.total else None,
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': self.quantile(0.50),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'classes': {
+                (f"<={borne}" if position < len(self.bornes) else f">{self.bornes[-1]}"): compteur
+                for position, (borne, compteur) in enumerate(zip(self.bornes + (self.bornes[-1],), self.compteurs))
+            }
+        }
+
+
+class SanteConnexion:
+    """État de santé d'un automate : échanges S7 mesurés par le pool et dernière sonde réseau"""
+
+    def __init__(self):
+        self.latences = HistogrammeLatence()
+        self.echanges_ok = 0
+        self.echanges_erreur = 0
+        self.dernier_succes = None        # datetime du dernier échange S7 réussi
+        self.derniere_erreur = None       # (datetime, message)
+        self.connexions = 0               # connect() réussis
+        self.reconnexions = 0             # connect() après une première connexion + connexions remplacées dans le pool
+        self.sonde = {}                   # Dernière sonde réseau (ping, port S7, latence)
+        self._verrou = threading.Lock()
+
+    # Appelés par le pool et par l'automate (chemin critique : compteurs seulement)
+
+    def echange(self, duree_s, erreur=None):
+        with self._verrou:
+            self.latences.ajouter(duree_s)
+            if erreur is None:
+                self.echanges_ok += 1
+                self.dernier_succes = datetime.now()
+            else:
+                self.echanges_erreur += 1
+                self.derniere_erreur = (datetime.now(), str(erreur))
+
+    def connexion_etablie(self):
+        with self._verrou:
+            if self.connexions:
+                self.reconnexions += 1
+            self.connexions += 1
+
+    def connexion_remplacee(self):
+        with self._verrou:
+            self.reconnexions += 1
+
+    def enregistrer_sonde(self, sonde):
+        self.sonde = sonde    # Remplacement atomique : lu sans verrou par get_status()
+
+    def stats(self):
+        with self._verrou:
+            return {
+                'echanges_ok': self.echanges_ok,
+                'echanges_erreur': self.echanges_erreur,
+                'dernier_succes': self.dernier_succes.isoformat() if self.dernier_succes else None,
+                'derniere_erreur': {
+                    'timestamp': self.derniere_erreur[0].isoformat(),
+                    'message': self.derniere_erreur[1]
+                } if self.derniere_erreur else None,
+                'connexions': self.connexions,
+                'reconnexions': self.reconnexions,
+                'latence': self.latences.stats()
+            }
+
+
+class MoniteurSante:
+    """Thread de sondes réseau périodiques de tous les automates du registre"""
+
+    def __init__(self, registre, periode=PERIODE_SONDE_DEFAUT_S, timeout=TIMEOUT_SONDE_S):
+        self.registre = registre
+        self.periode = periode
+        self.timeout = timeout
+        self.sondes = 0
+
+        self._reveil = threading.Event()
+        self._thread = None
+        self._actif = False
+
+    def init_app(self, app):
+        self.periode = app.config.get('SANTE_PERIODE_S', PERIODE_SONDE_DEFAUT_S)
+        self.timeout = app.config.get('SANTE_TIMEOUT_S', TIMEOUT_SONDE_S)
+        if app.config.get('SANTE_ACTIVE', True):
+            self.demarrer()
+
+    def demarrer(self):
+        if self.est_actif():
+            return
+        self._actif = True
+        self._thread = threading.Thread(target=self._boucle, name="sante-automates", daemon=True)
+        self._thread.start()
+        logger.info("Moniteur de santé démarré (période %.1f s)", self.periode)
+
+    def arreter(self):
+        self._actif = False
+        self._reveil.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def est_actif(self):
+        return self._actif and self._thread is not None and self._thread.is_alive()
+
+    def sonder_maintenant(self):
+        """Réveille le thread pour une sonde immédiate (après connexion / déconnexion)"""
+        self._reveil.set()
+
+    def _boucle(self):
+        while self._actif:
+            try:
+                self.sonder()
+            except Exception as e:
+                logger.error("Erreur sonde santé automates: %s", e)
+
+            self._reveil.wait(self.periode)
+            self._reveil.clear()
+
+    def sonder(self):
+        """Sonde tous les automates en parallèle et enregistre l'instantané de chacun"""
+        automates = [self.registre.automate(source) for source in self.registre.sources()]
+        sondes = boucle_s7.executer(self._sonder_tous(automates), timeout=self.timeout * 2 + 5)
+        for automate, sonde in zip(automates, sondes):
+            automate.sante.enregistrer_sonde(sonde)
+        self.sondes += 1
+        return sondes
+
+    async def _sonder_tous(self, automates):
+        return await asyncio.gather(*(self._sonder(automate) for automate in automates))
+
+    async def _sonder(self, automate):
+        sonde = {
+            'timestamp': datetime.now().isoformat(),
+            'horodatage': time.monotonic(),
+            'tags_en_cache': automate.image.compter(automate.nom)
+        }
+        if automate.simulation_mode or not automate.ip_address:
+            return sonde
+
+        async def port():
+            debut = time.perf_counter()
+            ouvert = await tester_port_async(automate.ip_address, automate.port, self.timeout)
+            return ouvert, time.perf_counter() - debut
+
+        async def ping():
+            return await ping_async(automate.ip_address, self.timeout) if automate.validation_ping else None
+
+        (ouvert, duree), ping_ok = await asyncio.gather(port(), ping())
+        sonde['s7_port_open'] = ouvert
+        sonde['latence_port_ms'] = round(duree * 1000, 2) if ouvert else None
+        if ping_ok is not None:
+            sonde['network_ping'] = ping_ok
+        return sonde
@@ -0,0 +1,594 @@
+import ctypes
+import heapq
+import json
+import logging
+import math
+import random
+import struct
+import threading
+import time
+
+from app.utils.adresse_s7 import compiler_adresse
+from app.utils.s7_lecture_groupee import (
+    TAILLE_PDU_DEFAUT, encoder_valeur, decoder_variable, variable_depuis_adresse
+)
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# SIMULATEUR DE CPU S7 - MÉMOIRE EN OCTETS ET SIGNAUX SCRIPTÉS
+# =================================================================
+# La CPU simulée a de vraies images mémoire : un tableau d'octets par DB et
+# par zone (I, Q, M, T, C), en big-endian comme une CPU S7. Le mode
+# simulation emprunte des ClientSimule au pool comme il emprunterait des
+# clients snap7 : lectures groupées, planification des plages, décodage et
+# écritures groupées sont ceux du mode REEL. Des signaux scriptés (rampes,
+# bruit, séquences d'étapes, rafales d'alarmes, charge de N tags) sont
+# recalculés par un seul thread, à des périodes jusqu'à 10 ms. La mémoire
+# peut aussi être servie par un serveur snap7 local (SIMULATEUR_PORT) pour
+# tester le pilote réel de bout en bout, sans automate.
+
+PERIODE_MIN_S = 0.01
+TAILLE_DB_DEFAUT = 1024
+TAILLES_ZONES_DEFAUT = {'I': 1024, 'Q': 1024, 'M': 4096, 'T': 512, 'C': 512}
+DB_CHARGE_DEFAUT = 100
+
+# Code de résultat d'un item refusé (snap7 : "CPU : Address out of range")
+CODE_ITEM_HORS_ZONE = 0x00C00000
+
+# Zone -> nom de la constante de zone du serveur snap7 (snap7.types)
+ZONES_SERVEUR = {'I': 'srvAreaPE', 'Q': 'srvAreaPA', 'M': 'srvAreaMK', 'T': 'srvAreaTM', 'C': 'srvAreaCT'}
+
+
+class ErreurS7Simulee(Exception):
+    """Échange refusé par la CPU simulée (adresse hors de la zone)"""
+
+
+# =================================================================
+# MÉMOIRE
+# =================================================================
+
+class MemoireS7:
+    """Images mémoire d'une CPU : un tableau d'octets par DB et par zone (I, Q, M, T, C)"""
+
+    def __init__(self, tailles_db=None, taille_db_defaut=TAILLE_DB_DEFAUT, tailles_zones=None):
+        self.taille_db_defaut = taille_db_defaut
+        self.dbs = {}
+        self.zones = {
+            zone: (ctypes.c_uint8 * taille)()
+            for zone, taille in {**TAILLES_ZONES_DEFAUT, **(tailles_zones or {})}.items()
+        }
+        self.serveur = None
+        self._verrou = threading.RLock()
+        for numero, taille in (tailles_db or {}).items():
+            self.creer_db(int(numero), int(taille))
+
+    def creer_db(self, numero, taille=None):
+        with self._verrou:
+            tableau = self.dbs.get(numero)
+            if tableau is None:
+                tableau = self.dbs[numero] = (ctypes.c_uint8 * (taille or self.taille_db_defaut))()
+                if self.serveur is not None:
+                    self.serveur.register_area(self._code_serveur('DB'), numero, tableau)
+            return tableau
+
+    def _tableau(self, zone, db):
+        if zone != 'DB':
+            return self.zones[zone]
+        tableau = self.dbs.get(db)
+        if tableau is None:
+            # DB non déclaré par le scénario : créé à la première demande, à la taille par défaut
+            tableau = self.creer_db(db)
+        return tableau
+
+    def _vue(self, zone, db, debut, taille):
+        tableau = self._tableau(zone, db)
+        if debut < 0 or debut + taille > len(tableau):
+            nom = f"DB{db}" if zone == 'DB' else zone
+            raise ErreurS7Simulee(f"Adresse hors zone: {nom} [{debut}:{debut + taille}] ({len(tableau)} octets)")
+        return memoryview(tableau).cast('B')[debut:debut + taille]
+
+    @staticmethod
+    def _code_serveur(zone):
+        from snap7 import types
+        return getattr(types, ZONES_SERVEUR.get(zone, 'srvAreaDB'))
+
+    def _modifier(self, zone, db, modification):
+        """Modification sous verrou, zone verrouillée côté serveur snap7 s'il sert la mémoire"""
+        with self._verrou:
+            if self.serveur is None:
+                return modification()
+            code, index = self._code_serveur(zone), (db if zone == 'DB' else 0)
+            self.serveur.lock_area(code, index)
+            try:
+                return modification()
+            finally:
+                self.serveur.unlock_area(code, index)
+
+    def lire(self, zone, db, debut, taille):
+        with self._verrou:
+            return bytearray(self._vue(zone, db, debut, taille))
+
+    def ecrire(self, zone, db, debut, donnees):
+        def modification():
+            self._vue(zone, db, debut, len(donnees))[:] = bytes(donnees)
+        self._modifier(zone, db, modification)
+
+    def ecrire_bits(self, zone, db, premier_bit, nombre, valeur):
+        """Met à 1 (ou à 0) `nombre` bits consécutifs à partir du bit absolu premier_bit (octet * 8 + bit)"""
+        debut, fin = premier_bit // 8, (premier_bit + nombre - 1) // 8 + 1
+
+        def modification():
+            vue = self._vue(zone, db, debut, fin - debut)
+            for rang in range(premier_bit, premier_bit + nombre):
+                masque = 1 << (rang % 8)
+                octet = rang // 8 - debut
+                vue[octet] = vue[octet] | masque if valeur else vue[octet] & ~masque
+        self._modifier(zone, db, modification)
+
+    def ecrire_valeur(self, adresse, type_donnee, valeur):
+        """Écrit une valeur à une AdresseS7 compilée (codage du mode REEL)"""
+        if type_donnee == 'BOOL':
+            self.ecrire_bits(adresse.zone, adresse.db, adresse.octet * 8 + adresse.bit, 1, valeur)
+        else:
+            self.ecrire(adresse.zone, adresse.db, adresse.debut, encoder_valeur(type_donnee, valeur, adresse.largeur))
+
+    def lire_valeur(self, adresse, type_donnee=None):
+        variable = variable_depuis_adresse(0, adresse, type_donnee)
+        return decoder_variable(self.lire(variable.zone, variable.db, variable.debut, variable.taille), 0, variable)
+
+    def effacer(self):
+        with self._verrou:
+            for tableau in list(self.dbs.values()) + list(self.zones.values()):
+                ctypes.memset(tableau, 0, len(tableau))
+
+    def taille_totale(self):
+        return sum(len(t) for t in self.dbs.values()) + sum(len(t) for t in self.zones.values())
+
+
+# =================================================================
+# SIGNAUX SCRIPTÉS
+# =================================================================
+
+class Signal:
+    """Valeur recalculée toutes les `periode_s` secondes (t : secondes depuis le démarrage)"""
+
+    def __init__(self, adresse, periode_s=1.0, type_donnee=None):
+        self.adresse_texte = adresse
+        self.adresse = compiler_adresse(adresse)
+        self.type_donnee = self.adresse.type_lu(type_donnee)
+        self.periode_s = max(PERIODE_MIN_S, float(periode_s))
+
+    def valeur(self, t):
+        raise NotImplementedError
+
+    def appliquer(self, memoire, t):
+        valeur = self.valeur(t)
+        if self.type_donnee in ('INT', 'DINT', 'BYTE', 'WORD', 'DWORD', 'TIMER', 'COUNTER'):
+            valeur = int(valeur)
+        memoire.ecrire_valeur(self.adresse, self.type_donnee, valeur)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.adresse_texte} {self.periode_s * 1000:.0f} ms>"
+
+
+class Rampe(Signal):
+    """Dent de scie de minimum à maximum en duree_s, puis recommence"""
+
+    def __init__(self, adresse, minimum=0.0, maximum=100.0, duree_s=60.0, periode_s=1.0, type_donnee=None):
+        super().__init__(adresse, periode_s, type_donnee)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.duree_s = max(PERIODE_MIN_S, float(duree_s))
+
+    def valeur(self, t):
+        return self.minimum + (self.maximum - self.minimum) * ((t % self.duree_s) / self.duree_s)
+
+
+class Bruit(Signal):
+    """Valeur centrale plus un bruit uniforme de ± amplitude (graine : tirages reproductibles)"""
+
+    def __init__(self, adresse, centre=0.0, amplitude=1.0, graine=None, periode_s=1.0, type_donnee=None):
+        super().__init__(adresse, periode_s, type_donnee)
+        self.centre = float(centre)
+        self.amplitude = float(amplitude)
+        self._aleatoire = random.Random(graine)
+
+    def valeur(self, t):
+        return self.centre + self._aleatoire.uniform(-self.amplitude, self.amplitude)
+
+
+class Sequence(Signal):
+    """Suite d'étapes [(valeur, durée en s), ...], rejouée en boucle ou figée sur la dernière"""
+
+    def __init__(self, adresse, etapes, boucle=True, periode_s=0.1, type_donnee=None):
+        super().__init__(adresse, periode_s, type_donnee)
+        self.etapes = [(valeur, max(PERIODE_MIN_S, float(duree))) for valeur, duree in etapes]
+        if not self.etapes:
+            raise ValueError("Séquence sans étape")
+        self.boucle = boucle
+        self.duree_totale = sum(duree for _, duree in self.etapes)
+
+    def valeur(self, t):
+        if self.boucle:
+            t %= self.duree_totale
+        for valeur, duree in self.etapes:
+            if t < duree:
+                return valeur
+            t -= duree
+        return self.etapes[-1][0]
+
+
+class RafaleAlarmes(Signal):
+    """`nombre` bits consécutifs à partir de l'adresse, tous à 1 pendant duree_s toutes les toutes_s secondes"""
+
+    def __init__(self, adresse, nombre=1, toutes_s=60.0, duree_s=5.0, periode_s=0.1):
+        super().__init__(adresse, periode_s, 'BOOL')
+        if self.adresse.bit is None:
+            raise ValueError(f"Rafale d'alarmes : adresse de bit attendue ({adresse})")
+        self.nombre = int(nombre)
+        self.toutes_s = max(PERIODE_MIN_S, float(toutes_s))
+        self.duree_s = float(duree_s)
+
+    def valeur(self, t):
+        return (t % self.toutes_s) < self.duree_s
+
+    def appliquer(self, memoire, t):
+        premier_bit = self.adresse.octet * 8 + self.adresse.bit
+        memoire.ecrire_bits(self.adresse.zone, self.adresse.db, premier_bit, self.nombre, self.valeur(t))
+
+
+class Charge(Signal):
+    """
+    `nombre` valeurs REAL (ou INT) consécutives d'un DB, chacune sinusoïdale avec sa propre période :
+    N tags qui changent tous, écrits en un bloc par cycle
+    """
+
+    def __init__(self, db=DB_CHARGE_DEFAUT, debut=0, nombre=1000, type_donnee='REAL', periode_s=1.0):
+        self.type_donnee = 'INT' if str(type_donnee).upper() == 'INT' else 'REAL'
+        self.taille = 2 if self.type_donnee == 'INT' else 4
+        lettre = 'W' if self.type_donnee == 'INT' else 'D'
+        super().__init__(f"DB{int(db)}.DB{lettre}{int(debut)}", periode_s, self.type_donnee)
+        self.nombre = int(nombre)
+        self._format = f">{self.nombre}{'h' if self.type_donnee == 'INT' else 'f'}"
+        self._pulsations = [2 * math.pi / (5 + i % 60) for i in range(self.nombre)]
+
+    @property
+    def fin(self):
+        return self.adresse.debut + self.nombre * self.taille
+
+    def valeur(self, t):
+        valeurs = [50.0 + 40.0 * math.sin(w * t + i) for i, w in enumerate(self._pulsations)]
+        if self.type_donnee == 'INT':
+            return [int(v * 10) for v in valeurs]
+        return valeurs
+
+    def appliquer(self, memoire, t):
+        memoire.ecrire('DB', self.adresse.db, self.adresse.debut, struct.pack(self._format, *self.valeur(t)))
+
+
+class Logique(Signal):
+    """Logique écrite en Python exécutée à chaque période : fonction(memoire)"""
+
+    def __init__(self, fonction, periode_s=0.1):
+        self.adresse_texte = fonction.__name__
+        self.adresse = None
+        self.type_donnee = None
+        self.periode_s = max(PERIODE_MIN_S, float(periode_s))
+        self.fonction = fonction
+
+    def appliquer(self, memoire, t):
+        self.fonction(memoire)
+
+
+TYPES_SIGNAUX = {
+    'rampe': Rampe,
+    'bruit': Bruit,
+    'sequence': Sequence,
+    'rafale': RafaleAlarmes,
+    'charge': Charge
+}
+
+
+def signal_depuis_dict(definition):
+    """Signal d'un scénario : {"type": "rampe", "adresse": "DB100.DBD0", "periode_ms": 10, ...paramètres}"""
+    parametres = dict(definition)
+    type_signal = str(parametres.pop('type', '')).lower()
+    classe = TYPES_SIGNAUX.get(type_signal)
+    if classe is None:
+        raise ValueError(f"Type de signal inconnu: '{type_signal}' ({', '.join(TYPES_SIGNAUX)})")
+    if 'periode_ms' in parametres:
+        parametres['periode_s'] = float(parametres.pop('periode_ms')) / 1000
+    return classe(**parametres)
+
+
+# =================================================================
+# SCÉNARIOS
+# =================================================================
+
+def logique_marche_arret(memoire):
+    """Boutons marche / arrêt (DB1) -> voyants et moteur (DB3), comme l'ancienne simulation"""
+    lire = lambda adresse: memoire.lire_valeur(compiler_adresse(adresse))
+    ecrire = lambda adresse, valeur: memoire.ecrire_valeur(compiler_adresse(adresse), 'BOOL', valeur)
+    if lire('DB1.DBX0.0'):
+        ecrire('DB3.DBX0.0', True)
+        ecrire('DB3.DBX0.3', True)
+    if lire('DB1.DBX0.1'):
+        ecrire('DB3.DBX0.0', False)
+        ecrire('DB3.DBX0.1', True)
+        ecrire('DB3.DBX0.3', False)
+
+
+# Tags Siemens de démonstration : DB1 static, DB2 lec_ecr_ihm_indus, DB3 sorti_ihm_indus
+SCENARIO_DEFAUT = {
+    'db': {'1': TAILLE_DB_DEFAUT, '2': 256, '3': 256},
+    'valeurs': {
+        'DB1.DBX0.3': True,   # ARU
+        'DB1.DBW4': 123,      # TestInt
+    },
+    'signaux': [
+        {'type': 'sequence', 'adresse': 'DB2.DBX0.0', 'etapes': [[True, 1], [False, 1]]},    # bit_de_vie
+        {'type': 'rampe', 'adresse': 'DB1.DBW2', 'minimum': 0, 'maximum': 100, 'duree_s': 100},   # quantite_produit
+    ],
+    'logique_marche_arret': True
+}
+
+
+def charger_scenario(source):
+    """Scénario depuis un dict, un texte JSON ou un chemin de fichier JSON (SCENARIO_DEFAUT si vide)"""
+    if not source:
+        return SCENARIO_DEFAUT
+    if isinstance(source, dict):
+        return source
+    source = str(source)
+    if source.lstrip().startswith('{'):
+        return json.loads(source)
+    with open(source, encoding='utf-8') as fichier:
+        return json.load(fichier)
+
+
+# =================================================================
+# CPU SIMULÉE
+# =================================================================
+
+class SimulateurS7:
+    """CPU S7 simulée : mémoire, signaux cadencés par un thread, serveur snap7 optionnel"""
+
+    def __init__(self, scenario=None):
+        self.port = None                  # Serveur snap7 sur ce port au démarrage (None : pas de serveur)
+        self.latence_s = 0.0              # Durée simulée de chaque échange client
+        self.signaux_actifs = True        # False : mémoire figée, modifiée par les seules écritures
+        self.taille_pdu = TAILLE_PDU_DEFAUT
+        self.memoire = MemoireS7()
+        self.signaux = []
+        self.scenario = None
+
+        self._serveur = None
+        self._thread = None
+        self._actif = False
+        self._demarre = False
+        self._reveil = threading.Event()
+        self._origine = time.monotonic()
+
+        self.cycles = 0
+        self.retard_max_s = 0.0
+        self.echanges = 0
+
+        self.charger(scenario or SCENARIO_DEFAUT)
+
+    def init_app(self, app):
+        scenario = dict(charger_scenario(app.config.get('SIMULATEUR_SCENARIO')))
+        nb_tags = app.config.get('SIMULATEUR_NB_TAGS', 0)
+        if nb_tags:
+            # Charge : N valeurs REAL qui changent toutes, dans un DB dimensionné pour elles
+            db_charge = app.config.get('SIMULATEUR_DB_CHARGE', DB_CHARGE_DEFAUT)
+            scenario['db'] = {**scenario.get('db', {}), str(db_charge): max(TAILLE_DB_DEFAUT, nb_tags * 4)}
+            scenario['signaux'] = list(scenario.get('signaux', [])) + [{
+                'type': 'charge', 'db': db_charge, 'nombre': nb_tags,
+                'periode_ms': app.config.get('SIMULATEUR_PERIODE_CHARGE_MS', 1000)
+            }]
+        scenario['taille_db'] = app.config.get('SIMULATEUR_TAILLE_DB', scenario.get('taille_db', TAILLE_DB_DEFAUT))
+        self.port = app.config.get('SIMULATEUR_PORT')
+        self.signaux_actifs = app.config.get('SIMULATEUR_SIGNAUX_ACTIFS', True)
+        self.latence_s = app.config.get('SIMULATEUR_LATENCE_MS', 0) / 1000
+        self.charger(scenario)
+
+    def charger(self, scenario):
+        """Nouvelle mémoire (DB déclarés, valeurs initiales) et nouveaux signaux ; ValueError si invalide"""
+        signaux = [signal_depuis_dict(definition) for definition in scenario.get('signaux', [])]
+        if scenario.get('logique_marche_arret'):
+            signaux.append(Logique(logique_marche_arret, 0.1))
+        memoire = MemoireS7(scenario.get('db'), scenario.get('taille_db', TAILLE_DB_DEFAUT), scenario.get('zones'))
+        for signal in signaux:
+            if isinstance(signal, Charge) and signal.fin > len(memoire.creer_db(signal.adresse.db)):
+                raise ValueError(f"DB{signal.adresse.db} trop petit pour {signal.nombre} valeurs de charge")
+        for adresse, valeur in scenario.get('valeurs', {}).items():
+            compilee = compiler_adresse(adresse)
+            # Un flottant dans un double mot est un REAL (DINT sinon)
+            memoire.ecrire_valeur(compilee, compilee.type_lu('REAL' if isinstance(valeur, float) else None), valeur)
+
+        demarre = self._demarre
+        if demarre:
+            self.arreter()
+        self.scenario = scenario
+        self.memoire = memoire
+        self.signaux = signaux
+        if demarre:
+            self.demarrer()
+
+    def reinitialiser(self):
+        """Rejoue le scénario depuis le début (mémoire remise à ses valeurs initiales)"""
+        self.charger(self.scenario)
+
+    def client(self):
+        return ClientSimule(self)
+
+    # =================================================================
+    # CYCLE DES SIGNAUX
+    # =================================================================
+
+    def demarrer(self):
+        """Serveur snap7 (si un port est configuré) puis thread des signaux (si actifs)"""
+        self._demarre = True
+        if self.port and self._serveur is None:
+            try:
+                self.exposer(self.port)
+            except Exception as e:
+                # Port occupé, snap7 absent... : la simulation continue, sans serveur
+                logger.warning("Serveur snap7 simulé indisponible sur le port %s: %s", self.port, e)
+        if self.est_actif() or not self.signaux_actifs:
+            return
+        self._actif = True
+        self._origine = time.monotonic()
+        self._thread = threading.Thread(target=self._boucle, name="simulateur-s7", daemon=True)
+        self._thread.start()
+        logger.info("🔄 Simulation S7 démarrée : %d signal(aux), %d octets de mémoire",
+                    len(self.signaux), self.memoire.taille_totale())
+
+    def arreter(self):
+        self._demarre = False
+        self._actif = False
+        self._reveil.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+        self._reveil.clear()
+        self._arreter_serveur()
+
+    def est_actif(self):
+        return self._actif and self._thread is not None and self._thread.is_alive()
+
+    def _boucle(self):
+        # Échéancier : chaque signal est recalculé à sa période, le plus proche en premier
+        echeancier = [(self._origine, rang, signal) for rang, signal in enumerate(self.signaux)]
+        heapq.heapify(echeancier)
+        memoire = self.memoire
+
+        while self._actif and echeancier:
+            echeance, rang, signal = echeancier[0]
+            attente = echeance - time.monotonic()
+            if attente > 0:
+                self._reveil.wait(attente)
+                continue
+
+            maintenant = time.monotonic()
+            self.retard_max_s = max(self.retard_max_s, maintenant - echeance)
+            try:
+                signal.appliquer(memoire, maintenant - self._origine)
+            except Exception as e:
+                logger.warning("Simulation: signal %r en erreur: %s", signal, e)
+            self.cycles += 1
+            # En retard : pas de rattrapage en rafale, la période repart de maintenant
+            heapq.heapreplace(echeancier, (max(echeance + signal.periode_s, maintenant), rang, signal))
+
+    # =================================================================
+    # SERVEUR SNAP7 (TEST DU PILOTE RÉEL)
+    # =================================================================
+
+    def exposer(self, port):
+        """Sert la mémoire simulée sur un serveur snap7 local (les DB créés ensuite y sont ajoutés)"""
+        import snap7
+        from snap7 import types
+
+        serveur = snap7.server.Server(log=False)
+        for numero, tableau in self.memoire.dbs.items():
+            serveur.register_area(types.srvAreaDB, numero, tableau)
+        for zone, tableau in self.memoire.zones.items():
+            serveur.register_area(getattr(types, ZONES_SERVEUR[zone]), 0, tableau)
+        try:
+            serveur.start(tcpport=int(port))
+        except Exception:
+            serveur.destroy()
+            raise
+        self._serveur = serveur
+        self.memoire.serveur = serveur
+        logger.info("Simulation S7 servie par snap7 sur le port %s", port)
+
+    def _arreter_serveur(self):
+        serveur, self._serveur = self._serveur, None
+        if serveur is None:
+            return
+        self.memoire.serveur = None
+        try:
+            serveur.stop()
+            serveur.destroy()
+        except Exception as e:
+            logger.debug("Erreur arrêt serveur snap7 simulé: %s", e)
+
+    def stats(self):
+        return {
+            'actif': self.est_actif(),
+            'signaux': len(self.signaux),
+            'octets': self.memoire.taille_totale(),
+            'dbs': sorted(self.memoire.dbs),
+            'cycles': self.cycles,
+            'retard_max_ms': round(self.retard_max_s * 1000, 2),
+            'echanges': self.echanges,
+            'port': self._serveur and self.port
+        }
+
+
+class ClientSimule:
+    """Connexion du pool vers la CPU simulée : mêmes échanges que le client snap7, sur sa mémoire"""
+
+    def __init__(self, simulateur):
+        self.simulateur = simulateur
+        self.connecte = True
+
+    def _echange(self):
+        self.simulateur.echanges += 1
+        if self.simulateur.latence_s:
+            time.sleep(self.simulateur.latence_s)
+        return self.simulateur.memoire
+
+    # Interface du client snap7 utilisée par le pool et les lectures / écritures DB
+    def get_connected(self):
+        return self.connecte
+
+    def disconnect(self):
+        self.connecte = False
+
+    def get_pdu_length(self):
+        return self.simulateur.taille_pdu
+
+    def db_read(self, db, debut, taille):
+        return self._echange().lire('DB', db, debut, taille)
+
+    def db_write(self, db, debut, donnees):
+        self._echange().ecrire('DB', db, debut, donnees)
+
+    # Zones, bits et requêtes multi-variables (équivalents de pool_s7 sans types snap7)
+    def lire_zone(self, zone, db, debut, taille):
+        return self._echange().lire(zone, db, debut, taille)
+
+    def ecrire_zone(self, zone, db, debut, donnees):
+        self._echange().ecrire(zone, db, debut, donnees)
+
+    def ecrire_bit(self, zone, db, octet, bit, valeur):
+        self._echange().ecrire_bits(zone, db, octet * 8 + bit, 1, valeur)
+
+    def lire_plages(self, plages):
+        """read_multi_vars : une requête, un tampon par plage (None si refusée)"""
+        memoire = self._echange()
+        tampons = []
+        for plage in plages:
+            try:
+                tampons.append(memoire.lire(plage.zone, plage.db, plage.debut, plage.taille))
+            except ErreurS7Simulee:
+                tampons.append(None)
+        return tampons
+
+    def ecrire_plages(self, plages):
+        """write_multi_vars : une requête, un code de résultat par plage (0 = écrit)"""
+        memoire = self._echange()
+        resultats = []
+        for plage in plages:
+            try:
+                if plage.bit is None:
+                    memoire.ecrire(plage.zone, plage.db, plage.debut, plage.donnees)
+                else:
+                    memoire.ecrire_bits(plage.zone, plage.db, plage.debut * 8 + plage.bit, 1, plage.donnees[0])
+                resultats.append(0)
+            except ErreurS7Simulee:
+                resultats.append(CODE_ITEM_HORS_ZONE)
+        return resultats
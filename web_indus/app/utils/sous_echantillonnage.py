@@ -0,0 +1,133 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# =================================================================
+# SOUS-ÉCHANTILLONNAGE DES SÉRIES HISTORIQUES
+# =================================================================
+# Une courbe n'affiche pas plus de points que l'écran n'a de pixels : un mois
+# d'un tag à 1 Hz (2,6 millions de points) est réduit côté serveur.
+# - agreger() : la plage est découpée en intervalles de même largeur, communs
+#   à tous les tags d'une requête (axe des temps partagé). Chaque intervalle
+#   donne min, max, moyenne et dernière valeur : les pics restent visibles.
+# - lttb() : Largest-Triangle-Three-Buckets, conserve les points qui
+#   préservent le mieux la forme de la courbe (horodatages propres au tag).
+# Les séries sont des tableaux compacts (SerieHistorique) : NumPy les lit
+# sans copie s'il est installé.
+
+
+def pas_intervalles(debut, fin, nb_intervalles):
+    """Largeur entière (ms) des intervalles couvrant [debut, fin]. Retourne: (pas, nombre d'intervalles)"""
+    duree = fin - debut + 1
+    pas = max(1, math.ceil(duree / max(1, nb_intervalles)))
+    return pas, math.ceil(duree / pas)
+
+
+def _nan_vers_none(valeurs):
+    return [None if v != v else v for v in valeurs]
+
+
+def agreger(horodatages, valeurs, debut, pas, nombre):
+    """
+    Agrège des points triés, compris dans [debut, debut + pas * nombre[, en `nombre` intervalles
+    Retourne: {'min', 'max', 'moyenne', 'derniere', 'nombre'} (listes, None pour un intervalle vide)
+    """
+    if np is not None:
+        return _agreger_numpy(horodatages, valeurs, debut, pas, nombre)
+
+    minimums, maximums = [None] * nombre, [None] * nombre
+    sommes, derniers, comptes = [0.0] * nombre, [None] * nombre, [0] * nombre
+    for horodatage, valeur in zip(horodatages, valeurs):
+        i = (horodatage - debut) // pas
+        if comptes[i]:
+            minimums[i] = min(minimums[i], valeur)
+            maximums[i] = max(maximums[i], valeur)
+        else:
+            minimums[i] = maximums[i] = valeur
+        sommes[i] += valeur
+        derniers[i] = valeur
+        comptes[i] += 1
+    return {
+        'min': minimums,
+        'max': maximums,
+        'moyenne': [s / c if c else None for s, c in zip(sommes, comptes)],
+        'derniere': derniers,
+        'nombre': comptes
+    }
+
+
+def _agreger_numpy(horodatages, valeurs, debut, pas, nombre):
+    t = np.frombuffer(horodatages, dtype=np.int64) if len(horodatages) else np.zeros(0, dtype=np.int64)
+    v = np.frombuffer(valeurs, dtype=np.float64) if len(valeurs) else np.zeros(0, dtype=np.float64)
+
+    # Bornes de chaque intervalle dans la série triée
+    bornes = np.searchsorted(t, debut + pas * np.arange(nombre + 1, dtype=np.int64), side='left')
+    comptes = np.diff(bornes)
+    remplis = comptes > 0
+    departs = bornes[:-1][remplis]
+
+    minimums = np.full(nombre, np.nan)
+    maximums = np.full(nombre, np.nan)
+    moyennes = np.full(nombre, np.nan)
+    derniers = np.full(nombre, np.nan)
+    if len(departs):
+        # Les intervalles vides ne contiennent aucun point : reduceat sur les seuls départs non vides
+        minimums[remplis] = np.minimum.reduceat(v, departs)
+        maximums[remplis] = np.maximum.reduceat(v, departs)
+        moyennes[remplis] = np.add.reduceat(v, departs) / comptes[remplis]
+        derniers[remplis] = v[bornes[1:][remplis] - 1]
+
+    return {
+        'min': _nan_vers_none(minimums.tolist()),
+        'max': _nan_vers_none(maximums.tolist()),
+        'moyenne': _nan_vers_none(moyennes.tolist()),
+        'derniere': _nan_vers_none(derniers.tolist()),
+        'nombre': comptes.tolist()
+    }
+
+
+def lttb(horodatages, valeurs, nb_points):
+    """
+    Largest-Triangle-Three-Buckets sur une série triée
+    Retourne: indices des points retenus (premier et dernier toujours conservés)
+    """
+    n = len(horodatages)
+    if nb_points >= n:
+        return list(range(n))
+    if nb_points < 3:
+        return [0, n - 1][:max(nb_points, 0)]
+
+    largeur = (n - 2) / (nb_points - 2)
+    indices = [0]
+    a = 0
+    if np is not None:
+        x = np.frombuffer(horodatages, dtype=np.int64).astype(np.float64)
+        y = np.frombuffer(valeurs, dtype=np.float64)
+
+    for i in range(nb_points - 2):
+        debut = int(i * largeur) + 1
+        fin = int((i + 1) * largeur) + 1
+        suivant_fin = min(int((i + 2) * largeur) + 1, n)
+
+        # Sommet C : moyenne de l'intervalle suivant (le dernier point pour le dernier intervalle)
+        if np is not None:
+            cx = x[fin:suivant_fin].mean() if suivant_fin > fin else x[n - 1]
+            cy = y[fin:suivant_fin].mean() if suivant_fin > fin else y[n - 1]
+            aires = np.abs((x[a] - cx) * (y[debut:fin] - y[a]) - (x[a] - x[debut:fin]) * (cy - y[a]))
+            a = debut + int(aires.argmax())
+        else:
+            if suivant_fin > fin:
+                cx = sum(horodatages[fin:suivant_fin]) / (suivant_fin - fin)
+                cy = sum(valeurs[fin:suivant_fin]) / (suivant_fin - fin)
+            else:
+                cx, cy = horodatages[n - 1], valeurs[n - 1]
+            ax, ay = horodatages[a], valeurs[a]
+            a = max(range(debut, fin), key=lambda j: abs(
+                (ax - cx) * (valeurs[j] - ay) - (ax - horodatages[j]) * (cy - ay)))
+        indices.append(a)
+
+    indices.append(n - 1)
+    return indices
@@ -0,0 +1,278 @@
+import bisect
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from app.utils.compression_series import encoder_bloc, decoder_bloc
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# STOCKAGE DE L'HISTORIQUE NUMÉRIQUE
+# =================================================================
+# Les valeurs numériques historisées ne passent plus par Historique_tag
+# (valeur en String(100), lien HISTORISER) : elles sont écrites dans
+# Historique_Mesure, clé (id_tag, horodatage_ms), valeur en DOUBLE et
+# qualité codée. Les journées complètes plus anciennes que
+# HISTORIQUE_JOURS_BRUTS sont ensuite compactées, tag par tag, en un bloc
+# compressé par jour dans Historique_Bloc (une ligne au lieu de 86 400 pour
+# un tag à 1 Hz). Une lecture de plage décompresse les blocs qui la
+# recouvrent puis ajoute les mesures brutes récentes.
+
+MS_PAR_JOUR = 86400 * 1000
+JOURS_BRUTS_DEFAUT = 1
+PERIODE_COMPACTAGE_S = 3600
+EPOQUE = datetime(1970, 1, 1)
+
+QUALITES_HISTORIQUE = {'GOOD': 0, 'STALE': 1, 'BAD': 2, 'EN_ATTENTE': 3, 'UNCERTAIN': 4}
+QUALITE_INCONNUE = 255
+NOMS_QUALITES = {code: nom for nom, code in QUALITES_HISTORIQUE.items()}
+
+
+def horodatage_ms(timestamp):
+    """datetime UTC naïf -> millisecondes depuis 1970"""
+    return (timestamp - EPOQUE) // timedelta(milliseconds=1)
+
+
+def depuis_horodatage_ms(horodatage):
+    return EPOQUE + timedelta(milliseconds=horodatage)
+
+
+def code_qualite(qualite):
+    return QUALITES_HISTORIQUE.get(qualite, QUALITE_INCONNUE)
+
+
+def nom_qualite(code):
+    return NOMS_QUALITES.get(code, 'INCONNUE')
+
+
+class SerieHistorique:
+    """Points d'un tag triés par horodatage (tableaux compacts, utilisables par NumPy sans copie)"""
+
+    __slots__ = ('horodatages', 'valeurs', 'qualites')
+
+    def __init__(self, horodatages=None, valeurs=None, qualites=None):
+        self.horodatages = horodatages if horodatages is not None else array('q')
+        self.valeurs = valeurs if valeurs is not None else array('d')
+        self.qualites = qualites if qualites is not None else array('B')
+
+    def __len__(self):
+        return len(self.horodatages)
+
+    def ajouter(self, horodatages, valeurs, qualites, debut=0, fin=None):
+        """Ajoute les points [debut:fin] d'une autre série"""
+        self.horodatages.extend(horodatages[debut:fin])
+        self.valeurs.extend(valeurs[debut:fin])
+        self.qualites.extend(qualites[debut:fin])
+
+    def trier(self):
+        """Tri stable par horodatage, le dernier point d'un horodatage en double l'emporte"""
+        points = {}
+        for point in zip(self.horodatages, self.valeurs, self.qualites):
+            points[point[0]] = point
+        ordonnes = [points[h] for h in sorted(points)]
+        self.horodatages = array('q', (p[0] for p in ordonnes))
+        self.valeurs = array('d', (p[1] for p in ordonnes))
+        self.qualites = array('B', (p[2] for p in ordonnes))
+
+    def vers_dict(self):
+        return {
+            'horodatages': list(self.horodatages),
+            'valeurs': list(self.valeurs),
+            'qualites': [nom_qualite(code) for code in self.qualites]
+        }
+
+
+class StockageHistorique:
+    """Écriture des mesures brutes, compactage en blocs journaliers, lecture de plages"""
+
+    def __init__(self, jours_bruts=JOURS_BRUTS_DEFAUT, periode_compactage=PERIODE_COMPACTAGE_S):
+        self.app = None
+        self.jours_bruts = jours_bruts
+        self.periode_compactage = periode_compactage
+        self._dernier_compactage = 0.0
+        self._verrou = threading.Lock()
+
+        self.mesures_ecrites = 0
+        self.blocs_ecrits = 0
+        self.points_compactes = 0
+        self.derniere_duree_compactage = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.jours_bruts = app.config.get('HISTORIQUE_JOURS_BRUTS', JOURS_BRUTS_DEFAUT)
+        self.periode_compactage = app.config.get('HISTORIQUE_PERIODE_COMPACTAGE_S', PERIODE_COMPACTAGE_S)
+
+    # =================================================================
+    # ÉCRITURE
+    # =================================================================
+
+    def ecrire(self, connexion, mesures):
+        """
+        Insère des mesures dans la transaction `connexion` (un seul executemany)
+        mesures: [(id_tag, horodatage_ms, valeur, code_qualite)]. Un doublon (tag, horodatage) est ignoré
+        """
+        if not mesures:
+            return
+        from sqlalchemy import insert
+        from app.models.modele_tag import MesureHistorique
+
+        requete = insert(MesureHistorique.__table__) \
+            .prefix_with('IGNORE', dialect='mysql') \
+            .prefix_with('OR IGNORE', dialect='sqlite')
+        connexion.execute(requete, [
+            {'id_tag': id_tag, 'horodatage_ms': horodatage, 'valeur': valeur, 'qualite': qualite}
+            for id_tag, horodatage, valeur, qualite in mesures
+        ])
+        self.mesures_ecrites += len(mesures)
+
+    # =================================================================
+    # COMPACTAGE EN BLOCS JOURNALIERS
+    # =================================================================
+
+    def compacter_si_du(self):
+        """Appelé par le thread de l'historien : compacte au plus une fois par période"""
+        if self.app is None or time.monotonic() - self._dernier_compactage < self.periode_compactage:
+            return 0
+        self._dernier_compactage = time.monotonic()
+        try:
+            return self.compacter()
+        except Exception as e:
+            logger.error("Compactage de l'historique échoué: %s", e)
+            return 0
+
+    def compacter(self, limite_ms=None):
+        """
+        Compresse les mesures brutes antérieures à `limite_ms` (par défaut, seuls les
+        HISTORIQUE_JOURS_BRUTS derniers jours, jour courant compris, restent bruts)
+        Retourne: nombre de points compactés
+        """
+        from sqlalchemy import select, func
+        from app import db
+        from app.models.modele_tag import MesureHistorique
+
+        if limite_ms is None:
+            jour_courant = horodatage_ms(datetime.utcnow()) // MS_PAR_JOUR
+            limite_ms = (jour_courant - self.jours_bruts + 1) * MS_PAR_JOUR
+
+        table = MesureHistorique.__table__
+        debut = time.perf_counter()
+        total = 0
+        with self._verrou, self.app.app_context():
+            moteur = db.engine
+            with moteur.connect() as connexion:
+                tags = connexion.execute(
+                    select(table.c.id_tag).where(table.c.horodatage_ms < limite_ms).distinct()
+                ).scalars().all()
+
+            for id_tag in tags:
+                while True:
+                    with moteur.begin() as connexion:
+                        premier = connexion.execute(
+                            select(func.min(table.c.horodatage_ms))
+                            .where(table.c.id_tag == id_tag, table.c.horodatage_ms < limite_ms)
+                        ).scalar()
+                        if premier is None:
+                            break
+                        jour = premier // MS_PAR_JOUR * MS_PAR_JOUR
+                        total += self._compacter_jour(connexion, id_tag, jour, min(jour + MS_PAR_JOUR, limite_ms))
+
+        self.derniere_duree_compactage = time.perf_counter() - debut
+        self.points_compactes += total
+        if total:
+            logger.info("Historique: %d points compactés en %.2f s", total, self.derniere_duree_compactage)
+        return total
+
+    def _compacter_jour(self, connexion, id_tag, jour, fin):
+        """Fusionne les mesures brutes [jour, fin) dans le bloc du jour, puis les supprime"""
+        from sqlalchemy import select, delete, insert
+        from app.models.modele_tag import MesureHistorique, BlocHistorique
+
+        mesures = MesureHistorique.__table__
+        blocs = BlocHistorique.__table__
+        dans_plage = (mesures.c.id_tag == id_tag, mesures.c.horodatage_ms >= jour, mesures.c.horodatage_ms < fin)
+        lignes = connexion.execute(
+            select(mesures.c.horodatage_ms, mesures.c.valeur, mesures.c.qualite)
+            .where(*dans_plage).order_by(mesures.c.horodatage_ms)
+        ).all()
+
+        serie = SerieHistorique()
+        # Mesures arrivées après le compactage du jour : fusionnées dans le bloc existant
+        existant = connexion.execute(
+            select(blocs.c.donnees).where(blocs.c.id_tag == id_tag, blocs.c.debut_ms == jour)
+        ).scalar()
+        if existant is not None:
+            serie.ajouter(*decoder_bloc(existant))
+            connexion.execute(delete(blocs).where(blocs.c.id_tag == id_tag, blocs.c.debut_ms == jour))
+        serie.ajouter(array('q', (l[0] for l in lignes)), array('d', (l[1] for l in lignes)),
+                      array('B', (l[2] for l in lignes)))
+        if existant is not None:
+            serie.trier()
+
+        connexion.execute(insert(blocs), {
+            'id_tag': id_tag,
+            'debut_ms': jour,
+            'fin_ms': serie.horodatages[-1],
+            'nb_points': len(serie),
+            'valeur_min': min(serie.valeurs),
+            'valeur_max': max(serie.valeurs),
+            'donnees': encoder_bloc(serie.horodatages, serie.valeurs, serie.qualites)
+        })
+        connexion.execute(delete(mesures).where(*dans_plage))
+        self.blocs_ecrits += 1
+        return len(lignes)
+
+    # =================================================================
+    # LECTURE DE PLAGES
+    # =================================================================
+
+    def lire_plage(self, id_tag, debut_ms, fin_ms):
+        """Points du tag dans [debut_ms, fin_ms], triés. Retourne: SerieHistorique"""
+        from sqlalchemy import select
+        from app import db
+        from app.models.modele_tag import MesureHistorique, BlocHistorique
+
+        mesures = MesureHistorique.__table__
+        blocs = BlocHistorique.__table__
+        serie = SerieHistorique()
+
+        with self.app.app_context():
+            with db.engine.connect() as connexion:
+                for (donnees,) in connexion.execute(
+                    select(blocs.c.donnees)
+                    .where(blocs.c.id_tag == id_tag, blocs.c.debut_ms <= fin_ms, blocs.c.fin_ms >= debut_ms)
+                    .order_by(blocs.c.debut_ms)
+                ):
+                    horodatages, valeurs, qualites = decoder_bloc(donnees)
+                    serie.ajouter(horodatages, valeurs, qualites,
+                                  bisect.bisect_left(horodatages, debut_ms),
+                                  bisect.bisect_right(horodatages, fin_ms))
+
+                lignes = connexion.execute(
+                    select(mesures.c.horodatage_ms, mesures.c.valeur, mesures.c.qualite)
+                    .where(mesures.c.id_tag == id_tag, mesures.c.horodatage_ms.between(debut_ms, fin_ms))
+                    .order_by(mesures.c.horodatage_ms)
+                ).all()
+
+        dernier_bloc = serie.horodatages[-1] if len(serie) else None
+        serie.ajouter(array('q', (l[0] for l in lignes)), array('d', (l[1] for l in lignes)),
+                      array('B', (l[2] for l in lignes)))
+        # Mesures brutes d'une journée déjà compactée (arrivées en retard) : remises dans l'ordre
+        if lignes and dernier_bloc is not None and lignes[0][0] <= dernier_bloc:
+            serie.trier()
+        return serie
+
+    def stats(self):
+        return {
+            'jours_bruts': self.jours_bruts,
+            'mesures_ecrites': self.mesures_ecrites,
+            'blocs_ecrits': self.blocs_ecrits,
+            'points_compactes': self.points_compactes,
+            'derniere_duree_compactage_ms': round(self.derniere_duree_compactage * 1000, 2)
+        }
+
+
+# Instance globale
+stockage_historique = StockageHistorique()
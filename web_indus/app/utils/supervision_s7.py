@@ -0,0 +1,189 @@
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# =================================================================
+# SUPERVISION DE LA CONNEXION S7 - RECONNEXION ET DISJONCTEUR
+# =================================================================
+# Quand la CPU tombe, chaque lecture attendait le délai snap7 avant
+# d'échouer : une page runtime restait bloquée plusieurs secondes par tag.
+# Après SEUIL_ECHECS échecs de connexion consécutifs, le circuit s'ouvre :
+# les lectures échouent immédiatement (dernière valeur connue de l'image,
+# qualité STALE ou BAD) et un thread tente de reconnecter avec un délai
+# croissant (exponentiel, avec gigue). Le circuit se referme à la première
+# reconnexion réussie, sans action de l'opérateur.
+#
+#   CONNECTE --échec--> DEGRADE --N échecs--> CIRCUIT_OUVERT
+#       ^                  |                      |  délai
+#       +-----succès-------+                      v
+#       +-------------succès----------------- RECONNEXION --échec--> CIRCUIT_OUVERT
+
+ETAT_DECONNECTE = 'DECONNECTE'
+ETAT_CONNECTE = 'CONNECTE'
+ETAT_DEGRADE = 'DEGRADE'
+ETAT_RECONNEXION = 'RECONNEXION'
+ETAT_CIRCUIT_OUVERT = 'CIRCUIT_OUVERT'
+
+SEUIL_ECHECS = 3
+DELAI_INITIAL_S = 1.0
+DELAI_MAX_S = 60.0
+GIGUE = 0.2   # ±20 % : les automates tombés ensemble ne se reconnectent pas au même instant
+
+
+class CircuitOuvertError(ConnectionError):
+    """Échange S7 refusé sans attente : automate injoignable, reconnexion en cours"""
+
+
+class SuperviseurConnexion:
+    """Machine d'état de la connexion d'un automate, reconnexion automatique en tâche de fond"""
+
+    def __init__(self, reconnecter, nom='', seuil_echecs=SEUIL_ECHECS,
+                 delai_initial=DELAI_INITIAL_S, delai_max=DELAI_MAX_S, a_l_ouverture=None):
+        self.reconnecter = reconnecter        # () -> (succès, message)
+        self.a_l_ouverture = a_l_ouverture    # () appelé à l'ouverture du circuit
+        self.nom = nom
+        self.seuil_echecs = seuil_echecs
+        self.delai_initial = delai_initial
+        self.delai_max = delai_max
+
+        self.etat = ETAT_DECONNECTE
+        self.echecs_consecutifs = 0
+        self.ouvertures = 0
+        self.tentatives = 0
+        self.prochaine_tentative = None   # time.monotonic()
+        self.depuis = time.monotonic()
+
+        self._verrou = threading.Lock()
+        self._reveil = threading.Event()
+        self._thread = None
+
+    def configurer(self, seuil_echecs=None, delai_initial=None, delai_max=None):
+        if seuil_echecs is not None:
+            self.seuil_echecs = max(1, seuil_echecs)
+        if delai_initial is not None:
+            self.delai_initial = delai_initial
+        if delai_max is not None:
+            self.delai_max = delai_max
+
+    def _changer_etat(self, etat):
+        if etat != self.etat:
+            logger.info("Automate %s: %s -> %s", self.nom, self.etat, etat)
+            self.etat = etat
+            self.depuis = time.monotonic()
+
+    # =================================================================
+    # COMMANDES OPÉRATEUR (connect / disconnect)
+    # =================================================================
+
+    def connecte(self):
+        """Connexion établie : supervision active, compteurs remis à zéro"""
+        with self._verrou:
+            self.echecs_consecutifs = 0
+            self.prochaine_tentative = None
+            self._changer_etat(ETAT_CONNECTE)
+        self._reveil.set()
+
+    def deconnecte(self):
+        """Déconnexion demandée : plus de reconnexion automatique"""
+        with self._verrou:
+            self._changer_etat(ETAT_DECONNECTE)
+            self.prochaine_tentative = None
+        self._reveil.set()
+
+    # =================================================================
+    # RÉSULTATS DES ÉCHANGES (chemin critique : pas d'attente)
+    # =================================================================
+
+    def circuit_ouvert(self):
+        return self.etat in (ETAT_CIRCUIT_OUVERT, ETAT_RECONNEXION)
+
+    def autoriser(self):
+        """Lève CircuitOuvertError si l'échange doit échouer immédiatement"""
+        if self.etat in (ETAT_CIRCUIT_OUVERT, ETAT_RECONNEXION):
+            raise CircuitOuvertError(f"Circuit ouvert ({self.nom}): reconnexion en cours")
+
+    def succes(self):
+        if self.echecs_consecutifs or self.etat == ETAT_DEGRADE:
+            with self._verrou:
+                self.echecs_consecutifs = 0
+                if self.etat == ETAT_DEGRADE:
+                    self._changer_etat(ETAT_CONNECTE)
+
+    def echec(self):
+        """Échec de connexion (CPU injoignable, connexion perdue) : dégradé, puis circuit ouvert"""
+        with self._verrou:
+            if self.etat not in (ETAT_CONNECTE, ETAT_DEGRADE):
+                return
+            self.echecs_consecutifs += 1
+            if self.echecs_consecutifs < self.seuil_echecs:
+                self._changer_etat(ETAT_DEGRADE)
+                return
+            self._ouvrir()
+
+        if self.a_l_ouverture:
+            try:
+                self.a_l_ouverture()
+            except Exception as e:
+                logger.error("Erreur ouverture circuit %s: %s", self.nom, e)
+
+    def _ouvrir(self):
+        """Ouvre le circuit et lance le thread de reconnexion (verrou tenu)"""
+        self.ouvertures += 1
+        self._changer_etat(ETAT_CIRCUIT_OUVERT)
+        logger.warning("Automate %s injoignable après %d échec(s): circuit ouvert, reconnexion automatique",
+                       self.nom, self.echecs_consecutifs)
+        if self._thread is None or not self._thread.is_alive():
+            self._reveil.clear()
+            self._thread = threading.Thread(target=self._boucle_reconnexion, name=f"reconnexion-{self.nom}", daemon=True)
+            self._thread.start()
+
+    # =================================================================
+    # RECONNEXION AVEC DÉLAI EXPONENTIEL
+    # =================================================================
+
+    def _boucle_reconnexion(self):
+        delai = self.delai_initial
+        while True:
+            attente = delai * random.uniform(1 - GIGUE, 1 + GIGUE)
+            self.prochaine_tentative = time.monotonic() + attente
+            self._reveil.wait(attente)
+            self._reveil.clear()
+
+            with self._verrou:
+                if self.etat != ETAT_CIRCUIT_OUVERT:
+                    return    # Déconnexion ou reconnexion manuelle pendant l'attente
+                self._changer_etat(ETAT_RECONNEXION)
+                self.tentatives += 1
+
+            try:
+                succes, message = self.reconnecter()
+            except Exception as e:
+                succes, message = False, str(e)
+
+            with self._verrou:
+                if self.etat != ETAT_RECONNEXION:
+                    return
+                if succes:
+                    self.echecs_consecutifs = 0
+                    self.prochaine_tentative = None
+                    self._changer_etat(ETAT_CONNECTE)
+                    logger.info("Automate %s reconnecté (%d tentative(s) au total)", self.nom, self.tentatives)
+                    return
+                self._changer_etat(ETAT_CIRCUIT_OUVERT)
+
+            delai = min(delai * 2, self.delai_max)
+            logger.debug("Reconnexion %s échouée (%s), nouvel essai dans %.1f s", self.nom, message, delai)
+
+    def stats(self):
+        prochaine = self.prochaine_tentative
+        return {
+            'etat': self.etat,
+            'depuis_s': round(time.monotonic() - self.depuis, 1),
+            'echecs_consecutifs': self.echecs_consecutifs,
+            'ouvertures': self.ouvertures,
+            'tentatives_reconnexion': self.tentatives,
+            'prochaine_tentative_s': round(max(0.0, prochaine - time.monotonic()), 1) if prochaine else None
+        }
@@ -4,6 +4,7 @@
 
 import os
 import secrets
+import tempfile
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
 
@@ -47,7 +48,80 @@ class ConfigSimple:
     MODE_COMMUNICATION = os.environ.get('MODE_COMMUNICATION', 'REEL')
     TIMEOUT_CONNEXION = int(os.environ.get('TIMEOUT_CONNEXION', '10'))
     VALIDATION_PING = True
-    
+    LECTURE_MULTI_VARS = os.environ.get('LECTURE_MULTI_VARS', 'True') == 'True'
+    S7_POOL_TAILLE = int(os.environ.get('S7_POOL_TAILLE', '3'))  # Borné par les connexions acceptées par la CPU
+    S7_POOL_CONNEXIONS_RESERVEES = 1  # Laissées libres pour TIA Portal / autres IHM
+    S7_POOL_ATTENTE_S = 5.0
+    S7_CIRCUIT_SEUIL_ECHECS = 3          # Échecs de connexion consécutifs avant ouverture du circuit
+    S7_RECONNEXION_DELAI_INITIAL_S = 1.0  # Puis doublé à chaque tentative échouée
+    S7_RECONNEXION_DELAI_MAX_S = 60.0
+    AUTOMATES_LECTURES_PARALLELES_MAX = 8  # Automates nommés lus en parallèle par une même requête
+    S7_THREADS_IO = 16     # Threads des appels snap7 bloquants de la couche asynchrone (tous automates)
+    SCAN_CONCURRENCE = 128  # Sondes TCP simultanées de /api/scan_network (un /24 en deux vagues)
+    SCAN_TIMEOUT_S = 0.5    # Délai de connexion au port 102 par hôte
+
+    # Moteur d'acquisition (scrutation en tâche de fond)
+    ACQUISITION_ACTIVE = os.environ.get('ACQUISITION_ACTIVE', 'True') == 'True'
+    ACQUISITION_PERIODE_MS = int(os.environ.get('ACQUISITION_PERIODE_MS', '1000'))
+    ACQUISITION_PERIODE_RUNTIME_MS = int(os.environ.get('ACQUISITION_PERIODE_RUNTIME_MS', '500'))
+    ACQUISITION_DUREE_BAIL_S = 30  # Une variable non redemandée est abandonnée après ce délai
+    ACQUISITION_ATTENTE_PREMIERE_LECTURE_S = 2.0
+    ACQUISITION_GROUPES = {
+        'rapide': 200,
+        'normal': 1000,
+        'lent': 5000
+    }
+
+    # Moniteur de santé (sondes réseau en tâche de fond, get_status() servi depuis le cache)
+    SANTE_ACTIVE = os.environ.get('SANTE_ACTIVE', 'True') == 'True'
+    SANTE_PERIODE_S = float(os.environ.get('SANTE_PERIODE_S', '10'))
+    SANTE_TIMEOUT_S = 1.0
+
+    # Historien (historisation par lots en tâche de fond, voir app/utils/historien.py)
+    HISTORIEN_ACTIF = os.environ.get('HISTORIEN_ACTIF', 'True') == 'True'
+    HISTORIEN_PERIODE_S = float(os.environ.get('HISTORIEN_PERIODE_S', '2'))  # Vidage au plus tard après ce délai
+    HISTORIEN_LOT_MAX = 500            # Vidage anticipé dès qu'un lot est plein
+    HISTORIEN_TAILLE_TAMPON = 100000   # Au-delà, les valeurs les plus anciennes sont perdues
+    HISTORIEN_JOURNAL = os.environ.get('HISTORIEN_JOURNAL')  # instance/historien.spool par défaut
+    HISTORIEN_JOURNAL_FSYNC = False    # True : journal synchronisé sur disque à chaque lot
+
+    # Stockage de l'historique numérique (voir app/utils/stockage_historique.py)
+    HISTORIQUE_JOURS_BRUTS = int(os.environ.get('HISTORIQUE_JOURS_BRUTS', '1'))  # Jours gardés en mesures brutes, jour courant compris
+    HISTORIQUE_PERIODE_COMPACTAGE_S = 3600   # Compression des journées plus anciennes en blocs
+    HISTORIQUE_POINTS_MAX = 10000            # Plafond de max_points de /api/history
+
+    # Moteur d'alarmes (évaluation sur changement, voir app/utils/moteur_alarmes.py)
+    ALARMES_ACTIVES = os.environ.get('ALARMES_ACTIVES', 'True') == 'True'   # Thread des temporisations
+    ALARMES_TAILLE_TRANSITIONS = 1000   # Transitions gardées pour la reprise des flux SSE
+    ALARMES_JOURNAL_ACTIF = os.environ.get('ALARMES_JOURNAL_ACTIF', 'True') == 'True'
+    ALARMES_JOURNAL_PERIODE_S = 1.0      # Journal_Alarme écrit au plus tard après ce délai
+    ALARMES_JOURNAL_LOT_MAX = 1000       # Vidage anticipé dès qu'un lot est plein
+    ALARMES_JOURNAL_TAILLE_FILE = 100000 # Au-delà (avalanche), les transitions les plus anciennes sont perdues
+
+    # Tag.valeur écrit en différé (write-behind) : les valeurs vivantes restent dans l'image des tags
+    VALEURS_PERSISTANCE_ACTIVE = os.environ.get('VALEURS_PERSISTANCE_ACTIVE', 'True') == 'True'
+    VALEURS_PERSISTANCE_PERIODE_S = float(os.environ.get('VALEURS_PERSISTANCE_PERIODE_S', '5'))
+    VALEURS_PERSISTANCE_LOT_MAX = 1000   # Lignes par executemany de l'UPDATE groupé
+
+    # CPU simulée du mode SIMULATEUR (voir app/utils/simulateur_s7.py)
+    SIMULATEUR_SCENARIO = os.environ.get('SIMULATEUR_SCENARIO')   # Fichier JSON (scénario de démonstration si vide)
+    SIMULATEUR_SIGNAUX_ACTIFS = os.environ.get('SIMULATEUR_SIGNAUX_ACTIFS', 'True') == 'True'
+    SIMULATEUR_TAILLE_DB = int(os.environ.get('SIMULATEUR_TAILLE_DB', '1024'))   # Octets d'un DB non déclaré
+    SIMULATEUR_NB_TAGS = int(os.environ.get('SIMULATEUR_NB_TAGS', '0'))   # Charge : N valeurs REAL changeantes
+    SIMULATEUR_DB_CHARGE = 100
+    SIMULATEUR_PERIODE_CHARGE_MS = 1000
+    SIMULATEUR_PORT = int(os.environ['SIMULATEUR_PORT']) if os.environ.get('SIMULATEUR_PORT') else None   # Serveur snap7
+    SIMULATEUR_LATENCE_MS = 0   # Durée simulée de chaque échange
+
+    # Journalisation (voir app/utils/journalisation.py)
+    LOG_NIVEAU = os.environ.get('LOG_NIVEAU', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'texte')  # 'texte' ou 'json'
+    LOG_NIVEAUX_MODULES = {
+        # Niveau propre à un module, ex: 'app.controleur.controleur_tags': 'DEBUG'
+    }
+    LOG_LIMITE_MESSAGES = 5      # Messages identiques (WARNING et plus) autorisés par fenêtre
+    LOG_LIMITE_FENETRE_S = 60
+
     # Configuration IHM
     PROJET_PAR_DEFAUT = "IHM_Industrielle_Arthur"
     VERSION_PROJET = "1.0"
@@ -68,6 +142,8 @@ class ConfigProduction(ConfigSimple):
     
     # Logging en production
     SQLALCHEMY_ECHO = False
+    LOG_NIVEAU = os.environ.get('LOG_NIVEAU', 'WARNING')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
 
 # Configuration pour les tests
 class ConfigTesting(ConfigSimple):
@@ -78,6 +154,16 @@ class ConfigTesting(ConfigSimple):
     
     # Base de données en mémoire pour les tests
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+
+    # Pas de thread de scrutation : lectures directes pendant les tests
+    ACQUISITION_ACTIVE = False
+    SANTE_ACTIVE = False
+    HISTORIEN_ACTIF = False
+    ALARMES_JOURNAL_ACTIF = False
+    VALEURS_PERSISTANCE_ACTIVE = False
+    SIMULATEUR_SIGNAUX_ACTIFS = False
+    HISTORIEN_JOURNAL = os.path.join(tempfile.gettempdir(), 'ihm_indus_test_historien.spool')
+    LOG_NIVEAU = 'WARNING'
     
     # Sessions de test
     PERMANENT_SESSION_LIFETIME = 300  # 5 minutes pour tests
@@ -0,0 +1,153 @@
+# Microbenchmarks des adresses S7 : analyse de la chaîne à chaque appel vs adresse compilée une fois
+# 1) analyse seule (lectures / écritures du pilote)  2) propriétés du modèle Tag et to_dict (sérialisation API)
+# Usage : python tests/bench_adresses.py [--appels 100000] [--tags 200]
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event
+from app.utils.adresse_s7 import compiler_adresse
+
+ADRESSES = ['DB1.DBX0.0', 'DB1.DBX3.7', 'DB1.DBW2', 'DB2.DBW120', 'DB1.DBD4', 'DB10.DBD300']
+
+
+# =================================================================
+# IMPLÉMENTATIONS PRÉCÉDENTES (référence)
+# =================================================================
+
+def ancien_parse_adresse_s7(adresse):
+    """Découpage de la chaîne à chaque appel (ancien AutomateSiemensS7Complete.parse_adresse_s7)"""
+    try:
+        if not adresse.startswith('DB') or '.DB' not in adresse:
+            raise ValueError(f"Format d'adresse invalide: {adresse}")
+        parts = adresse.split('.')
+        db_num = int(parts[0][2:])
+        if 'DBX' in parts[1]:
+            return {'type': 'BOOL', 'db': db_num, 'byte_offset': int(parts[1][3:]), 'bit_offset': int(parts[2])}
+        elif 'DBW' in parts[1]:
+            return {'type': 'INT', 'db': db_num, 'offset': int(parts[1][3:])}
+        elif 'DBD' in parts[1]:
+            return {'type': 'DINT', 'db': db_num, 'offset': int(parts[1][3:])}
+        raise ValueError(f"Type d'adresse non supporté: {parts[1]}")
+    except (ValueError, IndexError) as e:
+        raise ValueError(f"Erreur parsing adresse '{adresse}': {str(e)}")
+
+
+def anciens_composants(adresse, type_donnee):
+    """Expressions régulières à chaque accès (anciens db_number, offset_address, get_adresse_components)"""
+    match = re.search(r'DB(\d+)', adresse)
+    db_number = int(match.group(1)) if match else 1
+    match = re.search(r'DB\d+\.DB[XWD](.+)', adresse)
+    offset = match.group(1) if match else "0.0"
+    components = {'adresse_complete': adresse, 'type': type_donnee}
+    match = re.match(r'DB(\d+)\.DB([XWD])(.+)', adresse)
+    if match:
+        components['db'] = int(match.group(1))
+        if match.group(2) == 'X':
+            byte_part, bit_part = match.group(3).split('.')
+            components['byte_offset'] = int(byte_part)
+            components['bit_offset'] = int(bit_part)
+        else:
+            components['offset'] = int(match.group(3))
+    return db_number, offset, components
+
+
+def chronometrer(fonction, nb_appels):
+    debut = time.perf_counter()
+    for i in range(nb_appels):
+        fonction(ADRESSES[i % len(ADRESSES)])
+    return (time.perf_counter() - debut) / nb_appels
+
+
+def bench_analyse(nb_appels):
+    """Coût par appel de l'analyse d'adresse sur le chemin lecture / écriture"""
+    avant = chronometrer(ancien_parse_adresse_s7, nb_appels)
+    apres = chronometrer(compiler_adresse, nb_appels)
+    composants_avant = chronometrer(lambda a: anciens_composants(a, 'INT'), nb_appels)
+    composants_apres = chronometrer(lambda a: (compiler_adresse(a).db, compiler_adresse(a).offset_texte), nb_appels)
+
+    print(f"\n📊 Analyse d'adresse ({nb_appels} appels)")
+    print(f"  parse_adresse_s7 (split)    : {avant * 1e9:8.0f} ns/appel")
+    print(f"  compiler_adresse (cache)    : {apres * 1e9:8.0f} ns/appel  (x{avant / apres:.1f})")
+    print(f"  db/offset/composants (regex): {composants_avant * 1e9:8.0f} ns/appel")
+    print(f"  db/offset (enregistrement)  : {composants_apres * 1e9:8.0f} ns/appel  (x{composants_avant / composants_apres:.1f})")
+
+    erreurs = 0
+    for adresse in ADRESSES:
+        if ancien_parse_adresse_s7(adresse) != compiler_adresse(adresse).composants():
+            erreurs += 1
+            print(f"❌ {adresse}: composants différents")
+    return erreurs
+
+
+def bench_modele(nb_tags):
+    """Sérialisation API de tags : requêtes Mapping_Com et durée par tag"""
+    from app import create_app, db
+    from app.models.modele_tag import Tag, MappingCom
+
+    app = create_app('testing')
+    erreurs = 0
+    with app.app_context():
+        db.metadata.create_all(bind=db.engine, tables=[Tag.__table__, MappingCom.__table__])
+        for i in range(nb_tags):
+            tag = Tag(f"tag_{i}", 'INT', id_projet=1)
+            db.session.add(tag)
+            db.session.add(MappingCom(nom_du_tag=tag.nom_tag, adresse=ADRESSES[i % len(ADRESSES)]))
+        db.session.commit()
+
+        requetes = [0]
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def compter(*args):
+            requetes[0] += 1
+
+        def mesurer(serialiser):
+            db.session.expire_all()
+            tags = Tag.query.all()
+            requetes[0] = 0
+            debut = time.perf_counter()
+            resultats = [serialiser(tag) for tag in tags]
+            return (time.perf_counter() - debut) / len(tags), requetes[0] / len(tags), resultats
+
+        def ancienne_serialisation(tag):
+            # Chaque propriété relisait Mapping_Com puis appliquait ses expressions régulières
+            db_number, _, _ = anciens_composants(tag.adresse_tag, tag.type_donnee)
+            _, offset, _ = anciens_composants(tag.adresse_tag, tag.type_donnee)
+            _, _, components = anciens_composants(tag.adresse_tag, tag.type_donnee)
+            return tag.adresse_tag, db_number, offset, components
+
+        def nouvelle_serialisation(tag):
+            return tag.to_dict()['adresse_tag'], tag.db_number, tag.offset_address, tag.get_adresse_components()
+
+        duree_avant, requetes_avant, avant = mesurer(ancienne_serialisation)
+        duree_apres, requetes_apres, apres = mesurer(nouvelle_serialisation)
+        event.remove(db.engine, 'before_cursor_execute', compter)
+
+    print(f"\n📊 Sérialisation de {nb_tags} tags (adresse, db_number, offset_address, composants)")
+    print(f"  Analyse à chaque accès : {duree_avant * 1e6:8.1f} µs/tag, {requetes_avant:.1f} requêtes Mapping_Com/tag")
+    print(f"  Adresse compilée       : {duree_apres * 1e6:8.1f} µs/tag, {requetes_apres:.1f} requête Mapping_Com/tag")
+
+    if avant != apres:
+        erreurs += 1
+        print("❌ Résultats différents")
+    if requetes_apres > requetes_avant:
+        erreurs += 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks des adresses S7 compilées")
+    parser.add_argument('--appels', type=int, default=100000)
+    parser.add_argument('--tags', type=int, default=200)
+    args = parser.parse_args()
+
+    print("⚡ BENCHMARK ADRESSES S7 COMPILÉES")
+    print("=" * 60)
+    erreurs = bench_analyse(args.appels)
+    erreurs += bench_modele(args.tags)
+    print("\n" + ("✅ Résultats identiques" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
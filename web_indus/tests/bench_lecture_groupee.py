@@ -0,0 +1,167 @@
+# Benchmark lecture groupée S7 : lecture tag par tag vs lecture planifiée
+# Usage : python tests/bench_lecture_groupee.py [--tags 300] [--latence-ms 2]
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.controleur.controleur_tags import AutomateSiemensS7Complete
+from app.utils.s7_lecture_groupee import variable_depuis_adresse, planifier_plages, repartir_multi_vars
+from app.utils.adresse_s7 import compiler_adresse
+
+PORT_SERVEUR_S7 = 1102
+TAILLE_DB = 1024
+
+
+class FauxClientS7:
+    """Client S7 en mémoire qui compte les requêtes et simule la latence réseau"""
+
+    def __init__(self, dbs, latence=0.002):
+        self.dbs = dbs
+        self.latence = latence
+        self.requetes = 0
+        self.verrou = threading.Lock()
+
+    def db_read(self, db, debut, taille):
+        with self.verrou:
+            self.requetes += 1
+        time.sleep(self.latence)
+        return bytearray(self.dbs[db][debut:debut + taille])
+
+    def db_write(self, db, debut, data):
+        with self.verrou:
+            self.requetes += 1
+        time.sleep(self.latence)
+        self.dbs[db][debut:debut + len(data)] = data
+
+    def get_pdu_length(self):
+        return 240
+
+    def get_connected(self):
+        return True
+
+
+def generer_tags(nombre, nb_dbs=3):
+    """Génère des adresses réalistes : blocs de variables par DB avec quelques trous"""
+    tags = []
+    offsets = {db: 0 for db in range(1, nb_dbs + 1)}
+    for i in range(nombre):
+        db = 1 + (i % nb_dbs)
+        type_donnee = random.choice(['BOOL', 'BOOL', 'INT', 'INT', 'DINT', 'REAL'])
+        offset = offsets[db]
+        if random.random() < 0.1:
+            offset += random.randint(4, 64)  # trou dans le DB
+        if type_donnee == 'BOOL':
+            tags.append((f"DB{db}.DBX{offset}.{random.randint(0, 7)}", 'BOOL'))
+            offsets[db] = offset + 1
+        elif type_donnee == 'INT':
+            offset += offset % 2
+            tags.append((f"DB{db}.DBW{offset}", 'INT'))
+            offsets[db] = offset + 2
+        else:
+            offset += (4 - offset % 4) % 4
+            tags.append((f"DB{db}.DBD{offset}", type_donnee))
+            offsets[db] = offset + 4
+    return tags
+
+
+def preparer_automate(client):
+    automate = AutomateSiemensS7Complete()
+    automate.client = client
+    automate.connected = True
+    automate.simulation_mode = False
+    return automate
+
+
+def mesurer(nom, fonction, repetitions=5):
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        fonction()
+    duree = (time.perf_counter() - debut) / repetitions
+    print(f"  {nom:<40} {duree * 1000:8.2f} ms / cycle")
+    return duree
+
+
+def bench_faux_client(tags, latence):
+    print(f"\n📊 Faux client en mémoire ({len(tags)} tags, latence {latence * 1000:.1f} ms/requête)")
+    dbs = {db: bytearray(random.getrandbits(8) for _ in range(TAILLE_DB)) for db in range(1, 4)}
+    client = FauxClientS7(dbs, latence)
+    automate = preparer_automate(client)
+    automate.lecture_multi_vars = False
+
+    client.requetes = 0
+    unitaire = mesurer("Lecture tag par tag", lambda: [automate.lire_tag_par_adresse(a, t) for a, t in tags])
+    requetes_unitaire = client.requetes / 5
+
+    client.requetes = 0
+    groupee = mesurer("Lecture groupée (db_read par plage)", lambda: automate.lire_tags_par_adresses(tags))
+    requetes_groupee = client.requetes / 5
+
+    # Vérification : les deux chemins décodent les mêmes valeurs
+    attendu = [automate.lire_tag_par_adresse(a, t) for a, t in tags]
+    obtenu = automate.lire_tags_par_adresses(tags)
+    assert repr(attendu) == repr(obtenu), "Les valeurs décodées diffèrent entre lecture unitaire et groupée"
+
+    print(f"  Requêtes S7 par cycle : {requetes_unitaire:.0f} → {requetes_groupee:.0f}")
+    print(f"  Gain : x{unitaire / groupee:.1f}")
+
+
+def bench_serveur_snap7(tags):
+    try:
+        import snap7
+        from snap7.types import srvAreaDB
+    except ImportError:
+        print("\n⚠️ snap7 non installé - benchmark serveur S7 local ignoré")
+        return
+
+    import ctypes
+
+    print(f"\n📊 Serveur snap7 local (port {PORT_SERVEUR_S7}, {len(tags)} tags)")
+    serveur = snap7.server.Server()
+    zones = {}
+    for db in range(1, 4):
+        zones[db] = (ctypes.c_uint8 * TAILLE_DB)(*[random.getrandbits(8) for _ in range(TAILLE_DB)])
+        serveur.register_area(srvAreaDB, db, zones[db])
+    serveur.start(tcpport=PORT_SERVEUR_S7)
+
+    try:
+        client = snap7.client.Client()
+        client.connect('127.0.0.1', 0, 1, PORT_SERVEUR_S7)
+        automate = preparer_automate(client)
+
+        unitaire = mesurer("Lecture tag par tag", lambda: [automate.lire_tag_par_adresse(a, t) for a, t in tags])
+
+        automate.lecture_multi_vars = False
+        plages = mesurer("Lecture groupée (db_read par plage)", lambda: automate.lire_tags_par_adresses(tags))
+
+        automate.lecture_multi_vars = True
+        multi = mesurer("Lecture groupée (read_multi_vars)", lambda: automate.lire_tags_par_adresses(tags))
+
+        variables = [variable_depuis_adresse(i, compiler_adresse(a), t) for i, (a, t) in enumerate(tags)]
+        plan = planifier_plages(variables)
+        print(f"  Plan : {len(tags)} tags → {len(plan)} plages → {len(repartir_multi_vars(plan, client.get_pdu_length()))} PDU")
+        print(f"  Gain : x{unitaire / plages:.1f} (plages), x{unitaire / multi:.1f} (multi vars)")
+
+        client.disconnect()
+    finally:
+        serveur.stop()
+        serveur.destroy()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la lecture groupée S7")
+    parser.add_argument('--tags', type=int, default=300)
+    parser.add_argument('--latence-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    random.seed(42)
+    tags = generer_tags(args.tags)
+
+    print("🏭 BENCHMARK LECTURE GROUPÉE S7")
+    print("=" * 60)
+    bench_faux_client(tags, args.latence_ms / 1000)
+    bench_serveur_snap7(tags)
@@ -0,0 +1,175 @@
+# Benchmark évaluation des règles : test_condition historique vs prédicats compilés (Python / NumPy)
+# Vérifie aussi que les résultats sont identiques sur des valeurs de tous types
+# Usage : python tests/bench_regles.py [--objets 2000] [--regles-par-objet 3]
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils import evaluation_regles
+from app.utils.evaluation_regles import (
+    JeuRegles, Predicat, convertir_valeur_couleur, convertir_valeur_visibilite
+)
+
+OPERATEURS = ['=', '==', '!=', '>', '<', '>=', '<=', '<>']
+CIBLES = ['0', '1', '10', '-5', '2.5', '1e3', '1E-2', 'true', 'off', 'oui', 'abc', '', ' 42 ', '9007199254740993']
+VALEURS = [None, True, False, 0, 1, 10, -5, 2.5, 1000.0, 0.01, float('nan'), 'abc', '', '42', 'ON',
+           '3.0', '1e3', 9007199254740993, ' 7 ']
+
+
+def ancienne_conversion_couleur(value):
+    """Copie de l'ancien ColorRule._convert_value"""
+    if value is None:
+        return None
+    if isinstance(value, (bool, int, float)):
+        return value
+    str_value = str(value).strip()
+    if not str_value:
+        return None
+    str_value_lower = str_value.lower()
+    if str_value_lower in ['true', '1', 'on', 'yes', 'oui']:
+        return True
+    elif str_value_lower in ['false', '0', 'off', 'no', 'non']:
+        return False
+    try:
+        if '.' not in str_value and 'e' not in str_value_lower:
+            return int(str_value)
+        else:
+            return float(str_value)
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def ancienne_conversion_visibilite(value):
+    """Copie de l'ancien VisibilityRule._convert_value"""
+    if value is None:
+        return None
+    if isinstance(value, (bool, int, float)):
+        return value
+    str_value = str(value).strip().lower()
+    if not str_value:
+        return None
+    if str_value in ['true', '1', 'on', 'yes', 'oui']:
+        return True
+    elif str_value in ['false', '0', 'off', 'no', 'non']:
+        return False
+    try:
+        if '.' not in str_value:
+            return int(str_value)
+        else:
+            return float(str_value)
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def ancien_test_condition(operateur, cible, valeur, convertir):
+    """Copie de l'ancien test_condition (sans les logs)"""
+    try:
+        rule_value = convertir(cible)
+        test_value = convertir(valeur)
+        operators_map = {
+            '=': lambda x, y: x == y,
+            '==': lambda x, y: x == y,
+            '!=': lambda x, y: x != y,
+            '>': lambda x, y: x > y,
+            '<': lambda x, y: x < y,
+            '>=': lambda x, y: x >= y,
+            '<=': lambda x, y: x <= y
+        }
+        if operateur in operators_map:
+            return operators_map[operateur](test_value, rule_value)
+        return False
+    except Exception:
+        return False
+
+
+def verifier_semantique():
+    """Compare prédicat compilé et ancien test_condition sur toutes les combinaisons"""
+    erreurs = 0
+    for ancienne, nouvelle in ((ancienne_conversion_couleur, convertir_valeur_couleur),
+                               (ancienne_conversion_visibilite, convertir_valeur_visibilite)):
+        for operateur in OPERATEURS:
+            for cible in CIBLES:
+                predicat = Predicat(operateur, cible, nouvelle)
+                for valeur in VALEURS:
+                    attendu = ancien_test_condition(operateur, cible, valeur, ancienne)
+                    if predicat.tester(valeur) != attendu:
+                        erreurs += 1
+                        print(f"❌ {nouvelle.__name__}: {valeur!r} {operateur} {cible!r} -> attendu {attendu}")
+    print(f"{'✅' if not erreurs else '❌'} Sémantique: {erreurs} écart(s)")
+    return erreurs
+
+
+def generer_page(nb_objets, regles_par_objet):
+    listes = []
+    for _ in range(nb_objets):
+        listes.append([
+            Predicat(random.choice(OPERATEURS), random.choice(CIBLES), convertir_valeur_couleur, f"#{i:06d}")
+            for i in range(regles_par_objet)
+        ])
+    return listes
+
+
+def bench_page(nb_objets, regles_par_objet, tours=20):
+    listes = generer_page(nb_objets, regles_par_objet)
+    valeurs = [random.choice(VALEURS) for _ in range(nb_objets)]
+
+    # Référence : ancienne boucle, conversion de la cible et de la valeur à chaque règle
+    debut = time.perf_counter()
+    for _ in range(tours):
+        reference = []
+        for liste, valeur in zip(listes, valeurs):
+            resultat = None
+            for predicat in liste:
+                if predicat.valide and ancien_test_condition(
+                        predicat.operateur, predicat.cle[2], valeur, ancienne_conversion_couleur):
+                    resultat = predicat.resultat
+                    break
+            reference.append(resultat)
+    duree_ancienne = (time.perf_counter() - debut) / tours
+
+    seuil = evaluation_regles.SEUIL_NUMPY
+    evaluation_regles.SEUIL_NUMPY = float('inf')
+    jeu_python = JeuRegles(listes, convertir_valeur_couleur)
+    evaluation_regles.SEUIL_NUMPY = seuil
+
+    debut = time.perf_counter()
+    for _ in range(tours):
+        resultats_python = jeu_python.evaluer(valeurs)
+    duree_python = (time.perf_counter() - debut) / tours
+
+    print(f"\n📊 Page de {nb_objets} objets, {jeu_python.nombre} règles valides")
+    print(f"   Ancienne évaluation : {duree_ancienne * 1000:8.2f} ms")
+    print(f"   Prédicats compilés  : {duree_python * 1000:8.2f} ms  (identique: {resultats_python == reference})")
+
+    if evaluation_regles.np is None:
+        print("   NumPy non installé : chemin vectorisé non testé")
+        return
+
+    jeu_numpy = JeuRegles(listes, convertir_valeur_couleur)
+    if jeu_numpy.vecteur is None:
+        print(f"   Moins de {seuil} règles : chemin vectorisé non utilisé")
+        return
+
+    debut = time.perf_counter()
+    for _ in range(tours):
+        resultats_numpy = jeu_numpy.evaluer(valeurs)
+    duree_numpy = (time.perf_counter() - debut) / tours
+    print(f"   NumPy vectorisé     : {duree_numpy * 1000:8.2f} ms  (identique: {resultats_numpy == reference})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de l'évaluation des règles")
+    parser.add_argument('--objets', type=int, default=2000)
+    parser.add_argument('--regles-par-objet', type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(42)
+
+    print("🎨 BENCHMARK ÉVALUATION DES RÈGLES")
+    print("=" * 60)
+    verifier_semantique()
+    bench_page(args.objets, args.regles_par_objet)
@@ -0,0 +1,153 @@
+# Benchmark couche S7 asynchrone : lectures concurrentes (un thread par requête vs coroutines) et scan réseau d'un /24
+# Usage : python tests/bench_s7_async.py [--requetes 500] [--pool 3] [--threads-io 8]
+import os
+import sys
+import time
+import ctypes
+import asyncio
+import argparse
+import logging
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.controleur.controleur_tags import AutomateSiemensS7Complete
+from app.utils.s7_async import BoucleAsynchrone, PiloteS7Async, scanner_reseau_flux, plage_adresses
+
+PORT_SERVEUR_S7 = 1102
+TAILLE_DB = 256
+
+
+def preparer_automate(taille_pool):
+    automate = AutomateSiemensS7Complete()
+    automate.ip_address = '127.0.0.1'
+    automate.port = PORT_SERVEUR_S7
+    automate.taille_pool = taille_pool
+    automate.validation_ping = False
+    automate.simulation_mode = False
+    succes, message = automate.connect()
+    if not succes:
+        raise RuntimeError(message)
+    return automate
+
+
+def bench_threads(automate, nb_requetes):
+    """Ancien modèle : chaque requête HTTP est un thread qui fait son appel S7 bloquant"""
+    erreurs = []
+    pic = [threading.active_count()]
+
+    def requete(i):
+        valeur, qualite = automate.lire_tag_par_adresse(f"DB1.DBW{2 * (i % 100)}", 'INT')
+        if qualite != 'GOOD':
+            erreurs.append(qualite)
+
+    threads = [threading.Thread(target=requete, args=(i,)) for i in range(nb_requetes)]
+    debut = time.perf_counter()
+    for thread in threads:
+        thread.start()
+        pic[0] = max(pic[0], threading.active_count())
+    for thread in threads:
+        thread.join()
+    duree = time.perf_counter() - debut
+    print(f"  Un thread par requête : {duree * 1000:8.1f} ms, {pic[0]:4d} threads au pic, erreurs: {len(erreurs)}")
+    return len(erreurs)
+
+
+def bench_async(automate, nb_requetes, threads_io):
+    """Couche asynchrone : coroutines en attente, threads_io threads pour les appels snap7"""
+    boucle = BoucleAsynchrone(threads_io)
+    pilote = PiloteS7Async(automate, boucle)
+    pic = [threading.active_count()]
+
+    async def lot():
+        taches = [pilote.lire_tag_par_adresse(f"DB1.DBW{2 * (i % 100)}", 'INT') for i in range(nb_requetes)]
+        resultats = await asyncio.gather(*taches)
+        pic[0] = max(pic[0], threading.active_count())
+        return resultats
+
+    debut = time.perf_counter()
+    resultats = boucle.executer(lot())
+    duree = time.perf_counter() - debut
+    erreurs = sum(1 for _, qualite in resultats if qualite != 'GOOD')
+    print(f"  Coroutines (asyncio)  : {duree * 1000:8.1f} ms, {pic[0]:4d} threads au pic, erreurs: {erreurs}")
+    boucle.arreter()
+    return erreurs
+
+
+def bench_scan(nb_adresses, timeout, nb_sequentiel=16):
+    """
+    Serveur local + adresses de documentation (RFC 5737) qui ne répondent pas : le délai domine
+    Séquentiel mesuré sur nb_sequentiel adresses puis extrapolé ; parallèle en flux sur toute la plage,
+    avec identification SZL de la CPU trouvée
+    """
+    adresses = ['127.0.0.1'] + plage_adresses('192.0.2', 1, nb_adresses - 1)
+    automate = AutomateSiemensS7Complete()
+
+    debut = time.perf_counter()
+    trouves_sequentiel = [
+        ip for ip in adresses[:nb_sequentiel] if automate.tester_port_s7(ip, PORT_SERVEUR_S7, timeout=timeout)
+    ]
+    duree_sequentielle = (time.perf_counter() - debut) * len(adresses) / nb_sequentiel
+
+    boucle = BoucleAsynchrone()
+    debut = time.perf_counter()
+    premier = None
+    trouves = []
+    for hote in boucle.iterer(scanner_reseau_flux(adresses, PORT_SERVEUR_S7, timeout=timeout, identifier=True)):
+        premier = premier or time.perf_counter() - debut
+        trouves.append(hote)
+    duree_async = time.perf_counter() - debut
+    boucle.arreter()
+
+    ports = [h['ip'] for h in trouves if h['s7_port']]
+    identifications = [h.get('identification') or {} for h in trouves]
+    print(f"\n📊 Scan de {len(adresses)} adresses (port {PORT_SERVEUR_S7}, délai {timeout} s)")
+    print(f"  Séquentiel (estimé)   : {duree_sequentielle * 1000:8.1f} ms, port ouvert: {trouves_sequentiel}")
+    print(f"  Parallèle (flux)      : {duree_async * 1000:8.1f} ms, premier résultat à {(premier or 0) * 1000:.1f} ms, "
+          f"port ouvert: {ports}")
+    for hote, identification in zip(trouves, identifications):
+        print(f"  {hote['ip']}: {identification.get('module')} {identification.get('reference', '')} "
+              f"rack {identification.get('rack')} slot {identification.get('slot')} ({identification.get('etat')})")
+
+    erreurs = 0 if sorted(ports) == sorted(trouves_sequentiel) else 1
+    erreurs += 0 if all(i.get('module') for i in identifications) else 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la couche S7 asynchrone")
+    parser.add_argument('--requetes', type=int, default=500)
+    parser.add_argument('--pool', type=int, default=3)
+    parser.add_argument('--threads-io', type=int, default=8)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    try:
+        import snap7
+        from snap7.types import srvAreaDB
+    except ImportError:
+        print("⚠️ snap7 non installé - benchmark ignoré")
+        sys.exit(0)
+
+    print("⚡ BENCHMARK COUCHE S7 ASYNCHRONE")
+    print("=" * 60)
+
+    serveur = snap7.server.Server()
+    zone = (ctypes.c_uint8 * TAILLE_DB)()
+    serveur.register_area(srvAreaDB, 1, zone)
+    serveur.start(tcpport=PORT_SERVEUR_S7)
+
+    try:
+        automate = preparer_automate(args.pool)
+        print(f"\n📊 {args.requetes} lectures concurrentes, pool de {automate.pool.taille} connexions")
+        erreurs = bench_threads(automate, args.requetes)
+        erreurs += bench_async(automate, args.requetes, args.threads_io)
+        automate.disconnect()
+        erreurs += bench_scan(254, 0.5)
+    finally:
+        serveur.stop()
+        serveur.destroy()
+
+    print("\n" + ("✅ Résultats identiques" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
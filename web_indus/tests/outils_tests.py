@@ -0,0 +1,22 @@
+# Outils communs aux scripts de test : tables SQLite en mémoire et projet de test
+# Usage : from outils_tests import creer_projet_test (dans un contexte d'application 'testing')
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import db
+from app.models.modele_tag import Tag, MappingCom, HMIProject
+
+
+def creer_projet_test(*modeles):
+    """Crée les tables des tags et des modèles donnés, puis un projet actif 'test'"""
+    tables = [Tag.__table__, MappingCom.__table__, HMIProject.__table__]
+    db.metadata.create_all(bind=db.engine, tables=tables + [modele.__table__ for modele in modeles])
+    maintenant = datetime.utcnow()
+    projet = HMIProject(nom_projet='test', chemin_fichier='-', date_creation_projet=maintenant,
+                        date_modification=maintenant, version_projet='1.0', actif_projet=True)
+    db.session.add(projet)
+    db.session.commit()
+    return projet
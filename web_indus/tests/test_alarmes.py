@@ -0,0 +1,223 @@
+# Test du moteur d'alarmes : index par tag (coût proportionnel aux tags modifiés, pas au nombre
+# d'alarmes), hystérésis, temporisation d'apparition, acquittement, qualité dégradée et flux SSE
+# des transitions (/api/alarms/stream)
+# Usage : python tests/test_alarmes.py [--tags 2000] [--alarmes-par-tag 5]
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app, db
+from app.models.modele_tag import Tag, Alarme, GererAlarme
+from app.utils.image_tags import image_tags, cle_image, QUALITE_GOOD, QUALITE_STALE
+from app.utils.moteur_alarmes import moteur_alarmes, APPARITION, DISPARITION
+from outils_tests import creer_projet_test
+
+SOURCE = 'test-alarmes'
+
+# nom, type, limite, hystérésis, temporisation ms
+ALARMES_FONCTIONNELLES = [
+    ('TEMPERATURE', 'HAUTE', 80, 5.0, None),
+    ('PRESSION', 'BASSE', 10, None, 300),
+    ('DEFAUT_MOTEUR', 'TOR', 1, None, None),
+]
+
+
+def cle(nom):
+    return cle_image(SOURCE, f'DB1.DBD{nom}', 'REAL')
+
+
+def preparer_base(nb_tags, alarmes_par_tag):
+    projet = creer_projet_test(Alarme, GererAlarme)
+
+    definitions = [(f'CHARGE_{i}', 'HAUTE', 50 + j, None, None) for i in range(nb_tags) for j in range(alarmes_par_tag)]
+    definitions += ALARMES_FONCTIONNELLES
+    tags = {}
+    for nom, type_alarme, limite, hysteresis, delai in definitions:
+        if nom not in tags:
+            tags[nom] = Tag(nom, 'REAL', id_projet=projet.id_projet, alarmes_actives=True)
+            db.session.add(tags[nom])
+            db.session.flush()
+        alarme = Alarme(nom_du_tag=nom, type_alarme=type_alarme, limite=limite, message=f'{nom} {type_alarme}',
+                        priorite='1', hysteresis=hysteresis, delai_activation_ms=delai)
+        db.session.add(alarme)
+        db.session.flush()
+        db.session.add(GererAlarme(id_tag=tags[nom].id_tag, id_alarme=alarme.id_alarme))
+    db.session.commit()
+
+    # Clés de l'image des tags surveillés, comme les fournit le moteur d'acquisition
+    moteur_alarmes.associer_cles(SOURCE, {cle(nom): [tag.id_tag] for nom, tag in tags.items()})
+    return projet.id_projet, len(definitions)
+
+
+def alarme(nom):
+    return next((a for a in moteur_alarmes.actives() if a['nom_tag'] == nom), None)
+
+
+def tester_cout(nb_tags, alarmes_par_tag, nb_regles):
+    """Une publication n'évalue que les règles des tags modifiés"""
+    erreurs = 0
+    image_tags.publier_lot([(cle(f'CHARGE_{i}'), 0.0, QUALITE_GOOD) for i in range(nb_tags)])
+
+    nb_changes = 10
+    evaluations = moteur_alarmes.evaluations
+    debut = time.perf_counter()
+    for tour in range(100):
+        image_tags.publier_lot([(cle(f'CHARGE_{i}'), float(1 + tour % 2), QUALITE_GOOD) for i in range(nb_changes)])
+    duree = (time.perf_counter() - debut) / 100
+    evaluees = (moteur_alarmes.evaluations - evaluations) / 100
+
+    # Référence : réévaluation de toutes les alarmes à chaque cycle
+    regles = list(moteur_alarmes._regles.values())
+    debut = time.perf_counter()
+    for regle in regles:
+        regle.condition(0.0)
+    duree_complete = time.perf_counter() - debut
+
+    print(f"\n📊 {nb_regles} alarmes sur {nb_tags + len(ALARMES_FONCTIONNELLES)} tags, {nb_changes} tags modifiés par publication")
+    print(f"  {evaluees:.0f} règles évaluées en {duree * 1e6:.0f} µs (publication comprise) "
+          f"vs {len(regles)} en {duree_complete * 1e6:.0f} µs pour une réévaluation complète")
+    if evaluees != nb_changes * alarmes_par_tag or moteur_alarmes.stats()['regles'] != nb_regles:
+        erreurs += 1
+    return erreurs
+
+
+def tester_hysteresis():
+    erreurs = 0
+    etats = []
+    for valeur in (79.0, 81.0, 78.0, 76.0, 74.0, 81.0):
+        image_tags.publier(cle('TEMPERATURE'), valeur)
+        active = alarme('TEMPERATURE')
+        etats.append(active['presente'] if active else False)
+    attendus = [False, True, True, True, False, True]
+    print(f"\n📊 Hystérésis (HAUTE 80, hystérésis 5) : 79 81 78 76 74 81 -> présente {etats}")
+    if etats != attendus:
+        erreurs += 1
+    return erreurs
+
+
+def tester_temporisation():
+    erreurs = 0
+    image_tags.publier(cle('PRESSION'), 12.0)
+    image_tags.publier(cle('PRESSION'), 5.0)
+    time.sleep(0.1)
+    image_tags.publier(cle('PRESSION'), 12.0)        # Creux bref : pas d'alarme
+    time.sleep(0.4)
+    breve = alarme('PRESSION')
+
+    image_tags.publier(cle('PRESSION'), 5.0)
+    time.sleep(0.1)
+    avant = alarme('PRESSION')
+    time.sleep(0.4)
+    apres = alarme('PRESSION')
+    print(f"\n📊 Temporisation (BASSE 10, 300 ms) : creux de 100 ms ignoré {breve is None}, "
+          f"absente à 100 ms {avant is None}, présente après 500 ms {apres is not None}")
+    if breve is not None or avant is not None or apres is None or not apres['presente']:
+        erreurs += 1
+    return erreurs
+
+
+def tester_acquittement(id_projet):
+    erreurs = 0
+    # Acquittée pendant qu'elle est présente, puis disparition : quitte l'ensemble actif
+    image_tags.publier(cle('DEFAUT_MOTEUR'), True)
+    id_defaut = alarme('DEFAUT_MOTEUR')['id_alarme']
+    moteur_alarmes.acquitter([id_defaut], 'operateur', id_projet)
+    etat_acquittee = alarme('DEFAUT_MOTEUR')['etat']
+    image_tags.publier(cle('DEFAUT_MOTEUR'), False)
+    retiree = alarme('DEFAUT_MOTEUR') is None
+
+    # Disparue sans acquittement : reste affichée jusqu'à l'acquittement
+    image_tags.publier(cle('TEMPERATURE'), 70.0)
+    etat_disparue = alarme('TEMPERATURE')['etat']
+    acquittees = moteur_alarmes.acquitter(None, 'operateur', id_projet)
+
+    # Qualité dégradée : l'alarme présente est conservée
+    image_tags.publier(cle('TEMPERATURE'), 90.0)
+    image_tags.publier(cle('TEMPERATURE'), None, QUALITE_STALE)
+    conservee = alarme('TEMPERATURE') is not None
+
+    print(f"\n📊 Acquittement : {etat_acquittee} puis retirée à la disparition {retiree}, "
+          f"disparue {etat_disparue}, {len(acquittees)} acquittée(s) en bloc, présente conservée en STALE {conservee}")
+    if etat_acquittee != 'ACQUITTEE' or not retiree or etat_disparue != 'NON_ACQUITTEE' \
+            or alarme('PRESSION')['acquittee'] is not True or not conservee:
+        erreurs += 1
+    return erreurs
+
+
+def lire_evenement(flux):
+    """Prochain événement SSE (hors retry et ping) : (type, identifiant, données)"""
+    while True:
+        bloc = next(flux)
+        bloc = bloc.decode() if isinstance(bloc, bytes) else bloc
+        champs = dict(ligne.split(': ', 1) for ligne in bloc.strip().split('\n') if ': ' in ligne and not ligne.startswith(':'))
+        if 'data' in champs:
+            return champs.get('event'), int(champs['id']), json.loads(champs['data'])
+
+
+def tester_flux(app, id_projet):
+    erreurs = 0
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=1, username='operateur', user_role='operateur', user_role_level=1,
+                       session_token='test', nom_complet='Test', current_project_id=id_projet)
+
+    reponse = client.get('/api/alarms/stream', buffered=False)
+    flux = iter(reponse.response)
+    type_instantane, sequence, instantane = lire_evenement(flux)
+
+    # Alarme brève entre deux lectures du client : apparition et disparition transmises dans l'ordre
+    image_tags.publier(cle('DEFAUT_MOTEUR'), True)
+    image_tags.publier(cle('DEFAUT_MOTEUR'), False)
+    transitions = [lire_evenement(flux) for _ in range(2)]
+    reponse.close()
+
+    # Reprise : Last-Event-ID après l'apparition -> seule la disparition est renvoyée
+    reprise = client.get('/api/alarms/stream', headers={'Last-Event-ID': str(transitions[0][1])}, buffered=False)
+    type_reprise, _, donnees_reprise = lire_evenement(iter(reprise.response))
+    reprise.close()
+
+    acquit = client.post(f"/api/alarms/{transitions[1][2]['id_alarme']}/ack")
+    liste = client.get('/api/alarms').get_json()
+
+    resume = [(t[0], t[2]['transition'], t[2]['nom_tag']) for t in transitions]
+    print(f"\n📊 Flux SSE : {type_instantane} ({len(instantane['alarmes'])} alarmes), puis {resume}")
+    print(f"  Reprise après l'apparition : {type_reprise} {donnees_reprise.get('transition')}, "
+          f"acquittement HTTP {acquit.status_code}, {liste['non_acquittees']} alarme(s) non acquittée(s)")
+    if type_instantane != 'snapshot' or [r[1] for r in resume] != [APPARITION, DISPARITION] \
+            or transitions[1][1] <= sequence or type_reprise != 'transition' \
+            or donnees_reprise.get('transition') != DISPARITION or acquit.status_code != 200 \
+            or any(a['nom_tag'] == 'DEFAUT_MOTEUR' for a in liste['alarmes']):
+        erreurs += 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test du moteur d'alarmes")
+    parser.add_argument('--tags', type=int, default=2000)
+    parser.add_argument('--alarmes-par-tag', type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    print("🚨 TEST MOTEUR D'ALARMES")
+    print("=" * 60)
+
+    app = create_app('testing')
+    with app.app_context():
+        id_projet, nb_regles = preparer_base(args.tags, args.alarmes_par_tag)
+    moteur_alarmes.charger_alarmes()
+
+    erreurs = tester_cout(args.tags, args.alarmes_par_tag, nb_regles)
+    erreurs += tester_hysteresis()
+    erreurs += tester_temporisation()
+    erreurs += tester_acquittement(id_projet)
+    erreurs += tester_flux(app, id_projet)
+
+    print(f"\n📈 {moteur_alarmes.stats()}")
+    print("\n" + ("✅ Alarmes évaluées sur changement, transitions diffusées" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
@@ -0,0 +1,177 @@
+# Test de l'API d'historique (/api/history) : un mois d'un tag à 1 Hz (blocs compressés + mesures
+# brutes récentes) réduit à max_points intervalles min/max/moyenne/dernière, plusieurs tags sur un
+# axe des temps commun, mode LTTB, paramètres invalides
+# Usage : python tests/test_api_historique.py [--jours 30] [--max-points 2000]
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import logging
+from array import array
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import insert
+from app import create_app, db
+from app.models.modele_tag import Tag, MappingCom, MesureHistorique, BlocHistorique
+from app.utils.compression_series import encoder_bloc
+from app.utils.stockage_historique import stockage_historique, horodatage_ms, MS_PAR_JOUR
+
+ORIGINE = datetime(2026, 2, 1)
+PIC = 1000.0
+
+
+def generer_jour(jour, periode_ms, amplitude):
+    """Une journée d'un signal périodiquement scruté (gigue de quelques ms)"""
+    debut = horodatage_ms(ORIGINE) + jour * MS_PAR_JOUR
+    horodatages = array('q', (debut + i * periode_ms + random.randint(0, 3) for i in range(MS_PAR_JOUR // periode_ms)))
+    valeurs = array('d', (20 + amplitude * math.sin(h / 3.6e6) + random.gauss(0, 0.1) for h in horodatages))
+    return horodatages, valeurs
+
+
+def preparer_historique(nb_jours):
+    """Tag rapide (1 Hz) et lent (0,1 Hz) : journées compactées en blocs, dernière heure en mesures brutes"""
+    db.metadata.create_all(bind=db.engine, tables=[
+        Tag.__table__, MappingCom.__table__, MesureHistorique.__table__, BlocHistorique.__table__
+    ])
+    rapide = Tag('T_RAPIDE', 'REAL', id_projet=1, historisation_active=True)
+    lent = Tag('T_LENT', 'REAL', id_projet=1, historisation_active=True)
+    db.session.add_all([rapide, lent])
+    db.session.commit()
+
+    reference = {'nombre': 0, 'min': math.inf, 'max': -math.inf, 'pic': None}
+    for jour in range(nb_jours):
+        for tag, periode in ((rapide, 1000), (lent, 10000)):
+            horodatages, valeurs = generer_jour(jour, periode, 5 if tag is rapide else 2)
+            if tag is rapide and jour == nb_jours // 2:
+                valeurs[12345] = PIC
+                reference['pic'] = horodatages[12345]
+            brut = jour == nb_jours - 1 and tag is rapide
+            if brut:
+                # Dernière heure pas encore compactée
+                horodatages, recents = horodatages[:-3600], horodatages[-3600:]
+                valeurs, valeurs_recentes = valeurs[:-3600], valeurs[-3600:]
+                with db.engine.begin() as connexion:
+                    stockage_historique.ecrire(connexion, [(rapide.id_tag, h, v, 0) for h, v in zip(recents, valeurs_recentes)])
+            with db.engine.begin() as connexion:
+                connexion.execute(insert(BlocHistorique.__table__), {
+                    'id_tag': tag.id_tag, 'debut_ms': horodatages[0] // MS_PAR_JOUR * MS_PAR_JOUR,
+                    'fin_ms': horodatages[-1], 'nb_points': len(horodatages),
+                    'valeur_min': min(valeurs), 'valeur_max': max(valeurs),
+                    'donnees': encoder_bloc(horodatages, valeurs, bytes(len(horodatages)))
+                })
+            if tag is rapide:
+                for serie in (valeurs, valeurs_recentes) if brut else (valeurs,):
+                    reference['nombre'] += len(serie)
+                    reference['min'] = min(reference['min'], min(serie))
+                    reference['max'] = max(reference['max'], max(serie))
+    return reference
+
+
+def client_connecte(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=1, username='test', user_role='automaticien', user_role_level=2,
+                       session_token='test', nom_complet='Test', current_project_id=1)
+    return client
+
+
+def tester_mois(client, nb_jours, max_points, reference):
+    erreurs = 0
+    fin = horodatage_ms(ORIGINE) + nb_jours * MS_PAR_JOUR - 1
+    url = f"/api/history/T_RAPIDE?start={ORIGINE.isoformat()}Z&end={fin}&max_points={max_points}"
+
+    debut = time.perf_counter()
+    reponse = client.get(url)
+    duree = time.perf_counter() - debut
+    donnees = reponse.get_json()
+    serie = donnees['tags']['T_RAPIDE']
+    minimums = [v for v in serie['min'] if v is not None]
+    maximums = [v for v in serie['max'] if v is not None]
+
+    print(f"\n📊 {nb_jours} jours à 1 Hz, max_points={max_points}")
+    print(f"  {serie['points_lus']} points lus -> {len(donnees['horodatages'])} intervalles de {donnees['pas_ms'] / 1000:.0f} s "
+          f"en {duree * 1000:.0f} ms ({len(reponse.data) / 1024:.0f} Ko de JSON)")
+    print(f"  Min {min(minimums):.3f} / max {max(maximums):.3f} (attendus {reference['min']:.3f} / {reference['max']:.3f}), "
+          f"pic conservé: {max(maximums) == PIC}")
+
+    if reponse.status_code != 200 or len(donnees['horodatages']) > max_points \
+            or serie['points_lus'] != reference['nombre'] or sum(serie['nombre']) != reference['nombre'] \
+            or min(minimums) != reference['min'] or max(maximums) != reference['max'] \
+            or len(serie['moyenne']) != len(donnees['horodatages']):
+        erreurs += 1
+    return erreurs
+
+
+def tester_axe_commun(client, nb_jours):
+    erreurs = 0
+    debut = horodatage_ms(ORIGINE) + (nb_jours - 2) * MS_PAR_JOUR
+    reponse = client.get(f"/api/history?tags=T_RAPIDE,T_LENT&start={debut}&end={debut + 2 * MS_PAR_JOUR - 1}&max_points=500")
+    donnees = reponse.get_json()
+    longueurs = {nom: len(serie['moyenne']) for nom, serie in donnees['tags'].items()}
+    print(f"\n📊 Deux tags (1 Hz et 0,1 Hz) sur 2 jours : {len(donnees['horodatages'])} horodatages communs, {longueurs}")
+    if reponse.status_code != 200 or set(longueurs) != {'T_RAPIDE', 'T_LENT'} \
+            or any(n != len(donnees['horodatages']) for n in longueurs.values()) \
+            or sum(donnees['tags']['T_LENT']['nombre']) != 2 * 8640:
+        erreurs += 1
+    return erreurs
+
+
+def tester_lttb(client, nb_jours, reference):
+    erreurs = 0
+    fin = horodatage_ms(ORIGINE) + nb_jours * MS_PAR_JOUR - 1
+    debut = time.perf_counter()
+    reponse = client.get(f"/api/history/T_RAPIDE?start={horodatage_ms(ORIGINE)}&end={fin}&max_points=1000&mode=lttb")
+    duree = time.perf_counter() - debut
+    serie = reponse.get_json()['tags']['T_RAPIDE']
+    print(f"\n📊 LTTB : {serie['points_lus']} -> {len(serie['valeurs'])} points en {duree * 1000:.0f} ms, "
+          f"pic conservé: {reference['pic'] in serie['horodatages']}")
+    if reponse.status_code != 200 or len(serie['valeurs']) != 1000 or reference['pic'] not in serie['horodatages'] \
+            or serie['horodatages'] != sorted(serie['horodatages']):
+        erreurs += 1
+    return erreurs
+
+
+def tester_erreurs(client):
+    erreurs = 0
+    cas = [
+        ("/api/history/INCONNU", 404),
+        ("/api/history/T_RAPIDE?start=2026-02-02T00:00:00&end=2026-02-01T00:00:00", 400),
+        ("/api/history/T_RAPIDE?max_points=0", 400),
+        ("/api/history/T_RAPIDE?mode=moyenne", 400),
+        ("/api/history", 400),
+    ]
+    print("\n📊 Paramètres invalides")
+    for url, attendu in cas:
+        code = client.get(url).status_code
+        print(f"  {'✅' if code == attendu else '❌'} {url} -> {code}")
+        erreurs += 0 if code == attendu else 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de l'API d'historique sous-échantillonnée")
+    parser.add_argument('--jours', type=int, default=30)
+    parser.add_argument('--max-points', type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    print("📈 TEST API HISTORIQUE")
+    print("=" * 60)
+
+    app = create_app('testing')
+    with app.app_context():
+        reference = preparer_historique(args.jours)
+    client = client_connecte(app)
+
+    erreurs = tester_mois(client, args.jours, args.max_points, reference)
+    erreurs += tester_axe_commun(client, args.jours)
+    erreurs += tester_lttb(client, args.jours, reference)
+    erreurs += tester_erreurs(client)
+
+    print("\n" + ("✅ Historique sous-échantillonné côté serveur" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
@@ -0,0 +1,199 @@
+# Test de la bande morte et de l'intervalle minimal de publication dans la couche d'acquisition :
+# un serveur snap7 local produit des REAL bruités, le moteur d'acquisition les scrute toutes les 50 ms,
+# et l'on compte les changements publiés par l'image des tags et reçus par l'historien, par tag
+# Usage : python tests/test_bande_morte.py [--duree 3]
+import os
+import sys
+import time
+import struct
+import ctypes
+import random
+import argparse
+import logging
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app, db
+from app.models.modele_tag import (
+    Tag, ConfigAcquisitionTag, LierConnexionTag, MesureHistorique, ConfigHistorisationTag
+)
+from app.controleur.controleur_tags import AutomateSiemensS7Complete
+from app.utils.acquisition import MoteurAcquisition
+from app.utils.image_tags import image_tags, cle_image, ImageTags, FiltreChangement, QUALITE_GOOD, QUALITE_STALE
+from app.utils.historien import historien
+from outils_tests import creer_projet_test
+
+PORT_SERVEUR_S7 = 1102
+PERIODE_MS = 50
+
+# nom, adresse, (bande morte, bande morte %, intervalle min ms)
+TAGS = [
+    ('BRUIT_SANS_FILTRE', 'DB1.DBD0', None),
+    ('BRUIT_BANDE_MORTE', 'DB1.DBD4', (0.5, None, None)),
+    ('RAMPE_POURCENT', 'DB1.DBD8', (None, 1.0, 500)),
+]
+
+
+def demarrer_serveur():
+    import snap7
+    from snap7.types import srvAreaDB
+
+    serveur = snap7.server.Server()
+    zone = (ctypes.c_uint8 * 64)()
+    serveur.register_area(srvAreaDB, 1, zone)
+    serveur.start(tcpport=PORT_SERVEUR_S7)
+    return serveur, zone
+
+
+def animer(zone, arret, valeurs):
+    """Mesure à 10 ± 0.2 (bruit) sur DBD0 et DBD4, rampe rapide sur DBD8, mise à jour toutes les 10 ms"""
+    debut = time.monotonic()
+    while not arret.is_set():
+        bruit = valeurs['niveau'] + random.uniform(-0.2, 0.2)
+        zone[0:4] = struct.pack('>f', bruit)
+        zone[4:8] = struct.pack('>f', bruit)
+        zone[8:12] = struct.pack('>f', 100 + 20 * (time.monotonic() - debut))
+        time.sleep(0.01)
+
+
+def preparer_base():
+    projet = creer_projet_test(ConfigAcquisitionTag, LierConnexionTag, MesureHistorique, ConfigHistorisationTag)
+
+    ids = {}
+    for nom, adresse, filtre in TAGS:
+        tag = Tag(nom, 'REAL', adresse, id_projet=projet.id_projet, historisation_active=True)
+        db.session.add(tag)
+        db.session.flush()
+        bande_morte, pourcent, intervalle = filtre or (None, None, None)
+        db.session.add(ConfigAcquisitionTag(id_tag=tag.id_tag, periode_ms=PERIODE_MS, bande_morte=bande_morte,
+                                            bande_morte_pct=pourcent, intervalle_min_ms=intervalle))
+        ids[nom] = tag.id_tag
+    db.session.commit()
+    return ids
+
+
+def tester_filtre_unitaire():
+    """Intervalle minimal : le changement retenu est publié à la première lecture après l'intervalle"""
+    erreurs = 0
+    image = ImageTags()
+    cle = ('unitaire', 'DB1.DBD0', 'REAL')
+    image.definir_filtres('unitaire', {cle: FiltreChangement(None, None, 0.2)})
+    image.publier(cle, 1.0)
+    retenue = image.publier(cle, 2.0)                      # Dans l'intervalle : retenu
+    qualite = image.publier(cle, 2.0, QUALITE_STALE)       # Qualité : publiée immédiatement
+    time.sleep(0.25)
+    apres = image.publier(cle, 2.0, QUALITE_GOOD)
+    forcee = image.publier(cle, 3.0, forcer=True)          # Écriture opérateur : filtre ignoré
+    print(f"  Intervalle min : retenu {not retenue}, qualité publiée {qualite}, publié après l'intervalle {apres}, "
+          f"écriture forcée {forcee}")
+    if retenue or not qualite or not apres or not forcee or image.lire(cle).valeur != 3.0:
+        erreurs += 1
+    return erreurs
+
+
+def tester_acquisition(app, ids, duree):
+    erreurs = 0
+    serveur, zone = demarrer_serveur()
+    arret = threading.Event()
+    niveau = {'niveau': 10.0}
+    animation = threading.Thread(target=animer, args=(zone, arret, niveau), daemon=True)
+    animation.start()
+
+    automate = AutomateSiemensS7Complete()
+    automate.nom = 'test-bande-morte'
+    automate.ip_address = '127.0.0.1'
+    automate.port = PORT_SERVEUR_S7
+    automate.validation_ping = False
+    automate.simulation_mode = False
+    moteur = MoteurAcquisition(automate)
+    moteur.app = app
+
+    publies = {}
+    cles = {cle_image(automate.nom, adresse, 'REAL'): nom for nom, adresse, _ in TAGS}
+
+    def compter(changements):
+        for cle, _, _, _ in changements:
+            if cle in cles:
+                publies[cles[cle]] = publies.get(cles[cle], 0) + 1
+
+    image_tags.ajouter_auditeur(compter)
+    try:
+        succes, message = automate.connect()
+        print(f"  {message}")
+        moteur.charger_tags_configures()
+        moteur.demarrer()
+        time.sleep(duree)
+        niveau['niveau'] = 15.0                    # Marche : publiée malgré la bande morte
+        time.sleep(0.5)
+        cycles = moteur.cycles
+    finally:
+        moteur.arreter()
+        arret.set()
+        automate.disconnect()              # Changement de qualité : publié et historisé aussi
+        image_tags.retirer_auditeur(compter)
+        serveur.stop()
+        serveur.destroy()
+
+    historien.vider()
+    with app.app_context():
+        historises = {nom: MesureHistorique.query.filter_by(id_tag=ids[nom]).count() for nom, _, _ in TAGS}
+    filtre = image_tags.lire(cle_image(automate.nom, 'DB1.DBD4', 'REAL'))
+    image_tags.vider(automate.nom)
+
+    print(f"\n📊 {cycles} cycles d'acquisition en {duree + 0.5:.1f} s (période {PERIODE_MS} ms)")
+    for nom, _, filtre_tag in TAGS:
+        print(f"  {nom:18s} filtre {str(filtre_tag):22s}: {publies.get(nom, 0):4d} changements publiés, "
+              f"{historises[nom]:4d} valeurs historisées")
+    print(f"  Valeur publiée après la marche : {filtre.valeur:.2f}")
+
+    max_rampe = (duree + 0.5) / 0.5 + 2
+    if not succes or publies.get('BRUIT_SANS_FILTRE', 0) < cycles * 0.8 \
+            or not 2 <= publies.get('BRUIT_BANDE_MORTE', 0) <= 5 \
+            or publies.get('RAMPE_POURCENT', 0) > max_rampe \
+            or abs(filtre.valeur - 15) > 0.3 \
+            or any(historises[nom] != publies.get(nom, 0) for nom in historises):
+        erreurs += 1
+    return erreurs
+
+
+def tester_lectures_http(app, ids):
+    """Lectures HTTP (Tag.mettre_a_jour_valeur) : rien pour l'historien, qui n'écoute que l'image"""
+    erreurs = 0
+    recus = historien.recus
+    with app.app_context():
+        tag = db.session.get(Tag, ids['BRUIT_SANS_FILTRE'])
+        for _ in range(20):
+            tag.mettre_a_jour_valeur(12.5)
+    print(f"\n📊 20 lectures HTTP d'un tag historisé : {historien.recus - recus} valeur(s) reçue(s) par l'historien")
+    if historien.recus != recus:
+        erreurs += 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de la bande morte dans la couche d'acquisition")
+    parser.add_argument('--duree', type=float, default=3.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    try:
+        import snap7
+    except ImportError:
+        print("⚠️ snap7 non installé - test ignoré")
+        sys.exit(0)
+
+    print("🎚️ TEST BANDE MORTE ET PUBLICATION PAR CHANGEMENT")
+    print("=" * 60)
+
+    app = create_app('testing')
+    with app.app_context():
+        ids = preparer_base()
+
+    erreurs = tester_filtre_unitaire()
+    erreurs += tester_acquisition(app, ids, args.duree)
+    erreurs += tester_lectures_http(app, ids)
+
+    print("\n" + ("✅ Seuls les changements significatifs sont publiés" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
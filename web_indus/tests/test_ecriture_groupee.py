@@ -0,0 +1,252 @@
+# Test de l'écriture groupée contre un serveur snap7 local : un lot de recette (consignes contiguës,
+# bits voisins) part en quelques requêtes au lieu de 1 à 2 par tag, les bits non écrits d'un octet
+# sont préservés, une écriture fautive n'empêche pas les autres, puis /api/write_batch de bout en bout
+# Usage : python tests/test_ecriture_groupee.py [--consignes 60]
+import os
+import sys
+import struct
+import ctypes
+import argparse
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils.image_tags import image_tags, cle_image
+
+PORT_SERVEUR_S7 = 1102
+TAILLE_DB = 1024
+OCTET_BITS = 600        # DB1.DBX600.0 à 601.7 : 16 bits écrits en entier
+OCTET_PARTIEL = 610     # DB1.DBX610 : 3 bits écrits, les 5 autres appartiennent à l'automate
+OCTET_MOTS = 620        # DB1.DBW620... : compteurs de recette
+
+
+def demarrer_serveur():
+    import snap7
+    from snap7.types import srvAreaDB, srvAreaMK
+
+    serveur = snap7.server.Server()
+    zones = {'DB': (ctypes.c_uint8 * TAILLE_DB)(), 'M': (ctypes.c_uint8 * 64)()}
+    serveur.register_area(srvAreaDB, 1, zones['DB'])
+    serveur.register_area(srvAreaMK, 0, zones['M'])
+    serveur._zones = zones
+    serveur.start(tcpport=PORT_SERVEUR_S7)
+    return serveur
+
+
+def preparer_automate(automate, nom):
+    automate.nom = nom
+    automate.ip_address = '127.0.0.1'
+    automate.port = PORT_SERVEUR_S7
+    automate.validation_ping = False
+    automate.simulation_mode = False
+    return automate
+
+
+class CompteurRequetes:
+    """Compte les échanges S7 (méthodes du client snap7 et write_multi_vars par items)"""
+
+    METHODES = ('db_read', 'db_write', 'read_area', 'read_multi_vars')
+
+    def __init__(self):
+        import snap7
+        from app.utils import pool_s7
+        from app.controleur import controleur_tags
+        self.cibles = [(snap7.client.Client, nom) for nom in self.METHODES]
+        self.cibles += [(pool_s7, 'ecrire_items_s7'), (controleur_tags, 'ecrire_items_s7')]
+        self.originales = [getattr(objet, nom) for objet, nom in self.cibles]
+        self.appels = []
+
+    def __enter__(self):
+        for (objet, nom), fonction in zip(self.cibles, self.originales):
+            setattr(objet, nom, self._compter(nom, fonction))
+        return self
+
+    def __exit__(self, *exc):
+        for (objet, nom), fonction in zip(self.cibles, self.originales):
+            setattr(objet, nom, fonction)
+
+    def _compter(self, nom, fonction):
+        def compter(*args, **kwargs):
+            self.appels.append('write_multi_vars' if nom == 'ecrire_items_s7' else nom)
+            return fonction(*args, **kwargs)
+        return compter
+
+    def __len__(self):
+        return len(self.appels)
+
+    def resume(self):
+        return {nom: self.appels.count(nom) for nom in sorted(set(self.appels))}
+
+
+def lot_recette(nb_consignes, numero):
+    """Consignes REAL contiguës, 16 bits d'un même mot, 3 bits d'un octet partagé, mots INT"""
+    lot = [(f'DB1.DBD{4 * i}', float(numero * 100 + i) + 0.5, 'REAL') for i in range(nb_consignes)]
+    lot += [(f'DB1.DBX{OCTET_BITS + i // 8}.{i % 8}', (i + numero) % 3 == 0, 'BOOL') for i in range(16)]
+    lot += [(f'DB1.DBX{OCTET_PARTIEL}.{bit}', valeur, 'BOOL') for bit, valeur in ((0, True), (1, True), (7, False))]
+    lot += [(f'DB1.DBW{OCTET_MOTS + 2 * i}', numero * 10 - i, 'INT') for i in range(8)]
+    lot += [('MW10', numero, 'INT'), ('M12.3', True, 'BOOL')]
+    return lot
+
+
+def relire(serveur, adresse, type_donnee):
+    """Valeur écrite, lue directement dans la mémoire du serveur"""
+    zone = serveur._zones['M' if adresse.startswith('M') else 'DB']
+    octet = int(adresse.replace('DB1.DB', '').lstrip('XDWM').split('.')[0])
+    if type_donnee == 'BOOL':
+        return bool(zone[octet] & (1 << int(adresse.split('.')[-1])))
+    if type_donnee == 'REAL':
+        return struct.unpack('>f', bytes(zone[octet:octet + 4]))[0]
+    return struct.unpack('>h', bytes(zone[octet:octet + 2]))[0]
+
+
+def tester_recette(automate, serveur, nb_consignes):
+    erreurs = 0
+    resultats = {}
+    for mode, bits_atomiques in (('bit seul', True), ('relecture', False)):
+        serveur._zones['DB'][OCTET_PARTIEL] = 0b10110100
+        automate.bits_atomiques = bits_atomiques
+        lot = lot_recette(nb_consignes, len(resultats) + 1)
+
+        with CompteurRequetes() as unitaires:
+            for adresse, valeur, type_donnee in lot:
+                automate.ecrire_tag_par_adresse(adresse, valeur, type_donnee)
+        automate.bits_atomiques = bits_atomiques
+
+        serveur._zones['DB'][OCTET_PARTIEL] = 0b10110100
+        lot = lot_recette(nb_consignes, len(resultats) + 2)
+        with CompteurRequetes() as groupees:
+            ecrits = automate.ecrire_tags_par_adresses(lot)
+
+        relus = [relire(serveur, adresse, type_donnee) for adresse, _, type_donnee in lot]
+        exactes = sum(1 for (_, valeur, _), relu in zip(lot, relus) if relu == valeur)
+        partiel = serveur._zones['DB'][OCTET_PARTIEL]
+        publie = image_tags.lire(cle_image(automate.nom, lot[0][0], 'REAL'))
+        resultats[mode] = (len(unitaires), len(groupees))
+
+        print(f"\n📊 Recette de {len(lot)} écritures ({mode}) : {len(unitaires)} échanges S7 tag par tag, "
+              f"{len(groupees)} en écriture groupée {groupees.resume()}")
+        print(f"  {exactes}/{len(lot)} valeurs relues exactes, octet partagé 0b{partiel:08b} "
+              f"(attendu 0b00110111), image à jour {publie is not None and publie.valeur == lot[0][1]}")
+        if not all(ok for ok, _ in ecrits) or exactes != len(lot) or partiel != 0b00110111 \
+                or publie is None or publie.valeur != lot[0][1] or len(groupees) > 4:
+            erreurs += 1
+    return erreurs
+
+
+def tester_echecs_partiels(automate, serveur):
+    """Adresse invalide, valeur hors limites, DB absent : seules ces écritures échouent"""
+    erreurs = 0
+    lot = [
+        ('DB1.DBW700', 1234, 'INT'),
+        ('DB1.DBX9.9', True, 'BOOL'),
+        ('DB1.DBW702', 99999, 'INT'),
+        ('DB9.DBW0', 1, 'INT'),
+        ('DB1.DBW704', -4321, 'INT'),
+    ]
+    attendus = [True, False, False, False, True]
+    ecrits = automate.ecrire_tags_par_adresses(lot)
+    relus = [relire(serveur, 'DB1.DBW700', 'INT'), relire(serveur, 'DB1.DBW704', 'INT')]
+
+    print("\n📊 Échecs partiels")
+    for (adresse, valeur, _), (succes, statut), attendu in zip(lot, ecrits, attendus):
+        print(f"  {'✅' if succes == attendu else '❌'} {adresse:12s} {valeur!r:8} -> {statut}")
+        erreurs += 0 if succes == attendu else 1
+    if relus != [1234, -4321]:
+        erreurs += 1
+    return erreurs
+
+
+def tester_api(serveur):
+    from app import create_app, db
+    from app.models.modele_tag import Tag
+    from app.controleur.controleur_tags import automate
+    from app.utils.persistance_valeurs import persistance_valeurs
+    from outils_tests import creer_projet_test
+
+    erreurs = 0
+    app = create_app('testing')
+    with app.app_context():
+        projet = creer_projet_test()
+        for nom, type_donnee, adresse, acces in (
+                ('CONSIGNE_1', 'REAL', 'DB1.DBD800', 'RW'), ('CONSIGNE_2', 'REAL', 'DB1.DBD804', 'RW'),
+                ('MARCHE', 'BOOL', 'DB1.DBX808.0', 'RW'), ('MESURE', 'REAL', 'DB1.DBD812', 'R')):
+            db.session.add(Tag(nom, type_donnee, adresse, id_projet=projet.id_projet, acces=acces))
+        db.session.commit()
+        id_projet = projet.id_projet
+
+    preparer_automate(automate, automate.nom)
+    automate.connect()
+    try:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session.update(user_id=1, username='test', user_role='automaticien', user_role_level=2,
+                           session_token='test', nom_complet='Test', current_project_id=id_projet)
+
+        reponse = client.post('/api/write_batch', json={'ecritures': [
+            {'tag': 'CONSIGNE_1', 'valeur': 12.5},
+            {'tag': 'CONSIGNE_2', 'value': '7.25'},
+            {'tag': 'MARCHE', 'valeur': True},
+            {'tag': 'MESURE', 'valeur': 1.0},
+            {'tag': 'INCONNU', 'valeur': 1},
+            {'tag': 'CONSIGNE_1', 'valeur': 'abc'},
+        ]})
+        donnees = reponse.get_json()
+        invalide = client.post('/api/write_batch', json={'ecritures': [{'valeur': 1}]}).status_code
+
+        # Tag.valeur est écrit en différé, au vidage de la persistance des valeurs
+        persistance_valeurs.vider()
+        with app.app_context():
+            en_base = Tag.query.filter_by(nom_tag='CONSIGNE_2').first().valeur
+
+        statuts = [r['success'] for r in donnees['resultats']]
+        print(f"\n📊 /api/write_batch : HTTP {reponse.status_code}, {donnees['ecrites']} écrites, "
+              f"{donnees['echecs']} échecs {statuts}, corps invalide HTTP {invalide}")
+        for resultat in donnees['resultats']:
+            if not resultat['success']:
+                print(f"  {resultat['nom_tag']}: {resultat['error']}")
+        relus = [relire(serveur, 'DB1.DBD800', 'REAL'), relire(serveur, 'DB1.DBD804', 'REAL'),
+                 relire(serveur, 'DB1.DBX808.0', 'BOOL')]
+        if reponse.status_code != 200 or statuts != [True, True, True, False, False, False] \
+                or relus != [12.5, 7.25, True] or invalide != 400 or en_base != '7.25':
+            erreurs += 1
+    finally:
+        automate.disconnect()
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de l'écriture groupée S7")
+    parser.add_argument('--consignes', type=int, default=60)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    try:
+        import snap7
+    except ImportError:
+        print("⚠️ snap7 non installé - test ignoré")
+        sys.exit(0)
+
+    from app.controleur.controleur_tags import AutomateSiemensS7Complete
+
+    print("✍️ TEST ÉCRITURE GROUPÉE S7")
+    print("=" * 60)
+
+    serveur = demarrer_serveur()
+    automate = preparer_automate(AutomateSiemensS7Complete(), 'test-ecriture')
+    try:
+        succes, message = automate.connect()
+        print(f"  {message}")
+        erreurs = 0 if succes else 1
+        erreurs += tester_recette(automate, serveur, args.consignes)
+        erreurs += tester_echecs_partiels(automate, serveur)
+        automate.disconnect()
+        erreurs += tester_api(serveur)
+    finally:
+        automate.disconnect()
+        serveur.stop()
+        serveur.destroy()
+        image_tags.vider(automate.nom)
+
+    print("\n" + ("✅ Lots écrits en un minimum de requêtes S7" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
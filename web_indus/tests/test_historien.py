@@ -0,0 +1,219 @@
+# Test de l'historien : écriture par lots (Historique_Mesure) vs une insertion + flush par valeur
+# (Historique_tag + HISTORISER), bande morte par tag, reprise après arrêt brutal depuis le journal
+# d'écriture anticipée, et valeurs non numériques toujours écrites dans Historique_tag
+# Usage : python tests/test_historien.py [--tags 200] [--cycles 10]
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models.modele_tag import Tag, MappingCom, HistoriqueTag, Historiser, ConfigHistorisationTag, MesureHistorique
+from app.utils.historien import Historien
+
+
+def preparer_base(nb_tags):
+    db.metadata.create_all(bind=db.engine, tables=[
+        Tag.__table__, MappingCom.__table__, HistoriqueTag.__table__, Historiser.__table__,
+        ConfigHistorisationTag.__table__, MesureHistorique.__table__
+    ])
+    tags = [Tag(f"hist_{i}", 'REAL', id_projet=1, historisation_active=True) for i in range(nb_tags)]
+    db.session.add_all(tags)
+    db.session.commit()
+    return [tag.id_tag for tag in tags]
+
+
+def vider_historique():
+    db.session.query(Historiser).delete()
+    db.session.query(HistoriqueTag).delete()
+    db.session.query(MesureHistorique).delete()
+    db.session.commit()
+
+
+def compter_requetes():
+    requetes = [0]
+    moteur = db.engine
+
+    def compter(*args):
+        requetes[0] += 1
+
+    event.listen(moteur, 'before_cursor_execute', compter)
+    return requetes, lambda: event.remove(moteur, 'before_cursor_execute', compter)
+
+
+def ancienne_historisation(id_tag, valeur, qualite):
+    """Ancien Tag._ajouter_historique : insertion, flush pour l'identifiant, lien, commit de la requête"""
+    historique = HistoriqueTag(valeur_historique=str(valeur), timestamp_hist=datetime.utcnow(),
+                               qualite_hist=qualite, type_changement='LECTURE_AUTO')
+    db.session.add(historique)
+    db.session.flush()
+    db.session.add(Historiser(id_tag=id_tag, id_historique=historique.id_historique))
+    db.session.commit()
+
+
+def tester_lots(app, ids, nb_cycles):
+    erreurs = 0
+    nb_valeurs = len(ids) * nb_cycles
+
+    with app.app_context():
+        requetes, arreter = compter_requetes()
+        debut = time.perf_counter()
+        for cycle in range(nb_cycles):
+            for id_tag in ids:
+                ancienne_historisation(id_tag, cycle + random.random(), 'GOOD')
+        duree_avant = time.perf_counter() - debut
+        requetes_avant = requetes[0]
+        arreter()
+        vider_historique()
+
+    historien = Historien()
+    historien.init_app(app)
+    with app.app_context():
+        requetes, arreter = compter_requetes()
+    # Un cycle de scrutation par seconde : clés (tag, horodatage) distinctes
+    origine = datetime.utcnow()
+    debut = time.perf_counter()
+    for cycle in range(nb_cycles):
+        horodatage = origine + timedelta(seconds=cycle)
+        for id_tag in ids:
+            historien.enregistrer(id_tag, cycle + random.random(), timestamp=horodatage)
+    duree_enregistrement = time.perf_counter() - debut
+    historien.vider()
+    duree_apres = time.perf_counter() - debut
+    arreter()
+
+    with app.app_context():
+        lignes = MesureHistorique.query.count()
+        vider_historique()
+    stats = historien.stats()
+    historien.journal.fermer()
+
+    print(f"\n📊 Historisation de {nb_valeurs} valeurs ({len(ids)} tags x {nb_cycles} cycles)")
+    print(f"  Insertion + flush par valeur : {duree_avant * 1000:8.1f} ms, {requetes_avant} requêtes SQL")
+    print(f"  Historien (lots de {historien.lot_max})    : {duree_apres * 1000:8.1f} ms, {requetes[0]} requêtes SQL "
+          f"({stats['lots']} lots, enregistrement {duree_enregistrement / nb_valeurs * 1e6:.1f} µs/valeur)")
+    print(f"  Lignes écrites : {lignes} Historique_Mesure")
+
+    if lignes != nb_valeurs or requetes[0] > stats['lots']:
+        erreurs += 1
+    return erreurs
+
+
+def tester_bande_morte(app, ids):
+    erreurs = 0
+    historien = Historien()
+    historien.init_app(app)
+    historien.filtres = {}
+    with app.app_context():
+        db.session.add(ConfigHistorisationTag(id_tag=ids[0], bande_morte=0.5))
+        db.session.commit()
+    historien.charger_configuration()
+
+    # Bruit de mesure de ±0.2 autour de 10, puis une marche à 12
+    valeurs = [10 + random.uniform(-0.2, 0.2) for _ in range(100)] + [12.0]
+    retenues = [historien.enregistrer(ids[0], valeur) for valeur in valeurs]
+    sans_filtre = [historien.enregistrer(ids[1], valeur) for valeur in valeurs]
+    historien.vider()
+    historien.journal.fermer()
+
+    print(f"\n📊 Bande morte 0.5 sur un bruit de ±0.2 : {sum(retenues)}/{len(valeurs)} valeurs historisées "
+          f"(sans bande morte : {sum(sans_filtre)})")
+    if sum(retenues) != 2 or not retenues[-1] or sum(sans_filtre) != len(valeurs):
+        erreurs += 1
+
+    with app.app_context():
+        vider_historique()
+    return erreurs
+
+
+def tester_tampon_plein_apres_echec(app, ids):
+    """Lot en échec remis en tampon pendant que le tampon s'est rempli : les plus anciens sont perdus et comptés"""
+    erreurs = 0
+    historien = Historien(taille_tampon=5, lot_max=3)
+    historien.app = app
+    for i in range(5):
+        historien.enregistrer(ids[i], i)
+
+    def avalanche_pendant_echec(lot):
+        # Nouvelles valeurs pendant l'écriture du lot, puis base indisponible
+        for i in range(5, 8):
+            historien.enregistrer(ids[i], i)
+        raise RuntimeError("base indisponible")
+
+    historien._ecrire_lot = avalanche_pendant_echec
+    ok = historien.vider()
+    en_tampon = [e.valeur for e in historien._tampon]
+
+    print(f"\n📊 Échec d'écriture, tampon plein entre-temps : vider() {ok}, tampon {en_tampon}, "
+          f"{historien.perdus} perdu(s) (attendu [3..7], 3)")
+    if ok or en_tampon != [3.0, 4.0, 5.0, 6.0, 7.0] or historien.perdus != 3:
+        erreurs += 1
+    return erreurs
+
+
+def tester_reprise(app, ids):
+    erreurs = 0
+    historien = Historien()
+    historien.init_app(app)
+    origine = datetime.utcnow()
+    for i in range(50):
+        historien.enregistrer(ids[i % len(ids)], i, timestamp=origine + timedelta(milliseconds=i))
+    historien.vider()                       # 50 valeurs en base, journal vidé
+    for i in range(30):
+        historien.enregistrer(ids[i % len(ids)], 100 + i, timestamp=origine + timedelta(milliseconds=100 + i))
+    historien.enregistrer(ids[0], 'MARCHE')
+    historien.journal.fermer()              # Arrêt brutal : 30 valeurs seulement dans le journal
+
+    redemarre = Historien()
+    redemarre.init_app(app)
+    rejouees = redemarre.stats()['en_attente']
+    redemarre.vider()
+    redemarre.journal.fermer()
+
+    with app.app_context():
+        mesures = MesureHistorique.query.all()
+        valeurs = sorted(int(m.valeur) for m in mesures)
+        tags_ok = all(m.id_tag == ids[int(m.valeur) % 100 % len(ids)] for m in mesures)
+        # Valeur texte : Historique_tag, liée au tag par HISTORISER (identifiant du lot bien attribué)
+        textes = [(lien.id_tag, h.valeur_historique) for lien, h in db.session.query(Historiser, HistoriqueTag).join(
+            HistoriqueTag, Historiser.id_historique == HistoriqueTag.id_historique)]
+        vider_historique()
+
+    print(f"\n📊 Reprise après arrêt brutal : {rejouees} valeurs rejouées depuis le journal, {len(mesures)} mesures "
+          f"et {len(textes)} texte(s) en base, tags corrects: {tags_ok}")
+    if rejouees != 31 or not tags_ok or textes != [(ids[0], 'MARCHE')] \
+            or valeurs != list(range(50)) + list(range(100, 130)):
+        erreurs += 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de l'historien par lots")
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--cycles', type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    print("🗃️ TEST HISTORIEN PAR LOTS")
+    print("=" * 60)
+
+    app = create_app('testing')
+    if os.path.exists(app.config['HISTORIEN_JOURNAL']):
+        os.remove(app.config['HISTORIEN_JOURNAL'])
+    with app.app_context():
+        ids = preparer_base(args.tags)
+
+    erreurs = tester_lots(app, ids, args.cycles)
+    erreurs += tester_bande_morte(app, ids)
+    erreurs += tester_tampon_plein_apres_echec(app, ids)
+    erreurs += tester_reprise(app, ids)
+
+    print("\n" + ("✅ Historisation par lots, bande morte et reprise OK" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
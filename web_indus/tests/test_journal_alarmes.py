@@ -0,0 +1,257 @@
+# Test du journal des alarmes : avalanche de transitions absorbée par la file sans ralentir la
+# publication, écriture par lots, puis pagination par curseur de /api/alarms/history sur un journal
+# volumineux (pages profondes à coût constant, contrairement à OFFSET), filtres tag / priorité
+# Usage : python tests/test_journal_alarmes.py [--lignes 500000] [--avalanche 2000]
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event, insert, text
+from app import create_app, db
+from app.models.modele_tag import Tag, Alarme, GererAlarme, JournalAlarme
+from app.utils.image_tags import image_tags, cle_image, QUALITE_GOOD
+from app.utils.moteur_alarmes import moteur_alarmes
+from app.utils.journal_alarmes import JournalAlarmes, journal_alarmes, encoder_curseur
+from app.utils.stockage_historique import horodatage_ms
+from outils_tests import creer_projet_test
+
+SOURCE = 'test-journal'
+PRIORITES = ['1', '2', '3']
+DEBUT_JOURNAL = horodatage_ms(datetime(2025, 1, 1))
+
+
+def preparer_base(nb_tags):
+    projet = creer_projet_test(Alarme, GererAlarme, JournalAlarme)
+
+    surveilles = {}
+    for i in range(nb_tags):
+        tag = Tag(f'DEFAUT_{i}', 'BOOL', id_projet=projet.id_projet, alarmes_actives=True)
+        db.session.add(tag)
+        db.session.flush()
+        alarme = Alarme(nom_du_tag=tag.nom_tag, type_alarme='TOR', limite=1, message=f'Défaut {i}',
+                        priorite=PRIORITES[i % len(PRIORITES)])
+        db.session.add(alarme)
+        db.session.flush()
+        db.session.add(GererAlarme(id_tag=tag.id_tag, id_alarme=alarme.id_alarme))
+        surveilles[cle_image(SOURCE, f'DB1.DBX{i}.0')] = [tag.id_tag]
+    db.session.commit()
+    moteur_alarmes.associer_cles(SOURCE, surveilles)
+    return projet.id_projet, list(surveilles)
+
+
+def tester_avalanche(cles):
+    """Déclenchement de ligne : tous les défauts apparaissent puis disparaissent, plusieurs fois"""
+    erreurs = 0
+    cycles = 5
+    debut = time.perf_counter()
+    for cycle in range(cycles):
+        for etat in (True, False):
+            image_tags.publier_lot([(cle, etat, QUALITE_GOOD) for cle in cles])
+    duree_publication = time.perf_counter() - debut
+    attendues = 2 * cycles * len(cles)
+
+    en_file = journal_alarmes.stats()['en_attente']
+    debut = time.perf_counter()
+    journal_alarmes.vider()
+    duree_ecriture = time.perf_counter() - debut
+    stats = journal_alarmes.stats()
+    with db.engine.connect() as connexion:
+        en_base = connexion.execute(text("SELECT COUNT(*) FROM Journal_Alarme")).scalar()
+
+    print(f"\n📊 Avalanche : {attendues} transitions publiées en {duree_publication * 1000:.0f} ms "
+          f"({attendues / duree_publication:.0f}/s, évaluation et mise en file comprises)")
+    print(f"  {en_file} en file, écrites en {stats['lots']} lots en {duree_ecriture * 1000:.0f} ms, "
+          f"{en_base} lignes en base, {stats['perdues']} perdue(s)")
+    if en_file != attendues or en_base != attendues or stats['lots'] != -(-attendues // journal_alarmes.lot_max):
+        erreurs += 1
+    return erreurs
+
+
+def transition_test(numero):
+    return {
+        'horodatage_ms': DEBUT_JOURNAL + numero, 'transition': 'APPARITION', 'id_alarme': 1, 'id_tag': 1,
+        'id_projet': 1, 'nom_tag': f'DEFAUT_{numero}', 'type_alarme': 'TOR', 'priorite': '1', 'limite': 1,
+        'valeur': True, 'message': f'Transition {numero}', 'acquittee_par': None
+    }
+
+
+def tester_file_pleine_apres_echec(app):
+    """Lot en échec remis en file pendant que la file s'est remplie : les plus anciennes sont perdues et comptées"""
+    erreurs = 0
+    journal = JournalAlarmes(taille_file=5, lot_max=3)
+    journal.app = app
+    for numero in range(5):
+        journal.enregistrer(transition_test(numero))
+
+    def avalanche_pendant_echec(*args):
+        # Nouvelles transitions pendant l'écriture du lot, puis base indisponible
+        for numero in range(5, 8):
+            journal.enregistrer(transition_test(numero))
+        raise RuntimeError("base indisponible")
+
+    event.listen(db.engine, 'before_cursor_execute', avalanche_pendant_echec)
+    try:
+        ok = journal.vider()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', avalanche_pendant_echec)
+    en_file = [int(ligne['nom_tag'].split('_')[1]) for ligne in journal._file]
+
+    print(f"\n📊 Échec d'écriture, file pleine entre-temps : vider() {ok}, file {en_file}, "
+          f"{journal.perdues} perdue(s) (attendu [3..7], 3)")
+    if ok or en_file != [3, 4, 5, 6, 7] or journal.perdues != 3:
+        erreurs += 1
+    return erreurs
+
+
+def remplir_journal(id_projet, nb_lignes, nb_tags):
+    """Journal volumineux : nb_lignes événements sur un an, insérés par lots"""
+    random.seed(1)
+    ids_tags = [t.id_tag for t in Tag.query.all()]
+    pas = 365 * 86400 * 1000 // nb_lignes
+    lot = []
+    with db.engine.begin() as connexion:
+        for i in range(nb_lignes):
+            id_tag = ids_tags[i % nb_tags]
+            lot.append({
+                'horodatage_ms': DEBUT_JOURNAL + i * pas + random.randint(0, pas // 2),
+                'transition': ('APPARITION', 'DISPARITION', 'ACQUITTEMENT')[i % 3],
+                'id_alarme': id_tag, 'id_tag': id_tag, 'id_projet': id_projet,
+                'nom_tag': f'DEFAUT_{id_tag}', 'type_alarme': 'TOR', 'priorite': PRIORITES[id_tag % 3],
+                'limite': 1.0, 'valeur': 1.0, 'message': 'historique'
+            })
+            if len(lot) == 10000:
+                connexion.execute(insert(JournalAlarme.__table__), lot)
+                lot = []
+        if lot:
+            connexion.execute(insert(JournalAlarme.__table__), lot)
+
+
+def client_connecte(app, id_projet):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=1, username='test', user_role='operateur', user_role_level=1,
+                       session_token='test', nom_complet='Test', current_project_id=id_projet)
+    return client
+
+
+def mesurer(fonction, repetitions=5):
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        resultat = fonction()
+    return resultat, (time.perf_counter() - debut) / repetitions
+
+
+def tester_pagination(client, id_projet):
+    erreurs = 0
+    total = JournalAlarme.query.count()
+    profondeur = total * 9 // 10
+
+    premiere, duree_premiere = mesurer(lambda: client.get('/api/alarms/history?limit=100').get_json())
+
+    # Curseur d'une page profonde : dernier événement vu après `profondeur` lignes
+    ligne = JournalAlarme.query.order_by(
+        JournalAlarme.horodatage_ms.desc(), JournalAlarme.id_evenement.desc()
+    ).offset(profondeur - 1).first()
+    curseur = encoder_curseur(ligne.horodatage_ms, ligne.id_evenement)
+    profonde, duree_profonde = mesurer(lambda: client.get(f'/api/alarms/history?limit=100&cursor={curseur}').get_json())
+
+    # Référence : même page par OFFSET
+    requete = f"SELECT * FROM Journal_Alarme WHERE id_projet = {id_projet} " \
+              f"ORDER BY horodatage_ms DESC, id_evenement DESC LIMIT 100 OFFSET {profondeur}"
+    with db.engine.connect() as connexion:
+        par_offset, duree_offset = mesurer(lambda: connexion.execute(text(requete)).fetchall())
+        plan = connexion.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM Journal_Alarme WHERE id_projet = :p AND horodatage_ms <= :h "
+            "AND (horodatage_ms < :h OR id_evenement < :i) ORDER BY horodatage_ms DESC, id_evenement DESC LIMIT 101"
+        ), {'p': id_projet, 'h': ligne.horodatage_ms, 'i': ligne.id_evenement}).fetchall()
+    plan = ' / '.join(p[-1] for p in plan)
+
+    identique = [e['id_evenement'] for e in profonde['evenements']] == [r.id_evenement for r in par_offset]
+    print(f"\n📊 Pagination sur {total} événements (pages de 100)")
+    print(f"  Première page            : {duree_premiere * 1000:6.1f} ms")
+    print(f"  Page à {profondeur:8d} (curseur) : {duree_profonde * 1000:6.1f} ms, identique à OFFSET {identique}")
+    print(f"  Même page par OFFSET     : {duree_offset * 1000:6.1f} ms")
+    print(f"  Plan : {plan}")
+    if premiere['nombre'] != 100 or not premiere['cursor'] or not identique \
+            or 'ix_journal_alarme_projet_temps' not in plan or 'TEMP B-TREE' in plan:
+        erreurs += 1
+    return erreurs
+
+
+def tester_parcours_filtre(client):
+    """Parcours complet des pages d'un tag et d'une priorité : ni doublon ni trou"""
+    erreurs = 0
+    tag = Tag.query.filter_by(nom_tag='DEFAUT_7').first()
+    attendus = [e.id_evenement for e in JournalAlarme.query.filter_by(id_tag=tag.id_tag).order_by(
+        JournalAlarme.horodatage_ms.desc(), JournalAlarme.id_evenement.desc())]
+
+    vus, curseur, pages = [], None, 0
+    debut = time.perf_counter()
+    while True:
+        url = '/api/alarms/history?tags=DEFAUT_7&priorite=2,3&limit=250' + (f'&cursor={curseur}' if curseur else '')
+        page = client.get(url).get_json()
+        vus += [e['id_evenement'] for e in page['evenements']]
+        pages += 1
+        curseur = page['cursor']
+        if not curseur:
+            break
+    duree = time.perf_counter() - debut
+
+    priorite = JournalAlarme.query.filter_by(id_tag=tag.id_tag).first().priorite
+    print(f"\n📊 Parcours du tag DEFAUT_7 (priorité {priorite}) : {len(vus)} événements en {pages} pages, "
+          f"{duree * 1000:.0f} ms, identique à la requête complète {vus == attendus}")
+    if vus != attendus or priorite not in ('2', '3'):
+        erreurs += 1
+    return erreurs
+
+
+def tester_erreurs(client):
+    erreurs = 0
+    cas = [
+        ("/api/alarms/history?cursor=abc", 400),
+        ("/api/alarms/history?limit=0", 400),
+        ("/api/alarms/history?transition=AUTRE", 400),
+        ("/api/alarms/history?tags=INCONNU", 404),
+        ("/api/alarms/history?start=2025-01-02T00:00:00&end=2025-01-01T00:00:00", 200),
+    ]
+    print("\n📊 Paramètres invalides")
+    for url, attendu in cas:
+        code = client.get(url).status_code
+        print(f"  {'✅' if code == attendu else '❌'} {url} -> {code}")
+        erreurs += 0 if code == attendu else 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test du journal des alarmes")
+    parser.add_argument('--lignes', type=int, default=500000)
+    parser.add_argument('--avalanche', type=int, default=2000, help="Nombre de tags en défaut simultanément")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    print("📜 TEST JOURNAL DES ALARMES")
+    print("=" * 60)
+
+    app = create_app('testing')
+    with app.app_context():
+        id_projet, cles = preparer_base(args.avalanche)
+    moteur_alarmes.charger_alarmes()
+
+    with app.app_context():
+        erreurs = tester_avalanche(cles)
+        erreurs += tester_file_pleine_apres_echec(app)
+        remplir_journal(id_projet, args.lignes, args.avalanche)
+        client = client_connecte(app, id_projet)
+        erreurs += tester_pagination(client, id_projet)
+        erreurs += tester_parcours_filtre(client)
+        erreurs += tester_erreurs(client)
+
+    print("\n" + ("✅ Avalanche absorbée, journal paginé par curseur" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
@@ -0,0 +1,200 @@
+# Test du registre multi-automates : deux serveurs snap7 locaux, chacun avec son pool et son moteur d'acquisition
+# Vérifie que chaque variable est lue sur le bon automate et que les automates sont lus en parallèle,
+# et qu'un tag d'une connexion inactive n'est jamais envoyé à l'automate par défaut
+# Usage : python tests/test_multi_automates.py [--automates 2] [--variables 50]
+import os
+import sys
+import time
+import struct
+import ctypes
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from app.controleur.controleur_tags import AutomateSiemensS7Complete
+from app.utils.acquisition import MoteurAcquisition
+from app.utils.registre_automates import RegistreAutomates, SOURCE_INDISPONIBLE, STATUT_INDISPONIBLE
+from app.utils.image_tags import image_tags, SOURCE_DEFAUT, QUALITE_BAD
+
+PORT_PREMIER_SERVEUR = 1102
+TAILLE_DB = 256
+
+
+def application_test():
+    app = Flask(__name__)
+    app.config.update(
+        MODE_COMMUNICATION='REEL',
+        VALIDATION_PING=False,
+        ACQUISITION_ACTIVE=True,
+        ACQUISITION_PERIODE_MS=100,
+        ACQUISITION_ATTENTE_PREMIERE_LECTURE_S=5.0
+    )
+    return app
+
+
+def connexion(numero, port):
+    """Ligne Connexion_Automate (sans base de données)"""
+    return SimpleNamespace(
+        id_connexion=numero, nom_connexion=f"cpu{numero}", adresse_ip='127.0.0.1',
+        rack=0, slot=1, port=port, mode_communication='REEL', taille_pool=2, connexion_auto=False
+    )
+
+
+def demarrer_serveurs(nb_automates):
+    import snap7
+    from snap7.types import srvAreaDB
+
+    serveurs = []
+    for numero in range(1, nb_automates + 1):
+        serveur = snap7.server.Server()
+        zone = (ctypes.c_uint8 * TAILLE_DB)()
+        # DB1.DBW(2*i) = numero * 1000 + i : chaque automate a ses propres valeurs
+        for i in range(TAILLE_DB // 2):
+            zone[2 * i:2 * i + 2] = struct.pack('>h', numero * 1000 + i)
+        serveur.register_area(srvAreaDB, 1, zone)
+        serveur.start(tcpport=PORT_PREMIER_SERVEUR + numero - 1)
+        serveurs.append((serveur, zone))
+    return serveurs
+
+
+def tester_registre(nb_automates, nb_variables):
+    app = application_test()
+    defaut = AutomateSiemensS7Complete()
+    registre = RegistreAutomates(defaut, MoteurAcquisition(defaut), AutomateSiemensS7Complete)
+    registre.init_app(app)
+
+    erreurs = 0
+    serveurs = demarrer_serveurs(nb_automates)
+    try:
+        for numero in range(1, nb_automates + 1):
+            registre._appliquer(connexion(numero, PORT_PREMIER_SERVEUR + numero - 1))
+            succes, message = registre.automate(f"cpu{numero}").connect()
+            print(f"  cpu{numero}: {message}")
+            erreurs += 0 if succes else 1
+
+        demandes = [
+            (f"cpu{numero}", f"DB1.DBW{2 * i}", 'INT')
+            for numero in range(1, nb_automates + 1)
+            for i in range(nb_variables)
+        ]
+
+        debut = time.perf_counter()
+        entrees = registre.lire(demandes)
+        duree = time.perf_counter() - debut
+
+        for (source, adresse, _), entree in zip(demandes, entrees):
+            attendu = int(source[3:]) * 1000 + int(adresse[7:]) // 2
+            if entree is None or entree.valeur != attendu:
+                erreurs += 1
+                print(f"❌ {source} {adresse}: attendu {attendu}, lu {entree.valeur if entree else None}")
+
+        print(f"\n📊 {len(demandes)} variables sur {nb_automates} automates, première lecture en {duree * 1000:.1f} ms")
+        for source, etat in registre.stats().items():
+            if source == SOURCE_DEFAUT:
+                continue
+            print(f"  {source}: {etat['acquisition']['abonnements']} abonnements, "
+                  f"{etat['acquisition']['cycles']} cycles, pool {etat['pool']['ouvertes']}/{etat['pool']['taille']}")
+
+        # Un automate arrêté ne bloque pas la lecture des autres
+        registre.automate('cpu1').disconnect()
+        time.sleep(0.3)
+        entrees = registre.lire(demandes)
+        qualites = {source: set() for source, _, _ in demandes}
+        for (source, _, _), entree in zip(demandes, entrees):
+            qualites[source].add(entree.qualite if entree else None)
+        print(f"  Après déconnexion de cpu1: {', '.join(f'{s}={sorted(q)}' for s, q in qualites.items())}")
+        if nb_automates > 1 and qualites['cpu2'] != {'GOOD'}:
+            erreurs += 1
+    finally:
+        registre.arreter()
+        for serveur, _ in serveurs:
+            serveur.stop()
+            serveur.destroy()
+        image_tags.vider()
+
+    return erreurs
+
+
+def tester_connexion_inactive():
+    """Tag lié à une connexion inactive : lu en BAD, écriture refusée, automate par défaut jamais sollicité"""
+    from app import create_app, db
+    from app.models.modele_tag import Tag, ConnexionAutomate, LierConnexionTag
+    from app.controleur.controleur_tags import automate, registre_automates
+    from outils_tests import creer_projet_test
+
+    erreurs = 0
+    app = create_app('testing')
+    with app.app_context():
+        projet = creer_projet_test(ConnexionAutomate, LierConnexionTag)
+        connexion_arretee = ConnexionAutomate(nom_connexion='cpu_arretee', adresse_ip='127.0.0.1', actif=False,
+                                              connexion_auto=False, id_projet=projet.id_projet)
+        tag = Tag('MESURE_ARRETEE', 'REAL', 'DB1.DBD0', id_projet=projet.id_projet, acces='RW')
+        db.session.add_all([connexion_arretee, tag])
+        db.session.flush()
+        db.session.add(LierConnexionTag(id_tag=tag.id_tag, id_connexion=connexion_arretee.id_connexion))
+        db.session.commit()
+        id_tag, id_projet = tag.id_tag, projet.id_projet
+
+    registre_automates.charger_connexions()
+
+    # Toute requête vers l'automate par défaut est une erreur de routage
+    appels_defaut = []
+    for methode in ('lire_tag_par_adresse', 'lire_tags_par_adresses', 'ecrire_tag_par_adresse', 'ecrire_tags_par_adresses'):
+        setattr(automate, methode, lambda *args, methode=methode: appels_defaut.append(methode))
+    automate.connected = True
+    try:
+        source = registre_automates.source_tag(id_tag)
+        entree, = registre_automates.lire([(source, 'DB1.DBD0', 'REAL')])
+        ecrit, = registre_automates.ecrire([(source, 'DB1.DBD0', 1.5, 'REAL')])
+        print(f"  Source du tag: {source}, lecture: {entree.qualite if entree else None}, écriture: {ecrit}")
+        if source != SOURCE_INDISPONIBLE or entree is None or entree.qualite != QUALITE_BAD \
+                or ecrit != (False, STATUT_INDISPONIBLE):
+            erreurs += 1
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session.update(user_id=1, username='test', user_role='automaticien', user_role_level=2,
+                           session_token='test', nom_complet='Test', current_project_id=id_projet)
+        lecture = client.get('/api/read/MESURE_ARRETEE').get_json()
+        ecriture = client.post('/api/write/MESURE_ARRETEE', json={'valeur': 1.5})
+        lot = client.post('/api/write_batch', json={'ecritures': [{'tag': 'MESURE_ARRETEE', 'valeur': 1.5}]})
+        resultat_lot = lot.get_json()['resultats'][0]
+        print(f"  /api/read: {lecture.get('qualite')}, /api/write: {ecriture.status_code}, "
+              f"/api/write_batch: {resultat_lot.get('error')}")
+        if lecture.get('qualite') != QUALITE_BAD or ecriture.status_code != 400 \
+                or resultat_lot.get('error') != STATUT_INDISPONIBLE:
+            erreurs += 1
+
+        print(f"  Appels à l'automate par défaut: {appels_defaut or 'aucun'}")
+        erreurs += 1 if appels_defaut else 0
+    finally:
+        for methode in ('lire_tag_par_adresse', 'lire_tags_par_adresses', 'ecrire_tag_par_adresse', 'ecrire_tags_par_adresses'):
+            delattr(automate, methode)
+        automate.connected = False
+        image_tags.vider()
+
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test du registre multi-automates")
+    parser.add_argument('--automates', type=int, default=2)
+    parser.add_argument('--variables', type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        import snap7
+    except ImportError:
+        print("⚠️ snap7 non installé - test ignoré")
+        sys.exit(0)
+
+    print("🏭 TEST REGISTRE MULTI-AUTOMATES")
+    print("=" * 60)
+    erreurs = tester_registre(args.automates, args.variables)
+
+    print("\n🔌 Connexion inactive")
+    erreurs += tester_connexion_inactive()
+    print("\n" + ("✅ Chaque automate lu avec son propre pool et son propre moteur" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
@@ -0,0 +1,166 @@
+# Test de la persistance différée de Tag.valeur : lectures et écritures HTTP sans UPDATE ni COMMIT
+# sur le chemin de la requête, dernière valeur de chaque tag écrite par un UPDATE groupé au vidage,
+# valeurs conservées si le vidage échoue, thread de vidage périodique
+# Usage : python tests/test_persistance_valeurs.py [--tags 500]
+import os
+import sys
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event, text
+from app import create_app, db
+from app.models.modele_tag import Tag
+from app.controleur.controleur_tags import automate
+from app.utils.persistance_valeurs import persistance_valeurs
+from outils_tests import creer_projet_test
+
+
+def preparer_base(nb_tags):
+    projet = creer_projet_test()
+    for i in range(nb_tags):
+        db.session.add(Tag(f'MESURE_{i}', 'INT', f'DB1.DBW{2 * i}', id_projet=projet.id_projet, acces='RW'))
+    db.session.commit()
+    return projet.id_projet
+
+
+class CompteurSQL:
+    """Instructions SQL exécutées, par type (UPDATE, COMMIT...)"""
+
+    def __init__(self):
+        self.instructions = []
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._instruction)
+        event.listen(db.engine, 'commit', self._commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self._instruction)
+        event.remove(db.engine, 'commit', self._commit)
+
+    def _instruction(self, conn, cursor, statement, parameters, context, executemany):
+        self.instructions.append(statement.split(None, 1)[0].upper())
+
+    def _commit(self, conn):
+        self.instructions.append('COMMIT')
+
+    def nombre(self, type_instruction):
+        return self.instructions.count(type_instruction)
+
+
+def valeurs_en_base():
+    with db.engine.connect() as connexion:
+        return dict(connexion.execute(text("SELECT nom_tag, valeur FROM Tag")).fetchall())
+
+
+def tester_chemin_requete(client, nb_tags):
+    """Écritures puis lectures répétées : aucune écriture en base pendant les requêtes"""
+    erreurs = 0
+    with CompteurSQL() as requetes:
+        debut = time.perf_counter()
+        for i in range(nb_tags):
+            client.post(f'/api/write/MESURE_{i}', json={'valeur': i + 1000})
+        for _ in range(3):
+            for i in range(nb_tags):
+                client.get(f'/api/read/MESURE_{i}')
+        duree = time.perf_counter() - debut
+
+    appels = 4 * nb_tags
+    print(f"\n📊 {nb_tags} écritures + {3 * nb_tags} lectures HTTP en {duree * 1000:.0f} ms "
+          f"({duree / appels * 1e6:.0f} µs par appel)")
+    print(f"  Sur le chemin des requêtes : {requetes.nombre('UPDATE')} UPDATE, {requetes.nombre('COMMIT')} COMMIT, "
+          f"{persistance_valeurs.stats()['en_attente']} valeur(s) en attente")
+    if requetes.nombre('UPDATE') or requetes.nombre('COMMIT') \
+            or persistance_valeurs.stats()['en_attente'] != nb_tags:
+        erreurs += 1
+    return erreurs
+
+
+def tester_vidage(nb_tags):
+    """Un seul UPDATE groupé pour toutes les valeurs notées, dernière valeur de chaque tag"""
+    erreurs = 0
+    notees = persistance_valeurs.stats()['notees']
+    with CompteurSQL() as requetes:
+        debut = time.perf_counter()
+        persistance_valeurs.vider()
+        duree = time.perf_counter() - debut
+    valeurs = valeurs_en_base()
+    exactes = sum(1 for i in range(nb_tags) if valeurs[f'MESURE_{i}'] == str(i + 1000))
+
+    print(f"\n📊 Vidage : {notees} valeurs notées -> {persistance_valeurs.ecrites} lignes écrites en "
+          f"{duree * 1000:.1f} ms, {requetes.nombre('UPDATE')} UPDATE groupé, {requetes.nombre('COMMIT')} COMMIT")
+    print(f"  {exactes}/{nb_tags} valeurs exactes en base")
+    if requetes.nombre('UPDATE') != 1 or requetes.nombre('COMMIT') != 1 or exactes != nb_tags \
+            or persistance_valeurs.ecrites != nb_tags:
+        erreurs += 1
+    return erreurs
+
+
+def tester_echec():
+    """Vidage en échec : valeurs conservées, une valeur notée entre-temps n'est pas écrasée"""
+    erreurs = 0
+    persistance_valeurs.noter(1, 'ancienne')
+    with db.engine.begin() as connexion:
+        connexion.execute(text("ALTER TABLE Tag RENAME TO Tag_absente"))
+    try:
+        ok = persistance_valeurs.vider()
+    finally:
+        with db.engine.begin() as connexion:
+            connexion.execute(text("ALTER TABLE Tag_absente RENAME TO Tag"))
+    conservee = persistance_valeurs.stats()['en_attente']
+    persistance_valeurs.vider()
+    valeur = db.session.get(Tag, 1).valeur
+
+    print(f"\n📊 Échec de vidage : vider() {ok}, {conservee} valeur(s) conservée(s), "
+          f"écrite au vidage suivant {valeur == 'ancienne'}")
+    if ok or conservee != 1 or valeur != 'ancienne':
+        erreurs += 1
+    return erreurs
+
+
+def tester_thread(client):
+    erreurs = 0
+    persistance_valeurs.periode = 0.2
+    persistance_valeurs.demarrer()
+    client.post('/api/write/MESURE_0', json={'valeur': 4242})
+    time.sleep(0.6)
+    valeur = valeurs_en_base()['MESURE_0']
+    persistance_valeurs.arreter()
+    print(f"\n📊 Thread de vidage (période 0.2 s) : valeur en base après 0.6 s {valeur}")
+    if valeur != '4242':
+        erreurs += 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de la persistance différée des valeurs des tags")
+    parser.add_argument('--tags', type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    print("💾 TEST PERSISTANCE DIFFÉRÉE DES VALEURS")
+    print("=" * 60)
+
+    app = create_app('testing')
+    with app.app_context():
+        id_projet = preparer_base(args.tags)
+        automate.connect(force_simulation=True)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session.update(user_id=1, username='test', user_role='automaticien', user_role_level=2,
+                           session_token='test', nom_complet='Test', current_project_id=id_projet)
+
+        erreurs = tester_chemin_requete(client, args.tags)
+        erreurs += tester_vidage(args.tags)
+        erreurs += tester_echec()
+        erreurs += tester_thread(client)
+        automate.disconnect()
+
+    print(f"\n📈 {persistance_valeurs.stats()}")
+    print("\n" + ("✅ Valeurs des tags persistées en différé, hors requêtes" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
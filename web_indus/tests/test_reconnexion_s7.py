@@ -0,0 +1,141 @@
+# Test de la supervision S7 : ouverture du circuit quand la CPU tombe, lectures immédiates
+# (dernière valeur STALE, BAD si jamais lue), reconnexion automatique avec délai croissant
+# Usage : python tests/test_reconnexion_s7.py [--variables 20] [--panne 2.0]
+import os
+import sys
+import time
+import struct
+import ctypes
+import argparse
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.controleur.controleur_tags import AutomateSiemensS7Complete
+from app.utils.image_tags import image_tags, cle_image, QUALITE_GOOD, QUALITE_STALE, QUALITE_BAD
+from app.utils.supervision_s7 import ETAT_CONNECTE, ETAT_CIRCUIT_OUVERT
+
+PORT_SERVEUR_S7 = 1102
+TAILLE_DB = 256
+
+
+def demarrer_serveur(serveur=None):
+    import snap7
+    from snap7.types import srvAreaDB
+
+    if serveur is None:
+        serveur = snap7.server.Server()
+        zone = (ctypes.c_uint8 * TAILLE_DB)()
+        for i in range(TAILLE_DB // 2):
+            zone[2 * i:2 * i + 2] = struct.pack('>h', i)
+        serveur.register_area(srvAreaDB, 1, zone)
+        serveur._zone = zone
+    serveur.start(tcpport=PORT_SERVEUR_S7)
+    return serveur
+
+
+def preparer_automate():
+    automate = AutomateSiemensS7Complete()
+    automate.nom = 'test-reconnexion'
+    automate.superviseur.nom = automate.nom
+    automate.superviseur.configurer(seuil_echecs=3, delai_initial=0.2, delai_max=1.0)
+    automate.ip_address = '127.0.0.1'
+    automate.port = PORT_SERVEUR_S7
+    automate.validation_ping = False
+    automate.simulation_mode = False
+    return automate
+
+
+def attendre_etat(automate, etat, delai_max):
+    echeance = time.monotonic() + delai_max
+    while automate.superviseur.etat != etat and time.monotonic() < echeance:
+        time.sleep(0.05)
+    return automate.superviseur.etat == etat
+
+
+def tester_reconnexion(nb_variables, duree_panne):
+    erreurs = 0
+    demandes = [(f"DB1.DBW{2 * i}", 'INT') for i in range(nb_variables)]
+    serveur = demarrer_serveur()
+    automate = preparer_automate()
+
+    try:
+        succes, message = automate.connect()
+        print(f"  {message}")
+        resultats = automate.lire_tags_par_adresses(demandes)
+        if any(qualite != QUALITE_GOOD for _, qualite in resultats):
+            erreurs += 1
+
+        # Panne : les premiers échanges échouent, puis le circuit s'ouvre
+        serveur.stop()
+        durees = []
+        for _ in range(10):
+            debut = time.perf_counter()
+            resultats = automate.lire_tags_par_adresses(demandes)
+            durees.append(time.perf_counter() - debut)
+        jamais_lue = automate.lire_tag_par_adresse("DB1.DBW200", 'INT')
+        supervision = automate.superviseur.stats()
+
+        qualites = {qualite for _, qualite in resultats}
+        valeurs_conservees = [valeur for valeur, _ in resultats] == list(range(nb_variables))
+        print(f"\n📊 Panne CPU : état {supervision['etat']} après {supervision['ouvertures']} ouverture(s)")
+        print(f"  Lectures : {' / '.join(f'{d * 1000:.2f}' for d in durees)} ms")
+        print(f"  Qualités : {sorted(qualites)}, valeurs conservées: {valeurs_conservees}, "
+              f"jamais lue: {jamais_lue[1]}")
+        entree = image_tags.lire(cle_image(automate.nom, "DB1.DBW2"))
+        print(f"  Image : DB1.DBW2 = {entree.valeur} ({entree.qualite})")
+
+        if supervision['etat'] not in (ETAT_CIRCUIT_OUVERT, 'RECONNEXION') or qualites != {QUALITE_STALE}:
+            erreurs += 1
+        if not valeurs_conservees or jamais_lue[1] != QUALITE_BAD or entree.qualite != QUALITE_STALE:
+            erreurs += 1
+        if max(durees[-5:]) > 0.005:
+            erreurs += 1
+
+        # Retour de la CPU : reconnexion automatique, lectures GOOD sans action
+        time.sleep(duree_panne)
+        demarrer_serveur(serveur)
+        debut = time.perf_counter()
+        reconnecte = attendre_etat(automate, ETAT_CONNECTE, 10)
+        duree_reprise = time.perf_counter() - debut
+        resultats = automate.lire_tags_par_adresses(demandes)
+        supervision = automate.superviseur.stats()
+        print(f"\n  CPU revenue : reconnecté en {duree_reprise * 1000:.0f} ms "
+              f"({supervision['tentatives_reconnexion']} tentative(s)), "
+              f"qualités {sorted({q for _, q in resultats})}, "
+              f"reconnexions comptées: {automate.sante.stats()['reconnexions']}")
+        if not reconnecte or any(qualite != QUALITE_GOOD for _, qualite in resultats):
+            erreurs += 1
+
+        # Déconnexion opérateur : plus de reconnexion automatique
+        automate.disconnect()
+        if automate.superviseur.etat != 'DECONNECTE':
+            erreurs += 1
+    finally:
+        automate.disconnect()
+        serveur.stop()
+        serveur.destroy()
+        image_tags.vider(automate.nom)
+
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de la reconnexion S7 et du disjoncteur")
+    parser.add_argument('--variables', type=int, default=20)
+    parser.add_argument('--panne', type=float, default=2.0, help="Durée de la panne simulée (s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    try:
+        import snap7
+    except ImportError:
+        print("⚠️ snap7 non installé - test ignoré")
+        sys.exit(0)
+
+    print("🔁 TEST RECONNEXION S7 / DISJONCTEUR")
+    print("=" * 60)
+    erreurs = tester_reconnexion(args.variables, args.panne)
+    print("\n" + ("✅ Lectures immédiates pendant la panne, reprise automatique" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
@@ -0,0 +1,106 @@
+# Test de non-régression : nombre de requêtes SQL de la liste des tags (GET /api/tags)
+# Les adresses Mapping_Com sont chargées avec les tags (selectin) : 1 requête pour les tags
+# + 1 requête par lot de 500 noms, au lieu d'une requête Mapping_Com par tag
+# Vérifie aussi la migration (index sur Mapping_Com.nom_du_tag) sur une table créée sans l'index
+# Usage : python tests/test_requetes_tags.py [--tags 1000]
+import os
+import sys
+import math
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event, inspect, text
+from app import create_app, db
+from app.models.modele_tag import Tag
+from app.utils.migrations import appliquer_migrations
+
+LOT_SELECTIN = 500   # Taille des lots IN du chargement selectin de SQLAlchemy
+ADRESSES = ['DB1.DBX0.0', 'DB1.DBW2', 'DB1.DBD4']
+
+
+def preparer_base():
+    """Tables Tag et Mapping_Com seules, Mapping_Com dans son ancien schéma (sans index)"""
+    with db.engine.begin() as connexion:
+        connexion.execute(text(
+            "CREATE TABLE Mapping_Com (id_mapping_com INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "nom_du_tag VARCHAR(100) NOT NULL, adresse VARCHAR(50) NOT NULL)"
+        ))
+    db.metadata.create_all(bind=db.engine, tables=[Tag.__table__])
+
+
+def tester_migration():
+    erreurs = 0
+    premiere = appliquer_migrations(db)
+    seconde = appliquer_migrations(db)
+    index = [i['name'] for i in inspect(db.engine).get_indexes('Mapping_Com')]
+    print(f"  Migrations : {premiere} appliquée(s), puis {seconde} (idempotent), index {index}")
+    if premiere < 1 or seconde != 0 or 'ix_mapping_com_nom_du_tag' not in index:
+        erreurs += 1
+    return erreurs
+
+
+def ajouter_tags(debut, nombre):
+    for i in range(debut, debut + nombre):
+        tag = Tag(f"tag_{i}", 'INT', id_projet=1)
+        tag.adresse_tag = ADRESSES[i % len(ADRESSES)]
+        db.session.add(tag)
+    db.session.commit()
+
+
+def compter_requetes_liste(app, client):
+    requetes = []
+    with app.app_context():
+        moteur = db.engine
+
+    def compter(conn, cursor, statement, *args):
+        requetes.append(statement)
+
+    event.listen(moteur, 'before_cursor_execute', compter)
+    try:
+        reponse = client.get('/api/tags')
+    finally:
+        event.remove(moteur, 'before_cursor_execute', compter)
+    donnees = reponse.get_json()
+    return len(requetes), donnees
+
+
+def tester_liste(app, nb_tags):
+    erreurs = 0
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=1, username='test', user_role='automaticien', user_role_level=2,
+                       session_token='test', nom_complet='Test', current_project_id=1)
+
+    total = 0
+    for nombre in (10, nb_tags - 10):
+        with app.app_context():
+            ajouter_tags(total, nombre)
+        total += nombre
+        requetes, donnees = compter_requetes_liste(app, client)
+        attendues = 1 + math.ceil(total / LOT_SELECTIN)
+        adresses_ok = all(
+            t['adresse_tag'] == ADRESSES[int(t['nom_tag'][4:]) % len(ADRESSES)] for t in donnees['tags']
+        )
+        print(f"  {total:5d} tags : {requetes} requête(s) SQL (max {attendues}), adresses correctes: {adresses_ok}")
+        if requetes > attendues or not adresses_ok or donnees['nombre_tags'] != total:
+            erreurs += 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Non-régression : requêtes SQL de la liste des tags")
+    parser.add_argument('--tags', type=int, default=1000)
+    args = parser.parse_args()
+
+    print("🗄️ TEST REQUÊTES LISTE DES TAGS")
+    print("=" * 60)
+
+    app = create_app('testing')
+    with app.app_context():
+        preparer_base()
+        erreurs = tester_migration()
+    erreurs += tester_liste(app, args.tags)
+
+    print("\n" + ("✅ Adresses chargées avec les tags, sans requête par tag" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
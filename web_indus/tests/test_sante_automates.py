@@ -0,0 +1,127 @@
+# Test du moniteur de santé : get_status() servi depuis le dernier instantané (sans ping ni socket),
+# histogramme de latence des échanges S7, dernier échange réussi et compteur de reconnexions
+# Usage : python tests/test_sante_automates.py [--lectures 200] [--appels 1000]
+import os
+import sys
+import time
+import ctypes
+import argparse
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.controleur.controleur_tags import AutomateSiemensS7Complete, registre_automates
+from app.utils.sante_automates import MoniteurSante
+
+PORT_SERVEUR_S7 = 1102
+TAILLE_DB = 256
+
+
+def demarrer_serveur():
+    import snap7
+    from snap7.types import srvAreaDB
+
+    serveur = snap7.server.Server()
+    zone = (ctypes.c_uint8 * TAILLE_DB)()
+    serveur.register_area(srvAreaDB, 1, zone)
+    serveur.start(tcpport=PORT_SERVEUR_S7)
+    return serveur, zone
+
+
+def preparer_automate():
+    automate = AutomateSiemensS7Complete()
+    automate.ip_address = '127.0.0.1'
+    automate.port = PORT_SERVEUR_S7
+    automate.validation_ping = False
+    automate.simulation_mode = False
+    return automate
+
+
+def mesurer(fonction, nb_appels):
+    debut = time.perf_counter()
+    for _ in range(nb_appels):
+        fonction()
+    return (time.perf_counter() - debut) / nb_appels
+
+
+def tester_sante(nb_lectures, nb_appels):
+    erreurs = 0
+    serveur, _ = demarrer_serveur()
+    automate = preparer_automate()
+    moniteur = MoniteurSante(registre_automates)
+    registre_automates._automates['test'] = automate
+
+    try:
+        succes, message = automate.connect()
+        print(f"  {message}")
+        erreurs += 0 if succes else 1
+
+        for i in range(nb_lectures):
+            automate.lire_tag_par_adresse(f"DB1.DBW{2 * (i % 100)}", 'INT')
+        moniteur.sonder()
+
+        status = automate.get_status()
+        sante = status['sante']
+        latence = sante['latence']
+        print(f"\n📊 {sante['echanges_ok']} échanges S7 (erreurs: {sante['echanges_erreur']}), "
+              f"dernier succès {sante['dernier_succes']}")
+        print(f"  Latence : moyenne {latence['moyenne_ms']} ms, p50 <= {latence['p50_ms']} ms, "
+              f"p99 <= {latence['p99_ms']} ms, max {latence['max_ms']} ms")
+        print(f"  Sonde   : port S7 {status.get('s7_port_open')}, {status.get('latence_port_ms')} ms "
+              f"({status.get('sonde_timestamp')})")
+        if sante['echanges_ok'] < nb_lectures or not status.get('s7_port_open'):
+            erreurs += 1
+
+        duree_cache = mesurer(automate.get_status, nb_appels)
+        duree_reseau = mesurer(lambda: automate.get_status(verifier_reseau=True), max(1, nb_appels // 100))
+        print(f"\n📊 get_status() : {duree_cache * 1e6:8.1f} µs depuis le cache, "
+              f"{duree_reseau * 1e6:8.1f} µs avec sonde réseau synchrone")
+        if duree_cache > 0.001:
+            erreurs += 1
+
+        # Perte de la CPU : échanges en erreur, sonde port fermé
+        serveur.stop()
+        valeur, qualite = automate.lire_tag_par_adresse("DB1.DBW0", 'INT')
+        moniteur.sonder()
+        status = automate.get_status()
+        print(f"\n  Serveur arrêté : lecture {qualite}, erreurs {status['sante']['echanges_erreur']}, "
+              f"port S7 {status.get('s7_port_open')}")
+        if status['sante']['echanges_erreur'] < 1 or status.get('s7_port_open'):
+            erreurs += 1
+
+        # Retour de la CPU : reconnexion comptée
+        serveur.start(tcpport=PORT_SERVEUR_S7)
+        succes, _ = automate.connect()
+        status = automate.get_status()
+        print(f"  Serveur redémarré : reconnexion {'OK' if succes else 'KO'}, "
+              f"{status['sante']['reconnexions']} reconnexion(s) sur {status['sante']['connexions']} connexion(s)")
+        if not succes or status['sante']['reconnexions'] != 1:
+            erreurs += 1
+    finally:
+        registre_automates._automates.pop('test', None)
+        automate.disconnect()
+        serveur.stop()
+        serveur.destroy()
+
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test du moniteur de santé des automates")
+    parser.add_argument('--lectures', type=int, default=200)
+    parser.add_argument('--appels', type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    try:
+        import snap7
+    except ImportError:
+        print("⚠️ snap7 non installé - test ignoré")
+        sys.exit(0)
+
+    print("🩺 TEST MONITEUR DE SANTÉ")
+    print("=" * 60)
+    erreurs = tester_sante(args.lectures, args.appels)
+    print("\n" + ("✅ Statut servi depuis le cache, santé mesurée" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
@@ -0,0 +1,275 @@
+# Test de la CPU simulée : signaux scriptés (rampe, bruit, séquence, rafale d'alarmes) jusqu'à 10 ms,
+# lecture groupée de milliers de tags par le chemin de décodage du mode REEL, écritures relues dans
+# la mémoire simulée, puis (si snap7 est installé) pilote réel contre la mémoire servie par snap7
+# Usage : python tests/test_simulateur.py [--tags 5000] [--periode-ms 10]
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+import tempfile
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.controleur.controleur_tags import AutomateSiemensS7Complete
+from app.utils.adresse_s7 import compiler_adresse
+from app.utils.image_tags import image_tags, QUALITE_GOOD
+from app.utils.simulateur_s7 import (
+    SimulateurS7, ClientSimule, ErreurS7Simulee, Rampe, Bruit, Sequence, RafaleAlarmes, signal_depuis_dict
+)
+
+PORT_SERVEUR_S7 = 1103
+DB_CHARGE = 100
+
+
+def scenario_charge(nb_tags, periode_ms):
+    return {
+        'db': {'1': 256, str(DB_CHARGE): max(1024, nb_tags * 4)},
+        'valeurs': {'DB1.DBW4': 123, 'DB1.DBD8': 2.5, 'MW10': -7},
+        'signaux': [
+            {'type': 'rampe', 'adresse': 'DB1.DBD20', 'minimum': 0, 'maximum': 10, 'duree_s': 1,
+             'periode_ms': periode_ms, 'type_donnee': 'REAL'},
+            {'type': 'bruit', 'adresse': 'DB1.DBD24', 'centre': 20, 'amplitude': 0.5, 'graine': 1,
+             'periode_ms': periode_ms, 'type_donnee': 'REAL'},
+            {'type': 'sequence', 'adresse': 'DB1.DBW30', 'etapes': [[1, 0.05], [2, 0.05], [3, 0.05]],
+             'periode_ms': periode_ms},
+            {'type': 'rafale', 'adresse': 'DB1.DBX40.0', 'nombre': 12, 'toutes_s': 0.2, 'duree_s': 0.1,
+             'periode_ms': periode_ms},
+            {'type': 'charge', 'db': DB_CHARGE, 'nombre': nb_tags, 'periode_ms': periode_ms},
+        ]
+    }
+
+
+def automate_simule(scenario, nom='test-simulateur'):
+    automate = AutomateSiemensS7Complete()
+    automate.nom = nom
+    automate.ip_address = '127.0.0.1'
+    automate.simulateur.charger(scenario)
+    return automate
+
+
+def tester_signaux():
+    """Valeurs calculées par chaque type de signal, sans thread"""
+    erreurs = 0
+    rampe = Rampe('DB1.DBD0', 0, 100, 10, type_donnee='REAL')
+    bruit = Bruit('DB1.DBD4', 50, 2, graine=3)
+    sequence = Sequence('DB1.DBW8', [(5, 1), (7, 2)], boucle=True)
+    figee = Sequence('DB1.DBW8', [(5, 1), (7, 2)], boucle=False)
+    rafale = RafaleAlarmes('DB1.DBX10.6', nombre=4, toutes_s=10, duree_s=2)
+    controles = [
+        ('rampe t=2.5 s', rampe.valeur(2.5), 25.0),
+        ('rampe t=12.5 s (recommence)', rampe.valeur(12.5), 25.0),
+        ('bruit dans ±2', all(48 <= bruit.valeur(t) <= 52 for t in range(100)), True),
+        ('séquence t=0.5 / 1.5 / 3.5 s', [sequence.valeur(t) for t in (0.5, 1.5, 3.5)], [5, 7, 5]),
+        ('séquence sans boucle t=10 s', figee.valeur(10), 7),
+        ('rafale t=1 / 5 / 11 s', [rafale.valeur(t) for t in (1, 5, 11)], [True, False, True]),
+        ('période bornée à 10 ms', signal_depuis_dict({'type': 'rampe', 'adresse': 'MW0', 'periode_ms': 1}).periode_s,
+         0.01),
+    ]
+    print("\n📊 Signaux scriptés")
+    for nom, valeur, attendu in controles:
+        ok = valeur == attendu
+        print(f"  {'✅' if ok else '❌'} {nom}: {valeur!r}")
+        erreurs += 0 if ok else 1
+
+    try:
+        signal_depuis_dict({'type': 'inconnu', 'adresse': 'MW0'})
+        erreurs += 1
+    except ValueError:
+        pass
+    return erreurs
+
+
+def tester_cadence(nb_tags, periode_ms):
+    """Tous les signaux recalculés à leur période, y compris la charge de N tags"""
+    erreurs = 0
+    simulateur = SimulateurS7(scenario_charge(nb_tags, periode_ms))
+    memoire = simulateur.memoire
+    duree = 1.0
+
+    simulateur.demarrer()
+    valeurs_sequence = set()
+    rafales = set()
+    instantanes = []
+    fin = time.monotonic() + duree
+    while time.monotonic() < fin:
+        valeurs_sequence.add(memoire.lire_valeur(compiler_adresse('DB1.DBW30')))
+        rafales.add(memoire.lire('DB', 1, 40, 2)[0])
+        instantanes.append(memoire.lire('DB', DB_CHARGE, 0, 4))
+        time.sleep(0.005)
+    simulateur.arreter()
+
+    stats = simulateur.stats()
+    attendus = len(simulateur.signaux) * duree / (periode_ms / 1000)
+    changements = sum(1 for a, b in zip(instantanes, instantanes[1:]) if a != b)
+    rampe = memoire.lire_valeur(compiler_adresse('DB1.DBD20'), 'REAL')
+    print(f"\n📊 Cadence {periode_ms} ms : {stats['cycles']} calculs de signaux en {duree:.0f} s "
+          f"(~{attendus:.0f} attendus), retard max {stats['retard_max_ms']} ms, {nb_tags} tags de charge")
+    print(f"  Séquence vue {sorted(valeurs_sequence)}, octets de rafale vus {sorted(rafales)}, "
+          f"charge modifiée {changements} fois, rampe {rampe:.2f}")
+    if stats['cycles'] < attendus * 0.5 or valeurs_sequence != {1, 2, 3} or rafales != {0, 0xFF} \
+            or changements < 10 or not 0 <= rampe <= 10 or stats['actif']:
+        erreurs += 1
+    return erreurs
+
+
+def tester_lecture_groupee(nb_tags):
+    """Milliers de tags lus par planification de plages et décodage du mode REEL, en quelques échanges"""
+    erreurs = 0
+    automate = automate_simule(scenario_charge(nb_tags, 1000))
+    automate.connect(force_simulation=True)
+    try:
+        demandes = [(f'DB{DB_CHARGE}.DBD{4 * i}', 'REAL') for i in range(nb_tags)]
+        demandes += [('DB1.DBW4', 'INT'), ('DB1.DBD8', 'REAL'), ('MW10', 'INT')]
+        # Mémoire figée pendant la lecture : comparaison exacte avec un décodage direct
+        automate.simulateur.arreter()
+
+        echanges = automate.simulateur.echanges
+        debut = time.perf_counter()
+        resultats = automate.lire_tags_par_adresses(demandes)
+        duree = time.perf_counter() - debut
+        echanges = automate.simulateur.echanges - echanges
+
+        memoire = automate.simulateur.memoire
+        attendues = [memoire.lire_valeur(compiler_adresse(adresse), type_donnee) for adresse, type_donnee in demandes]
+        exactes = sum(1 for (valeur, qualite), attendue in zip(resultats, attendues)
+                      if qualite == QUALITE_GOOD and valeur == attendue)
+        print(f"\n📊 Lecture groupée simulée : {len(demandes)} tags en {duree * 1000:.1f} ms, "
+              f"{echanges} échange(s) avec la CPU simulée, {exactes}/{len(demandes)} valeurs exactes")
+        print(f"  Valeurs initiales du scénario {[valeur for valeur, _ in resultats[-3:]]}")
+        if exactes != len(demandes) or echanges > len(demandes) // 50 \
+                or [valeur for valeur, _ in resultats[-3:]] != [123, 2.5, -7]:
+            erreurs += 1
+    finally:
+        automate.disconnect()
+        image_tags.vider(automate.nom)
+    return erreurs
+
+
+def tester_ecritures():
+    """Écritures unitaires et groupées relues dans la mémoire simulée, adresse hors DB refusée"""
+    erreurs = 0
+    automate = automate_simule({'db': {'1': 64}, 'taille_db': 64})
+    automate.connect(force_simulation=True)
+    try:
+        memoire = automate.simulateur.memoire
+        memoire.ecrire('DB', 1, 50, bytes([0b10110100]))
+        unitaires = [
+            automate.ecrire_tag_par_adresse(adresse, valeur, type_donnee)[0] for adresse, valeur, type_donnee in (
+                ('DB1.DBW0', -1234, 'INT'), ('DB1.DBD2', 3.5, 'REAL'), ('QW4', 77, 'INT'), ('C3', 42, 'COUNTER'))
+        ]
+        groupees = automate.ecrire_tags_par_adresses([
+            ('DB1.DBX50.0', True, 'BOOL'), ('DB1.DBX50.1', True, 'BOOL'), ('DB1.DBX50.7', False, 'BOOL'),
+            ('DB1.DBW10', 11, 'INT'), ('DB1.DBW12', 12, 'INT'), ('DB1.DBW60', 1, 'INT'), ('DB1.DBW70', 1, 'INT')])
+        relus = [memoire.lire_valeur(compiler_adresse(adresse), type_donnee) for adresse, type_donnee in (
+            ('DB1.DBW0', 'INT'), ('DB1.DBD2', 'REAL'), ('QW4', 'INT'), ('C3', 'COUNTER'),
+            ('DB1.DBW10', 'INT'), ('DB1.DBW12', 'INT'))]
+        octet = memoire.lire('DB', 1, 50, 1)[0]
+        succes_groupees = [succes for succes, _ in groupees]
+
+        try:
+            ClientSimule(automate.simulateur).db_read(1, 63, 2)
+            hors_zone = False
+        except ErreurS7Simulee:
+            hors_zone = True
+
+        print(f"\n📊 Écritures simulées : unitaires {unitaires}, groupées {succes_groupees}")
+        print(f"  Relues {relus}, octet partagé 0b{octet:08b} (attendu 0b00110111), hors zone refusée {hors_zone}")
+        if unitaires != [True] * 4 or succes_groupees != [True] * 6 + [False] \
+                or relus != [-1234, 3.5, 77, 42, 11, 12] or octet != 0b00110111 or not hors_zone:
+            erreurs += 1
+    finally:
+        automate.disconnect()
+        image_tags.vider(automate.nom)
+    return erreurs
+
+
+def tester_configuration():
+    """Scénario JSON, taille des DB et charge de N tags lus dans la configuration Flask"""
+    erreurs = 0
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as fichier:
+        json.dump({'db': {'7': 32}, 'valeurs': {'DB7.DBW0': 99}}, fichier)
+    try:
+        app = SimpleNamespace(config={
+            'SIMULATEUR_SCENARIO': fichier.name, 'SIMULATEUR_TAILLE_DB': 2048, 'SIMULATEUR_NB_TAGS': 600,
+            'SIMULATEUR_DB_CHARGE': 200, 'SIMULATEUR_PERIODE_CHARGE_MS': 50, 'SIMULATEUR_SIGNAUX_ACTIFS': False
+        })
+        simulateur = SimulateurS7()
+        simulateur.init_app(app)
+    finally:
+        os.unlink(fichier.name)
+
+    memoire = simulateur.memoire
+    charge = simulateur.signaux[-1]
+    tailles = {numero: len(tableau) for numero, tableau in memoire.dbs.items()}
+    memoire.creer_db(8)
+    print(f"\n📊 Configuration : DB {tailles}, DB non déclaré {len(memoire.dbs[8])} octets, "
+          f"charge {charge!r} x {charge.nombre}, DB7.DBW0 = {memoire.lire_valeur(compiler_adresse('DB7.DBW0'))}")
+    if tailles != {7: 32, 200: 2400} or len(memoire.dbs[8]) != 2048 or charge.nombre != 600 \
+            or charge.periode_s != 0.05 or memoire.lire_valeur(compiler_adresse('DB7.DBW0')) != 99:
+        erreurs += 1
+    return erreurs
+
+
+def tester_serveur_snap7(nb_tags):
+    """Pilote réel (mode REEL, pool snap7) contre la mémoire simulée servie sur 127.0.0.1"""
+    erreurs = 0
+    simulateur = SimulateurS7(scenario_charge(nb_tags, 20))
+    simulateur.port = PORT_SERVEUR_S7
+    simulateur.demarrer()
+
+    automate = AutomateSiemensS7Complete()
+    automate.nom = 'test-simulateur-snap7'
+    automate.ip_address = '127.0.0.1'
+    automate.port = PORT_SERVEUR_S7
+    automate.validation_ping = False
+    try:
+        succes, message = automate.connect()
+        print(f"\n📊 Serveur snap7 simulé : {message}")
+        demandes = [(f'DB{DB_CHARGE}.DBD{4 * i}', 'REAL') for i in range(nb_tags)] + [('DB1.DBW4', 'INT')]
+        debut = time.perf_counter()
+        resultats = automate.lire_tags_par_adresses(demandes)
+        duree = time.perf_counter() - debut
+        bonnes = sum(1 for valeur, qualite in resultats if qualite == QUALITE_GOOD and valeur is not None)
+
+        ecrits = automate.ecrire_tags_par_adresses([('DB1.DBW100', 4321, 'INT'), ('MW20', -5, 'INT')])
+        relus = [simulateur.memoire.lire_valeur(compiler_adresse('DB1.DBW100')),
+                 simulateur.memoire.lire_valeur(compiler_adresse('MW20'))]
+        print(f"  {bonnes}/{len(demandes)} tags lus en {duree * 1000:.1f} ms, DB1.DBW4 = {resultats[-1][0]}, "
+              f"écritures {[ok for ok, _ in ecrits]} relues {relus}")
+        if not succes or bonnes != len(demandes) or resultats[-1][0] != 123 or relus != [4321, -5]:
+            erreurs += 1
+    finally:
+        automate.disconnect()
+        simulateur.arreter()
+        image_tags.vider(automate.nom)
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de la CPU S7 simulée")
+    parser.add_argument('--tags', type=int, default=5000)
+    parser.add_argument('--periode-ms', type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    print("🎮 TEST SIMULATEUR S7")
+    print("=" * 60)
+
+    erreurs = tester_signaux()
+    erreurs += tester_cadence(args.tags, args.periode_ms)
+    erreurs += tester_lecture_groupee(args.tags)
+    erreurs += tester_ecritures()
+    erreurs += tester_configuration()
+
+    try:
+        import snap7
+        erreurs += tester_serveur_snap7(args.tags)
+    except ImportError:
+        print("\n⚠️ snap7 non installé - test du serveur simulé ignoré")
+
+    print("\n" + ("✅ CPU simulée fidèle au mode REEL" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
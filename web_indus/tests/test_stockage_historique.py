@@ -0,0 +1,189 @@
+# Test du stockage compact de l'historique : place occupée par une journée à 1 Hz dans l'ancien
+# schéma (Historique_tag + HISTORISER) vs mesures typées (Historique_Mesure) puis blocs compressés
+# (Historique_Bloc), lecture de plages sans perte, mesures arrivées après le compactage
+# Usage : python tests/test_stockage_historique.py [--points 86400]
+import os
+import sys
+import math
+import time
+import random
+import struct
+import argparse
+import logging
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import insert, text
+from app import create_app, db
+from app.models.modele_tag import HistoriqueTag, Historiser, MesureHistorique, BlocHistorique
+from app.utils.stockage_historique import (
+    StockageHistorique, horodatage_ms, depuis_horodatage_ms, code_qualite, MS_PAR_JOUR
+)
+
+ID_TAG = 1
+ORIGINE = datetime(2026, 3, 1, 12, 0, 0)   # Midi : la série couvre deux journées
+
+
+def generer_serie(nb_points):
+    """Température lue en REAL (float32) toutes les secondes, gigue de scrutation de quelques ms"""
+    debut = horodatage_ms(ORIGINE)
+    horodatages, valeurs, qualites = [], [], []
+    for i in range(nb_points):
+        mesure = 20 + 5 * math.sin(i / 3000) + random.gauss(0, 0.05)
+        horodatages.append(debut + i * 1000 + random.randint(-3, 3))
+        valeurs.append(struct.unpack('>f', struct.pack('>f', mesure))[0])
+        qualites.append('BAD' if i % 10000 == 5000 else 'GOOD')
+    return horodatages, valeurs, qualites
+
+
+def taille_tables(*tables):
+    """Octets occupés par des tables et leurs index (table virtuelle dbstat de SQLite)"""
+    return db.session.execute(text(
+        "SELECT COALESCE(SUM(d.pgsize), 0) FROM dbstat d JOIN sqlite_master m ON d.name = m.name "
+        f"WHERE m.tbl_name IN ({', '.join(repr(t) for t in tables)})"
+    )).scalar()
+
+
+def ecrire_ancien_schema(horodatages, valeurs, qualites):
+    with db.engine.begin() as connexion:
+        connexion.execute(insert(HistoriqueTag.__table__), [
+            {'id_historique': i + 1, 'valeur_historique': str(v), 'timestamp_hist': depuis_horodatage_ms(h),
+             'qualite_hist': q, 'type_changement': 'LECTURE_AUTO'}
+            for i, (h, v, q) in enumerate(zip(horodatages, valeurs, qualites))
+        ])
+        connexion.execute(insert(Historiser.__table__), [
+            {'id_tag': ID_TAG, 'id_historique': i + 1} for i in range(len(horodatages))
+        ])
+
+
+def lire_ancien_schema(debut, fin):
+    return db.session.query(HistoriqueTag.timestamp_hist, HistoriqueTag.valeur_historique).join(
+        Historiser, Historiser.id_historique == HistoriqueTag.id_historique
+    ).filter(
+        Historiser.id_tag == ID_TAG,
+        HistoriqueTag.timestamp_hist.between(depuis_horodatage_ms(debut), depuis_horodatage_ms(fin))
+    ).order_by(HistoriqueTag.timestamp_hist).all()
+
+
+def tester_place(app, stockage, serie):
+    erreurs = 0
+    horodatages, valeurs, qualites = serie
+
+    with app.app_context():
+        ecrire_ancien_schema(horodatages, valeurs, qualites)
+        taille_ancienne = taille_tables('Historique_tag', 'HISTORISER')
+
+        with db.engine.begin() as connexion:
+            stockage.ecrire(connexion, [(ID_TAG, h, v, code_qualite(q)) for h, v, q in zip(horodatages, valeurs, qualites)])
+        taille_brute = taille_tables('Historique_Mesure')
+
+    debut = time.perf_counter()
+    compactes = stockage.compacter(limite_ms=horodatages[-1] // MS_PAR_JOUR * MS_PAR_JOUR + MS_PAR_JOUR)
+    duree = time.perf_counter() - debut
+
+    with app.app_context():
+        taille_blocs = taille_tables('Historique_Bloc')
+        blocs = BlocHistorique.query.count()
+        restantes = MesureHistorique.query.count()
+
+    nombre = len(horodatages)
+    ratio = taille_ancienne / max(taille_blocs, 1)
+    print(f"\n📊 Place occupée par {nombre} points (1 Hz)")
+    print(f"  Historique_tag + HISTORISER : {taille_ancienne / 1024:9.1f} Ko ({taille_ancienne / nombre:5.1f} o/point)")
+    print(f"  Historique_Mesure (brut)    : {taille_brute / 1024:9.1f} Ko ({taille_brute / nombre:5.1f} o/point)")
+    print(f"  Historique_Bloc (compressé) : {taille_blocs / 1024:9.1f} Ko ({taille_blocs / nombre:5.1f} o/point), "
+          f"{blocs} bloc(s) journalier(s), compactage {duree * 1000:.0f} ms")
+    print(f"  Gain : x{ratio:.1f}")
+
+    if compactes != nombre or restantes != 0 or blocs != 2 or ratio < 10:
+        erreurs += 1
+    return erreurs
+
+
+def tester_lecture(app, stockage, serie):
+    erreurs = 0
+    horodatages, valeurs, qualites = serie
+
+    print("\n📊 Lecture de plages (blocs décompressés vs jointure Historique_tag / HISTORISER)")
+    heure = 3600 * 1000
+    minuit = horodatages[0] // MS_PAR_JOUR * MS_PAR_JOUR + MS_PAR_JOUR
+    plages = [
+        ('1 h à cheval sur minuit', minuit - heure // 2, minuit + heure // 2),
+        ('Série complète', horodatages[0], horodatages[-1]),
+    ]
+    for nom, debut, fin in plages:
+        t0 = time.perf_counter()
+        lue = stockage.lire_plage(ID_TAG, debut, fin)
+        duree_blocs = time.perf_counter() - t0
+
+        with app.app_context():
+            t0 = time.perf_counter()
+            ancienne = lire_ancien_schema(debut, fin)
+            duree_ancienne = time.perf_counter() - t0
+
+        attendus = [i for i, h in enumerate(horodatages) if debut <= h <= fin]
+        identique = (
+            list(lue.horodatages) == [horodatages[i] for i in attendus]
+            and list(lue.valeurs) == [valeurs[i] for i in attendus]
+            and lue.vers_dict()['qualites'] == [qualites[i] for i in attendus]
+        )
+        print(f"  {'✅' if identique else '❌'} {nom:24s}: {len(lue):6d} points en {duree_blocs * 1000:7.1f} ms "
+              f"(ancien schéma : {len(ancienne)} lignes en {duree_ancienne * 1000:7.1f} ms)")
+        if not identique or len(ancienne) != len(attendus):
+            erreurs += 1
+    return erreurs
+
+
+def tester_retardataires(app, stockage, serie):
+    """Mesure d'une journée déjà compactée : lue dans l'ordre, puis fusionnée dans le bloc existant"""
+    erreurs = 0
+    horodatages = serie[0]
+    retard = horodatages[100] + 500     # Entre deux points du premier bloc
+
+    with app.app_context():
+        with db.engine.begin() as connexion:
+            stockage.ecrire(connexion, [(ID_TAG, retard, -1.0, code_qualite('GOOD'))])
+
+    lue = stockage.lire_plage(ID_TAG, horodatages[99], horodatages[102])
+    ordre_ok = list(lue.horodatages) == [horodatages[99], horodatages[100], retard, horodatages[101], horodatages[102]]
+
+    stockage.compacter(limite_ms=horodatages[-1] // MS_PAR_JOUR * MS_PAR_JOUR + MS_PAR_JOUR)
+    with app.app_context():
+        points = sum(b.nb_points for b in BlocHistorique.query.all())
+        restantes = MesureHistorique.query.count()
+    relue = stockage.lire_plage(ID_TAG, horodatages[99], horodatages[102])
+
+    print(f"\n📊 Mesure en retard : lue dans l'ordre {ordre_ok}, fusionnée dans le bloc "
+          f"({points} points en blocs, {restantes} mesure brute restante)")
+    if not ordre_ok or points != len(horodatages) + 1 or restantes != 0 \
+            or list(relue.horodatages) != list(lue.horodatages) or -1.0 not in relue.valeurs:
+        erreurs += 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test du stockage compact de l'historique")
+    parser.add_argument('--points', type=int, default=86400)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    print("🗜️ TEST STOCKAGE COMPACT DE L'HISTORIQUE")
+    print("=" * 60)
+
+    app = create_app('testing')
+    with app.app_context():
+        db.metadata.create_all(bind=db.engine, tables=[
+            HistoriqueTag.__table__, Historiser.__table__, MesureHistorique.__table__, BlocHistorique.__table__
+        ])
+    stockage = StockageHistorique()
+    stockage.init_app(app)
+
+    serie = generer_serie(args.points)
+    erreurs = tester_place(app, stockage, serie)
+    erreurs += tester_lecture(app, stockage, serie)
+    erreurs += tester_retardataires(app, stockage, serie)
+
+    print("\n" + ("✅ Historique compressé, relu sans perte" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)
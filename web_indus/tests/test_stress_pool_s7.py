@@ -0,0 +1,222 @@
+# Test de charge du pool de connexions S7 : lectures et écritures de bits concurrentes
+# Vérifie qu'aucun client n'est utilisé par deux threads à la fois et qu'aucune écriture de bit n'est perdue
+# Usage : python tests/test_stress_pool_s7.py [--threads 8] [--operations 200] [--pool 3]
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.controleur.controleur_tags import AutomateSiemensS7Complete
+from app.utils.pool_s7 import PoolConnexionsS7
+
+PORT_SERVEUR_S7 = 1102
+TAILLE_DB = 256
+
+
+class FauxAutomate:
+    """Mémoire de l'automate : chaque requête S7 est traitée atomiquement par la CPU"""
+
+    def __init__(self, nb_dbs=2):
+        self.dbs = {db: bytearray(TAILLE_DB) for db in range(1, nb_dbs + 1)}
+        self.verrou = threading.Lock()
+
+
+class FauxClientS7:
+    """Client S7 en mémoire qui détecte les appels concurrents (non supportés par snap7)"""
+
+    def __init__(self, automate, latence=0.001):
+        self.automate = automate
+        self.latence = latence
+        self.en_cours = threading.Lock()
+        self.violations = 0
+        self.requetes = 0
+
+    def _requete(self, operation):
+        if not self.en_cours.acquire(blocking=False):
+            self.violations += 1
+            self.en_cours.acquire()
+        try:
+            self.requetes += 1
+            time.sleep(self.latence)
+            with self.automate.verrou:
+                return operation()
+        finally:
+            self.en_cours.release()
+
+    def db_read(self, db, debut, taille):
+        return self._requete(lambda: bytearray(self.automate.dbs[db][debut:debut + taille]))
+
+    def db_write(self, db, debut, data):
+        def ecrire():
+            self.automate.dbs[db][debut:debut + len(data)] = data
+        self._requete(ecrire)
+
+    def get_pdu_length(self):
+        return 240
+
+    def get_connected(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+
+def lancer_charge(automate, nb_threads, operations):
+    """
+    Chaque thread possède un bit de DB1.DBX0.x (même octet pour tous) et l'écrit en alternance,
+    en lisant des variables entre deux écritures. Retourne: (durée, valeurs finales attendues, erreurs)
+    """
+    attendus = {}
+    erreurs = []
+    lectures = [(f"DB2.DBW{2 * i}", 'INT') for i in range(20)]
+    depart = threading.Barrier(nb_threads)
+
+    def travailleur(numero):
+        bit = numero % 8
+        octet = numero // 8
+        valeur = False
+        depart.wait()
+        for i in range(operations):
+            valeur = not valeur
+            succes, statut = automate.ecrire_tag_par_adresse(f"DB1.DBX{octet}.{bit}", valeur, 'BOOL')
+            if not succes:
+                erreurs.append(statut)
+            if i % 4 == 0:
+                automate.lire_tags_par_adresses(lectures)
+        attendus[(octet, bit)] = valeur
+
+    threads = [threading.Thread(target=travailleur, args=(n,)) for n in range(nb_threads)]
+    debut = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - debut, attendus, erreurs
+
+
+def verifier_bits(memoire, attendus):
+    """Bits perdus : valeur finale différente de la dernière valeur écrite par son thread"""
+    return sum(
+        1 for (octet, bit), valeur in attendus.items()
+        if bool(memoire[octet] & (1 << bit)) != valeur
+    )
+
+
+def preparer_automate(pool):
+    automate = AutomateSiemensS7Complete()
+    automate.pool = pool
+    automate.connected = True
+    automate.simulation_mode = False
+    return automate
+
+
+def stress_client_partage(nb_threads, operations):
+    """Ancien fonctionnement : un seul client partagé sans verrou, bits écrits par lecture-modification-écriture"""
+    memoire = FauxAutomate()
+    client = FauxClientS7(memoire)
+
+    def ecrire_bit_sans_verrou(db, octet, bit, valeur):
+        data = client.db_read(db, octet, 1)
+        byte_val = data[0] | (1 << bit) if valeur else data[0] & ~(1 << bit)
+        client.db_write(db, octet, bytes([byte_val]))
+
+    class AutomatePartage:
+        def ecrire_tag_par_adresse(self, adresse, valeur, type_attendu):
+            octet, bit = adresse.split('DBX')[1].split('.')
+            ecrire_bit_sans_verrou(1, int(octet), int(bit), valeur)
+            return True, "OK"
+
+        def lire_tags_par_adresses(self, demandes):
+            for adresse, _ in demandes[:1]:
+                client.db_read(2, 0, 40)
+
+    duree, attendus, _ = lancer_charge(AutomatePartage(), nb_threads, operations)
+    perdus = verifier_bits(memoire.dbs[1], attendus)
+    print(f"  {'Client partagé (avant)':<32} {duree:6.2f} s  appels concurrents: {client.violations:5d}  bits perdus: {perdus}")
+    return perdus
+
+
+def stress_pool(nb_threads, operations, taille_pool):
+    memoire = FauxAutomate()
+    clients = []
+
+    def fabrique():
+        client = FauxClientS7(memoire)
+        clients.append(client)
+        return client
+
+    pool = PoolConnexionsS7(fabrique, taille=taille_pool)
+    automate = preparer_automate(pool)
+
+    duree, attendus, erreurs = lancer_charge(automate, nb_threads, operations)
+    violations = sum(client.violations for client in clients)
+    perdus = verifier_bits(memoire.dbs[1], attendus)
+    requetes = sum(client.requetes for client in clients)
+    stats = pool.stats()
+
+    print(f"  {f'Pool de {taille_pool} connexion(s)':<32} {duree:6.2f} s  appels concurrents: {violations:5d}  bits perdus: {perdus}")
+    print(f"    {requetes / duree:8.0f} requêtes S7/s, {stats['emprunts']} emprunts, "
+          f"{stats['attentes']} attentes (moy. {stats['attente_moyenne_ms']} ms), erreurs: {len(erreurs)}")
+    return violations + perdus + len(erreurs)
+
+
+def stress_serveur_snap7(nb_threads, operations, taille_pool):
+    try:
+        import ctypes
+        import snap7
+        from snap7.types import srvAreaDB
+    except ImportError:
+        print("\n⚠️ snap7 non installé - test sur serveur S7 local ignoré")
+        return 0
+
+    print(f"\n📊 Serveur snap7 local (port {PORT_SERVEUR_S7}), pool de {taille_pool} connexions")
+    serveur = snap7.server.Server()
+    zones = {db: (ctypes.c_uint8 * TAILLE_DB)() for db in (1, 2)}
+    for db, zone in zones.items():
+        serveur.register_area(srvAreaDB, db, zone)
+    serveur.start(tcpport=PORT_SERVEUR_S7)
+
+    try:
+        def fabrique():
+            client = snap7.client.Client()
+            client.connect('127.0.0.1', 0, 1, PORT_SERVEUR_S7)
+            return client
+
+        pool = PoolConnexionsS7(fabrique, taille=taille_pool)
+        automate = preparer_automate(pool)
+
+        duree, attendus, erreurs = lancer_charge(automate, nb_threads, operations)
+        perdus = verifier_bits(bytes(zones[1]), attendus)
+        stats = pool.stats()
+        print(f"  {duree:6.2f} s, {stats['emprunts'] / duree:8.0f} échanges/s, bits perdus: {perdus}, "
+              f"erreurs: {len(erreurs)}, écriture de bit seul: {automate.bits_atomiques}")
+        pool.fermer()
+        return perdus + len(erreurs)
+    finally:
+        serveur.stop()
+        serveur.destroy()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge du pool de connexions S7")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=200)
+    parser.add_argument('--pool', type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(42)
+
+    print("🏭 TEST DE CHARGE POOL S7")
+    print("=" * 60)
+    print(f"\n📊 Faux automate en mémoire ({args.threads} threads x {args.operations} écritures de bits)")
+    stress_client_partage(args.threads, args.operations)
+    defauts = stress_pool(args.threads, args.operations, 1)
+    defauts += stress_pool(args.threads, args.operations, args.pool)
+    defauts += stress_serveur_snap7(args.threads, args.operations, args.pool)
+
+    print("\n" + ("✅ Aucun appel concurrent, aucune écriture perdue" if not defauts else f"❌ {defauts} défaut(s)"))
+    sys.exit(1 if defauts else 0)
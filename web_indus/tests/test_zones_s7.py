@@ -0,0 +1,192 @@
+# Test des zones S7 hors DB (I, Q, M, T, C) et des types étendus (BYTE, WORD, DWORD, LREAL, STRING, DTL)
+# contre un serveur snap7 local : lecture groupée d'un lot mêlant les zones (une PDU read_multi_vars),
+# lectures unitaires et écritures aller-retour
+# Usage : python tests/test_zones_s7.py
+import os
+import sys
+import struct
+import ctypes
+import argparse
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.controleur.controleur_tags import AutomateSiemensS7Complete
+from app.utils.image_tags import image_tags, cle_image, QUALITE_GOOD
+from app.utils.acquisition import MoteurAcquisition
+
+PORT_SERVEUR_S7 = 1102
+TAILLE_ZONE = 256
+
+
+def demarrer_serveur():
+    import snap7
+    from snap7.types import srvAreaDB, srvAreaPE, srvAreaPA, srvAreaMK, srvAreaTM, srvAreaCT
+
+    serveur = snap7.server.Server()
+    zones = {}
+    for nom, area in (('DB', srvAreaDB), ('I', srvAreaPE), ('Q', srvAreaPA), ('M', srvAreaMK),
+                      ('T', srvAreaTM), ('C', srvAreaCT)):
+        zones[nom] = (ctypes.c_uint8 * TAILLE_ZONE)()
+        serveur.register_area(area, 1 if nom == 'DB' else 0, zones[nom])
+
+    zones['I'][0] = 0b00000101                                       # I0.0, I0.2
+    zones['I'][1] = 200                                              # IB1
+    zones['Q'][2:4] = struct.pack('>H', 0xBEEF)                      # QW2 en WORD
+    zones['M'][10] = 0b00001000                                      # M10.3
+    zones['M'][12:16] = struct.pack('>i', -123456)                   # MD12
+    zones['M'][16:24] = struct.pack('>d', 3.14159265358979)          # MLR16
+    zones['DB'][0:8] = struct.pack('>d', -2.5)                       # DB1.DBLR0
+    zones['DB'][10:18] = bytes([20, 6]) + b'Pompe1'                  # DB1.DBS10.20
+    zones['DB'][40:52] = struct.pack('>HBBBBBBI', 2024, 3, 15, 6, 8, 30, 0, 500000000)   # DB1.DBDTL40
+    zones['DB'][120:122] = struct.pack('>H', 0xFFFF)                 # DB1.DBW120 : tags INT et WORD
+
+    serveur._zones = zones
+    serveur.start(tcpport=PORT_SERVEUR_S7)
+    return serveur
+
+
+def preparer_automate():
+    automate = AutomateSiemensS7Complete()
+    automate.nom = 'test-zones'
+    automate.ip_address = '127.0.0.1'
+    automate.port = PORT_SERVEUR_S7
+    automate.validation_ping = False
+    automate.simulation_mode = False
+    return automate
+
+
+LOT = [
+    (('I0.0', 'BOOL'), True),
+    (('E0.1', 'BOOL'), False),
+    (('I0.2', 'BOOL'), True),
+    (('IB1', 'BYTE'), 200),
+    (('QW2', 'WORD'), 0xBEEF),
+    (('M10.3', 'BOOL'), True),
+    (('MD12', 'DINT'), -123456),
+    (('MLR16', 'LREAL'), 3.14159265358979),
+    (('DB1.DBLR0', 'LREAL'), -2.5),
+    (('DB1.DBS10.20', 'STRING'), 'Pompe1'),
+    (('DB1.DBDTL40', 'DTL'), '2024-03-15T08:30:00.500000'),
+    (('T5', 'TIMER'), 12300),
+    (('C3', 'COUNTER'), 42),
+]
+
+
+def tester_lecture_groupee(automate):
+    erreurs = 0
+    requetes = []
+
+    # Le serveur snap7 ne range pas les temporisations / compteurs comme une CPU (N -> octet N/2) :
+    # leurs valeurs sont posées par le client, qui les adresse par numéro
+    for (adresse, type_donnee), valeur in LOT:
+        if type_donnee in ('TIMER', 'COUNTER'):
+            automate.ecrire_tag_par_adresse(adresse, valeur, type_donnee)
+
+    lecture = automate._read_multi_vars
+
+    def compter(client, plages):
+        requetes.append(len(plages))
+        return lecture(client, plages)
+
+    automate._read_multi_vars = compter
+    try:
+        resultats = automate.lire_tags_par_adresses([demande for demande, _ in LOT])
+    finally:
+        del automate._read_multi_vars
+
+    print(f"\n📊 Lecture groupée : {len(LOT)} variables, {len(requetes)} requête(s) read_multi_vars {requetes}")
+    for ((adresse, type_donnee), attendu), (valeur, qualite) in zip(LOT, resultats):
+        ok = qualite == QUALITE_GOOD and valeur == attendu
+        print(f"  {'✅' if ok else '❌'} {adresse:14s} {type_donnee:8s} = {valeur!r} ({qualite})")
+        erreurs += 0 if ok else 1
+
+    # 6 zones (I, Q, M, DB, T, C) : au plus une plage par zone et par trou > ECART_MAX_FUSION
+    if len(requetes) != 1 or requetes[0] > 7:
+        erreurs += 1
+        print("❌ Le lot n'est pas lu en une seule PDU")
+    return erreurs
+
+
+def tester_meme_mot(automate):
+    """Tags INT et WORD sur le même DBW : une clé d'image et un décodage chacun"""
+    erreurs = 0
+    demandes = [('DB1.DBW120', 'INT'), ('DB1.DBW120', 'WORD')]
+    resultats = automate.lire_tags_par_adresses(demandes)
+    cles = [cle_image(automate.nom, adresse, type_donnee) for adresse, type_donnee in demandes]
+    image = [image_tags.lire(cle).valeur for cle in cles]
+
+    moteur = MoteurAcquisition(automate)
+    for adresse, type_donnee in demandes:
+        moteur.abonner(adresse, type_donnee, permanent=True)
+    abonnements = sorted(abonnement.type_donnee for abonnement in moteur._abonnements.values())
+
+    # Écriture WORD publiée sous sa seule clé : le tag INT garde son décodage
+    automate.ecrire_tag_par_adresse('DB1.DBW120', 0xFFFE, 'WORD')
+    apres_ecriture = [image_tags.lire(cle).valeur for cle in cles]
+
+    print(f"\n📊 Même mot 0xFFFF : lu {[valeur for valeur, _ in resultats]}, image {image}, "
+          f"abonnements {abonnements}, après écriture WORD 0xFFFE {apres_ecriture}")
+    if [valeur for valeur, _ in resultats] != [-1, 0xFFFF] or image != [-1, 0xFFFF] \
+            or abonnements != ['INT', 'WORD'] or apres_ecriture != [-1, 0xFFFE]:
+        erreurs += 1
+    return erreurs
+
+
+def tester_ecritures(automate):
+    erreurs = 0
+    ecritures = [
+        ('M20.5', 'BOOL', True),
+        ('MB21', 'BYTE', 250),
+        ('QW4', 'INT', -1234),
+        ('MD24', 'DWORD', 0xDEADBEEF),
+        ('MD28', 'REAL', 1.5),
+        ('DB1.DBLR60', 'LREAL', 6.02214076e23),
+        ('DB1.DBS70.10', 'STRING', 'Vanne_02'),
+        ('MDTL100', 'DTL', '2025-12-31T23:59:59'),
+        ('T7', 'TIMER', 4500),
+        ('C9', 'COUNTER', 999),
+    ]
+
+    print("\n📊 Écritures aller-retour")
+    for adresse, type_donnee, valeur in ecritures:
+        succes, message = automate.ecrire_tag_par_adresse(adresse, valeur, type_donnee)
+        relu, qualite = automate.lire_tag_par_adresse(adresse, type_donnee)
+        ok = succes and qualite == QUALITE_GOOD and relu == valeur
+        print(f"  {'✅' if ok else '❌'} {adresse:14s} {type_donnee:8s} écrit {valeur!r}, relu {relu!r} ({message})")
+        erreurs += 0 if ok else 1
+    return erreurs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test des zones S7 I/Q/M/T/C et des types étendus")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    try:
+        import snap7
+    except ImportError:
+        print("⚠️ snap7 non installé - test ignoré")
+        sys.exit(0)
+
+    print("🧭 TEST ZONES S7 ET TYPES ÉTENDUS")
+    print("=" * 60)
+
+    serveur = demarrer_serveur()
+    automate = preparer_automate()
+    try:
+        succes, message = automate.connect()
+        print(f"  {message}")
+        erreurs = 0 if succes else 1
+        erreurs += tester_lecture_groupee(automate)
+        erreurs += tester_meme_mot(automate)
+        erreurs += tester_ecritures(automate)
+    finally:
+        automate.disconnect()
+        serveur.stop()
+        serveur.destroy()
+        image_tags.vider(automate.nom)
+
+    print("\n" + ("✅ Zones et types étendus lus et écrits" if not erreurs else f"❌ {erreurs} erreur(s)"))
+    sys.exit(1 if erreurs else 0)